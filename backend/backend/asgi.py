@@ -3,6 +3,9 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Proceso `asgi` del Procfile (uvicorn): sirve las vistas async de /api/async/
+(logistics/async_views.py). El resto de la API sigue en gunicorn (WSGI).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
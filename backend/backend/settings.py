@@ -11,7 +11,12 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
+
+from logistics.cache_compartida import (
+    ALIASES as ALIASES_CACHE, backend_por_defecto, configurar_caches, verificar_contadores,
+)
+from logistics.hashers import lista_hashers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +55,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'logistics.throttling.RateLimitMiddleware',
+    'logistics.replicas.ReplicasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,19 +89,19 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # Base de datos SQLite
+# SQLITE_DB permite apuntar a otra base (por ejemplo, la del benchmark_asgi)
+SQLITE_DB = config('SQLITE_DB', default=str(BASE_DIR / 'tecnoroute.sqlite3'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'tecnoroute.sqlite3',
+        'NAME': SQLITE_DB,
         'OPTIONS': {
             'timeout': 10,
         }
     }
 }
 
-print("SQLite configurado como base de datos principal")
-print(f"Ubicacion: {BASE_DIR / 'tecnoroute.sqlite3'}")
-
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -115,6 +122,32 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing (logistics.hashers)
+# Algoritmo para contraseñas nuevas: scrypt, argon2 (requiere argon2-cffi) o pbkdf2.
+# Los hashes con otro algoritmo o costo se actualizan en el siguiente login.
+# Para comparar configuraciones en un servidor: python manage.py benchmark_hashers
+
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='scrypt')
+
+PASSWORD_HASHER_PARAMS = {
+    'scrypt': {
+        'work_factor': config('PASSWORD_SCRYPT_WORK_FACTOR', default=2**14, cast=int),
+        'block_size': config('PASSWORD_SCRYPT_BLOCK_SIZE', default=8, cast=int),
+        'parallelism': config('PASSWORD_SCRYPT_PARALLELISM', default=1, cast=int),
+    },
+    'argon2': {
+        'time_cost': config('PASSWORD_ARGON2_TIME_COST', default=2, cast=int),
+        'memory_cost': config('PASSWORD_ARGON2_MEMORY_COST', default=19456, cast=int),  # KiB
+        'parallelism': config('PASSWORD_ARGON2_PARALLELISM', default=1, cast=int),
+    },
+    'pbkdf2': {
+        'iterations': config('PASSWORD_PBKDF2_ITERATIONS', default=600000, cast=int),
+    },
+}
+
+PASSWORD_HASHERS = lista_hashers(PASSWORD_HASHER)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -139,17 +172,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Session configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
-SESSION_CACHE_ALIAS = 'default'
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
-# Cache configuration (for sessions)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+# Caché compartida entre procesos (logistics/cache_compartida.py)
+# CACHE_BACKEND: memoria (por proceso), archivo (procesos del mismo servidor),
+# base_de_datos (python manage.py createcachetable) o redis (REDIS_URL).
+# CACHE_BACKEND_<ALIAS> cambia el de un alias, por ejemplo CACHE_BACKEND_SESSIONS=base_de_datos.
+# Sin ninguno: redis con REDIS_URL; si no, archivo y memoria para ratelimit (necesita incr atómico)
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_BACKEND = config('CACHE_BACKEND', default='')
+CACHE_BACKENDS = {
+    alias: config(f'CACHE_BACKEND_{alias.upper()}', default=CACHE_BACKEND or backend_por_defecto(alias, REDIS_URL))
+    for alias in ALIASES_CACHE
 }
+verificar_contadores(CACHE_BACKENDS)
+CACHES = configurar_caches(
+    CACHE_BACKENDS,
+    directorio=config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+    redis_url=REDIS_URL,
+    version=config('CACHE_VERSION', default=1, cast=int),  # subirla invalida todas las claves
+    maximo=config('CACHE_MAXIMO', default=10000, cast=int),  # entradas por alias (memoria, archivo y base de datos)
+    conexiones=config('CACHE_REDIS_CONEXIONES', default=50, cast=int),  # pool por proceso
+)
 
 # Django REST Framework settings
 REST_FRAMEWORK = {
@@ -157,7 +203,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'logistics.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_RENDERER_CLASSES': [
@@ -166,8 +212,140 @@ REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    # Proxies propios delante de la app (nginx, balanceador) que agregan su
+    # entrada a X-Forwarded-For. Con 0 la IP del cliente es REMOTE_ADDR y la
+    # cabecera se ignora: el cliente puede escribir lo que quiera en ella
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Tiempo (segundos) que se guarda en caché el usuario resuelto a partir de un token
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=300, cast=int)
+
+# Límite de peticiones de los endpoints públicos (logistics/throttling.py)
+# Por nombre de URL: 'ip' cuenta por IP, las demás claves por ese campo del cuerpo
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_CACHE_ALIAS = 'ratelimit'
+RATELIMIT_RATES = {
+    'auth-login': {'ip': '30/m', 'email': '10/m', 'username': '10/m'},
+    'login': {'ip': '30/m', 'email': '10/m', 'username': '10/m'},
+    'check-email': {'ip': '30/m'},
+    'check-phone': {'ip': '30/m'},
+    'send-verification-code': {'ip': '10/h', 'email': '3/10m'},
+    'verify-code': {'ip': '30/h', 'email': '10/h'},
+    'request-password-reset': {'ip': '10/h', 'email': '3/h'},
+    'verify-reset-code': {'ip': '30/h', 'email': '10/h'},
+    'reset-password': {'ip': '30/h', 'email': '10/h'},
+    'contact-message': {'ip': '5/h', 'email': '3/h'},
+    'rastreo-publico': {'ip': '120/m'},
 }
 
+# Rastreo público de envíos (logistics/rastreo.py)
+RASTREO_EVENTOS = 10  # eventos incluidos en el documento
+RASTREO_CACHE_ALIAS = 'api'
+RASTREO_CACHE_TTL = config('RASTREO_CACHE_TTL', default=300, cast=int)
+RASTREO_NO_ENCONTRADO_TTL = 60
+RASTREO_CACHE_CONTROL = 30  # max-age para navegadores y CDN
+
+# Sincronización incremental (GET /api/sync/, logistics/sync.py)
+SYNC_LIMITE = 500  # cambios u objetos por colección en cada respuesta
+SYNC_MARGEN_SEGUNDOS = 30  # la marca no avanza sobre cambios más recientes que esto
+SYNC_RETENCION_DIAS = 30  # clientes con marcas más antiguas reciben la colección completa
+
+# Idempotency-Key en la creación de pedidos y envíos (logistics/idempotencia.py)
+IDEMPOTENCIA_TTL = 24 * 3600  # segundos que se guarda cada respuesta
+IDEMPOTENCIA_ESPERA_SEGUNDOS = 10  # espera de un duplicado mientras la original está en curso
+IDEMPOTENCIA_BLOQUEO_SEGUNDOS = 60  # después de esto una petición en curso se da por abandonada
+
+# Reservas de stock de los carritos (logistics/reservas.py)
+RESERVA_STOCK_TTL = 15 * 60  # segundos que el carrito aparta las unidades sin actividad
+
+# POST /api/carrito/lote/ (logistics/carrito.py)
+CARRITO_LOTE_MAXIMO = 200  # operaciones por petición
+
+# Carrito de invitado en caché, se fusiona al iniciar sesión (logistics/carrito.py)
+CARRITO_INVITADO_CACHE_ALIAS = 'default'
+CARRITO_INVITADO_TTL = 7 * 86400
+
+# Libro de inventario y snapshots de stock (logistics/inventario.py)
+INVENTARIO_CACHE_ALIAS = 'default'
+INVENTARIO_CACHE_TTL = 3600  # stock derivado; se invalida con cada movimiento
+INVENTARIO_SNAPSHOT_MARGEN_SEGUNDOS = 60  # movimientos recientes que esperan a la siguiente snapshot
+
+# python manage.py benchmark_arranque falla si el arranque en frío (setup, URLs
+# y primera petición) supera este tiempo
+ARRANQUE_PRESUPUESTO_MS = config('ARRANQUE_PRESUPUESTO_MS', default=1500, cast=int)
+
+# Tareas periódicas de mantenimiento (python manage.py mantenimiento, logistics/mantenimiento.py)
+MANTENIMIENTO_LOTE = 500  # filas por DELETE
+MANTENIMIENTO_PAUSA = config('MANTENIMIENTO_PAUSA', default=0.2, cast=float)  # segundos entre lotes
+MANTENIMIENTO_BLOQUEO_SEGUNDOS = 900  # un nodo caído suelta sus tareas después de esto
+MANTENIMIENTO_INTERVALOS = {}  # {'contactos': 3600}: cambia el intervalo (segundos) de una tarea
+MANTENIMIENTO_CARRITOS_DIAS = 60  # carritos vacíos sin cambios
+MANTENIMIENTO_CONTACTOS_DIAS = 365  # mensajes de contacto leídos
+
+# Cambio de estado por lotes (POST /api/envios/cambiar_estado_lote/)
+ENVIOS_CAMBIO_ESTADO_MAXIMO = 10000
+
+# Números de pedido y de guía (logistics/numeracion.py): cada proceso reserva
+# bloques de este tamaño en la base de datos
+NUMERACION_BLOQUE = 100
+
+# Changelists del admin con tablas grandes (logistics/admin_tablas.py): con
+# filtros se cuentan como máximo estas filas
+ADMIN_CONTEO_MAXIMO = 10000
+
+# Archivo de seguimientos de envíos cerrados (logistics/archivo.py)
+ARCHIVO_SEGUIMIENTOS_DIR = config('ARCHIVO_SEGUIMIENTOS_DIR', default=str(BASE_DIR / 'archivo' / 'seguimientos'))
+ARCHIVO_SEGUIMIENTOS_DIAS = config('ARCHIVO_SEGUIMIENTOS_DIAS', default=180, cast=int)
+
+# Posiciones GPS de conductores (logistics/posiciones.py)
+# Con POSICIONES_DB se guardan en otra base SQLite, sin competir por los
+# bloqueos de escritura con pedidos y envíos (migrate --database posiciones)
+POSICIONES_DB = config('POSICIONES_DB', default='')
+POSICIONES_DB_ALIAS = 'default'
+if POSICIONES_DB:
+    DATABASES['posiciones'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': POSICIONES_DB,
+        'OPTIONS': {
+            'timeout': 10,
+        }
+    }
+    POSICIONES_DB_ALIAS = 'posiciones'
+DATABASE_ROUTERS = ['logistics.routers.PosicionesRouter', 'logistics.routers.ReplicasRouter']
+POSICIONES_CACHE_ALIAS = 'default'
+POSICIONES_ULTIMA_TTL = 600  # última posición de cada conductor en caché
+POSICIONES_MAXIMO_POR_PETICION = 1000
+POSICIONES_BUFFER_MAXIMO = 5000  # posiciones en memoria antes de escribir
+POSICIONES_BUFFER_SEGUNDOS = config('POSICIONES_BUFFER_SEGUNDOS', default=2, cast=float)  # 0 = escribir en la petición
+POSICIONES_BUFFER_LIMITE = 50000  # si la base de datos falla, posiciones en espera antes de descartar las más antiguas
+POSICIONES_DETALLE_DIAS = 7  # días con todas las posiciones
+POSICIONES_TRAYECTO_INTERVALO = 60  # segundos entre puntos de los trayectos
+POSICIONES_TRAYECTOS_DIAS = 365
+
+# Réplicas de lectura (logistics/replicas.py): rutas de bases SQLite separadas
+# por comas, alias replica_1, replica_2... Solo reciben lecturas de la API
+REPLICAS_DB = config('REPLICAS_DB', default='', cast=Csv())
+REPLICAS_DB_ALIASES = []
+for _indice, _nombre in enumerate(REPLICAS_DB, 1):
+    DATABASES[f'replica_{_indice}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _nombre,
+        'OPTIONS': {
+            'timeout': 10,
+        },
+        # En los tests la réplica es la misma base que la primaria
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS_DB_ALIASES.append(f'replica_{_indice}')
+REPLICAS_RUTAS = ['/api/']  # solo GET, HEAD y OPTIONS
+REPLICAS_EXCLUIR_RUTAS = ['/api/auth/', '/api/sync/']  # perfil y marcas de sincronización, de la primaria
+REPLICAS_PEGAJOSO_SEGUNDOS = 5  # un cliente que escribió lee de la primaria durante este tiempo
+REPLICAS_RETRASO_MAXIMO = config('REPLICAS_RETRASO_MAXIMO', default=5, cast=float)  # segundos
+REPLICAS_VERIFICAR_SEGUNDOS = 2  # cada cuánto verifica cada proceso el retraso de cada réplica
+REPLICAS_CACHE_ALIAS = 'default'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -176,6 +354,16 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 
+CORS_EXPOSE_HEADERS = [
+    'ratelimit-limit',
+    'ratelimit-remaining',
+    'ratelimit-reset',
+    'ratelimit-policy',
+    'retry-after',
+    'idempotent-replayed',
+    'x-carrito-invitado',
+]
+
 CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
@@ -186,16 +374,27 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+    'x-carrito-invitado',
 ]
 
 # Logging configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'estructurado': {
+            '()': 'logistics.log.FormatoEstructurado',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'estructurado': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'estructurado',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -212,9 +411,28 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': False,
         },
+        # Logs estructurados de la API (ver logistics/log.py)
+        'logistics': {
+            'handlers': ['estructurado'],
+            'level': config('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'user_management': {
+            'handlers': ['estructurado'],
+            'level': config('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
     },
 }
 
+# Muestreo por logger para mensajes DEBUG/INFO (1.0 = todos, 0.1 = 10%), con
+# el nombre del logger: LOG_SAMPLING=logistics.auth_views=0.1,logistics=0.5.
+# Un nombre también aplica a los loggers que cuelgan de él
+LOG_SAMPLING = {
+    nombre.strip(): float(tasa)
+    for nombre, tasa in (par.split('=', 1) for par in config('LOG_SAMPLING', default='', cast=Csv()))
+}
+
 # Email Configuration
 # Verifica si hay configuración de email en variables de entorno
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default=None)
@@ -227,11 +445,9 @@ if EMAIL_HOST_USER and EMAIL_HOST_PASSWORD:
     EMAIL_PORT = 587
     EMAIL_USE_TLS = True
     DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=f'TecnoRoute <{EMAIL_HOST_USER}>')
-    print(f"\n✅ Email configurado: Los correos se enviarán desde {EMAIL_HOST_USER}\n")
 else:
-    # Configuración de desarrollo (imprime en consola)
+    # Configuración de desarrollo: los correos se imprimen en la consola.
+    # Para enviar emails reales, crea un archivo .env con tu configuración de
+    # Gmail (ver .env.example)
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
     DEFAULT_FROM_EMAIL = 'TecnoRoute <noreply@tecnoroute.com>'
-    print("\n⚠️ Email en modo desarrollo: Los correos se imprimirán en la consola")
-    print("Para enviar emails reales, crea un archivo .env con tu configuración de Gmail")
-    print("Ver .env.example para instrucciones\n")
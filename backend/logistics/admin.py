@@ -1,7 +1,9 @@
 from django.contrib import admin
+from . import rastreo
+from .admin_tablas import TablaGrandeAdmin
 from .models import (
     Conductor, Vehiculo, Envio, 
-    SeguimientoEnvio, Admin
+    SeguimientoEnvio, Admin, TareaMantenimiento, SecuenciaNumeracion
 )
 
 
@@ -13,6 +15,7 @@ class ConductorAdmin(admin.ModelAdmin):
     search_fields = ['nombres', 'apellidos', 'cedula', 'email', 'licencia']
     list_editable = ['estado', 'activo']
     date_hierarchy = 'fecha_contratacion'
+    autocomplete_fields = ['user']
     
     def get_nombre_completo(self, obj):
         return obj.nombre_completo
@@ -25,17 +28,22 @@ class VehiculoAdmin(admin.ModelAdmin):
     list_filter = ['tipo', 'estado', 'activo', 'marca']
     search_fields = ['placa', 'marca', 'modelo']
     list_editable = ['estado', 'activo']
+    autocomplete_fields = ['conductor_asignado']
 
 
 
 @admin.register(Envio)
-class EnvioAdmin(admin.ModelAdmin):
+class EnvioAdmin(TablaGrandeAdmin):
     list_display = ['numero_guia', 'cliente', 'estado', 'prioridad', 'fecha_creacion']
+    list_select_related = ['cliente']
     list_filter = ['estado', 'prioridad', 'fecha_creacion']
     search_fields = ['numero_guia', 'cliente__username', 'cliente__email', 'descripcion_carga']
     list_editable = ['estado', 'prioridad']
-    date_hierarchy = 'fecha_creacion'
-    raw_id_fields = ['cliente', 'vehiculo', 'conductor']
+    autocomplete_fields = ['cliente', 'vehiculo', 'conductor']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rastreo.reconstruir(obj)
 
 
 # PedidoTransporte eliminado - usar Pedido de user_management para pedidos de electrodomésticos
@@ -46,12 +54,40 @@ class AdminUserAdmin(admin.ModelAdmin):
     list_filter = ['nivel_acceso', 'activo', 'fecha_contratacion']
     search_fields = ['nombre', 'email', 'telefono']
     list_editable = ['nivel_acceso', 'activo']
+    autocomplete_fields = ['user']
 
 
 @admin.register(SeguimientoEnvio)
-class SeguimientoEnvioAdmin(admin.ModelAdmin):
+class SeguimientoEnvioAdmin(TablaGrandeAdmin):
     list_display = ['envio', 'estado', 'fecha_hora', 'usuario']
+    list_select_related = ['envio__cliente', 'usuario']
     list_filter = ['estado', 'fecha_hora']
     search_fields = ['envio__numero_guia', 'descripcion', 'ubicacion']
-    date_hierarchy = 'fecha_hora'
-    raw_id_fields = ['envio', 'usuario']
+    autocomplete_fields = ['envio', 'usuario']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rastreo.reconstruir(obj.envio)
+
+
+@admin.register(TareaMantenimiento)
+class TareaMantenimientoAdmin(admin.ModelAdmin):
+    """Tareas de logistics/mantenimiento.py: se puede adelantar la próxima ejecución o soltar un bloqueo"""
+    list_display = ['nombre', 'ultima_ejecucion', 'procesados', 'duracion_ms', 'ejecuciones', 'fallos', 'proxima_ejecucion', 'nodo']
+    readonly_fields = ['nombre', 'nodo', 'ultima_ejecucion', 'duracion_ms', 'procesados', 'error', 'ejecuciones', 'fallos']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(SecuenciaNumeracion)
+class SecuenciaNumeracionAdmin(admin.ModelAdmin):
+    """Secuencias de logistics/numeracion.py: solo lectura (bajar `siguiente` repetiría números)"""
+    list_display = ['nombre', 'siguiente']
+    readonly_fields = ['nombre', 'siguiente']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
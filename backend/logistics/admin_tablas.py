@@ -0,0 +1,82 @@
+"""
+Admin para tablas con millones de filas (envíos, seguimientos, pedidos...).
+
+El changelist de Django cuenta las filas dos veces: el total filtrado para el
+paginador y el total sin filtros ("N resultados (M total)"). TablaGrandeAdmin
+omite el segundo (show_full_result_count = False) y pagina con
+PaginadorAproximado:
+
+- Sin filtros ni búsqueda usa la estimación del motor: pg_class.reltuples en
+  PostgreSQL, sqlite_stat1 en SQLite (la actualiza la tarea de mantenimiento
+  estadisticas_tablas). Si no hay estimación, o es menor que el máximo, cuenta.
+- Con filtros cuenta solo hasta ADMIN_CONTEO_MAXIMO filas: pasado ese número
+  el paginador muestra ese máximo de filas y no llega a las últimas páginas
+  (para eso están los filtros y el orden inverso).
+
+Las columnas que muestran una relación necesitan list_select_related para no
+hacer una consulta por fila; benchmark_admin verifica que la cantidad de
+consultas de cada changelist no crezca con las filas de la página.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def conteo_maximo():
+    return getattr(settings, 'ADMIN_CONTEO_MAXIMO', 10000)
+
+
+def estimar_filas(modelo, alias='default'):
+    """Filas de la tabla según las estadísticas del motor, o None si no hay"""
+    conexion = connections[alias]
+    tabla = modelo._meta.db_table
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+            fila = cursor.fetchone()
+            # -1 si la tabla nunca se analizó
+            return fila[0] if fila and fila[0] >= 0 else None
+        if conexion.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # La primera cifra de cada índice es el total de filas que indexa
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [tabla])
+            filas = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(filas) if filas else None
+    return None
+
+
+def actualizar_estadisticas(alias='default'):
+    """Recalcula las estadísticas del planificador (y las estimaciones de estimar_filas)"""
+    conexion = connections[alias]
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'sqlite':
+            # Estadísticas a partir de una muestra: no recorre las tablas grandes
+            cursor.execute('PRAGMA analysis_limit = 1000')
+        cursor.execute('ANALYZE')
+
+
+class PaginadorAproximado(Paginator):
+    """Paginator con conteo estimado sin filtros y acotado con filtros"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        maximo = conteo_maximo()
+        if not queryset.query.where:
+            estimado = estimar_filas(queryset.model, queryset.db)
+            if estimado is not None and estimado >= maximo:
+                return estimado
+        return queryset.order_by()[:maximo].count()
+
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """ModelAdmin para tablas grandes: sin el total exacto y con conteo aproximado"""
+    paginator = PaginadorAproximado
+    show_full_result_count = False
@@ -0,0 +1,196 @@
+"""
+Archivo de SeguimientoEnvio.
+
+Los eventos de envíos entregados o cancelados hace más de
+ARCHIVO_SEGUIMIENTOS_DIAS días se mueven a archivos JSONL comprimidos, uno
+por mes (según la fecha del evento):
+
+    ARCHIVO_SEGUIMIENTOS_DIR/seguimientos-2025-03.jsonl.gz
+
+Cada envío se escribe como un miembro gzip independiente y
+BloqueSeguimientoArchivado guarda su posición, así que leer la historia de un
+envío archivado es un seek + descomprimir solo sus eventos. Un archivo con
+varios miembros sigue siendo un .gz válido (zcat lo lee completo).
+
+El archivado va por lotes cortos (una transacción por lote, con pausa entre
+lotes) para no bloquear las escrituras en curso. Solo borra los eventos que
+escribió, así que un evento que llegue durante el lote se queda en la tabla.
+La lectura (eventos) une los eventos de la tabla con los archivados; solo
+busca bloques si Envio.eventos_archivados no es 0 (envíos cerrados y ya
+archivados) y lee los de la tabla del prefetch_related('seguimientos'), así
+que serializar un listado de envíos agrega una consulta, no una por envío.
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .log import get_logger
+from .models import BloqueSeguimientoArchivado, Envio, SeguimientoEnvio
+
+
+log = get_logger(__name__)
+
+ESTADOS_FINALES = ('entregado', 'cancelado')
+
+CAMPOS = ('id', 'envio_id', 'estado', 'descripcion', 'ubicacion', 'fecha_hora', 'usuario_id')
+
+# Límite de ids por DELETE ... WHERE id IN (...)
+TAMANO_BORRADO = 500
+
+
+def directorio():
+    ruta = Path(getattr(settings, 'ARCHIVO_SEGUIMIENTOS_DIR', settings.BASE_DIR / 'archivo' / 'seguimientos'))
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def nombre_archivo(mes):
+    return f'seguimientos-{mes}.jsonl.gz'
+
+
+# Lectura
+
+def leer_bloque(archivo, offset, longitud):
+    with open(directorio() / archivo, 'rb') as f:
+        f.seek(offset)
+        datos = gzip.decompress(f.read(longitud))
+    return [json.loads(linea) for linea in datos.splitlines() if linea]
+
+
+def _instancia(datos):
+    """SeguimientoEnvio sin guardar a partir de una línea del archivo"""
+    datos = dict(datos)
+    datos['fecha_hora'] = datetime.fromisoformat(datos['fecha_hora'])
+    return SeguimientoEnvio(**datos)
+
+
+def eventos_archivados(envio_id):
+    bloques = (
+        BloqueSeguimientoArchivado.objects.filter(envio_id=envio_id)
+        .values_list('archivo', 'offset', 'longitud')
+    )
+    return [
+        _instancia(datos)
+        for archivo, offset, longitud in bloques
+        for datos in leer_bloque(archivo, offset, longitud)
+    ]
+
+
+def eventos(envio):
+    """
+    Historia completa de un envío (tabla + archivo), del más reciente al más
+    antiguo, como instancias de SeguimientoEnvio. Usa el prefetch de
+    seguimientos si el queryset lo trae.
+    """
+    calientes = list(envio.seguimientos.all())
+    if not envio.eventos_archivados:
+        return calientes
+    archivados = eventos_archivados(envio.id)
+    if not archivados:
+        return calientes
+    return sorted(calientes + archivados, key=lambda s: (s.fecha_hora, s.id), reverse=True)
+
+
+# Archivado
+
+def envios_archivables(corte, limite):
+    return list(
+        Envio.objects.filter(
+            estado__in=ESTADOS_FINALES, fecha_actualizacion__lt=corte, seguimientos__isnull=False,
+        ).order_by('id').values_list('id', flat=True).distinct()[:limite]
+    )
+
+
+def _serializar(evento):
+    evento = dict(evento)
+    evento['fecha_hora'] = evento['fecha_hora'].isoformat()
+    return json.dumps(evento, ensure_ascii=False, separators=(',', ':'))
+
+
+def escribir_bloques(grupos):
+    """
+    Agrega cada grupo {(envio_id, mes): [eventos]} como un miembro gzip al
+    archivo de su mes. Retorna los BloqueSeguimientoArchivado (sin guardar).
+    """
+    por_mes = defaultdict(list)
+    for (envio_id, mes), lista in grupos.items():
+        por_mes[mes].append((envio_id, lista))
+
+    bloques = []
+    for mes, envios in sorted(por_mes.items()):
+        archivo = nombre_archivo(mes)
+        with open(directorio() / archivo, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            for envio_id, lista in envios:
+                datos = gzip.compress('\n'.join(_serializar(e) for e in lista).encode() + b'\n')
+                bloques.append(BloqueSeguimientoArchivado(
+                    envio_id=envio_id, mes=mes, archivo=archivo,
+                    offset=f.tell(), longitud=len(datos), eventos=len(lista),
+                ))
+                f.write(datos)
+            f.flush()
+            # Los datos deben estar en disco antes de borrar las filas
+            os.fsync(f.fileno())
+    return bloques
+
+
+def archivar_lote(envio_ids):
+    """Archiva los eventos de estos envíos. Retorna la cantidad de eventos"""
+    eventos_lote = list(
+        SeguimientoEnvio.objects.filter(envio_id__in=envio_ids)
+        .order_by('envio_id', 'fecha_hora', 'id').values(*CAMPOS)
+    )
+    if not eventos_lote:
+        return 0
+
+    grupos = defaultdict(list)
+    for evento in eventos_lote:
+        grupos[(evento['envio_id'], evento['fecha_hora'].strftime('%Y-%m'))].append(evento)
+
+    # Si el proceso se interrumpe después de escribir y antes de confirmar,
+    # solo quedan bytes sin índice en el archivo; los eventos siguen en la tabla
+    bloques = escribir_bloques(grupos)
+    ids = [evento['id'] for evento in eventos_lote]
+    por_envio = Counter(evento['envio_id'] for evento in eventos_lote)
+    with transaction.atomic():
+        BloqueSeguimientoArchivado.objects.bulk_create(bloques)
+        for envio_id, cantidad in por_envio.items():
+            Envio.objects.filter(id=envio_id).update(eventos_archivados=F('eventos_archivados') + cantidad)
+        for i in range(0, len(ids), TAMANO_BORRADO):
+            SeguimientoEnvio.objects.filter(id__in=ids[i:i + TAMANO_BORRADO]).delete()
+    return len(ids)
+
+
+def archivar(dias=None, lote=200, pausa=0.5, max_lotes=None, progreso=None):
+    """
+    Archiva por lotes de `lote` envíos con `pausa` segundos entre lotes.
+    Retorna (envios, eventos) archivados.
+    """
+    if dias is None:
+        dias = getattr(settings, 'ARCHIVO_SEGUIMIENTOS_DIAS', 180)
+    corte = timezone.now() - timedelta(days=dias)
+
+    total_envios = total_eventos = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        envio_ids = envios_archivables(corte, lote)
+        if not envio_ids:
+            break
+        eventos_archivados_lote = archivar_lote(envio_ids)
+        lotes += 1
+        total_envios += len(envio_ids)
+        total_eventos += eventos_archivados_lote
+        log.info('archivo.lote', lote=lotes, envios=len(envio_ids), eventos=eventos_archivados_lote)
+        if progreso:
+            progreso(lotes, total_envios, total_eventos)
+        if pausa:
+            time.sleep(pausa)
+    return total_envios, total_eventos
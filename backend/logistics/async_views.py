@@ -0,0 +1,188 @@
+"""
+Vistas async (ASGI) de los endpoints de lectura con más tráfico, bajo
+/api/async/. Responden lo mismo que sus equivalentes síncronos de DRF.
+
+Bajo WSGI cada petición ocupa un hilo de gunicorn mientras espera a la base
+de datos, así que las conexiones simultáneas quedan limitadas por los
+workers. Servidas con uvicorn (ver Procfile) estas vistas esperan al ORM con
+await y el event loop atiende otras conexiones mientras tanto. El ORM async
+de Django 4.2 todavía corre cada consulta en un hilo (uno por petición,
+ThreadSensitiveContext), por eso cada vista hace las menos consultas posibles
+y serializa en el mismo hilo cuando el serializer consulta relaciones.
+
+DRF no tiene vistas async: la autenticación es la del token
+(CachedTokenAuthentication, sin sesión) y las respuestas son JsonResponse.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.http import JsonResponse
+from rest_framework import exceptions
+
+from user_management.models import Pedido, Producto, UserProfile
+from .auth_views import conteos_pedidos, estadisticas_pedidos
+from .authentication import CachedTokenAuthentication
+from .models import Envio
+from .serializers import ProductoSerializer, SeguimientoEnvioSerializer
+from . import archivo, rastreo
+
+
+def vista_async(metodos):
+    """
+    Restringe los métodos HTTP y exime de CSRF (como APIView). En Django 4.2
+    csrf_exempt y require_http_methods no conservan las vistas async.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            if request.method not in metodos:
+                return JsonResponse(
+                    {'detail': str(exceptions.MethodNotAllowed(request.method).detail)}, status=405,
+                    headers={'Allow': ', '.join(metodos)},
+                )
+            return await vista(request, *args, **kwargs)
+        envoltura.csrf_exempt = True
+        return envoltura
+    return decorador
+
+
+async def autenticar(request):
+    """
+    Usuario del token de la petición, o una JsonResponse 401 (mismos mensajes
+    que DRF). La entrada suele estar en caché y no consulta la base de datos.
+    """
+    autenticacion = CachedTokenAuthentication()
+    try:
+        resultado = await sync_to_async(autenticacion.authenticate)(request)
+    except exceptions.AuthenticationFailed as error:
+        detalle = error.detail
+    else:
+        if resultado is not None:
+            return resultado[0]
+        detalle = exceptions.NotAuthenticated.default_detail
+    return JsonResponse(
+        {'detail': str(detalle)}, status=401,
+        headers={'WWW-Authenticate': autenticacion.authenticate_header(request)},
+    )
+
+
+def no_encontrado():
+    return JsonResponse({'detail': str(exceptions.NotFound.default_detail)}, status=404)
+
+
+def _cuerpo(request):
+    try:
+        datos = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+# Registro
+
+@vista_async(['POST'])
+async def check_email(request):
+    """Check if email already exists"""
+    datos = _cuerpo(request)
+    if datos is None:
+        return JsonResponse({'detail': 'JSON inválido'}, status=400)
+    email = datos.get('email')
+    if not email:
+        return JsonResponse({'error': 'Email is required'}, status=400)
+    return JsonResponse({'exists': await User.objects.filter(email=email).aexists()})
+
+
+@vista_async(['POST'])
+async def check_phone(request):
+    """Check if phone already exists"""
+    datos = _cuerpo(request)
+    if datos is None:
+        return JsonResponse({'detail': 'JSON inválido'}, status=400)
+    phone = datos.get('phone')
+    if not phone:
+        return JsonResponse({'error': 'Phone is required'}, status=400)
+    return JsonResponse({'exists': await UserProfile.objects.filter(telefono=phone).aexists()})
+
+
+# Envíos
+
+@vista_async(['GET'])
+async def buscar_por_guia(request):
+    """Buscar envío por número de guía (documento de rastreo)"""
+    usuario = await autenticar(request)
+    if isinstance(usuario, JsonResponse):
+        return usuario
+    numero_guia = request.GET.get('numero_guia')
+    if not numero_guia:
+        return JsonResponse({'error': 'Debe proporcionar un número de guía'}, status=400)
+    # Una lectura de caché; la base de datos solo si el documento no está
+    documento = await sync_to_async(rastreo.obtener)(numero_guia)
+    if documento is None:
+        return JsonResponse({'error': 'Envío no encontrado'}, status=404)
+    return JsonResponse(documento)
+
+
+@vista_async(['GET'])
+async def seguimiento(request, pk):
+    """Últimos eventos del envío (documento de rastreo); ?completo=1 da la historia completa"""
+    usuario = await autenticar(request)
+    if isinstance(usuario, JsonResponse):
+        return usuario
+    if request.GET.get('completo') in ('1', 'true'):
+        try:
+            envio = await Envio.objects.aget(pk=pk)
+        except Envio.DoesNotExist:
+            return no_encontrado()
+        # Los seguimientos archivados se leen de archivos: en el hilo del ORM
+        datos = await sync_to_async(
+            lambda: SeguimientoEnvioSerializer(archivo.eventos(envio), many=True).data
+        )()
+        return JsonResponse(datos, safe=False)
+    numero_guia = await Envio.objects.filter(pk=pk).values_list('numero_guia', flat=True).afirst()
+    documento = await sync_to_async(rastreo.obtener)(numero_guia) if numero_guia else None
+    if documento is None:
+        return JsonResponse({'error': 'Envío no encontrado'}, status=404)
+    return JsonResponse(documento['eventos'], safe=False)
+
+
+# Productos (públicos)
+
+def _productos():
+    return Producto.objects.filter(activo=True).select_related('categoria')
+
+
+@vista_async(['GET'])
+async def productos(request):
+    """Lista de productos activos (filtros categoria y search como ProductoViewSet)"""
+    queryset = _productos()
+    categoria = request.GET.get('categoria')
+    search = request.GET.get('search')
+    if categoria:
+        queryset = queryset.filter(categoria=categoria)
+    if search:
+        queryset = queryset.filter(Q(nombre__icontains=search) | Q(descripcion__icontains=search))
+    # Con categoria ya cargada el serializer no consulta: puede correr en el event loop
+    return JsonResponse(ProductoSerializer([p async for p in queryset], many=True).data, safe=False)
+
+
+@vista_async(['GET'])
+async def producto(request, pk):
+    try:
+        instancia = await _productos().aget(pk=pk)
+    except Producto.DoesNotExist:
+        return no_encontrado()
+    return JsonResponse(ProductoSerializer(instancia).data)
+
+
+# Dashboard
+
+@vista_async(['GET'])
+async def estadisticas(request):
+    """Obtener estadísticas de pedidos"""
+    usuario = await autenticar(request)
+    if isinstance(usuario, JsonResponse):
+        return usuario
+    return JsonResponse(estadisticas_pedidos(await Pedido.objects.aaggregate(**conteos_pedidos())))
@@ -1,31 +1,44 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.mail import send_mail
 from django.db.models import Q, Count, Sum
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
-import uuid
 
+from . import carrito as carrito_lote, inventario, numeracion, reservas
+from .idempotencia import idempotente
+from .log import get_logger
+from .login import iniciar_sesion
+from .models import Conductor, Envio, PasswordResetCode
+from .principal import principal_de
 from user_management.models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem
+from user_management.verification import EmailVerificationCode
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserRegistrationSerializer,
     CategoriaSerializer, ProductoSerializer, CarritoSerializer, CarritoItemSerializer,
-    PedidoSerializer, PedidoItemSerializer
+    PedidoSerializer, PedidoItemSerializer, MovimientoStockSerializer
 )
 
 
+log = get_logger(__name__)
+
+
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Permiso personalizado para permitir solo lectura a usuarios normales"""
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return request.user.is_authenticated
-        return request.user.is_authenticated and hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'admin'
+        return request.user.is_authenticated and principal_de(request.user).is_admin
 
 
 class AuthView(APIView):
@@ -42,26 +55,12 @@ class AuthView(APIView):
                 'error': 'Username/email y password son requeridos'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Intentar autenticación con username o email
-        user = None
-        if email:
-            try:
-                user_obj = User.objects.get(email=email)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                pass
-        
-        if not user and username:
-            user = authenticate(username=username, password=password)
+        # Usuario, perfil, conductor, admin y token en una sola consulta
+        sesion = iniciar_sesion(password, email=email, username=username, request=request)
         
-        if user and user.is_active:
-            token, created = Token.objects.get_or_create(user=user)
-            try:
-                profile = user.userprofile
-            except UserProfile.DoesNotExist:
-                # Crear perfil si no existe (para usuarios existentes)
-                role = 'admin' if user.is_superuser else 'customer'
-                profile = UserProfile.objects.create(user=user, role=role)
+        if sesion:
+            user, token, principal = sesion.user, sesion.token, sesion.principal
+            profile = principal.profile
             
             # Datos básicos del usuario
             user_data = {
@@ -79,28 +78,22 @@ class AuthView(APIView):
             
             # Datos específicos según el rol
             if profile.role == 'conductor':
-                try:
-                    from .models import Conductor
-                    conductor = Conductor.objects.get(email=user.email)
+                conductor = principal.conductor
+                if conductor:
                     user_data['conductor_info'] = {
                         'id': conductor.id,
                         'cedula': conductor.cedula,
                         'licencia': conductor.licencia,
                         'estado': conductor.estado
                     }
-                except Conductor.DoesNotExist:
-                    pass
             elif profile.role == 'admin':
-                try:
-                    from .models import Admin
-                    admin = Admin.objects.get(user=user)
+                admin = principal.admin
+                if admin:
                     user_data['admin_info'] = {
                         'id': admin.id,
                         'nivel_acceso': admin.nivel_acceso,
                         'fecha_contratacion': admin.fecha_contratacion.strftime('%Y-%m-%d')
                     }
-                except Admin.DoesNotExist:
-                    pass
             
             return Response({
                 'token': token.key,
@@ -124,11 +117,9 @@ class RegisterView(APIView):
             token, created = Token.objects.get_or_create(user=user)
             
             # Obtener el rol del perfil creado
-            try:
-                profile = user.userprofile
-                role = profile.role
-            except UserProfile.DoesNotExist:
-                role = 'customer'
+            principal = principal_de(user)
+            profile = principal.profile
+            role = principal.role
             
             # Crear datos de usuario completos incluyendo información del rol
             user_data = {
@@ -146,28 +137,22 @@ class RegisterView(APIView):
             
             # Agregar datos específicos según el rol
             if role == 'conductor':
-                try:
-                    from .models import Conductor
-                    conductor = Conductor.objects.get(email=user.email)
+                conductor = principal.conductor
+                if conductor:
                     user_data['conductor_info'] = {
                         'id': conductor.id,
                         'cedula': conductor.cedula,
                         'licencia': conductor.licencia,
                         'estado': conductor.estado
                     }
-                except Conductor.DoesNotExist:
-                    pass
             elif role == 'admin':
-                try:
-                    from .models import Admin
-                    admin = Admin.objects.get(user=user)
+                admin = principal.admin
+                if admin:
                     user_data['admin_info'] = {
                         'id': admin.id,
                         'nivel_acceso': admin.nivel_acceso,
                         'fecha_contratacion': admin.fecha_contratacion.strftime('%Y-%m-%d')
                     }
-                except Admin.DoesNotExist:
-                    pass
             
             return Response({
                 'success': True,
@@ -328,13 +313,65 @@ class ProductoViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def perform_update(self, serializer):
+        # Un cambio de stock queda en el libro como ajuste de este usuario
+        usuario = self.request.user if self.request.user.is_authenticated else None
+        try:
+            serializer.save(_usuario_stock=usuario)
+        except DjangoValidationError as error:
+            # Producto.save() rechaza un ajuste que dejaría el stock negativo: 400, no 500
+            raise ValidationError({'stock': error.messages})
+
+    @action(detail=True, methods=['get'])
+    def inventario(self, request, pk=None):
+        """Stock según el libro de inventario y sus últimos movimientos (solo admin)"""
+        if not request.user.is_authenticated or not principal_de(request.user).is_admin:
+            return Response({'error': 'Solo administradores pueden ver el inventario'}, status=status.HTTP_403_FORBIDDEN)
+
+        producto = self.get_object()
+        movimientos = producto.movimientos.select_related('usuario').order_by('-id')[:50]
+        return Response({
+            'producto': producto.id,
+            'stock': inventario.stock(producto.id),
+            'stock_registrado': producto.stock,
+            'reservado': producto.reservado,
+            'disponible': producto.disponible,
+            'movimientos': MovimientoStockSerializer(movimientos, many=True).data,
+        })
+
+
+def respuesta_carrito_invitado(request, operaciones=None):
+    """
+    Carrito de quien no inició sesión: vive en la caché, sin escribir en la
+    base de datos, y pasa a su carrito al hacer login (logistics/carrito.py)
+    """
+    if operaciones is None:
+        clave = carrito_lote.identificador(request)
+        cantidades = carrito_lote.leer(clave)
+    else:
+        clave = carrito_lote.identificador(request, crear=True)
+        try:
+            cantidades = carrito_lote.aplicar_invitado(clave, operaciones)
+        except carrito_lote.OperacionesInvalidas as error:
+            return Response({'error': error.errores[0]['error'], 'errores': error.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except reservas.StockInsuficiente as error:
+            return Response({
+                'error': f'Stock insuficiente para {error}', 'productos': error.productos
+            }, status=status.HTTP_400_BAD_REQUEST)
+    respuesta = Response(carrito_lote.representar_invitado(clave, cantidades))
+    if clave:
+        respuesta[carrito_lote.CABECERA_INVITADO] = clave
+    return respuesta
+
 
 class CarritoView(APIView):
-    """Vista para manejar el carrito de compras"""
-    permission_classes = [permissions.IsAuthenticated]
+    """Vista para manejar el carrito de compras (sin sesión, carrito de invitado)"""
+    permission_classes = [permissions.AllowAny]
 
     def get(self, request):
         """Obtener el carrito del usuario actual"""
+        if not request.user.is_authenticated:
+            return respuesta_carrito_invitado(request)
         carrito, created = Carrito.objects.get_or_create(usuario=request.user)
         serializer = CarritoSerializer(carrito)
         return Response(serializer.data)
@@ -342,33 +379,40 @@ class CarritoView(APIView):
     def post(self, request):
         """Agregar producto al carrito"""
         producto_id = request.data.get('producto_id')
-        cantidad = request.data.get('cantidad', 1)
 
         if not producto_id:
             return Response({'error': 'producto_id es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cantidad = int(request.data.get('cantidad', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'cantidad debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        if cantidad < 1:
+            return Response({'error': 'cantidad debe ser mayor a 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.is_authenticated:
+            return respuesta_carrito_invitado(
+                request, [{'accion': 'agregar', 'producto_id': producto_id, 'cantidad': cantidad}]
+            )
 
         try:
             producto = Producto.objects.get(id=producto_id, activo=True)
         except Producto.DoesNotExist:
             return Response({'error': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-        if cantidad > producto.stock:
-            return Response({'error': 'Stock insuficiente'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            carrito = reservas.carrito_bloqueado(request.user)
+            carrito_item = CarritoItem.objects.filter(carrito=carrito, producto=producto).first()
+            nueva_cantidad = cantidad + (carrito_item.cantidad if carrito_item else 0)
 
-        carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-        
-        carrito_item, created = CarritoItem.objects.get_or_create(
-            carrito=carrito,
-            producto=producto,
-            defaults={'cantidad': cantidad}
-        )
-
-        if not created:
-            nueva_cantidad = carrito_item.cantidad + cantidad
-            if nueva_cantidad > producto.stock:
+            # Apartar el stock para este carrito (falla si no hay disponible)
+            if not reservas.reservar(carrito, producto.id, nueva_cantidad):
                 return Response({'error': 'Stock insuficiente'}, status=status.HTTP_400_BAD_REQUEST)
-            carrito_item.cantidad = nueva_cantidad
-            carrito_item.save()
+
+            if carrito_item:
+                carrito_item.cantidad = nueva_cantidad
+                carrito_item.save()
+            else:
+                CarritoItem.objects.create(carrito=carrito, producto=producto, cantidad=cantidad)
 
         serializer = CarritoSerializer(carrito)
         return Response(serializer.data)
@@ -380,24 +424,34 @@ class CarritoView(APIView):
 
         if not item_id or cantidad is None:
             return Response({'error': 'item_id y cantidad son requeridos'}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            carrito_item = CarritoItem.objects.get(
-                id=item_id, 
-                carrito__usuario=request.user
-            )
-        except CarritoItem.DoesNotExist:
-            return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+            cantidad = int(cantidad)
+        except (TypeError, ValueError):
+            return Response({'error': 'cantidad debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.is_authenticated:
+            # En el carrito de invitado el id del item es el del producto
+            return respuesta_carrito_invitado(request, [
+                {'accion': 'fijar', 'producto_id': item_id, 'cantidad': max(cantidad, 0)}
+            ])
+
+        # El item y su reserva cambian juntos, con el carrito bloqueado como en post
+        with transaction.atomic():
+            carrito = reservas.carrito_bloqueado(request.user)
+            try:
+                carrito_item = CarritoItem.objects.get(id=item_id, carrito=carrito)
+            except CarritoItem.DoesNotExist:
+                return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-        if cantidad <= 0:
-            carrito_item.delete()
-        else:
-            if cantidad > carrito_item.producto.stock:
-                return Response({'error': 'Stock insuficiente'}, status=status.HTTP_400_BAD_REQUEST)
-            carrito_item.cantidad = cantidad
-            carrito_item.save()
+            if cantidad <= 0:
+                carrito_item.delete()
+                reservas.reservar(carrito, carrito_item.producto_id, 0)
+            else:
+                if not reservas.reservar(carrito, carrito_item.producto_id, cantidad):
+                    return Response({'error': 'Stock insuficiente'}, status=status.HTTP_400_BAD_REQUEST)
+                carrito_item.cantidad = cantidad
+                carrito_item.save()
 
-        carrito = carrito_item.carrito
         serializer = CarritoSerializer(carrito)
         return Response(serializer.data)
 
@@ -408,18 +462,68 @@ class CarritoView(APIView):
         if not item_id:
             return Response({'error': 'item_id es requerido'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            carrito_item = CarritoItem.objects.get(
-                id=item_id, 
-                carrito__usuario=request.user
-            )
+        if not request.user.is_authenticated:
+            return respuesta_carrito_invitado(request, [{'accion': 'quitar', 'producto_id': item_id}])
+
+        with transaction.atomic():
+            carrito = reservas.carrito_bloqueado(request.user)
+            try:
+                carrito_item = CarritoItem.objects.get(id=item_id, carrito=carrito)
+            except CarritoItem.DoesNotExist:
+                return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
             carrito_item.delete()
-            
-            carrito = Carrito.objects.get(usuario=request.user)
-            serializer = CarritoSerializer(carrito)
-            return Response(serializer.data)
-        except CarritoItem.DoesNotExist:
-            return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+            reservas.reservar(carrito, carrito_item.producto_id, 0)
+
+        serializer = CarritoSerializer(carrito)
+        return Response(serializer.data)
+
+
+class CarritoLoteView(APIView):
+    """Varias operaciones sobre el carrito en una petición (logistics/carrito.py)"""
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        """
+        Aplicar operaciones al carrito: {"operaciones": [{"accion": "agregar" |
+        "fijar" | "quitar", "producto_id": 1, "cantidad": 2}, ...]}
+        """
+        if not request.user.is_authenticated:
+            return respuesta_carrito_invitado(request, request.data.get('operaciones'))
+        try:
+            carrito = carrito_lote.aplicar(request.user, request.data.get('operaciones'))
+        except carrito_lote.OperacionesInvalidas as error:
+            return Response({'error': 'Operaciones inválidas', 'errores': error.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except reservas.StockInsuficiente as error:
+            return Response({
+                'error': f'Stock insuficiente para {error}', 'productos': error.productos
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        carrito = Carrito.objects.prefetch_related('items__producto__categoria').get(pk=carrito.pk)
+        serializer = CarritoSerializer(carrito)
+        return Response(serializer.data)
+
+
+ESTADOS_ESTADISTICAS = ('pendiente', 'confirmado', 'enviado', 'entregado', 'cancelado')
+
+
+def conteos_pedidos():
+    """Agregados de las estadísticas de pedidos, para una sola consulta"""
+    hoy = datetime.now().date()
+    inicio_semana = hoy - timedelta(days=hoy.weekday())
+    inicio_mes = hoy.replace(day=1)
+    return {
+        'total_pedidos': Count('id'),
+        'total_ingresos': Sum('total'),
+        'pedidos_hoy': Count('id', filter=Q(fecha_creacion__date=hoy)),
+        'pedidos_semana': Count('id', filter=Q(fecha_creacion__date__gte=inicio_semana)),
+        'pedidos_mes': Count('id', filter=Q(fecha_creacion__date__gte=inicio_mes)),
+        **{f'pedidos_{estado}s': Count('id', filter=Q(estado=estado)) for estado in ESTADOS_ESTADISTICAS},
+    }
+
+
+def estadisticas_pedidos(valores):
+    valores['total_ingresos'] = float(valores['total_ingresos'] or 0)
+    return valores
 
 
 class PedidoViewSet(viewsets.ModelViewSet):
@@ -429,45 +533,38 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Filtrar pedidos según el tipo de usuario
-        try:
-            user_profile = self.request.user.userprofile
-        except AttributeError:
-            user_profile = None
+        principal = principal_de(self.request.user)
         
-        print(f"\n=== DEBUG get_queryset ===")
-        print(f"User: {self.request.user.email}")
-        print(f"Has profile: {user_profile is not None}")
-        if user_profile:
-            print(f"Role: {user_profile.role}")
+        log.debug('pedidos.queryset', usuario=principal.user_id, rol=principal.role)
         
-        if user_profile and user_profile.role == 'admin':
+        if principal.role == 'admin':
             # Si es admin, mostrar todos los pedidos
-            queryset = Pedido.objects.all().select_related('usuario', 'conductor').prefetch_related('items')
-            print(f"Admin - Pedidos totales: {queryset.count()}")
-            return queryset
-        elif user_profile and user_profile.role == 'conductor':
+            return Pedido.objects.all().select_related('usuario', 'conductor').prefetch_related('items')
+        elif principal.role == 'conductor':
             # Si es conductor, mostrar solo pedidos asignados a él
-            from .models import Conductor
-            try:
-                conductor = Conductor.objects.get(email=self.request.user.email)
-                print(f"Conductor encontrado: {conductor.nombre_completo} (ID: {conductor.id})")
-                queryset = Pedido.objects.filter(conductor=conductor).select_related('usuario', 'conductor').prefetch_related('items')
-                print(f"Pedidos del conductor: {queryset.count()}")
-                for p in queryset:
-                    print(f"  - {p.numero_pedido}: estado={p.estado}")
-                return queryset
-            except Conductor.DoesNotExist:
-                print(f"Conductor NO encontrado para email: {self.request.user.email}")
+            if principal.conductor_id is None:
+                log.warning('pedidos.conductor_no_encontrado', usuario=principal.user_id)
                 return Pedido.objects.none()
+            return Pedido.objects.filter(conductor_id=principal.conductor_id).select_related('usuario', 'conductor').prefetch_related('items')
         else:
             # Si es usuario normal, solo sus pedidos
-            queryset = Pedido.objects.filter(usuario=self.request.user).select_related('conductor').prefetch_related('items')
-            print(f"Cliente - Pedidos: {queryset.count()}")
-            return queryset
+            return Pedido.objects.filter(usuario=self.request.user).select_related('conductor').prefetch_related('items')
+
+    def _numeros(self, request):
+        """
+        Números del pedido y de su guía, antes de la transacción del pedido y de
+        la de la Idempotency-Key: si hay que reservar un bloque se hace en una
+        transacción corta aparte, y su sobrante queda en memoria al confirmarla.
+        """
+        return {'numero_pedido': numeracion.siguiente('pedido'), 'numero_guia': numeracion.siguiente('guia')}
+
+    @idempotente(antes=_numeros)
+    def create(self, request, numero_pedido, numero_guia):
+        """Crear pedido desde el carrito (admite la cabecera Idempotency-Key)"""
+        return self._crear(request, numero_pedido, numero_guia)
 
     @transaction.atomic
-    def create(self, request):
-        """Crear pedido desde el carrito"""
+    def _crear(self, request, numero_pedido, numero_guia):
         direccion_envio = request.data.get('direccion_envio')
         telefono_contacto = request.data.get('telefono_contacto')
         notas = request.data.get('notas', '')
@@ -478,52 +575,50 @@ class PedidoViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            # Renovar las reservas mientras dura el checkout
+            reservas.renovar(request.user)
             carrito = Carrito.objects.get(usuario=request.user)
-            if not carrito.items.exists():
+            items = list(carrito.items.select_related('producto'))
+            if not items:
                 return Response({'error': 'El carrito está vacío'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Verificar stock
-            for item in carrito.items.all():
-                if item.cantidad > item.producto.stock:
-                    return Response({
-                        'error': f'Stock insuficiente para {item.producto.nombre}'
-                    }, status=status.HTTP_400_BAD_REQUEST)
 
             # Crear pedido
             pedido = Pedido.objects.create(
                 usuario=request.user,
-                numero_pedido=f'PED-{uuid.uuid4().hex[:8].upper()}',
-                total=carrito.total,
+                numero_pedido=numero_pedido,
+                total=sum(item.subtotal for item in items),
                 direccion_envio=direccion_envio,
                 telefono_contacto=telefono_contacto,
                 notas=notas
             )
 
-            # Crear items del pedido y actualizar stock
-            for item in carrito.items.all():
-                PedidoItem.objects.create(
+            # Descontar el stock consumiendo lo reservado por el carrito
+            try:
+                reservas.consumir(carrito, items, pedido)
+            except reservas.StockInsuficiente as error:
+                # Deshacer el pedido creado
+                transaction.set_rollback(True)
+                return Response({
+                    'error': f'Stock insuficiente para {error}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # Crear items del pedido
+            PedidoItem.objects.bulk_create([
+                PedidoItem(
                     pedido=pedido,
                     producto=item.producto,
                     cantidad=item.cantidad,
                     precio_unitario=item.producto.precio,
                     subtotal=item.subtotal
                 )
-                
-                # Actualizar stock
-                item.producto.stock -= item.cantidad
-                item.producto.save()
+                for item in items
+            ])
 
             # Limpiar carrito
             carrito.items.all().delete()
             
             # AUTO-CREAR ENVÍO automáticamente
             try:
-                from .models import Envio
-                from datetime import timedelta
-                
-                # Generar número de guía único
-                numero_guia = f'ENV-{uuid.uuid4().hex[:8].upper()}'
-                
                 # Calcular peso estimado basado en los productos
                 peso_total = sum(item.cantidad * 5 for item in pedido.items.all())  # Estimación: 5kg por producto
                 volumen_total = sum(item.cantidad * 0.1 for item in pedido.items.all())  # Estimación: 0.1m³ por producto
@@ -531,37 +626,37 @@ class PedidoViewSet(viewsets.ModelViewSet):
                 # Crear descripción de carga
                 productos_str = ', '.join([f"{item.producto.nombre} (x{item.cantidad})" for item in pedido.items.all()])
                 
-                # Crear el envío
-                envio = Envio.objects.create(
-                    numero_guia=numero_guia,
-                    cliente=request.user,
-                    origen='Bodega TecnoRoute',
-                    destino=direccion_envio,
-                    conductor=pedido.conductor if pedido.conductor else None,
-                    descripcion_carga=f"Pedido #{pedido.numero_pedido}: {productos_str}",
-                    peso_kg=peso_total,
-                    volumen_m3=volumen_total,
-                    direccion_recogida='Calle Principal 123, Bogotá',  # Dirección de bodega
-                    direccion_entrega=direccion_envio,
-                    contacto_recogida='Bodega TecnoRoute',
-                    contacto_entrega=f"{request.user.first_name} {request.user.last_name}",
-                    telefono_recogida='3001234567',
-                    telefono_entrega=telefono_contacto,
-                    fecha_recogida_programada=timezone.now(),
-                    fecha_entrega_programada=timezone.now() + timedelta(days=2),
-                    costo_envio=0,  # Envío gratis por ahora
-                    valor_declarado=pedido.total,
-                    estado='pendiente',
-                    prioridad='media',
-                    observaciones=notas
-                )
+                # Crear el envío (en un savepoint: si falla no invalida la transacción del pedido)
+                with transaction.atomic():
+                    envio = Envio.objects.create(
+                        numero_guia=numero_guia,
+                        cliente=request.user,
+                        origen='Bodega TecnoRoute',
+                        destino=direccion_envio,
+                        conductor=pedido.conductor if pedido.conductor else None,
+                        descripcion_carga=f"Pedido #{pedido.numero_pedido}: {productos_str}",
+                        peso_kg=peso_total,
+                        volumen_m3=volumen_total,
+                        direccion_recogida='Calle Principal 123, Bogotá',  # Dirección de bodega
+                        direccion_entrega=direccion_envio,
+                        contacto_recogida='Bodega TecnoRoute',
+                        contacto_entrega=f"{request.user.first_name} {request.user.last_name}",
+                        telefono_recogida='3001234567',
+                        telefono_entrega=telefono_contacto,
+                        fecha_recogida_programada=timezone.now(),
+                        fecha_entrega_programada=timezone.now() + timedelta(days=2),
+                        costo_envio=0,  # Envío gratis por ahora
+                        valor_declarado=pedido.total,
+                        estado='pendiente',
+                        prioridad='media',
+                        observaciones=notas
+                    )
                 
-                print(f"Envío creado automáticamente: {envio.numero_guia} para pedido {pedido.numero_pedido}")
+                log.info('pedidos.envio_creado', pedido=pedido.numero_pedido, envio=envio.numero_guia)
                 
-            except Exception as e:
-                print(f"Error creando envío automático: {str(e)}")
+            except Exception:
                 # No fallar el pedido si el envío no se puede crear
-                pass
+                log.exception('pedidos.error_envio_automatico', pedido=pedido.numero_pedido)
 
             serializer = PedidoSerializer(pedido)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -576,18 +671,13 @@ class PedidoViewSet(viewsets.ModelViewSet):
         conductor_id = request.data.get('conductor_id')
         
         # Verificar que sea admin
-        try:
-            user_profile = request.user.userprofile
-        except AttributeError:
-            user_profile = None
-        if not user_profile or user_profile.role != 'admin':
+        if not principal_de(request.user).is_admin:
             return Response({'error': 'Solo administradores pueden asignar conductores'}, status=status.HTTP_403_FORBIDDEN)
         
         if not conductor_id:
             return Response({'error': 'conductor_id es requerido'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            from .models import Conductor
             conductor = Conductor.objects.get(id=conductor_id, activo=True)
             
             # Asignar conductor al pedido
@@ -614,22 +704,17 @@ class PedidoViewSet(viewsets.ModelViewSet):
         nuevo_estado = request.data.get('estado')
         
         # Verificar permisos según el rol
-        try:
-            user_profile = request.user.userprofile
-        except AttributeError:
-            user_profile = None
-        if not user_profile:
+        principal = principal_de(request.user)
+        if principal.profile is None:
             return Response({'error': 'Usuario no tiene perfil'}, status=status.HTTP_403_FORBIDDEN)
         
         # Admins pueden cambiar cualquier estado
-        if user_profile.role == 'admin':
+        if principal.role == 'admin':
             pass  # Permitir cualquier cambio
         # Conductores pueden cambiar: pendiente->confirmado, confirmado->en_curso, en_curso->entregado
-        elif user_profile.role == 'conductor':
-            from .models import Conductor
-            try:
-                conductor = Conductor.objects.get(email=request.user.email)
-            except Conductor.DoesNotExist:
+        elif principal.role == 'conductor':
+            conductor = principal.conductor
+            if conductor is None:
                 return Response({'error': 'Conductor no encontrado'}, status=status.HTTP_404_NOT_FOUND)
             
             # Validar transiciones de estado permitidas
@@ -639,11 +724,11 @@ class PedidoViewSet(viewsets.ModelViewSet):
                 pedido.fecha_asignacion = timezone.now()
             elif nuevo_estado == 'en_curso' and pedido.estado == 'confirmado':
                 # Tomar pedido asignado - verificar que sea el conductor asignado
-                if pedido.conductor != conductor:
+                if pedido.conductor_id != conductor.id:
                     return Response({'error': 'Solo el conductor asignado puede tomar este pedido'}, status=status.HTTP_403_FORBIDDEN)
             elif nuevo_estado == 'entregado' and pedido.estado == 'en_curso':
                 # Completar entrega - verificar que sea el conductor asignado
-                if pedido.conductor != conductor:
+                if pedido.conductor_id != conductor.id:
                     return Response({'error': 'Solo el conductor asignado puede marcar como entregado'}, status=status.HTTP_403_FORBIDDEN)
             else:
                 return Response({'error': f'Cambio de estado no permitido: {pedido.estado} -> {nuevo_estado}'}, status=status.HTTP_403_FORBIDDEN)
@@ -664,15 +749,12 @@ class PedidoViewSet(viewsets.ModelViewSet):
         pedido = self.get_object()
         
         # Solo el propietario del pedido puede editarlo (excepto admins)
-        try:
-            user_profile = request.user.userprofile
-        except AttributeError:
-            user_profile = None
-        if not user_profile:
+        principal = principal_de(request.user)
+        if principal.profile is None:
             return Response({'error': 'Usuario no tiene perfil'}, status=status.HTTP_403_FORBIDDEN)
         
         # Verificar si es el propietario o admin
-        if user_profile.role != 'admin' and pedido.usuario != request.user:
+        if not principal.is_admin and pedido.usuario_id != request.user.id:
             return Response({'error': 'No autorizado para editar este pedido'}, status=status.HTTP_403_FORBIDDEN)
         
         # Solo se pueden editar pedidos en estado pendiente
@@ -719,15 +801,12 @@ class PedidoViewSet(viewsets.ModelViewSet):
         pedido = self.get_object()
         
         # Solo el propietario del pedido puede eliminarlo (excepto admins)
-        try:
-            user_profile = request.user.userprofile
-        except AttributeError:
-            user_profile = None
-        if not user_profile:
+        principal = principal_de(request.user)
+        if principal.profile is None:
             return Response({'error': 'Usuario no tiene perfil'}, status=status.HTTP_403_FORBIDDEN)
         
         # Verificar si es el propietario o admin
-        if user_profile.role != 'admin' and pedido.usuario != request.user:
+        if not principal.is_admin and pedido.usuario_id != request.user.id:
             return Response({'error': 'No autorizado para eliminar este pedido'}, status=status.HTTP_403_FORBIDDEN)
         
         # Solo se pueden eliminar pedidos en estado pendiente
@@ -738,11 +817,8 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                # Restaurar stock de los productos antes de eliminar
-                for item in pedido.items.all():
-                    producto = item.producto
-                    producto.stock += item.cantidad
-                    producto.save()
+                # Restaurar stock de los productos antes de eliminar (queda en el libro de inventario)
+                inventario.cancelar(pedido, usuario=request.user)
                 
                 # Eliminar el pedido (esto también eliminará los items por CASCADE)
                 pedido.delete()
@@ -760,38 +836,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
     def estadisticas(self, request):
         """Obtener estadísticas de pedidos"""
         try:
-            # Estadísticas generales
-            total_pedidos = Pedido.objects.count()
-            total_ingresos = Pedido.objects.aggregate(total=Sum('total'))['total'] or 0
-            
-            # Pedidos por estado
-            pedidos_por_estado = Pedido.objects.values('estado').annotate(count=Count('id'))
-            estados_dict = dict(pedidos_por_estado.values_list('estado', 'count'))
-            
-            # Pedidos del día
-            hoy = datetime.now().date()
-            pedidos_hoy = Pedido.objects.filter(fecha_creacion__date=hoy).count()
-            
-            # Pedidos de la semana
-            inicio_semana = hoy - timedelta(days=hoy.weekday())
-            pedidos_semana = Pedido.objects.filter(fecha_creacion__date__gte=inicio_semana).count()
-            
-            # Pedidos del mes
-            inicio_mes = hoy.replace(day=1)
-            pedidos_mes = Pedido.objects.filter(fecha_creacion__date__gte=inicio_mes).count()
-            
-            return Response({
-                'total_pedidos': total_pedidos,
-                'total_ingresos': float(total_ingresos),
-                'pedidos_hoy': pedidos_hoy,
-                'pedidos_semana': pedidos_semana,
-                'pedidos_mes': pedidos_mes,
-                'pedidos_pendientes': estados_dict.get('pendiente', 0),
-                'pedidos_confirmados': estados_dict.get('confirmado', 0),
-                'pedidos_enviados': estados_dict.get('enviado', 0),
-                'pedidos_entregados': estados_dict.get('entregado', 0),
-                'pedidos_cancelados': estados_dict.get('cancelado', 0),
-            })
+            return Response(estadisticas_pedidos(Pedido.objects.aggregate(**conteos_pedidos())))
         except Exception as e:
             return Response({
                 'error': f'Error obteniendo estadísticas: {str(e)}',
@@ -847,7 +892,6 @@ def check_phone(request):
     if not phone:
         return Response({'error': 'Phone is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    from user_management.models import UserProfile
     exists = UserProfile.objects.filter(telefono=phone).exists()
     return Response({'exists': exists})
 
@@ -870,8 +914,6 @@ def send_verification_code(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        from user_management.verification import EmailVerificationCode
-        
         # Crear y enviar código
         code = EmailVerificationCode.create_code(email)
         EmailVerificationCode.send_verification_email(email, code)
@@ -900,8 +942,6 @@ def verify_code(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        from user_management.verification import EmailVerificationCode
-        
         if EmailVerificationCode.verify_code(email, code):
             return Response({
                 'success': True,
@@ -921,7 +961,6 @@ def verify_code(request):
 @permission_classes([permissions.AllowAny])
 def test_connection(request):
     """Endpoint de prueba para verificar conexión"""
-    from user_management.models import Pedido
     total_pedidos = Pedido.objects.count()
     return Response({
         'status': 'API funcionando correctamente',
@@ -934,10 +973,6 @@ def test_connection(request):
 @permission_classes([permissions.AllowAny])
 def request_password_reset(request):
     """Enviar código de recuperación de contraseña al email"""
-    from logistics.models import PasswordResetCode
-    from django.core.mail import send_mail
-    from django.conf import settings
-    
     email = request.data.get('email')
     
     if not email:
@@ -1003,8 +1038,6 @@ Equipo TecnoRoute
 @permission_classes([permissions.AllowAny])
 def verify_reset_code(request):
     """Verificar código de recuperación"""
-    from logistics.models import PasswordResetCode
-    
     email = request.data.get('email')
     code = request.data.get('code')
     
@@ -1045,8 +1078,6 @@ def verify_reset_code(request):
 @permission_classes([permissions.AllowAny])
 def reset_password(request):
     """Restablecer contraseña con código válido"""
-    from logistics.models import PasswordResetCode
-    
     email = request.data.get('email')
     code = request.data.get('code')
     new_password = request.data.get('new_password')
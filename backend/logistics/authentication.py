@@ -0,0 +1,136 @@
+"""
+Autenticación por token con caché.
+
+TokenAuthentication de DRF consulta authtoken_token + auth_user en cada
+petición, y luego las vistas consultan el perfil para revisar el rol.
+CachedTokenAuthentication guarda en caché lo que necesita para reconstruir el
+usuario, el token y su Principal (cargados en un solo JOIN) durante
+AUTH_TOKEN_CACHE_TTL segundos.
+
+La entrada solo lleva campos simples: nunca el hash de la contraseña ni los
+objetos del perfil o del conductor, porque la caché es compartida (archivo o
+Redis). El usuario se reconstruye con los demás campos diferidos, así que
+user.password o user.save() funcionan como con un usuario de la base de
+datos. La clave es un hash del token.
+
+Las entradas se invalidan desde logistics.signals cuando se elimina el token
+(logout, eliminación de cuenta) o cambian el usuario (contraseña, estado),
+su perfil (rol) o su registro de conductor. Invalidar también cambia la
+generación del token: una petición que leyó la base de datos antes del
+logout guarda su entrada con la generación anterior y esa entrada se ignora.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .principal import RELACIONES, Principal, cargar_principal
+
+
+# Campos de User que viajan en la caché (sin password)
+CAMPOS_USUARIO = (
+    'id', 'username', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'is_superuser', 'last_login', 'date_joined',
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300)
+
+
+def clave_cache(key):
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def clave_generacion(key):
+    return f'{clave_cache(key)}:generacion'
+
+
+def _entrada(user, token, principal, generacion):
+    return {
+        'generacion': generacion,
+        'usuario': {campo: getattr(user, campo) for campo in CAMPOS_USUARIO},
+        'token_creado': token.created,
+        'principal': principal.datos(),
+    }
+
+
+def _reconstruir(key, entrada):
+    """(user, token, principal) de una entrada de la caché"""
+    usuario = entrada['usuario']
+    campos = [f.attname for f in User._meta.concrete_fields if f.attname in usuario]
+    user = User.from_db('default', campos, [usuario[campo] for campo in campos])
+    token = Token(key=key, user_id=user.id, created=entrada['token_creado'])
+    token._state.adding = False
+    token._state.db = 'default'
+    Token.user.field.set_cached_value(token, user)
+    return user, token, Principal(**entrada['principal'])
+
+
+# Sin generación indicada: guardar_en_cache lee la actual
+ACTUAL = object()
+
+
+def guardar_en_cache(user, token, principal, generacion=ACTUAL):
+    """
+    Guarda la entrada de un token (también la usa el servicio de login). Sin
+    `generacion` usa la actual; quien leyó la base de datos pasa la que leyó
+    antes de consultarla.
+    """
+    cache = _cache()
+    if generacion is ACTUAL:
+        generacion = cache.get(clave_generacion(token.key))
+    cache.set(clave_cache(token.key), _entrada(user, token, principal, generacion), _ttl())
+
+
+def invalidar_token(key):
+    cache = _cache()
+    # La generación dura más que cualquier entrada escrita con la anterior
+    cache.set(clave_generacion(key), uuid.uuid4().hex, _ttl() * 2)
+    cache.delete(clave_cache(key))
+
+
+def invalidar_usuario(user_id):
+    """Invalida el token (si existe) de un usuario"""
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidar_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication que resuelve el token desde la caché"""
+
+    def authenticate_credentials(self, key):
+        clave, clave_gen = clave_cache(key), clave_generacion(key)
+        leidos = _cache().get_many([clave, clave_gen])
+        generacion = leidos.get(clave_gen)
+        entrada = leidos.get(clave)
+
+        if entrada is not None and entrada['generacion'] == generacion:
+            user, token, principal = _reconstruir(key, entrada)
+        else:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related(
+                    'user', *(f'user__{nombre}' for nombre in RELACIONES)
+                ).get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+
+            user = token.user
+            principal = cargar_principal(user)
+            guardar_en_cache(user, token, principal, generacion)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        user.principal = principal
+        return (user, token)
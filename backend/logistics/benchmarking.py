@@ -0,0 +1,213 @@
+"""
+Utilidades comunes para los comandos de benchmark.
+
+Cada medición registra tiempo, memoria (tracemalloc) y cantidad de consultas
+SQL. Los resultados se guardan en JSON dentro de BENCHMARK_DIR y se comparan
+con una línea base para detectar regresiones.
+"""
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+
+
+# Tolerancia por defecto antes de considerar una regresión de tiempo o memoria
+TOLERANCIA = 0.25
+
+
+def directorio_resultados():
+    directorio = Path(getattr(settings, 'BENCHMARK_DIR', settings.BASE_DIR / 'benchmarks'))
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def medir(funcion, repeticiones=5, calentar=True):
+    """
+    Ejecuta `funcion` varias veces y retorna la mediana del tiempo, el pico de
+    memoria asignada y las consultas SQL de una ejecución.
+    """
+    if calentar:
+        # Ejecución de calentamiento (cachés de Django, imports perezosos)
+        funcion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    # El log de consultas de Django tiene un máximo de 9000 entradas
+    log_original = connection.queries_log
+    connection.queries_log = deque()
+    try:
+        with CaptureQueriesContext(connection) as consultas:
+            tracemalloc.start()
+            try:
+                funcion()
+                _, pico = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        total_consultas = len(consultas)
+    finally:
+        connection.queries_log = log_original
+
+    return {
+        'tiempo_ms': round(statistics.median(tiempos) * 1000, 3),
+        'memoria_pico_kb': round(pico / 1024, 1),
+        'consultas': total_consultas,
+    }
+
+
+def medir_rendimiento(funcion, hilos=4, operaciones=200):
+    """
+    Ejecuta `funcion` `operaciones` veces repartidas entre varios hilos y
+    retorna operaciones por segundo. Cada hilo cierra su conexión al terminar.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def trabajador(cantidad):
+        try:
+            for _ in range(cantidad):
+                funcion()
+        finally:
+            connection.close()
+
+    reparto = [operaciones // hilos + (1 if i < operaciones % hilos else 0) for i in range(hilos)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        for futuro in [ejecutor.submit(trabajador, cantidad) for cantidad in reparto]:
+            futuro.result()
+    return round(operaciones / (time.perf_counter() - inicio), 2)
+
+
+def caches_temporales(directorio):
+    """CACHES con los mismos backends, sin compartir claves con la caché real"""
+    temporales = {}
+    for alias, configuracion in settings.CACHES.items():
+        configuracion = dict(configuracion)
+        if configuracion['BACKEND'].endswith('FileBasedCache'):
+            configuracion['LOCATION'] = str(Path(directorio) / alias)
+        else:
+            configuracion['KEY_PREFIX'] = f"{configuracion.get('KEY_PREFIX', '')}:{Path(directorio).name}"
+        temporales[alias] = configuracion
+    return temporales
+
+
+def entorno_subproceso():
+    """Variables de entorno para que un proceso hijo use las bases y la caché temporales"""
+    entorno = {'SQLITE_DB': str(connections['default'].settings_dict['NAME'])}
+    for configuracion in settings.CACHES.values():
+        if configuracion['BACKEND'].endswith('FileBasedCache'):
+            entorno['CACHE_DIR'] = str(Path(configuracion['LOCATION']).parent)
+    if 'posiciones' in connections:
+        entorno['POSICIONES_DB'] = str(connections['posiciones'].settings_dict['NAME'])
+    return entorno
+
+
+@contextmanager
+def base_de_datos_temporal(en_disco=False):
+    """
+    Crea una base de datos de prueba (como el test runner) para no tocar los
+    datos reales, y la destruye al terminar. Las cachés usan otro directorio o
+    prefijo, para no mezclar claves (stock, tokens) con las de la base real.
+
+    Con en_disco=True las bases SQLite van a un archivo temporal en vez de a
+    memoria compartida, que bloquea por tabla y falla al instante con
+    escrituras concurrentes (para medir contención real entre hilos).
+    """
+    setup_test_environment(debug=False)
+    nombres_originales, espejos = {}, {}
+    directorio = tempfile.mkdtemp(prefix='benchmark-') if en_disco else None
+    directorio_cache = tempfile.mkdtemp(prefix='benchmark-cache-')
+    caches_originales = override_settings(CACHES=caches_temporales(directorio_cache))
+    caches_originales.enable()
+    try:
+        for alias in connections:
+            espejo = connections[alias].settings_dict['TEST'].get('MIRROR')
+            if espejo:
+                # Las réplicas apuntan a la base de prueba de su primaria
+                espejos[alias] = espejo
+                continue
+            if directorio and connections[alias].vendor == 'sqlite':
+                connections[alias].settings_dict['TEST']['NAME'] = str(Path(directorio) / f'{alias}.sqlite3')
+            nombres_originales[alias] = connections[alias].creation.create_test_db(
+                verbosity=0, autoclobber=True, keepdb=False
+            )
+        for alias, espejo in espejos.items():
+            connections[alias].creation.set_as_test_mirror(connections[espejo].settings_dict)
+        yield
+    finally:
+        for alias, nombre in nombres_originales.items():
+            connections[alias].creation.destroy_test_db(nombre, verbosity=0)
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+        caches_originales.disable()
+        shutil.rmtree(directorio_cache, ignore_errors=True)
+        teardown_test_environment()
+
+
+def guardar_resultados(nombre, resultados, como_base=False):
+    """Guarda los resultados (y opcionalmente los fija como línea base)"""
+    directorio = directorio_resultados()
+    archivo = directorio / (f'{nombre}.baseline.json' if como_base else f'{nombre}.json')
+    archivo.write_text(json.dumps(resultados, indent=2, sort_keys=True, ensure_ascii=False))
+    return archivo
+
+
+def cargar_base(nombre):
+    archivo = directorio_resultados() / f'{nombre}.baseline.json'
+    if not archivo.exists():
+        return None
+    return json.loads(archivo.read_text())
+
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """
+    Compara resultados {caso: {metrica: valor}} con la línea base.
+
+    Retorna (regresiones, advertencias). Un aumento de consultas SQL siempre es
+    una regresión (es determinista); tiempo, memoria y rendimiento (por_segundo)
+    dependen de la máquina y solo generan advertencias cuando superan la
+    tolerancia.
+    """
+    regresiones = []
+    advertencias = []
+    for caso, metricas in actual.items():
+        anterior = (base or {}).get(caso)
+        if not anterior:
+            continue
+        if metricas['consultas'] > anterior['consultas']:
+            regresiones.append(
+                f"{caso}: consultas {anterior['consultas']} -> {metricas['consultas']}"
+            )
+        for metrica in ('tiempo_ms', 'memoria_pico_kb'):
+            if anterior.get(metrica) and metricas[metrica] > anterior[metrica] * (1 + tolerancia):
+                advertencias.append(
+                    f"{caso}: {metrica} {anterior[metrica]} -> {metricas[metrica]}"
+                )
+        if anterior.get('por_segundo') and metricas.get('por_segundo', 0) < anterior['por_segundo'] * (1 - tolerancia):
+            advertencias.append(
+                f"{caso}: por_segundo {anterior['por_segundo']} -> {metricas['por_segundo']}"
+            )
+    return regresiones, advertencias
+
+
+def formatear_tabla(resultados):
+    """Tabla de texto con una fila por caso"""
+    lineas = [f"{'caso':<40} {'tiempo_ms':>12} {'memoria_kb':>12} {'consultas':>10}"]
+    for caso, metricas in resultados.items():
+        lineas.append(
+            f"{caso:<40} {metricas['tiempo_ms']:>12.3f} {metricas['memoria_pico_kb']:>12.1f} {metricas['consultas']:>10}"
+        )
+    return '\n'.join(lineas)
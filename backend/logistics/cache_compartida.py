@@ -0,0 +1,104 @@
+"""
+Configuración de CACHES compartida entre procesos (la usa settings.py).
+
+Con LocMemCache cada worker de gunicorn tiene su propia caché: las sesiones
+de un worker no existen en los demás y cada caché acierta una fracción de las
+veces. Cada alias se configura con uno de estos backends:
+
+- memoria: LocMemCache, solo dentro del proceso (desarrollo con un worker).
+- archivo: FileBasedCache en CACHE_DIR/<alias>, compartida entre los procesos
+  del mismo servidor. Cada escritura lista el directorio para podar: hasta
+  CACHE_MAXIMO entradas por alias.
+- base_de_datos: DatabaseCache en la tabla cache_<alias> (python manage.py
+  createcachetable), compartida por todos los servidores de la misma base.
+- redis: RedisCache en REDIS_URL (Redis o compatible, requiere el paquete
+  redis), con un pool de hasta CACHE_REDIS_CONEXIONES conexiones por proceso
+  y cada alias en su propia base de Redis (si REDIS_URL no fija una).
+
+Sin REDIS_URL los alias usan archivo, salvo ratelimit, que usa memoria: sus
+contadores necesitan add + incr atómicos, y FileBasedCache y DatabaseCache
+implementan incr como leer y escribir (dos workers pierden incrementos).
+Configurar ratelimit con uno de ellos es un error al arrancar. En memoria
+cada worker cuenta por separado: el límite efectivo se multiplica por los
+workers, pero nunca se pierden peticiones.
+
+Cada alias tiene su KEY_PREFIX y su directorio, tabla o base de Redis, así que
+limpiar uno no borra los demás; subir CACHE_VERSION invalida todas las claves
+de una vez (por ejemplo, si cambia lo que se guarda en ellas).
+"""
+from pathlib import Path
+
+
+BACKENDS = {
+    'memoria': 'django.core.cache.backends.locmem.LocMemCache',
+    'archivo': 'django.core.cache.backends.filebased.FileBasedCache',
+    'base_de_datos': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+# Alias: uso. El número es la base de Redis de cada uno
+ALIASES = {
+    'default': 0,  # tokens, inventario, posiciones, carritos de invitado
+    'sessions': 1,  # SESSION_CACHE_ALIAS
+    'api': 2,  # respuestas cacheadas de la API (rastreo público)
+    'ratelimit': 3,  # contadores de logistics/throttling.py
+}
+
+# Backends con add + incr atómicos
+ATOMICOS = {'memoria', 'redis'}
+
+# Alias con contadores: solo pueden usar un backend de ATOMICOS
+CONTADORES = {'ratelimit'}
+
+
+def backend_por_defecto(alias, redis_url=''):
+    """Backend de un alias sin CACHE_BACKEND: redis si hay REDIS_URL, si no archivo o memoria"""
+    if redis_url:
+        return 'redis'
+    return 'memoria' if alias in CONTADORES else 'archivo'
+
+
+def verificar_contadores(backends):
+    """Falla si un alias con contadores usa un backend sin incr atómico"""
+    for alias in CONTADORES & backends.keys():
+        if backends[alias] not in ATOMICOS:
+            raise ValueError(
+                f'El alias de caché {alias} usa {backends[alias]}, que no incrementa de forma atómica '
+                f'(opciones: {", ".join(sorted(ATOMICOS))}; por ejemplo CACHE_BACKEND_{alias.upper()}=memoria)'
+            )
+
+
+def configurar_cache(alias, backend, directorio='', redis_url='', version=1, maximo=10000, conexiones=50, timeout=1.0):
+    """Diccionario de CACHES para un alias con el backend indicado"""
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend de caché desconocido para {alias}: {backend} (opciones: {", ".join(BACKENDS)})')
+    configuracion = {
+        'BACKEND': BACKENDS[backend],
+        'KEY_PREFIX': f'tecnoroute:{alias}',
+        'VERSION': version,
+    }
+    if backend == 'memoria':
+        configuracion['LOCATION'] = f'tecnoroute-{alias}'
+        configuracion['OPTIONS'] = {'MAX_ENTRIES': maximo}
+    elif backend == 'archivo':
+        configuracion['LOCATION'] = str(Path(directorio) / alias)
+        configuracion['OPTIONS'] = {'MAX_ENTRIES': maximo}
+    elif backend == 'base_de_datos':
+        configuracion['LOCATION'] = f'cache_{alias}'
+        configuracion['OPTIONS'] = {'MAX_ENTRIES': maximo}
+    else:
+        if not redis_url:
+            raise ValueError(f'El alias de caché {alias} usa redis pero REDIS_URL está vacío')
+        configuracion['LOCATION'] = redis_url
+        configuracion['OPTIONS'] = {
+            'db': ALIASES.get(alias, 0),
+            'max_connections': conexiones,
+            'socket_connect_timeout': timeout,
+            'socket_timeout': timeout,
+        }
+    return configuracion
+
+
+def configurar_caches(backends, **opciones):
+    """CACHES con {alias: backend}; las opciones van a configurar_cache"""
+    return {alias: configurar_cache(alias, backend, **opciones) for alias, backend in backends.items()}
@@ -0,0 +1,252 @@
+"""
+Cambios por lotes sobre el carrito (POST /api/carrito/lote/).
+
+Restaurar un carrito guardado o repetir un pedido eran N peticiones y N
+serializaciones del carrito completo. aplicar() recibe la lista de
+operaciones (agregar, fijar, quitar), trae todos los productos en una
+consulta, calcula la cantidad final de cada uno y reserva el stock de todos
+en la misma transacción: si algún producto no alcanza no cambia nada.
+
+También guarda el carrito de quien navega sin sesión (ver más abajo).
+"""
+import re
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import serializers
+
+from user_management.models import CarritoItem, Producto
+from . import reservas, sync
+from .log import get_logger
+from .serializers import CarritoItemSerializer
+
+
+log = get_logger(__name__)
+
+
+ACCIONES = ('agregar', 'fijar', 'quitar')
+
+
+class OperacionesInvalidas(Exception):
+    def __init__(self, errores):
+        self.errores = errores  # [{'indice', 'error'}]
+        super().__init__(f'{len(errores)} operaciones inválidas')
+
+
+def _entero(valor):
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalizar(operaciones):
+    """Valida el cuerpo y retorna [(accion, producto_id, cantidad)]"""
+    if not isinstance(operaciones, list) or not operaciones:
+        raise OperacionesInvalidas([{'indice': None, 'error': 'operaciones debe ser una lista no vacía'}])
+    maximo = getattr(settings, 'CARRITO_LOTE_MAXIMO', 200)
+    if len(operaciones) > maximo:
+        raise OperacionesInvalidas([{'indice': None, 'error': f'Máximo {maximo} operaciones por petición'}])
+
+    resultado = []
+    errores = []
+    for indice, operacion in enumerate(operaciones):
+        if not isinstance(operacion, dict):
+            errores.append({'indice': indice, 'error': 'Cada operación debe ser un objeto'})
+            continue
+        accion = operacion.get('accion')
+        producto_id = _entero(operacion.get('producto_id'))
+        cantidad = _entero(operacion.get('cantidad', 1 if accion == 'agregar' else 0))
+        if accion not in ACCIONES:
+            errores.append({'indice': indice, 'error': f'accion debe ser {", ".join(ACCIONES)}'})
+        elif producto_id is None:
+            errores.append({'indice': indice, 'error': 'producto_id es requerido'})
+        elif cantidad is None or cantidad < (1 if accion == 'agregar' else 0):
+            errores.append({'indice': indice, 'error': 'cantidad inválida'})
+        else:
+            resultado.append((accion, producto_id, cantidad))
+    if errores:
+        raise OperacionesInvalidas(errores)
+    return resultado
+
+
+def _acumular(operaciones, cantidades, productos):
+    """Cantidad final de cada producto tras las operaciones (modifica `cantidades`)"""
+    errores = []
+    for indice, (accion, producto_id, cantidad) in enumerate(operaciones):
+        producto = productos.get(producto_id)
+        if accion != 'quitar' and (producto is None or not producto.activo):
+            errores.append({'indice': indice, 'error': 'Producto no encontrado'})
+        elif accion == 'agregar':
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+        elif accion == 'fijar':
+            cantidades[producto_id] = cantidad
+        else:
+            cantidades[producto_id] = 0
+    if errores:
+        raise OperacionesInvalidas(errores)
+    return cantidades
+
+
+def aplicar(usuario, operaciones):
+    """
+    Aplica las operaciones en orden sobre el carrito del usuario, en una
+    transacción. Retorna el carrito. Lanza OperacionesInvalidas (producto
+    inexistente o inactivo) o reservas.StockInsuficiente sin cambiar nada.
+    """
+    operaciones = normalizar(operaciones)
+    with transaction.atomic():
+        carrito = reservas.carrito_bloqueado(usuario)
+        actuales = {item.producto_id: item for item in carrito.items.all()}
+        productos = Producto.objects.in_bulk({producto_id for _, producto_id, _ in operaciones})
+
+        cantidades = _acumular(
+            operaciones, {producto_id: item.cantidad for producto_id, item in actuales.items()}, productos
+        )
+
+        cambios = {
+            producto_id: cantidad for producto_id, cantidad in cantidades.items()
+            if cantidad != (actuales[producto_id].cantidad if producto_id in actuales else 0)
+        }
+        if not cambios:
+            return carrito
+        reservas.reservar_lote(carrito, {productos[producto_id]: cantidad for producto_id, cantidad in cambios.items()})
+
+        quitar, modificar, nuevos = [], [], []
+        for producto_id, cantidad in cambios.items():
+            item = actuales.get(producto_id)
+            if item is None:
+                nuevos.append(CarritoItem(carrito=carrito, producto_id=producto_id, cantidad=cantidad))
+            elif cantidad <= 0:
+                quitar.append(producto_id)
+            else:
+                item.cantidad = cantidad
+                modificar.append(item)
+        if quitar:
+            CarritoItem.objects.filter(carrito=carrito, producto_id__in=quitar).delete()
+        CarritoItem.objects.bulk_update(modificar, ['cantidad'])
+        CarritoItem.objects.bulk_create(nuevos)
+        # bulk_update/bulk_create no emiten señales
+        sync.registrar('carrito', carrito)
+    return carrito
+
+
+# Carrito de invitado
+#
+# Quien navega sin sesión guarda su carrito en la caché ({producto_id:
+# cantidad}) bajo un identificador que viaja en la cabecera X-Carrito-Invitado
+# (o en la sesión, para clientes con cookies). No escribe en la base de datos
+# ni reserva stock: solo se valida contra el disponible. Al iniciar sesión,
+# fusionar_invitado() lo pasa al Carrito del usuario con aplicar().
+
+CABECERA_INVITADO = 'X-Carrito-Invitado'
+CLAVE_SESION = 'carrito_invitado'
+FORMATO_IDENTIFICADOR = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def _cache():
+    return caches[getattr(settings, 'CARRITO_INVITADO_CACHE_ALIAS', 'default')]
+
+
+def clave_cache(identificador):
+    return f'carrito_invitado:{identificador}'
+
+
+def identificador(request, crear=False):
+    """Identificador del carrito de invitado de la petición (o uno nuevo con crear=True)"""
+    valor = request.headers.get(CABECERA_INVITADO) or request.session.get(CLAVE_SESION)
+    if valor and FORMATO_IDENTIFICADOR.match(valor):
+        return valor
+    if not crear:
+        return None
+    valor = secrets.token_urlsafe(24)
+    request.session[CLAVE_SESION] = valor
+    return valor
+
+
+def leer(identificador):
+    """{producto_id: cantidad} del carrito de invitado"""
+    if not identificador:
+        return {}
+    return _cache().get(clave_cache(identificador)) or {}
+
+
+def guardar(identificador, cantidades):
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+    if cantidades:
+        _cache().set(clave_cache(identificador), cantidades, getattr(settings, 'CARRITO_INVITADO_TTL', 7 * 86400))
+    else:
+        _cache().delete(clave_cache(identificador))
+
+
+def aplicar_invitado(identificador, operaciones):
+    """
+    Como aplicar() para un carrito de invitado. Retorna {producto_id:
+    cantidad}. Lanza StockInsuficiente si un aumento supera el disponible.
+    """
+    operaciones = normalizar(operaciones)
+    actuales = leer(identificador)
+    productos = Producto.objects.in_bulk({producto_id for _, producto_id, _ in operaciones})
+    cantidades = _acumular(operaciones, dict(actuales), productos)
+    faltantes = [
+        productos[producto_id].nombre for producto_id, cantidad in cantidades.items()
+        if cantidad > actuales.get(producto_id, 0) and cantidad > productos[producto_id].disponible
+    ]
+    if faltantes:
+        raise reservas.StockInsuficiente(faltantes)
+    guardar(identificador, cantidades)
+    return {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+
+
+def representar_invitado(identificador, cantidades):
+    """Misma forma que CarritoSerializer; el id de cada item es el del producto"""
+    productos = Producto.objects.select_related('categoria').in_bulk(list(cantidades))
+    items = [
+        CarritoItem(id=producto_id, producto=productos[producto_id], cantidad=cantidad)
+        for producto_id, cantidad in cantidades.items()
+        if producto_id in productos and productos[producto_id].activo
+    ]
+    return {
+        'id': None,
+        'invitado': identificador,
+        'items': CarritoItemSerializer(items, many=True).data,
+        'total': serializers.DecimalField(max_digits=12, decimal_places=2).to_representation(
+            sum((item.subtotal for item in items), Decimal('0'))
+        ),
+        'fecha_creacion': None,
+        'fecha_actualizacion': None,
+    }
+
+
+def fusionar_invitado(request, usuario):
+    """
+    Pasa el carrito de invitado de la petición al carrito del usuario (al
+    iniciar sesión). Las cantidades se suman a lo que ya tenía; los productos
+    que ya no tienen disponible se descartan.
+    """
+    clave = identificador(request)
+    cantidades = leer(clave)
+    if not cantidades:
+        return
+    operaciones = [
+        {'accion': 'agregar', 'producto_id': producto_id, 'cantidad': cantidad}
+        for producto_id, cantidad in cantidades.items()
+    ]
+    descartados = 0
+    try:
+        aplicar(usuario, operaciones)
+    except (OperacionesInvalidas, reservas.StockInsuficiente):
+        # Alguno no alcanza: agregar uno por uno lo que se pueda
+        for operacion in operaciones:
+            try:
+                aplicar(usuario, [operacion])
+            except (OperacionesInvalidas, reservas.StockInsuficiente):
+                descartados += 1
+    _cache().delete(clave_cache(clave))
+    request.session.pop(CLAVE_SESION, None)
+    log.info('carrito.invitado_fusionado', usuario=usuario.id, productos=len(cantidades), descartados=descartados)
@@ -0,0 +1,400 @@
+"""
+Generador de datos sintéticos para pruebas de rendimiento.
+
+Todos los datos se generan de forma determinista a partir de una semilla:
+cada bloque de pedidos usa su propio generador aleatorio, por lo que el
+resultado es el mismo sin importar cuántos procesos se usen. Las fechas se
+cuentan hacia atrás desde una fecha de referencia fija que depende de la
+semilla (fecha_referencia), no desde la fecha en que se genera.
+
+Los IDs se asignan de forma explícita (a partir del máximo existente) para
+poder relacionar filas sin volver a leerlas de la base de datos. Los números
+de pedido y de guía salen de un rango reservado de una vez en
+logistics/numeracion.py, como en una importación masiva.
+"""
+import random
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+
+from user_management.models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem, MovimientoStock
+from . import numeracion
+from .models import Conductor, Vehiculo, Envio, SeguimientoEnvio
+
+
+PASSWORD_DATASET = 'tecnoroute123'
+
+CATEGORIAS = [
+    'Refrigeradores', 'Lavadoras', 'Televisores', 'Electrodomésticos Cocina',
+    'Aires Acondicionados', 'Audio', 'Computadores', 'Pequeños Electrodomésticos',
+]
+
+MARCAS = ['LG', 'Samsung', 'Whirlpool', 'Mabe', 'Haceb', 'Electrolux', 'Sony', 'Oster', 'Panasonic', 'TCL']
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Ana', 'Luis', 'Laura', 'Andrés', 'Sofía', 'Jorge', 'Camila',
+           'Pedro', 'Valentina', 'Diego', 'Daniela', 'Felipe', 'Paula']
+APELLIDOS = ['García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez', 'Ramírez',
+             'Torres', 'Díaz', 'Moreno', 'Vargas', 'Rojas', 'Castro']
+CIUDADES = ['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cartagena', 'Bucaramanga', 'Pereira', 'Manizales']
+
+# Distribución de estados observada en producción (pedido -> peso)
+ESTADOS_PEDIDO = [
+    ('entregado', 60),
+    ('en_curso', 10),
+    ('confirmado', 8),
+    ('pendiente', 12),
+    ('cancelado', 10),
+]
+
+# Estado del envío asociado a cada estado de pedido
+ESTADO_ENVIO_POR_PEDIDO = {
+    'pendiente': 'pendiente',
+    'confirmado': 'pendiente',
+    'en_curso': 'en_transito',
+    'entregado': 'entregado',
+    'cancelado': 'cancelado',
+}
+
+# Historial de seguimiento que produce cada estado final del envío
+HISTORIAL_ENVIO = {
+    'pendiente': ['pendiente'],
+    'en_transito': ['pendiente', 'asignado', 'en_transito'],
+    'entregado': ['pendiente', 'asignado', 'en_transito', 'entregado'],
+    'cancelado': ['pendiente', 'cancelado'],
+    'devuelto': ['pendiente', 'asignado', 'en_transito', 'devuelto'],
+}
+
+# Las fechas de referencia caen en el año que empieza aquí
+FECHA_BASE = datetime(2025, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+# Cantidad de pedidos que se procesan en cada bloque (y cada transacción)
+TAMANO_BLOQUE = 5000
+
+
+@contextmanager
+def sin_fechas_automaticas(*modelos):
+    """Desactiva temporalmente auto_now/auto_now_add para conservar fechas generadas"""
+    originales = []
+    for modelo in modelos:
+        for field in modelo._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                originales.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = False
+                field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in originales:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def optimizar_conexion():
+    """
+    Ajustes de SQLite para carga masiva (no afectan a otros motores). Dentro de
+    una transacción (TestCase) SQLite no los permite y se omiten.
+    """
+    if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=OFF')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+
+
+def siguiente_id(modelo):
+    """Primer ID libre de un modelo"""
+    return (modelo.objects.aggregate(maximo=Max('id'))['maximo'] or 0) + 1
+
+
+def elegir_ponderado(rng, opciones):
+    total = sum(peso for _, peso in opciones)
+    valor = rng.uniform(0, total)
+    acumulado = 0
+    for opcion, peso in opciones:
+        acumulado += peso
+        if valor <= acumulado:
+            return opcion
+    return opciones[-1][0]
+
+
+def fecha_referencia(semilla):
+    """Momento "actual" del dataset: el mismo en cada corrida con la misma semilla"""
+    return FECHA_BASE + timedelta(days=random.Random(f'{semilla}-fecha').randrange(365))
+
+
+def fecha_aleatoria(rng, ahora, dias):
+    """Fecha en los últimos `dias`, más densa en días recientes y horario laboral"""
+    dias_atras = int(dias * (rng.random() ** 1.5))
+    hora = min(23, max(6, int(rng.gauss(14, 3))))
+    fecha = ahora - timedelta(days=dias_atras)
+    return fecha.replace(hour=hora, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+
+
+def crear_catalogo(rng, productos, lote, ahora, dias):
+    """
+    Crea categorías, productos y el movimiento inicial de su stock. Retorna
+    (lista de (id, precio) de los productos, filas creadas)
+    """
+    categorias = []
+    filas = 0
+    for nombre in CATEGORIAS:
+        categoria, creada = Categoria.objects.get_or_create(
+            nombre=nombre,
+            defaults={'descripcion': f'Categoría {nombre}', 'activa': True}
+        )
+        categorias.append(categoria)
+        filas += creada
+
+    inicio = siguiente_id(Producto)
+    objetos = []
+    for i in range(productos):
+        categoria = categorias[i % len(categorias)]
+        marca = rng.choice(MARCAS)
+        alta = fecha_aleatoria(rng, ahora, dias)
+        objetos.append(Producto(
+            id=inicio + i,
+            nombre=f'{categoria.nombre} {marca} GEN-{inicio + i}',
+            descripcion=f'Producto sintético de {categoria.nombre.lower()} marca {marca}',
+            categoria=categoria,
+            precio=Decimal(rng.randrange(50, 8000) * 1000),
+            stock=rng.randrange(0, 500),
+            activo=rng.random() > 0.05,
+            fecha_creacion=alta,
+            fecha_actualizacion=alta,
+        ))
+    Producto.objects.bulk_create(objetos, batch_size=lote)
+    # bulk_create no pasa por Producto.save(): el stock inicial va al libro aquí
+    movimientos = [MovimientoStock(producto_id=p.id, cantidad=p.stock, motivo='inicial') for p in objetos if p.stock]
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=lote)
+    filas += len(objetos) + len(movimientos)
+    return [(p.id, p.precio) for p in objetos], filas
+
+
+def crear_usuarios(rng, cantidad, rol, lote, ahora, dias):
+    """Crea usuarios con perfil. Retorna la lista de usuarios creados"""
+    password = make_password(PASSWORD_DATASET)
+    inicio = siguiente_id(User)
+    usuarios = []
+    perfiles = []
+    for i in range(cantidad):
+        user_id = inicio + i
+        nombres = rng.choice(NOMBRES)
+        apellidos = f'{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}'
+        email = f'{rol}{user_id}@dataset.tecnoroute.test'
+        alta = fecha_aleatoria(rng, ahora, dias)
+        usuarios.append(User(
+            id=user_id, username=email, email=email, password=password,
+            first_name=nombres, last_name=apellidos, date_joined=alta,
+        ))
+        perfiles.append(UserProfile(
+            user_id=user_id, role=rol, nombres=nombres, apellidos=apellidos,
+            telefono=f'3{rng.randrange(10**8, 10**9)}',
+            direccion=f'Calle {rng.randrange(1, 200)} # {rng.randrange(1, 100)}-{rng.randrange(1, 100)}',
+            ciudad=rng.choice(CIUDADES),
+            fecha_creacion=alta, fecha_actualizacion=alta,
+        ))
+    User.objects.bulk_create(usuarios, batch_size=lote)
+    UserProfile.objects.bulk_create(perfiles, batch_size=lote)
+    return usuarios
+
+
+def crear_conductores(rng, cantidad, lote, ahora, dias):
+    """Crea conductores (con usuario y perfil) y un vehículo para cada uno"""
+    usuarios = crear_usuarios(rng, cantidad, 'conductor', lote, ahora, dias)
+    inicio = siguiente_id(Conductor)
+    inicio_vehiculo = siguiente_id(Vehiculo)
+    conductores = []
+    vehiculos = []
+    for i, user in enumerate(usuarios):
+        conductor_id = inicio + i
+        conductores.append(Conductor(
+            id=conductor_id, user_id=user.id,
+            nombres=user.first_name, apellidos=user.last_name,
+            cedula=f'GEN{conductor_id:010d}', licencia=f'LIC-GEN-{conductor_id}',
+            telefono=f'3{rng.randrange(10**8, 10**9)}', email=user.email,
+            direccion=f'Carrera {rng.randrange(1, 120)} # {rng.randrange(1, 100)}',
+            fecha_contratacion=user.date_joined.date(),
+            estado=elegir_ponderado(rng, [('disponible', 50), ('en_ruta', 35), ('descanso', 10), ('inactivo', 5)]),
+        ))
+        vehiculos.append(Vehiculo(
+            id=inicio_vehiculo + i,
+            placa=f'G{conductor_id:07d}', marca=rng.choice(MARCAS), modelo='Carga',
+            año=rng.randrange(2008, ahora.year + 1),
+            tipo=elegir_ponderado(rng, [('camion', 40), ('furgon', 30), ('camioneta', 20), ('motocicleta', 10)]),
+            capacidad_kg=Decimal(rng.randrange(200, 12000)),
+            conductor_asignado_id=conductor_id,
+            fecha_registro=user.date_joined,
+        ))
+    Conductor.objects.bulk_create(conductores, batch_size=lote)
+    Vehiculo.objects.bulk_create(vehiculos, batch_size=lote)
+    return [(c.id, v.id) for c, v in zip(conductores, vehiculos)]
+
+
+def crear_carritos(rng, usuarios, productos, lote, ahora):
+    """Crea un carrito con 1 a 4 items para cada usuario indicado"""
+    inicio = siguiente_id(Carrito)
+    carritos = []
+    items = []
+    for i, user_id in enumerate(usuarios):
+        carrito_id = inicio + i
+        carritos.append(Carrito(id=carrito_id, usuario_id=user_id, fecha_creacion=ahora, fecha_actualizacion=ahora))
+        for producto_id, _ in rng.sample(productos, k=min(len(productos), rng.randrange(1, 5))):
+            items.append(CarritoItem(
+                carrito_id=carrito_id, producto_id=producto_id,
+                cantidad=rng.choice((1, 1, 2)), fecha_agregado=ahora,
+            ))
+    Carrito.objects.bulk_create(carritos, batch_size=lote)
+    CarritoItem.objects.bulk_create(items, batch_size=lote)
+    return len(carritos) + len(items)
+
+
+def generar_bloque_pedidos(semilla, indice, cantidad, base, contexto, bloqueo=None):
+    """
+    Genera e inserta un bloque de pedidos con sus items, envíos y seguimientos.
+
+    `base` contiene los IDs y números iniciales de pedido y envío del dataset
+    completo, de modo que el bloque `indice` ocupa un rango fijo de IDs. `bloqueo`
+    serializa las escrituras entre procesos cuando el motor no admite
+    escritores concurrentes (SQLite); la generación sigue siendo paralela.
+    """
+    rng = random.Random(f'{semilla}-pedidos-{indice}')
+    ahora = contexto['ahora']
+    clientes = contexto['clientes']
+    conductores = contexto['conductores']
+    productos = contexto['productos']
+
+    pedidos, items, envios, seguimientos = [], [], [], []
+    primer = indice * TAMANO_BLOQUE
+    for n in range(primer, primer + cantidad):
+        pedido_id = base['pedido'] + n
+        envio_id = base['envio'] + n
+        numero_pedido = numeracion.formatear('pedido', base['numero_pedido'] + n)
+        numero_guia = numeracion.formatear('guia', base['numero_guia'] + n)
+        cliente_id = rng.choice(clientes)
+        creado = fecha_aleatoria(rng, ahora, contexto['dias'])
+        estado = elegir_ponderado(rng, ESTADOS_PEDIDO)
+        conductor_id = vehiculo_id = None
+        if estado in ('confirmado', 'en_curso', 'entregado') and conductores:
+            conductor_id, vehiculo_id = rng.choice(conductores)
+
+        total = Decimal(0)
+        for producto_id, precio in rng.sample(productos, k=min(len(productos), rng.choice((1, 1, 2, 2, 3, 4)))):
+            cantidad_item = rng.choice((1, 1, 1, 2, 3))
+            subtotal = precio * cantidad_item
+            total += subtotal
+            items.append(PedidoItem(
+                pedido_id=pedido_id, producto_id=producto_id, cantidad=cantidad_item,
+                precio_unitario=precio, subtotal=subtotal,
+            ))
+
+        direccion = f'Calle {rng.randrange(1, 200)} # {rng.randrange(1, 100)}-{rng.randrange(1, 100)}, {rng.choice(CIUDADES)}'
+        telefono = f'3{rng.randrange(10**8, 10**9)}'
+        actualizado = creado + timedelta(hours=rng.randrange(1, 96))
+        pedidos.append(Pedido(
+            id=pedido_id, usuario_id=cliente_id, numero_pedido=numero_pedido,
+            total=total, direccion_envio=direccion, telefono_contacto=telefono,
+            estado=estado, conductor_id=conductor_id,
+            fecha_asignacion=creado + timedelta(hours=1) if conductor_id else None,
+            fecha_creacion=creado, fecha_actualizacion=actualizado,
+        ))
+
+        estado_envio = ESTADO_ENVIO_POR_PEDIDO[estado]
+        if estado_envio == 'entregado' and rng.random() < 0.02:
+            estado_envio = 'devuelto'
+        recogida = creado + timedelta(hours=rng.randrange(2, 24))
+        entrega = recogida + timedelta(hours=rng.randrange(4, 72))
+        envios.append(Envio(
+            id=envio_id, numero_guia=numero_guia, cliente_id=cliente_id,
+            origen='Bodega TecnoRoute', destino=direccion,
+            distancia_km=Decimal(rng.randrange(1, 900)),
+            vehiculo_id=vehiculo_id, conductor_id=conductor_id,
+            descripcion_carga=f'Pedido #{numero_pedido}',
+            peso_kg=Decimal(rng.randrange(1, 200)), volumen_m3=Decimal(rng.randrange(1, 30)) / 10,
+            direccion_recogida='Calle Principal 123, Bogotá', direccion_entrega=direccion,
+            contacto_recogida='Bodega TecnoRoute', contacto_entrega=f'Cliente {cliente_id}',
+            telefono_recogida='3001234567', telefono_entrega=telefono,
+            fecha_recogida_programada=recogida, fecha_entrega_programada=entrega,
+            fecha_recogida_real=recogida if estado_envio in ('en_transito', 'entregado', 'devuelto') else None,
+            fecha_entrega_real=entrega if estado_envio in ('entregado', 'devuelto') else None,
+            costo_envio=Decimal(0), valor_declarado=total, estado=estado_envio,
+            prioridad=elegir_ponderado(rng, [('baja', 20), ('media', 60), ('alta', 15), ('urgente', 5)]),
+            fecha_creacion=creado, fecha_actualizacion=actualizado,
+        ))
+
+        momento = creado
+        for paso in HISTORIAL_ENVIO[estado_envio]:
+            seguimientos.append(SeguimientoEnvio(
+                envio_id=envio_id, estado=paso, descripcion=f'Estado cambiado a {paso}',
+                ubicacion=rng.choice(CIUDADES) if paso != 'pendiente' else 'Bodega TecnoRoute',
+                fecha_hora=momento,
+            ))
+            momento += timedelta(hours=rng.randrange(1, 24))
+
+    lote = contexto['lote']
+    with bloqueo or nullcontext(), transaction.atomic():
+        Pedido.objects.bulk_create(pedidos, batch_size=lote)
+        PedidoItem.objects.bulk_create(items, batch_size=lote)
+        Envio.objects.bulk_create(envios, batch_size=lote)
+        SeguimientoEnvio.objects.bulk_create(seguimientos, batch_size=lote)
+    return len(pedidos) + len(items) + len(envios) + len(seguimientos)
+
+
+def generar_bloques(semilla, bloques, base, contexto, bloqueo=None):
+    """Genera una lista de bloques (indice, cantidad). Punto de entrada de cada proceso"""
+    optimizar_conexion()
+    filas = 0
+    with sin_fechas_automaticas(Pedido, Envio, SeguimientoEnvio):
+        for indice, cantidad in bloques:
+            filas += generar_bloque_pedidos(semilla, indice, cantidad, base, contexto, bloqueo)
+    return filas
+
+
+def dividir_bloques(total):
+    """Divide `total` pedidos en bloques de TAMANO_BLOQUE: [(indice, cantidad), ...]"""
+    return [
+        (indice, min(TAMANO_BLOQUE, total - indice * TAMANO_BLOQUE))
+        for indice in range((total + TAMANO_BLOQUE - 1) // TAMANO_BLOQUE)
+    ]
+
+
+def preparar_dataset(semilla, usuarios, conductores, productos, lote, dias, carritos=0, pedidos=0):
+    """
+    Crea catálogo, clientes (y carritos para los primeros `carritos`) y
+    conductores, y reserva los rangos de IDs y de números de `pedidos`
+    pedidos y envíos.
+    Retorna (base, contexto) para generar los pedidos; contexto['filas'] son
+    las filas creadas hasta aquí.
+    """
+    rng = random.Random(f'{semilla}-base')
+    ahora = fecha_referencia(semilla)
+    optimizar_conexion()
+    with sin_fechas_automaticas(User, UserProfile, Producto, Vehiculo, Carrito, CarritoItem), transaction.atomic():
+        catalogo, filas = crear_catalogo(rng, productos, lote, ahora, dias)
+        clientes = crear_usuarios(rng, usuarios, 'customer', lote, ahora, dias)
+        flota = crear_conductores(rng, conductores, lote, ahora, dias)
+        # Usuario y perfil de cada cliente; usuario, perfil, conductor y vehículo de cada conductor
+        filas += 2 * len(clientes) + 4 * len(flota)
+        if carritos:
+            filas += crear_carritos(rng, [u.id for u in clientes[:carritos]], catalogo, lote, ahora)
+
+    base = {
+        'pedido': siguiente_id(Pedido),
+        'envio': siguiente_id(Envio),
+        'numero_pedido': numeracion.reservar('pedido', pedidos).start,
+        'numero_guia': numeracion.reservar('guia', pedidos).start,
+    }
+    contexto = {
+        'ahora': ahora,
+        'dias': dias,
+        'lote': lote,
+        'clientes': [u.id for u in clientes],
+        'conductores': flota,
+        'productos': [(pid, precio) for pid, precio in catalogo],
+        'filas': filas,
+    }
+    return base, contexto
@@ -0,0 +1,103 @@
+"""
+Hashers de contraseñas con parámetros configurables.
+
+settings.PASSWORD_HASHER elige el algoritmo con el que se guardan las
+contraseñas nuevas (scrypt, argon2 o pbkdf2) y PASSWORD_HASHER_PARAMS sus
+costos. Los demás algoritmos quedan en PASSWORD_HASHERS solo para verificar
+hashes antiguos: check_password() rehace el hash con el algoritmo y los
+parámetros actuales la primera vez que el usuario inicia sesión.
+
+Para elegir parámetros en un servidor: python manage.py benchmark_hashers
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+)
+
+
+def parametros(algoritmo):
+    return getattr(settings, 'PASSWORD_HASHER_PARAMS', {}).get(algoritmo, {})
+
+
+class ParametrosConfigurables:
+    """
+    Toma los atributos de costo del hasher (work_factor, time_cost...) de
+    PASSWORD_HASHER_PARAMS[nombre]; los no configurados quedan con el valor
+    de Django. `nombre` es la clave de HASHERS (el algorithm de PBKDF2 es
+    pbkdf2_sha256).
+    """
+    nombre = None
+    configurables = ()
+
+    def __init__(self, **valores):
+        configurados = {**parametros(self.nombre), **valores}
+        for nombre in self.configurables:
+            if nombre in configurados:
+                setattr(self, nombre, int(configurados[nombre]))
+
+    def costo(self):
+        return {nombre: getattr(self, nombre) for nombre in self.configurables}
+
+
+class ScryptHasher(ParametrosConfigurables, ScryptPasswordHasher):
+    nombre = 'scrypt'
+    configurables = ('work_factor', 'block_size', 'parallelism')
+
+    @property
+    def maxmem(self):
+        # OpenSSL limita scrypt a 32 MiB por defecto, menos de lo que necesita
+        # un work_factor de 2**15 o más: se reserva 128 * n * r * p con margen
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+    def memoria_kb(self):
+        return 128 * self.work_factor * self.block_size // 1024
+
+
+class Argon2Hasher(ParametrosConfigurables, Argon2PasswordHasher):
+    nombre = 'argon2'
+    configurables = ('time_cost', 'memory_cost', 'parallelism')
+
+    def memoria_kb(self):
+        return self.memory_cost
+
+
+class PBKDF2Hasher(ParametrosConfigurables, PBKDF2PasswordHasher):
+    nombre = 'pbkdf2'
+    configurables = ('iterations',)
+
+    def memoria_kb(self):
+        return 0
+
+
+HASHERS = {
+    'scrypt': 'logistics.hashers.ScryptHasher',
+    'argon2': 'logistics.hashers.Argon2Hasher',
+    'pbkdf2': 'logistics.hashers.PBKDF2Hasher',
+}
+
+# Solo se usan para verificar hashes antiguos
+HASHERS_LEGADOS = [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+
+def argon2_disponible():
+    try:
+        import argon2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def lista_hashers(preferido):
+    """
+    Valor de PASSWORD_HASHERS con `preferido` primero. Si se pide argon2 sin
+    argon2-cffi instalado se usa scrypt (incluido en la biblioteca estándar).
+    """
+    if preferido not in HASHERS:
+        raise ValueError(f'PASSWORD_HASHER desconocido: {preferido} (opciones: {", ".join(HASHERS)})')
+    if preferido == 'argon2' and not argon2_disponible():
+        preferido = 'scrypt'
+    otros = [ruta for nombre, ruta in HASHERS.items() if nombre != preferido]
+    return [HASHERS[preferido], *otros, *HASHERS_LEGADOS]
@@ -0,0 +1,173 @@
+"""
+Cabecera Idempotency-Key para las vistas de creación (pedidos y envíos).
+
+La primera petición con una clave inserta un ClaveIdempotencia "en_proceso"
+(la restricción única decide quién gana entre peticiones simultáneas), ejecuta
+la vista en una transacción y guarda la respuesta en la misma transacción, así
+que el pedido y su respuesta se confirman juntos. Los reintentos con la misma
+clave cuestan una consulta por índice y reciben la respuesta guardada sin
+volver a ejecutar la vista (ni tocar el stock). Un duplicado que llega
+mientras la original sigue en curso espera hasta IDEMPOTENCIA_ESPERA_SEGUNDOS
+su resultado.
+
+Solo se guardan las respuestas exitosas (2xx): un error no modificó nada y el
+cliente puede reintentar con la misma clave. Reusar una clave con otro cuerpo
+es un error 422.
+
+Lo que no debe quedar dentro de esa transacción va en `antes`: se ejecuta
+después de reservar la clave (los duplicados no lo ejecutan) y fuera de la
+transacción, y lo que retorna llega a la vista como argumentos. Así los
+números de pedido y de guía se reservan en su propia transacción corta, sin
+mantener bloqueada la fila de la secuencia durante todo el checkout.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .log import get_logger
+from .models import ClaveIdempotencia
+
+
+log = get_logger(__name__)
+
+CABECERA = 'Idempotency-Key'
+CABECERA_REPETIDA = 'Idempotent-Replayed'
+LONGITUD_MAXIMA = 255
+
+
+def huella(datos):
+    """SHA-256 del cuerpo normalizado (mismo JSON con otro orden = misma huella)"""
+    contenido = json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def reservar(usuario_id, alcance, clave, huella_cuerpo):
+    """
+    Retorna (registro, propio). propio=True si esta petición debe ejecutar la
+    vista; si no, registro es el de la petición original (o None).
+    """
+    ahora = timezone.now()
+    filtro = {'usuario_id': usuario_id, 'alcance': alcance, 'clave': clave}
+    existente = ClaveIdempotencia.objects.filter(**filtro).first()
+    if existente is not None:
+        if existente.expira > ahora:
+            bloqueo = timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_BLOQUEO_SEGUNDOS', 60))
+            abandonada = existente.estado == 'en_proceso' and existente.fecha_creacion < ahora - bloqueo
+            if not abandonada:
+                return existente, False
+            # El proceso que la tomó murió: la toma quien gane esta actualización
+            tomada = ClaveIdempotencia.objects.filter(
+                pk=existente.pk, estado='en_proceso', fecha_creacion=existente.fecha_creacion,
+            ).update(fecha_creacion=ahora, huella=huella_cuerpo)
+            if tomada:
+                existente.fecha_creacion, existente.huella = ahora, huella_cuerpo
+                return existente, True
+            return ClaveIdempotencia.objects.filter(**filtro).first(), False
+        existente.delete()
+
+    try:
+        with transaction.atomic():
+            registro = ClaveIdempotencia.objects.create(
+                huella=huella_cuerpo, fecha_creacion=ahora,
+                expira=ahora + timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_TTL', 86400)),
+                **filtro,
+            )
+        return registro, True
+    except IntegrityError:
+        return ClaveIdempotencia.objects.filter(**filtro).first(), False
+
+
+def esperar(registro):
+    """Espera a que termine la petición original. Retorna el registro completado o None"""
+    fin = time.monotonic() + getattr(settings, 'IDEMPOTENCIA_ESPERA_SEGUNDOS', 10)
+    pausa = 0.05
+    while registro is not None and registro.estado == 'en_proceso':
+        if time.monotonic() >= fin:
+            return None
+        time.sleep(pausa)
+        pausa = min(pausa * 2, 0.5)
+        registro = ClaveIdempotencia.objects.filter(pk=registro.pk).first()
+    return registro
+
+
+def _repetir(registro, huella_cuerpo):
+    if registro is not None and registro.huella != huella_cuerpo:
+        return Response(
+            {'error': f'La {CABECERA} ya se usó con otro cuerpo'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    registro = esperar(registro)
+    if registro is None:
+        # La original sigue en curso o falló: el cliente puede reintentar
+        return Response(
+            {'error': 'Hay una petición en curso con la misma Idempotency-Key'},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'}
+        )
+    return Response(registro.respuesta, status=registro.codigo_respuesta, headers={CABECERA_REPETIDA: 'true'})
+
+
+def idempotente(vista=None, *, antes=None):
+    """
+    Decorador para métodos de vistas DRF (self, request, ...). Con
+    `antes(self, request)` la vista recibe además los argumentos que retorna,
+    calculados fuera de la transacción de la clave.
+    """
+    if vista is None:
+        return functools.partial(idempotente, antes=antes)
+
+    def previos(self, request):
+        return antes(self, request) if antes is not None else {}
+
+    @functools.wraps(vista)
+    def envoltura(self, request, *args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave or not request.user.is_authenticated:
+            return vista(self, request, *args, **kwargs, **previos(self, request))
+        if len(clave) > LONGITUD_MAXIMA:
+            return Response(
+                {'error': f'{CABECERA} admite máximo {LONGITUD_MAXIMA} caracteres'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        alcance = f'{request.method} {request.path}'[:100]
+        huella_cuerpo = huella(request.data)
+        registro, propio = reservar(request.user.id, alcance, clave, huella_cuerpo)
+        if not propio:
+            log.info('idempotencia.repetida', alcance=alcance)
+            return _repetir(registro, huella_cuerpo)
+
+        try:
+            kwargs.update(previos(self, request))
+            with transaction.atomic():
+                # Escribir primero: en SQLite la transacción toma el bloqueo de
+                # escritura antes de leer y no choca con los duplicados en espera
+                ClaveIdempotencia.objects.filter(pk=registro.pk).update(fecha_creacion=timezone.now())
+                respuesta = vista(self, request, *args, **kwargs)
+                exitosa = status.is_success(respuesta.status_code)
+                if exitosa:
+                    ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+                        estado='completada', codigo_respuesta=respuesta.status_code,
+                        respuesta=respuesta.data,
+                    )
+        except Exception:
+            ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+            raise
+        if not exitosa:
+            ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+        return respuesta
+
+    return envoltura
+
+
+def vencidas():
+    """Claves vencidas (la tarea claves_idempotencia las borra por lotes)"""
+    return ClaveIdempotencia.objects.filter(expira__lt=timezone.now())
@@ -0,0 +1,185 @@
+"""
+Libro de inventario: historial de Producto.stock.
+
+Cada cambio de stock (venta, cancelación, ajuste desde el admin o la API)
+agrega un MovimientoStock con su motivo en la misma transacción que lo aplica.
+Producto.stock sigue siendo la suma materializada: las ventas la descuentan
+con UPDATE condicionales (logistics/reservas.py), que es lo que impide la
+sobreventa. El libro no se modifica nunca.
+
+El libro no quita la contención sobre la fila del producto: cada venta sigue
+actualizando Producto.stock (y Producto.reservado) y además inserta su
+movimiento. Leer el disponible del libro obligaría a serializar las ventas de
+un producto de otra forma para no vender de más, así que el libro es el
+historial y la base de auditoría (conciliar), no la fuente del disponible.
+
+tomar_snapshots() (comando snapshot_stock) guarda periódicamente el stock de
+cada producto con movimientos nuevos, así que stock() lo deriva de la última
+snapshot más los movimientos posteriores, sin recorrer todo el historial, y
+lo cachea. conciliar() compara ese valor con Producto.stock.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from user_management.models import MovimientoStock, Producto, SnapshotStock
+from . import sync
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+
+def _cache():
+    return caches[getattr(settings, 'INVENTARIO_CACHE_ALIAS', 'default')]
+
+
+def clave_cache(producto_id):
+    return f'stock:{producto_id}'
+
+
+def invalidar(producto_ids):
+    claves = [clave_cache(producto_id) for producto_id in set(producto_ids)]
+    transaction.on_commit(lambda: _cache().delete_many(claves))
+
+
+def registrar(movimientos):
+    """Agrega movimientos ya aplicados a Producto.stock"""
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=500)
+    invalidar(movimiento.producto_id for movimiento in movimientos)
+
+
+def vender(pedido, items, usuario=None):
+    """Movimientos de venta de los items (CarritoItem) de un pedido"""
+    registrar([
+        MovimientoStock(
+            producto_id=item.producto_id, cantidad=-item.cantidad, motivo='venta',
+            referencia=pedido.numero_pedido, usuario=usuario,
+        )
+        for item in items
+    ])
+
+
+def cancelar(pedido, usuario=None):
+    """Devuelve al stock las unidades de un pedido (antes de eliminarlo)"""
+    items = list(pedido.items.select_related('producto'))
+    por_producto = Counter()
+    for item in items:
+        por_producto[item.producto_id] += item.cantidad
+    with transaction.atomic():
+        for producto_id, cantidad in por_producto.items():
+            Producto.objects.filter(id=producto_id).update(stock=F('stock') + cantidad)
+        registrar([
+            MovimientoStock(
+                producto_id=producto_id, cantidad=cantidad, motivo='cancelacion',
+                referencia=pedido.numero_pedido, usuario=usuario,
+            )
+            for producto_id, cantidad in por_producto.items()
+        ])
+    # update() no emite señales: registrar el cambio de stock para la sincronización
+    sync.registrar_lote('productos', list({item.producto_id: item.producto for item in items}.values()))
+
+
+def ajustar(producto_id, cantidad, usuario=None, referencia=''):
+    """Suma `cantidad` (con signo) al stock. Retorna False si quedaría negativo"""
+    with transaction.atomic():
+        ajustado = Producto.objects.filter(id=producto_id, stock__gte=-cantidad).update(
+            stock=F('stock') + cantidad
+        )
+        if not ajustado:
+            return False
+        registrar([MovimientoStock(
+            producto_id=producto_id, cantidad=cantidad, motivo='ajuste', referencia=referencia, usuario=usuario,
+        )])
+    sync.registrar_lote('productos', [Producto(pk=producto_id)])
+    return True
+
+
+# Stock derivado
+
+def _ultima_snapshot(producto):
+    return SnapshotStock.objects.filter(producto_id=producto).order_by('-movimiento_id')
+
+
+def _posteriores(movimientos):
+    """Movimientos después de la última snapshot de su producto"""
+    return movimientos.filter(
+        id__gt=Coalesce(Subquery(_ultima_snapshot(OuterRef('producto_id')).values('movimiento_id')[:1]), 0)
+    )
+
+
+def calcular(producto_ids=None, hasta=None):
+    """
+    {producto_id: stock} desde la última snapshot más los movimientos
+    posteriores (hasta el movimiento `hasta` inclusive, si se indica)
+    """
+    productos = Producto.objects.all()
+    movimientos = MovimientoStock.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(id__in=producto_ids)
+        movimientos = movimientos.filter(producto_id__in=producto_ids)
+    if hasta is not None:
+        movimientos = movimientos.filter(id__lte=hasta)
+    resultado = dict(
+        productos.annotate(
+            base=Coalesce(Subquery(_ultima_snapshot(OuterRef('pk')).values('stock')[:1]), 0)
+        ).values_list('id', 'base')
+    )
+    totales = _posteriores(movimientos).values('producto_id').annotate(total=Sum('cantidad'))
+    for producto_id, total in totales.values_list('producto_id', 'total'):
+        resultado[producto_id] = resultado.get(producto_id, 0) + total
+    return resultado
+
+
+def stock(producto_id):
+    """Stock derivado del libro (cacheado hasta el próximo movimiento)"""
+    cache = _cache()
+    valor = cache.get(clave_cache(producto_id))
+    if valor is None:
+        valor = calcular([producto_id]).get(producto_id, 0)
+        cache.set(clave_cache(producto_id), valor, getattr(settings, 'INVENTARIO_CACHE_TTL', 3600))
+    return valor
+
+
+def tomar_snapshots(margen=None):
+    """
+    Guarda una snapshot de cada producto con movimientos desde la última.
+    Solo incluye movimientos de hace más de `margen` segundos, para no saltarse
+    uno de una transacción que aún no se confirma. Retorna la cantidad creada.
+    """
+    if margen is None:
+        margen = getattr(settings, 'INVENTARIO_SNAPSHOT_MARGEN_SEGUNDOS', 60)
+    hasta = MovimientoStock.objects.filter(
+        fecha__lte=timezone.now() - timedelta(seconds=margen)
+    ).aggregate(hasta=Max('id'))['hasta']
+    if hasta is None:
+        return 0
+    con_cambios = list(
+        _posteriores(MovimientoStock.objects.filter(id__lte=hasta)).values_list('producto_id', flat=True).distinct()
+    )
+    snapshots = []
+    for i in range(0, len(con_cambios), 500):
+        bloque = con_cambios[i:i + 500]
+        snapshots.extend(
+            SnapshotStock(producto_id=producto_id, stock=valor, movimiento_id=hasta)
+            for producto_id, valor in calcular(bloque, hasta).items()
+        )
+    SnapshotStock.objects.bulk_create(snapshots, batch_size=500)
+    log.info('inventario.snapshots', productos=len(snapshots), hasta=hasta)
+    return len(snapshots)
+
+
+def conciliar():
+    """[(producto_id, Producto.stock, stock del libro)] de los productos que no coinciden"""
+    derivado = calcular()
+    return [
+        (producto_id, registrado, derivado.get(producto_id, 0))
+        for producto_id, registrado in Producto.objects.values_list('id', 'stock').iterator()
+        if registrado != derivado.get(producto_id, 0)
+    ]
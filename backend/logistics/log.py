@@ -0,0 +1,102 @@
+"""
+Logging estructurado para las rutas calientes de la API.
+
+    log = get_logger('logistics.pedidos')
+    log.debug('pedidos.listado', usuario=request.user.id, total=lambda: qs.count())
+
+- Los campos que son funciones solo se evalúan si el mensaje se va a emitir,
+  así un log de depuración desactivado no ejecuta consultas.
+- Cada logger puede muestrearse con settings.LOG_SAMPLING = {'nombre': 0.1};
+  la tasa de 'logistics' aplica a 'logistics.views' si este no tiene una
+  propia. Las advertencias y errores nunca se muestrean.
+- Los campos sensibles (contraseñas, tokens, códigos) se redactan siempre,
+  también dentro de diccionarios anidados como request.data.
+"""
+import json
+import logging
+import random
+
+from django.conf import settings
+
+
+CAMPOS_SENSIBLES = {
+    'password', 'password_confirm', 'new_password', 'current_password', 'confirmpassword',
+    'password_temporal', 'token', 'code', 'debug_code', 'authorization',
+}
+
+REDACTADO = '***'
+
+
+def redactar(valor, clave=None):
+    """Reemplaza valores de campos sensibles, recorriendo diccionarios y listas"""
+    if clave is not None and str(clave).lower() in CAMPOS_SENSIBLES:
+        return REDACTADO
+    if hasattr(valor, 'items'):
+        return {k: redactar(v, k) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [redactar(v) for v in valor]
+    return valor
+
+
+class StructuredLogger:
+    """Envoltorio de logging.Logger con campos perezosos, muestreo y redacción"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.logger = logging.getLogger(nombre)
+
+    def tasa_muestreo(self):
+        tasas = getattr(settings, 'LOG_SAMPLING', {})
+        nombre = self.nombre
+        while nombre:
+            if nombre in tasas:
+                return tasas[nombre]
+            nombre = nombre.rpartition('.')[0]
+        return 1.0
+
+    def _emitir(self, nivel, evento, campos, exc_info=False):
+        if not self.logger.isEnabledFor(nivel):
+            return
+        if nivel < logging.WARNING:
+            tasa = self.tasa_muestreo()
+            if tasa < 1.0 and random.random() >= tasa:
+                return
+        evaluados = {
+            clave: redactar(valor() if callable(valor) else valor, clave)
+            for clave, valor in campos.items()
+        }
+        self.logger.log(nivel, evento, exc_info=exc_info, extra={'evento': evento, 'campos': evaluados})
+
+    def debug(self, evento, **campos):
+        self._emitir(logging.DEBUG, evento, campos)
+
+    def info(self, evento, **campos):
+        self._emitir(logging.INFO, evento, campos)
+
+    def warning(self, evento, **campos):
+        self._emitir(logging.WARNING, evento, campos)
+
+    def error(self, evento, **campos):
+        self._emitir(logging.ERROR, evento, campos)
+
+    def exception(self, evento, **campos):
+        self._emitir(logging.ERROR, evento, campos, exc_info=True)
+
+
+def get_logger(nombre):
+    return StructuredLogger(nombre)
+
+
+class FormatoEstructurado(logging.Formatter):
+    """Una línea JSON por registro: nivel, logger, evento y campos"""
+
+    def format(self, record):
+        datos = {
+            'nivel': record.levelname,
+            'logger': record.name,
+            'evento': getattr(record, 'evento', record.getMessage()),
+        }
+        datos.update(getattr(record, 'campos', {}))
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, default=str, ensure_ascii=False)
@@ -0,0 +1,149 @@
+"""
+Servicio de inicio de sesión compartido por AuthView (logistics) y
+login_user (user_management).
+
+    sesion = iniciar_sesion(password, email=email, username=username)
+    if sesion is None:
+        # credenciales incorrectas o usuario inactivo
+
+El usuario se carga junto con su perfil, conductor, admin y token en una sola
+consulta. Como authenticate() y login(), envía user_login_failed al fallar y
+user_logged_in al iniciar sesión (bloqueos, auditoría, last_login). Si
+AUTHENTICATION_BACKENDS tiene otros backends además de ModelBackend, las
+credenciales se verifican con authenticate() y se pierde la consulta única.
+
+Si ya tiene token se reutiliza sin escribir en la base de datos, y la sesión
+queda precargada en la caché de autenticación por token para que la primera
+petición después del login no tenga que consultar la base de datos.
+Si la petición trae un carrito de invitado, se fusiona con el del usuario.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from rest_framework.authtoken.models import Token
+
+from user_management.models import UserProfile
+from . import carrito
+from .authentication import guardar_en_cache
+from .log import get_logger
+from .principal import RELACIONES, cargar_principal
+
+
+log = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Sesion:
+    user: User
+    token: Token
+    principal: object
+
+
+def _candidatos(email, username):
+    """
+    Usuarios que coinciden con el email o el username, en el orden en que se
+    prueban: primero por email y luego por username.
+    """
+    filtro = Q()
+    if email:
+        filtro |= Q(email=email)
+    if username:
+        filtro |= Q(username=username)
+
+    usuarios = list(
+        User.objects.select_related(*RELACIONES, 'auth_token').filter(filtro).order_by('id')
+    )
+    por_email = [u for u in usuarios if email and u.email == email][:1]
+    por_username = [u for u in usuarios if username and u.username == username and u not in por_email]
+    return por_email + por_username
+
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def _solo_model_backend():
+    return list(getattr(settings, 'AUTHENTICATION_BACKENDS', [MODEL_BACKEND])) == [MODEL_BACKEND]
+
+
+def _con_backends(password, email, username, request):
+    """authenticate() con los backends configurados (email se traduce a username)"""
+    if email:
+        username = User.objects.filter(email=email).order_by('id').values_list('username', flat=True).first() or username
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        return None
+    # Recargar con las relaciones del principal y el token en una consulta
+    return User.objects.select_related(*RELACIONES, 'auth_token').get(pk=user.pk)
+
+
+def autenticar(password, email=None, username=None, request=None):
+    """
+    Equivalente a authenticate() con ModelBackend, probando primero el email y
+    luego el username. Retorna el usuario con sus relaciones cargadas o None.
+    """
+    if not password or not (email or username):
+        return None
+    if not _solo_model_backend():
+        # authenticate() ya envía user_login_failed
+        return _con_backends(password, email, username, request)
+
+    candidatos = _candidatos(email, username)
+    if not candidatos:
+        # Igual que ModelBackend: calcular un hash para no revelar por tiempo
+        # de respuesta si el usuario existe
+        User().set_password(password)
+
+    for user in candidatos:
+        if user.check_password(password) and user.is_active:
+            return user
+
+    # Como authenticate(): sin la contraseña en las credenciales
+    credenciales = {'email': email, 'username': username, 'password': '********************'}
+    user_login_failed.send(sender=__name__, credentials=credenciales, request=request)
+    return None
+
+
+def obtener_token(user):
+    """Token del usuario; solo escribe si todavía no tiene uno"""
+    try:
+        return user.auth_token
+    except ObjectDoesNotExist:
+        token, _ = Token.objects.get_or_create(user=user)
+        return token
+
+
+def iniciar_sesion(password, email=None, username=None, request=None):
+    """
+    Autentica y retorna la Sesion (usuario, token, principal) o None. Con
+    `request`, el carrito de invitado de la petición pasa al del usuario.
+    """
+    user = autenticar(password, email=email, username=username, request=request)
+    if user is None:
+        return None
+
+    token = obtener_token(user)
+
+    try:
+        user.userprofile
+    except UserProfile.DoesNotExist:
+        # Crear perfil si no existe (para usuarios existentes)
+        UserProfile.objects.create(user=user, role='admin' if user.is_superuser else 'customer')
+
+    # Como login(): el receptor de Django actualiza last_login
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+
+    principal = cargar_principal(user)
+    user.principal = principal
+    guardar_en_cache(user, token, principal)
+    if request is not None:
+        try:
+            carrito.fusionar_invitado(request, user)
+        except Exception:
+            # El login no falla por el carrito de invitado
+            log.exception('login.error_carrito_invitado', usuario=user.id)
+    return Sesion(user=user, token=token, principal=principal)
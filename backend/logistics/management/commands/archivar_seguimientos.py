@@ -0,0 +1,49 @@
+"""
+Mueve al archivo comprimido los seguimientos de envíos entregados o
+cancelados hace más de N días (ver logistics/archivo.py).
+
+    python manage.py archivar_seguimientos --dias 180 --lote 200 --pausa 0.5
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from logistics import archivo
+from logistics.models import Envio
+
+
+class Command(BaseCommand):
+    help = 'Archiva por lotes los seguimientos de envíos cerrados hace más de N días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=getattr(settings, 'ARCHIVO_SEGUIMIENTOS_DIAS', 180))
+        parser.add_argument('--lote', type=int, default=200, help='Envíos por lote (una transacción por lote)')
+        parser.add_argument('--pausa', type=float, default=0.5, help='Segundos de espera entre lotes')
+        parser.add_argument('--max-lotes', type=int, help='Detenerse después de esta cantidad de lotes')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar lo que se archivaría')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            corte = timezone.now() - timedelta(days=options['dias'])
+            pendientes = Envio.objects.filter(
+                estado__in=archivo.ESTADOS_FINALES, fecha_actualizacion__lt=corte,
+            ).aggregate(envios=Count('id', distinct=True), eventos=Count('seguimientos'))
+            self.stdout.write(
+                f"Se archivarían {pendientes['eventos']} eventos de {pendientes['envios']} envíos "
+                f"(cerrados antes de {corte:%Y-%m-%d})"
+            )
+            return
+
+        def progreso(lotes, envios, eventos):
+            self.stdout.write(f'  lote {lotes}: {envios} envíos, {eventos} eventos archivados')
+
+        envios, eventos = archivo.archivar(
+            dias=options['dias'], lote=options['lote'], pausa=options['pausa'],
+            max_lotes=options['max_lotes'], progreso=progreso,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archivados {eventos} eventos de {envios} envíos en {archivo.directorio()}'
+        ))
@@ -0,0 +1,116 @@
+"""
+Benchmark de los changelists del admin sobre un dataset sintético.
+
+Abre como superusuario el listado de cada modelo registrado (y algunos con
+filtros) y registra tiempo, memoria y consultas SQL. Además verifica que las
+consultas no dependan de las filas de la página: cada changelist de
+logistics y user_management se abre con 10 y con 100 filas por página y debe
+hacer las mismas consultas; si no, a alguna columna le falta
+list_select_related.
+"""
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from logistics import admin_tablas, benchmarking, dataset
+
+
+NOMBRE = 'admin'
+
+APPS_PROPIAS = ('logistics', 'user_management')
+
+# Changelists que además se miden con un filtro (conteo acotado)
+FILTROS = {
+    'logistics_envio': 'estado__exact=entregado',
+    'logistics_seguimientoenvio': 'estado__exact=entregado',
+    'user_management_pedido': 'estado__exact=entregado',
+    'user_management_pedidoitem': 'q=PED-',
+}
+
+
+def changelists():
+    """{caso: (ModelAdmin, ruta)} de cada modelo registrado"""
+    rutas = {}
+    for modelo, modelo_admin in sorted(admin.site._registry.items(), key=lambda m: m[0]._meta.label_lower):
+        caso = f'{modelo._meta.app_label}_{modelo._meta.model_name}'
+        rutas[caso] = (modelo_admin, reverse(f'admin:{caso}_changelist'))
+    return rutas
+
+
+def abrir(client, ruta):
+    def hacer():
+        respuesta = client.get(ruta)
+        assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+    return hacer
+
+
+def consultas_con(client, modelo_admin, ruta, por_pagina):
+    original = modelo_admin.list_per_page
+    modelo_admin.list_per_page = por_pagina
+    try:
+        with CaptureQueriesContext(connection) as consultas:
+            abrir(client, ruta)()
+    finally:
+        modelo_admin.list_per_page = original
+    return len(consultas)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de los changelists del admin: tiempo, consultas y consultas por fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=5000, help='Pedidos del dataset sintético')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        with benchmarking.base_de_datos_temporal():
+            self.stdout.write(f'Generando dataset ({options["pedidos"]} pedidos)...')
+            base, contexto = dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=500, conductores=20,
+                productos=200, lote=2000, dias=365, carritos=200, pedidos=options['pedidos'],
+            )
+            dataset.generar_bloques(options['semilla'], dataset.dividir_bloques(options['pedidos']), base, contexto)
+            # Las estimaciones de PaginadorAproximado, como después de la tarea estadisticas_tablas
+            admin_tablas.actualizar_estadisticas()
+
+            superusuario = User.objects.create_superuser('benchmark-admin', 'benchmark-admin@tecnoroute.test', 'x')
+            client = Client()
+            client.force_login(superusuario)
+
+            resultados, por_fila = {}, []
+            for caso, (modelo_admin, ruta) in changelists().items():
+                rutas = {caso: ruta}
+                if caso in FILTROS:
+                    rutas[f'{caso}_filtrado'] = f'{ruta}?{FILTROS[caso]}'
+                for nombre, ruta_caso in rutas.items():
+                    resultados[nombre] = benchmarking.medir(abrir(client, ruta_caso), options['repeticiones'])
+                    self.stdout.write(f'  {nombre}: {resultados[nombre]}')
+                    if modelo_admin.model._meta.app_label in APPS_PROPIAS:
+                        pocas = consultas_con(client, modelo_admin, ruta_caso, 10)
+                        muchas = consultas_con(client, modelo_admin, ruta_caso, 100)
+                        if pocas != muchas:
+                            por_fila.append(f'{nombre}: {pocas} consultas con 10 filas, {muchas} con 100')
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        if por_fila:
+            raise CommandError('Changelists con consultas por fila (falta list_select_related):\n' + '\n'.join(por_fila))
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
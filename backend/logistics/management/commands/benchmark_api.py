@@ -0,0 +1,107 @@
+"""
+Benchmark de endpoints de la API sobre un dataset sintético.
+
+Cada caso hace una petición real (con autenticación por token, salvo los
+endpoints públicos) a través de toda la pila de Django/DRF y registra
+tiempo, memoria y consultas SQL.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from logistics import benchmarking, dataset
+from logistics.models import Envio
+from user_management.models import Pedido
+
+
+NOMBRE = 'api'
+
+
+def _token(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return f'Token {token.key}'
+
+
+def preparar_casos():
+    """Retorna {caso: función que hace la petición}. Requiere el dataset cargado"""
+    client = APIClient()
+
+    conductor = (
+        Pedido.objects.exclude(conductor=None).values('conductor__email')
+        .annotate(total=Count('id')).order_by('-total').first()
+    )
+    cliente = Pedido.objects.values('usuario').annotate(total=Count('id')).order_by('-total').first()
+    usuario_conductor = User.objects.get(email=conductor['conductor__email'])
+    usuario_cliente = User.objects.get(id=cliente['usuario'])
+
+    envio = Envio.objects.annotate(total=Count('seguimientos')).order_by('-total', 'id').first()
+
+    auth_conductor = _token(usuario_conductor)
+    auth_cliente = _token(usuario_cliente)
+
+    def get(ruta, auth=None):
+        cabeceras = {'HTTP_AUTHORIZATION': auth} if auth else {}
+
+        def peticion():
+            respuesta = client.get(ruta, **cabeceras)
+            assert respuesta.status_code == 200, respuesta.status_code
+            return respuesta
+        return peticion
+
+    return {
+        'pedidos_conductor': get('/api/pedidos/', auth_conductor),
+        'pedidos_cliente': get('/api/pedidos/', auth_cliente),
+        'perfil': get('/api/auth/profile/', auth_cliente),
+        'envio_buscar_por_guia': get(f'/api/envios/buscar_por_guia/?numero_guia={envio.numero_guia}', auth_cliente),
+        'rastreo_publico': get(f'/api/rastreo/{envio.numero_guia}/'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de endpoints de la API: tiempo, memoria y consultas SQL por petición'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=20000, help='Pedidos del dataset sintético')
+        parser.add_argument('--conductores', type=int, default=20)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--solo', nargs='+', help='Limitar a estos casos')
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        with benchmarking.base_de_datos_temporal():
+            self.stdout.write(f'Generando dataset ({options["pedidos"]} pedidos)...')
+            base, contexto = dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=500, conductores=options['conductores'],
+                productos=100, lote=2000, dias=365, pedidos=options['pedidos'],
+            )
+            dataset.generar_bloques(options['semilla'], dataset.dividir_bloques(options['pedidos']), base, contexto)
+
+            casos = preparar_casos()
+            if options['solo']:
+                desconocidos = set(options['solo']) - set(casos)
+                if desconocidos:
+                    raise CommandError(f'Casos desconocidos: {", ".join(sorted(desconocidos))}')
+                casos = {nombre: casos[nombre] for nombre in options['solo']}
+
+            resultados = {}
+            for nombre, peticion in casos.items():
+                resultados[nombre] = benchmarking.medir(peticion, options['repeticiones'])
+                self.stdout.write(f'  {nombre}: {resultados[nombre]}')
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
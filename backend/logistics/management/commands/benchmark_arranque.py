@@ -0,0 +1,174 @@
+"""
+Benchmark de arranque en frío (lo que paga cada réplica nueva en Railway).
+
+Cada repetición es un proceso nuevo con `python -X importtime` que mide por
+fases: django.setup() (settings, apps, modelos, señales), la carga de las URLs
+(importa todas las vistas y serializers), la primera petición y una segunda
+ya en caliente. Reporta la mediana de cada fase, las consultas SQL de cada
+una (el arranque no debería consultar la base de datos) y los paquetes y
+módulos que más tardan en importarse.
+
+Falla si el arranque total supera ARRANQUE_PRESUPUESTO_MS (o --presupuesto-ms),
+para usarlo en CI como test de presupuesto.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from logistics import benchmarking, dataset
+
+
+NOMBRE = 'arranque'
+
+FASES = ('setup', 'urls', 'primera_peticion', 'segunda_peticion')
+
+# Se ejecuta en el proceso hijo; imprime las métricas como JSON en stdout
+MEDICION = '''
+import json, resource, time
+inicio = time.perf_counter()
+import django
+django.setup()
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+fases, consultas = {}, {}
+fases['setup'] = time.perf_counter() - inicio
+
+def medir(nombre, funcion):
+    reloj = time.perf_counter()
+    with CaptureQueriesContext(connection) as capturadas:
+        funcion()
+    fases[nombre] = time.perf_counter() - reloj
+    consultas[nombre] = len(capturadas)
+
+from django.urls import get_resolver
+medir('urls', lambda: get_resolver()._populate())
+
+# Sin RUTA solo se mide el arranque, sin tocar la base de datos
+if RUTA:
+    from django.test import Client
+    cliente = Client(HTTP_HOST='localhost')
+    def peticion():
+        respuesta = cliente.get(RUTA)
+        assert respuesta.status_code == 200, respuesta.status_code
+    medir('primera_peticion', peticion)
+    medir('segunda_peticion', peticion)
+consultas['setup'] = 0
+print(json.dumps({
+    'fases': fases, 'consultas': consultas,
+    'memoria_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def parsear_importtime(salida):
+    """{modulo: (propio_us, acumulado_us)} de la salida de -X importtime"""
+    modulos = {}
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulos[nombre.strip()] = (int(propio), int(acumulado))
+    return modulos
+
+
+def medir_proceso(ruta, entorno=None):
+    """
+    Métricas de un proceso nuevo y sus tiempos de import. Sin `ruta` no hace
+    peticiones; `entorno` reemplaza las bases y cachés temporales.
+    """
+    entorno = {
+        **os.environ,
+        **(benchmarking.entorno_subproceso() if entorno is None else entorno),
+        'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),
+    }
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'RUTA = {ruta!r}\n{MEDICION}'],
+        cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise CommandError(f'El proceso de medición falló:\n{proceso.stderr[-3000:]}')
+    return json.loads(proceso.stdout.strip().splitlines()[-1]), parsear_importtime(proceso.stderr)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de arranque en frío: django.setup(), URLs, primera petición e imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Procesos medidos')
+        parser.add_argument('--ruta', default='/api/productos/', help='Petición de la primera respuesta')
+        parser.add_argument('--top', type=int, default=15, help='Paquetes y módulos a listar')
+        parser.add_argument('--presupuesto-ms', type=float, default=None,
+                            help='Máximo del arranque total (por defecto ARRANQUE_PRESUPUESTO_MS)')
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        presupuesto = options['presupuesto_ms'] or getattr(settings, 'ARRANQUE_PRESUPUESTO_MS', 3000)
+
+        with benchmarking.base_de_datos_temporal(en_disco=True):
+            dataset.preparar_dataset(semilla=42, usuarios=10, conductores=1, productos=100, lote=2000, dias=30)
+            # Los .pyc ya compilados, como en un despliegue
+            medir_proceso(options['ruta'])
+            mediciones = [medir_proceso(options['ruta']) for _ in range(options['repeticiones'])]
+
+        resultados = {}
+        for fase in FASES:
+            resultados[fase] = {
+                'tiempo_ms': round(statistics.median(m['fases'][fase] for m, _ in mediciones) * 1000, 3),
+                'memoria_pico_kb': 0,
+                'consultas': mediciones[-1][0]['consultas'][fase],
+            }
+        totales = [sum(m['fases'][fase] for fase in FASES[:3]) for m, _ in mediciones]
+        resultados['total'] = {
+            'tiempo_ms': round(statistics.median(totales) * 1000, 3),
+            'memoria_pico_kb': float(statistics.median(m['memoria_kb'] for m, _ in mediciones)),
+            'consultas': sum(resultados[fase]['consultas'] for fase in FASES[:3]),
+        }
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        self.mostrar_imports([imports for _, imports in mediciones], options['top'])
+
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        total = resultados['total']['tiempo_ms']
+        if total > presupuesto:
+            raise CommandError(f'El arranque tarda {total} ms, más que el presupuesto de {presupuesto} ms')
+        self.stdout.write(self.style.SUCCESS(f'Arranque {total} ms (presupuesto {presupuesto} ms)'))
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
+
+    def mostrar_imports(self, corridas, top):
+        """Mediana del tiempo de import propio por paquete y acumulado por módulo"""
+        por_paquete = defaultdict(list)
+        por_modulo = defaultdict(list)
+        for modulos in corridas:
+            paquetes = defaultdict(int)
+            for nombre, (propio, acumulado) in modulos.items():
+                paquetes[nombre.split('.')[0]] += propio
+                por_modulo[nombre].append(acumulado)
+            for paquete, propio in paquetes.items():
+                por_paquete[paquete].append(propio)
+
+        self.stdout.write(f'\nImport por paquete (propio, ms)')
+        for paquete, tiempos in sorted(por_paquete.items(), key=lambda p: -statistics.median(p[1]))[:top]:
+            self.stdout.write(f'  {paquete:<40} {statistics.median(tiempos) / 1000:>10.1f}')
+        self.stdout.write(f'\nImport por módulo del proyecto (acumulado, ms)')
+        propios = ('backend', 'logistics', 'user_management', 'core')
+        modulos = [(nombre, t) for nombre, t in por_modulo.items() if nombre.split('.')[0] in propios]
+        for nombre, tiempos in sorted(modulos, key=lambda m: -statistics.median(m[1]))[:top]:
+            self.stdout.write(f'  {nombre:<40} {statistics.median(tiempos) / 1000:>10.1f}')
@@ -0,0 +1,277 @@
+"""
+Benchmark de las vistas async (logistics/async_views.py) bajo ASGI frente a
+la API síncrona bajo WSGI.
+
+Primero, en proceso, mide tiempo, memoria y consultas SQL de cada endpoint y
+de su versión async, y verifica que respondan lo mismo. Después levanta
+gunicorn (backend.wsgi, como el Procfile) y uvicorn (backend.asgi) sobre la
+misma base temporal, con los mismos workers, y lanza la mezcla de endpoints
+con cada nivel de conexiones simultáneas: reporta peticiones por segundo y
+latencia p50/p95 de cada servidor.
+"""
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.client import HTTPConnection
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from logistics import benchmarking, dataset
+from logistics.models import Envio
+from user_management.models import Producto
+
+
+NOMBRE = 'asgi'
+
+
+def preparar_peticiones():
+    """{caso: (método, ruta síncrona, cuerpo, con token)}. Requiere el dataset cargado"""
+    envio = Envio.objects.annotate(total=Count('seguimientos')).order_by('-total', 'id').first()
+    usuario = User.objects.filter(userprofile__role='customer').order_by('id').first()
+    producto = Producto.objects.filter(activo=True).order_by('id').first()
+    return {
+        'check_email': ('POST', '/api/auth/check-email/', {'email': usuario.email}, False),
+        'check_phone': ('POST', '/api/auth/check-phone/', {'phone': '3000000000'}, False),
+        'envio_buscar_por_guia': ('GET', f'/api/envios/buscar_por_guia/?numero_guia={envio.numero_guia}', None, True),
+        'envio_seguimiento': ('GET', f'/api/envios/{envio.id}/seguimiento/', None, True),
+        'productos': ('GET', '/api/productos/', None, False),
+        'producto': ('GET', f'/api/productos/{producto.id}/', None, False),
+        'pedidos_estadisticas': ('GET', '/api/pedidos/estadisticas/', None, True),
+    }
+
+
+def ruta_async(ruta):
+    return ruta.replace('/api/', '/api/async/', 1)
+
+
+def token_de_prueba():
+    usuario = User.objects.filter(userprofile__role='customer').order_by('id').first()
+    token, _ = Token.objects.get_or_create(user=usuario)
+    return f'Token {token.key}'
+
+
+def casos_en_proceso(peticiones, autorizacion):
+    """{caso: función} con la versión síncrona y la async de cada endpoint"""
+    client = APIClient()
+
+    def peticion(metodo, ruta, cuerpo, con_token):
+        cabeceras = {'HTTP_AUTHORIZATION': autorizacion} if con_token else {}
+
+        def hacer():
+            if metodo == 'POST':
+                respuesta = client.post(ruta, cuerpo, format='json', **cabeceras)
+            else:
+                respuesta = client.get(ruta, **cabeceras)
+            assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+            return respuesta
+        return hacer
+
+    casos = {}
+    for nombre, (metodo, ruta, cuerpo, con_token) in peticiones.items():
+        casos[nombre] = peticion(metodo, ruta, cuerpo, con_token)
+        casos[f'{nombre}_async'] = peticion(metodo, ruta_async(ruta), cuerpo, con_token)
+    return casos
+
+
+def diferencias(casos, peticiones):
+    """Endpoints cuya versión async no responde lo mismo que la síncrona"""
+    distintos = []
+    for nombre in peticiones:
+        sincrona, asincrona = casos[nombre](), casos[f'{nombre}_async']()
+        if json.loads(sincrona.content) != json.loads(asincrona.content):
+            distintos.append(nombre)
+    return distintos
+
+
+# Servidores
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def esperar_puerto(proceso, puerto, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise CommandError(f'El servidor terminó al arrancar:\n{proceso.stdout.read()}')
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f'El servidor no respondió en el puerto {puerto}')
+
+
+@contextmanager
+def servidor(tipo, workers):
+    """Levanta gunicorn o uvicorn sobre la base temporal y retorna su puerto"""
+    puerto = puerto_libre()
+    if tipo == 'wsgi':
+        comando = ['-m', 'gunicorn', 'backend.wsgi', '--workers', str(workers),
+                   '--bind', f'127.0.0.1:{puerto}', '--log-level', 'warning']
+    else:
+        comando = ['-m', 'uvicorn', 'backend.asgi:application', '--workers', str(workers),
+                   '--host', '127.0.0.1', '--port', str(puerto), '--log-level', 'warning', '--no-access-log']
+    entorno = {
+        **os.environ,
+        **benchmarking.entorno_subproceso(),
+        'DJANGO_SETTINGS_MODULE': 'backend.settings',
+        'RATELIMIT_ENABLED': 'False',
+        'LOG_LEVEL': 'WARNING',
+    }
+    proceso = subprocess.Popen(
+        [sys.executable, *comando], cwd=settings.BASE_DIR, env=entorno,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        esperar_puerto(proceso, puerto)
+        yield puerto
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def cargar(puerto, peticiones, conexiones, total):
+    """
+    Lanza `total` peticiones (la mezcla de endpoints, en orden) con
+    `conexiones` clientes simultáneos. Retorna las métricas del nivel.
+    """
+    siguiente = itertools.cycle(peticiones)
+    bloqueo = threading.Lock()
+    latencias, errores = [], []
+
+    def cliente(cantidad):
+        for _ in range(cantidad):
+            with bloqueo:
+                metodo, ruta, cuerpo, cabeceras = next(siguiente)
+            conexion = HTTPConnection('127.0.0.1', puerto, timeout=30)
+            inicio = time.perf_counter()
+            try:
+                conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                ok = respuesta.status == 200
+            except OSError:
+                ok = False
+            finally:
+                conexion.close()
+            with bloqueo:
+                (latencias if ok else errores).append(time.perf_counter() - inicio)
+
+    reparto = [total // conexiones + (1 if i < total % conexiones else 0) for i in range(conexiones)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=conexiones) as ejecutor:
+        list(ejecutor.map(cliente, reparto))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'tiempo_ms': round(statistics.median(latencias) * 1000, 3) if latencias else 0,
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 3) if latencias else 0,
+        'memoria_pico_kb': 0,
+        'consultas': 0,
+        'por_segundo': round(len(latencias) / duracion, 2),
+        'errores': len(errores),
+    }
+
+
+def peticiones_http(peticiones, autorizacion, asincronas):
+    resultado = []
+    for metodo, ruta, cuerpo, con_token in peticiones.values():
+        cabeceras = {'Content-Type': 'application/json', 'Host': 'localhost'}
+        if con_token:
+            cabeceras['Authorization'] = autorizacion
+        resultado.append((
+            metodo, ruta_async(ruta) if asincronas else ruta,
+            json.dumps(cuerpo) if cuerpo is not None else None, cabeceras,
+        ))
+    return resultado
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de concurrencia: vistas async con uvicorn frente a la API síncrona con gunicorn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=2000, help='Pedidos del dataset sintético')
+        parser.add_argument('--workers', type=int, default=2, help='Workers de cada servidor')
+        parser.add_argument('--conexiones', type=int, nargs='+', default=[1, 16, 64],
+                            help='Niveles de conexiones simultáneas')
+        parser.add_argument('--peticiones', type=int, default=600, help='Peticiones por nivel y servidor')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        with benchmarking.base_de_datos_temporal(en_disco=True):
+            self.stdout.write(f'Generando dataset ({options["pedidos"]} pedidos)...')
+            base, contexto = dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=200, conductores=10,
+                productos=100, lote=2000, dias=365, pedidos=options['pedidos'],
+            )
+            dataset.generar_bloques(options['semilla'], dataset.dividir_bloques(options['pedidos']), base, contexto)
+            peticiones = preparar_peticiones()
+            autorizacion = token_de_prueba()
+
+            casos = casos_en_proceso(peticiones, autorizacion)
+            distintos = diferencias(casos, peticiones)
+            if distintos:
+                raise CommandError(f'Las vistas async no responden lo mismo: {", ".join(distintos)}')
+
+            resultados = {}
+            for nombre, funcion in casos.items():
+                resultados[nombre] = benchmarking.medir(funcion, options['repeticiones'])
+                self.stdout.write(f'  {nombre}: {resultados[nombre]}')
+
+            for tipo in ('wsgi', 'asgi'):
+                mezcla = peticiones_http(peticiones, autorizacion, asincronas=tipo == 'asgi')
+                with servidor(tipo, options['workers']) as puerto:
+                    # Calentamiento (imports y cachés de cada worker)
+                    cargar(puerto, mezcla, options['workers'], len(mezcla) * options['workers'])
+                    for conexiones in options['conexiones']:
+                        caso = f'{tipo}_{conexiones}_conexiones'
+                        resultados[caso] = cargar(puerto, mezcla, conexiones, options['peticiones'])
+                        self.stdout.write(f'  {caso}: {resultados[caso]}')
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        self.stdout.write(f"{'conexiones':<12} {'wsgi req/s':>12} {'asgi req/s':>12} {'wsgi p95':>10} {'asgi p95':>10}")
+        for conexiones in options['conexiones']:
+            wsgi, asgi = resultados[f'wsgi_{conexiones}_conexiones'], resultados[f'asgi_{conexiones}_conexiones']
+            self.stdout.write(
+                f"{conexiones:<12} {wsgi['por_segundo']:>12} {asgi['por_segundo']:>12} "
+                f"{wsgi['p95_ms']:>10} {asgi['p95_ms']:>10}"
+            )
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        fallidas = {caso: m['errores'] for caso, m in resultados.items() if m.get('errores')}
+        if fallidas:
+            raise CommandError(f'Peticiones con error: {fallidas}')
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
@@ -0,0 +1,168 @@
+"""
+Benchmark de los backends de caché (logistics/cache_compartida.py).
+
+Para cada backend (memoria, archivo, base_de_datos y redis si REDIS_URL está
+configurado) mide la latencia por operación de un acierto, un fallo, una
+escritura, el add + incr del límite de peticiones, un get_many y la carga de
+una sesión, con la misma configuración que settings.py. También verifica si
+otro proceso (otro worker de gunicorn) ve lo que escribió este: con memoria
+no, y cada worker acierta solo lo que cacheó él mismo.
+"""
+import os
+import subprocess
+import sys
+import uuid
+
+from django.conf import settings
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from logistics import benchmarking, cache_compartida
+
+
+NOMBRE = 'cache'
+
+# Lee en otro proceso la clave que escribió este
+LECTURA = '''
+import django
+django.setup()
+from django.core.cache import caches
+print(caches['default'].get(CLAVE))
+'''
+
+
+def disponibles():
+    backends = ['memoria', 'archivo', 'base_de_datos']
+    if getattr(settings, 'REDIS_URL', ''):
+        backends.append('redis')
+    return backends
+
+
+def casos(cache, operaciones):
+    """{caso: función que hace `operaciones` operaciones}"""
+    claves = [f'benchmark:{i}' for i in range(100)]
+    for clave in claves:
+        cache.set(clave, {'id': clave, 'stock': 10, 'nombre': 'Producto de prueba'}, 300)
+    sesion = SessionStore()
+    sesion._cache = cache
+    sesion.update({'_auth_user_id': '1', 'carrito_invitado': 'x' * 32})
+    sesion.create()
+
+    def acierto():
+        for i in range(operaciones):
+            cache.get(claves[i % 100])
+
+    def fallo():
+        for i in range(operaciones):
+            cache.get(f'benchmark:no-existe:{i}')
+
+    def escritura():
+        for i in range(operaciones):
+            cache.set(claves[i % 100], i, 300)
+
+    def limite():
+        # Como logistics/throttling.py: add la primera vez, incr las demás
+        for i in range(operaciones):
+            clave = f'benchmark:limite:{i % 10}'
+            if not cache.add(clave, 1, 60):
+                cache.incr(clave)
+
+    def varias():
+        for i in range(operaciones // 10):
+            cache.get_many(claves[(i % 10) * 10:(i % 10) * 10 + 10])
+
+    def cargar_sesion():
+        for _ in range(operaciones):
+            cargada = SessionStore(session_key=sesion.session_key)
+            cargada._cache = cache
+            cargada.load()
+
+    return {
+        'acierto': acierto, 'fallo': fallo, 'escritura': escritura,
+        'limite': limite, 'get_many_10': varias, 'sesion': cargar_sesion,
+    }
+
+
+def compartida(backend, cache):
+    """True si otro proceso con la misma configuración lee la clave escrita por este"""
+    clave = f'benchmark:compartida:{uuid.uuid4().hex}'
+    cache.set(clave, 'si', 60)
+    entorno = {
+        **os.environ,
+        **benchmarking.entorno_subproceso(),
+        'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),
+        'CACHE_BACKEND_DEFAULT': backend,
+        'LOG_LEVEL': 'WARNING',
+    }
+    proceso = subprocess.run(
+        [sys.executable, '-c', f'CLAVE = {clave!r}\n{LECTURA}'],
+        cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise CommandError(f'El proceso de lectura falló:\n{proceso.stderr[-3000:]}')
+    return proceso.stdout.strip().splitlines()[-1] == 'si'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de latencia de la caché por backend (memoria, archivo, base de datos, redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', nargs='+', choices=list(cache_compartida.BACKENDS),
+                            help='Backends a medir (por defecto los disponibles)')
+        parser.add_argument('--operaciones', type=int, default=1000, help='Operaciones por medición')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or disponibles()
+        resultados = {}
+        with benchmarking.base_de_datos_temporal(en_disco=True):
+            directorio = os.path.dirname(settings.CACHES['default'].get('LOCATION', '')) or settings.BASE_DIR / '.cache'
+            for backend in backends:
+                configuracion = cache_compartida.configurar_caches(
+                    dict.fromkeys(cache_compartida.ALIASES, backend),
+                    directorio=directorio, redis_url=getattr(settings, 'REDIS_URL', ''),
+                )
+                with override_settings(CACHES=configuracion):
+                    if backend == 'base_de_datos':
+                        call_command('createcachetable', verbosity=0)
+                    cache = caches['default']
+                    cache.clear()
+                    es_compartida = compartida(backend, cache)
+                    for caso, funcion in casos(cache, options['operaciones']).items():
+                        medicion = benchmarking.medir(funcion, options['repeticiones'])
+                        # tiempo_ms de `operaciones` operaciones: µs por operación si son 1000
+                        medicion['por_operacion_us'] = round(medicion['tiempo_ms'] * 1000 / options['operaciones'], 2)
+                        medicion['compartida'] = es_compartida
+                        resultados[f'{backend}_{caso}'] = medicion
+                        self.stdout.write(f'  {backend}_{caso}: {medicion}')
+                    cache.clear()
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        self.stdout.write(f"\n{'backend':<16} {'acierto µs':>12} {'sesión µs':>12} {'límite µs':>12} {'entre procesos':>16}")
+        for backend in backends:
+            acierto, sesion, limite = (resultados[f'{backend}_{caso}'] for caso in ('acierto', 'sesion', 'limite'))
+            self.stdout.write(
+                f"{backend:<16} {acierto['por_operacion_us']:>12} {sesion['por_operacion_us']:>12} "
+                f"{limite['por_operacion_us']:>12} {'sí' if acierto['compartida'] else 'no':>16}"
+            )
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        no_compartidas = [b for b in backends if b != 'memoria' and not resultados[f'{b}_acierto']['compartida']]
+        if no_compartidas:
+            raise CommandError(f'Otro proceso no ve lo escrito con: {", ".join(no_compartidas)}')
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
@@ -0,0 +1,125 @@
+"""
+Benchmark de hashers de contraseñas para elegir PASSWORD_HASHER y sus
+parámetros en un servidor concreto.
+
+Para cada configuración mide el tiempo de CPU de crear un hash (registro,
+cambio de contraseña) y de verificarlo (login), y calcula cuántos logins por
+segundo soporta cada núcleo. Uso:
+
+    python manage.py benchmark_hashers
+    python manage.py benchmark_hashers --config scrypt:work_factor=32768 argon2:time_cost=3,memory_cost=65536
+"""
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from logistics import benchmarking
+from logistics.hashers import HASHERS, argon2_disponible
+
+
+NOMBRE = 'hashers'
+
+PASSWORD = 'tecnoroute-benchmark-123'
+
+# Configuraciones que se comparan por defecto (además de la actual)
+CONFIGURACIONES = [
+    ('pbkdf2', {'iterations': 600000}),
+    ('pbkdf2', {'iterations': 260000}),
+    ('scrypt', {'work_factor': 2**14, 'block_size': 8, 'parallelism': 1}),
+    ('scrypt', {'work_factor': 2**15, 'block_size': 8, 'parallelism': 1}),
+    ('scrypt', {'work_factor': 2**16, 'block_size': 8, 'parallelism': 1}),
+    ('argon2', {'time_cost': 2, 'memory_cost': 19456, 'parallelism': 1}),
+    ('argon2', {'time_cost': 3, 'memory_cost': 12288, 'parallelism': 1}),
+    ('argon2', {'time_cost': 1, 'memory_cost': 47104, 'parallelism': 1}),
+]
+
+
+def parsear_configuracion(texto):
+    """'scrypt:work_factor=32768,block_size=8' -> ('scrypt', {...})"""
+    algoritmo, _, resto = texto.partition(':')
+    if algoritmo not in HASHERS:
+        raise CommandError(f'Algoritmo desconocido: {algoritmo} (opciones: {", ".join(HASHERS)})')
+    valores = {}
+    for par in filter(None, resto.split(',')):
+        nombre, _, valor = par.partition('=')
+        try:
+            valores[nombre.strip()] = int(valor)
+        except ValueError:
+            raise CommandError(f'Valor no numérico en {texto}: {par}')
+    return algoritmo, valores
+
+
+def tiempo_cpu_ms(funcion, repeticiones):
+    """Mediana del tiempo de CPU (un solo núcleo) de `funcion`"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        funcion()
+        tiempos.append(time.process_time() - inicio)
+    return statistics.median(tiempos) * 1000
+
+
+def medir_hasher(hasher, repeticiones):
+    encoded = hasher.encode(PASSWORD, hasher.salt())
+    assert hasher.verify(PASSWORD, encoded)
+    hash_ms = tiempo_cpu_ms(lambda: hasher.encode(PASSWORD, hasher.salt()), repeticiones)
+    verificar_ms = tiempo_cpu_ms(lambda: hasher.verify(PASSWORD, encoded), repeticiones)
+    return {
+        'hash_ms': round(hash_ms, 2),
+        'verificar_ms': round(verificar_ms, 2),
+        'logins_por_segundo_nucleo': round(1000 / verificar_ms, 2) if verificar_ms else None,
+        'memoria_kb': hasher.memoria_kb(),
+    }
+
+
+def etiqueta(algoritmo, costo):
+    return f'{algoritmo}(' + ','.join(f'{k}={v}' for k, v in costo.items()) + ')'
+
+
+class Command(BaseCommand):
+    help = 'Compara hashers de contraseñas: tiempo de hash/verificación y logins por segundo por núcleo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', nargs='+', help='Configuraciones algoritmo:param=valor,... (reemplaza las predeterminadas)')
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['config']:
+            configuraciones = [parsear_configuracion(texto) for texto in options['config']]
+        else:
+            configuraciones = list(CONFIGURACIONES)
+
+        actual = import_string(settings.PASSWORD_HASHERS[0])()
+        actual_clave = (actual.nombre, actual.costo())
+        if actual_clave not in configuraciones:
+            configuraciones.insert(0, actual_clave)
+
+        resultados = {}
+        for algoritmo, valores in configuraciones:
+            if algoritmo == 'argon2' and not argon2_disponible():
+                self.stdout.write(self.style.WARNING(f'argon2-cffi no está instalado, se omite {etiqueta(algoritmo, valores)}'))
+                continue
+            hasher = import_string(HASHERS[algoritmo])(**valores)
+            nombre = etiqueta(algoritmo, hasher.costo())
+            resultados[nombre] = medir_hasher(hasher, options['repeticiones'])
+            if (algoritmo, hasher.costo()) == actual_clave:
+                resultados[nombre]['actual'] = True
+
+        self.stdout.write(f'Núcleos disponibles: {os.cpu_count()}')
+        self.stdout.write(
+            f"{'configuración':<58} {'hash_ms':>9} {'verificar_ms':>13} {'logins/s/núcleo':>16} {'memoria_kb':>11}"
+        )
+        for nombre, metricas in resultados.items():
+            marca = ' *' if metricas.get('actual') else ''
+            self.stdout.write(
+                f"{nombre + marca:<58} {metricas['hash_ms']:>9.2f} {metricas['verificar_ms']:>13.2f} "
+                f"{metricas['logins_por_segundo_nucleo']:>16.2f} {metricas['memoria_kb']:>11}"
+            )
+        self.stdout.write('* configuración actual (PASSWORD_HASHER)')
+
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
@@ -0,0 +1,122 @@
+"""
+Benchmark de inicio de sesión (inicio de turno de los conductores).
+
+Mide latencia, memoria y consultas SQL de un login por endpoint, y el
+rendimiento (logins por segundo) con varios hilos haciendo login a la vez
+con distintos conductores, que ya tienen token como ocurre cada mañana.
+"""
+import itertools
+import threading
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from logistics import benchmarking, dataset
+from user_management.views import login_user
+
+
+NOMBRE = 'login'
+
+
+def preparar_casos():
+    """Retorna {caso: función que hace un login}. Requiere el dataset cargado"""
+    emails = list(
+        User.objects.filter(userprofile__role='conductor').order_by('id').values_list('email', flat=True)
+    )
+    if not emails:
+        raise CommandError('El dataset no tiene conductores')
+
+    # Cada login usa el siguiente conductor, compartido entre hilos
+    siguiente = itertools.cycle(emails)
+    bloqueo = threading.Lock()
+
+    def proximo_email():
+        with bloqueo:
+            return next(siguiente)
+
+    factory = APIRequestFactory()
+
+    def auth_login():
+        respuesta = APIClient().post(
+            '/api/auth/login/',
+            {'email': proximo_email(), 'password': dataset.PASSWORD_DATASET},
+            format='json',
+        )
+        assert respuesta.status_code == 200, respuesta.status_code
+        return respuesta
+
+    def login_user_vista():
+        # Misma ruta que AuthView, así que se llama a la vista directamente
+        peticion = factory.post(
+            '/api/auth/login/',
+            {'email': proximo_email(), 'password': dataset.PASSWORD_DATASET},
+            format='json',
+        )
+        respuesta = login_user(peticion)
+        assert respuesta.status_code == 200, respuesta.status_code
+        return respuesta
+
+    # Primer login de cada conductor: crea los tokens que faltan
+    for _ in emails:
+        auth_login()
+
+    return {
+        'auth_login': auth_login,
+        'login_user': login_user_vista,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de login: latencia, consultas SQL y logins por segundo con varios hilos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conductores', type=int, default=50)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--hilos', type=int, default=4)
+        parser.add_argument('--logins', type=int, default=100, help='Logins totales por caso en la prueba de rendimiento')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--solo', nargs='+', help='Limitar a estos casos')
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        # Todos los logins salen de la misma IP: sin límite de peticiones
+        with override_settings(RATELIMIT_ENABLED=False), benchmarking.base_de_datos_temporal():
+            self.stdout.write(f'Generando dataset ({options["conductores"]} conductores)...')
+            dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=200, conductores=options['conductores'],
+                productos=10, lote=2000, dias=365,
+            )
+
+            casos = preparar_casos()
+            if options['solo']:
+                desconocidos = set(options['solo']) - set(casos)
+                if desconocidos:
+                    raise CommandError(f'Casos desconocidos: {", ".join(sorted(desconocidos))}')
+                casos = {nombre: casos[nombre] for nombre in options['solo']}
+
+            resultados = {}
+            for nombre, login in casos.items():
+                resultados[nombre] = benchmarking.medir(login, options['repeticiones'])
+                resultados[nombre]['por_segundo'] = benchmarking.medir_rendimiento(
+                    login, hilos=options['hilos'], operaciones=options['logins'],
+                )
+                self.stdout.write(f'  {nombre}: {resultados[nombre]}')
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        for nombre, metricas in resultados.items():
+            self.stdout.write(f"{nombre}: {metricas['por_segundo']} logins/s con {options['hilos']} hilos")
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
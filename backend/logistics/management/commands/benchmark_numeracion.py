@@ -0,0 +1,125 @@
+"""
+Benchmark de la numeración de pedidos y guías (logistics/numeracion.py).
+
+Mide el costo de entregar números según el tamaño del bloque que reserva cada
+proceso (con bloque 1 cada número es una reserva en la base de datos), una
+importación masiva de una vez, y el rendimiento con varios hilos. Verifica
+que ningún número se repita entre hilos ni entre procesos que reservan de la
+misma base al mismo tiempo, y que todos tengan el dígito verificador correcto.
+"""
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from logistics import benchmarking, numeracion
+
+
+NOMBRE = 'numeracion'
+
+# Pide números en otro proceso (otro worker) e imprime uno por línea
+PROCESO = '''
+import django
+django.setup()
+from logistics import numeracion
+for _ in range(CANTIDAD):
+    print(numeracion.siguiente('pedido'))
+'''
+
+
+def entregar(cantidad):
+    def hacer():
+        for _ in range(cantidad):
+            numeracion.siguiente('pedido')
+    return hacer
+
+
+def en_procesos(procesos, cantidad):
+    """Números entregados por `procesos` procesos a la vez"""
+    entorno = {
+        **os.environ,
+        **benchmarking.entorno_subproceso(),
+        'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),
+        'LOG_LEVEL': 'WARNING',
+    }
+    hijos = [
+        subprocess.Popen(
+            [sys.executable, '-c', f'CANTIDAD = {cantidad}\n{PROCESO}'],
+            cwd=settings.BASE_DIR, env=entorno, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for _ in range(procesos)
+    ]
+    numeros = []
+    for hijo in hijos:
+        salida, errores = hijo.communicate()
+        if hijo.returncode != 0:
+            raise CommandError(f'Un proceso de numeración falló:\n{errores[-3000:]}')
+        numeros += salida.split()
+    return numeros
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de la numeración de pedidos y guías: bloques, importación masiva y concurrencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--numeros', type=int, default=2000, help='Números por medición')
+        parser.add_argument('--importacion', type=int, default=10000, help='Números de la importación masiva')
+        parser.add_argument('--hilos', type=int, default=4)
+        parser.add_argument('--procesos', type=int, default=3)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        cantidad = options['numeros']
+        resultados = {}
+        with benchmarking.base_de_datos_temporal(en_disco=True):
+            for bloque in (1, 100, 1000):
+                with override_settings(NUMERACION_BLOQUE=bloque):
+                    numeracion._bloques.clear()
+                    resultados[f'bloque_{bloque}'] = benchmarking.medir(entregar(cantidad), options['repeticiones'])
+                    self.stdout.write(f'  bloque_{bloque}: {resultados[f"bloque_{bloque}"]}')
+
+            importacion = lambda: numeracion.siguientes('guia', options['importacion'])
+            resultados['importacion'] = benchmarking.medir(importacion, options['repeticiones'])
+            self.stdout.write(f'  importacion: {resultados["importacion"]}')
+
+            numeracion._bloques.clear()
+            entregados = []
+            por_segundo = benchmarking.medir_rendimiento(
+                lambda: entregados.append(numeracion.siguiente('pedido')), options['hilos'], cantidad,
+            )
+            resultados[f'{options["hilos"]}_hilos'] = {
+                'tiempo_ms': 0, 'memoria_pico_kb': 0, 'consultas': 0, 'por_segundo': por_segundo,
+            }
+            entregados += en_procesos(options['procesos'], cantidad)
+            entregados += [numeracion.siguiente('pedido') for _ in range(cantidad)]
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        self.stdout.write(f'{options["hilos"]} hilos: {por_segundo} números por segundo')
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        repetidos = [numero for numero, veces in Counter(entregados).items() if veces > 1]
+        if repetidos:
+            raise CommandError(f'{len(repetidos)} números repetidos entre hilos y procesos, por ejemplo {repetidos[:5]}')
+        incorrectos = [numero for numero in entregados if not numeracion.verificador_correcto(numero)]
+        if incorrectos:
+            raise CommandError(f'Números con dígito verificador incorrecto: {incorrectos[:5]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(entregados)} números sin repetir ({options["hilos"]} hilos y {options["procesos"]} procesos)'
+        ))
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
@@ -0,0 +1,188 @@
+"""
+Benchmark de reservas de stock (venta de un producto popular).
+
+Mide latencia, memoria y consultas SQL de agregar al carrito (reserva) y de un
+checkout, y luego lanza muchos compradores a la vez sobre un producto con poco
+stock: cada uno reserva una unidad y hace checkout. Reporta reservas por
+segundo, rechazos y errores de bloqueo, y verifica que no haya sobreventa
+(stock >= 0, vendidos = stock inicial - stock final, Producto.reservado igual
+a la suma de las reservas y Producto.stock igual al libro de inventario).
+
+La base de datos de prueba va a un archivo (no a memoria compartida) para que
+la contención entre hilos sea la de SQLite real.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from logistics import benchmarking, dataset, inventario
+from user_management.models import PedidoItem, Producto, ReservaStock
+
+
+NOMBRE = 'reservas'
+
+DATOS_PEDIDO = {'direccion_envio': 'Calle 1 # 2-3, Bogotá', 'telefono_contacto': '3001234567'}
+
+
+def cliente_para(usuario):
+    cliente = APIClient()
+    cliente.force_authenticate(user=usuario)
+    return cliente
+
+
+def preparar_casos(clientes, producto_id):
+    """Retorna {caso: función}. Cada llamada usa el siguiente cliente"""
+    siguiente = itertools.cycle(clientes)
+    bloqueo = threading.Lock()
+
+    def proximo_cliente():
+        with bloqueo:
+            return next(siguiente)
+
+    def reservar():
+        respuesta = proximo_cliente().post(
+            '/api/carrito/', {'producto_id': producto_id, 'cantidad': 1}, format='json',
+        )
+        assert respuesta.status_code == 200, respuesta.status_code
+        return respuesta
+
+    def checkout():
+        cliente = proximo_cliente()
+        respuesta = cliente.post('/api/carrito/', {'producto_id': producto_id, 'cantidad': 1}, format='json')
+        assert respuesta.status_code == 200, respuesta.status_code
+        respuesta = cliente.post('/api/pedidos/', DATOS_PEDIDO, format='json')
+        assert respuesta.status_code == 201, respuesta.status_code
+        return respuesta
+
+    return {'reservar': reservar, 'checkout': checkout}
+
+
+def comprar_concurrente(clientes, producto_id, hilos):
+    """Cada cliente reserva una unidad del producto y hace checkout"""
+    contadores = {'reservas': 0, 'rechazados': 0, 'vendidos': 0, 'checkout_fallidos': 0, 'errores_bloqueo': 0}
+    bloqueo = threading.Lock()
+
+    def contar(clave):
+        with bloqueo:
+            contadores[clave] += 1
+
+    def comprador(cliente):
+        try:
+            respuesta = cliente.post('/api/carrito/', {'producto_id': producto_id, 'cantidad': 1}, format='json')
+            if respuesta.status_code != 200:
+                contar('rechazados')
+                return
+            contar('reservas')
+            respuesta = cliente.post('/api/pedidos/', DATOS_PEDIDO, format='json')
+            contar('vendidos' if respuesta.status_code == 201 else 'checkout_fallidos')
+        except OperationalError:
+            contar('errores_bloqueo')
+        finally:
+            connection.close()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(comprador, clientes))
+    contadores['por_segundo'] = round(len(clientes) / (time.perf_counter() - inicio), 2)
+    return contadores
+
+
+def verificar(producto_id, stock_inicial, vendidos):
+    """Invariantes después de la venta concurrente. Retorna la lista de errores"""
+    producto = Producto.objects.get(id=producto_id)
+    reservado = ReservaStock.objects.aggregate(total=Sum('cantidad'))['total'] or 0
+    reservado_producto = ReservaStock.objects.filter(producto_id=producto_id).aggregate(total=Sum('cantidad'))['total'] or 0
+    en_pedidos = PedidoItem.objects.filter(producto_id=producto_id).aggregate(total=Sum('cantidad'))['total'] or 0
+    errores = []
+    if producto.stock < 0:
+        errores.append(f'stock negativo: {producto.stock}')
+    if producto.reservado != reservado_producto:
+        errores.append(f'reservado {producto.reservado} != suma de reservas {reservado_producto}')
+    if stock_inicial - producto.stock != en_pedidos or en_pedidos != vendidos:
+        errores.append(f'sobreventa: stock {stock_inicial} -> {producto.stock}, en pedidos {en_pedidos}, vendidos {vendidos}')
+    if reservado:
+        errores.append(f'quedaron {reservado} unidades reservadas después del checkout')
+    for producto_id, registrado, derivado in inventario.conciliar():
+        errores.append(f'producto {producto_id}: stock {registrado} != libro de inventario {derivado}')
+    return errores
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de reservas de stock: latencia y compradores concurrentes sobre un producto popular'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compradores', type=int, default=200)
+        parser.add_argument('--stock', type=int, default=50, help='Stock del producto popular')
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--operaciones', type=int, default=200, help='Reservas totales en la prueba de rendimiento')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        with override_settings(RATELIMIT_ENABLED=False), benchmarking.base_de_datos_temporal(en_disco=True):
+            self.stdout.write(f'Generando dataset ({options["compradores"]} compradores)...')
+            dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=options['compradores'] + 50, conductores=1,
+                productos=2, lote=2000, dias=30,
+            )
+            productos = dict(Producto.objects.order_by('id').values_list('id', 'stock')[:2])
+            popular, abundante = productos
+            Producto.objects.filter(id__in=productos).update(activo=True)
+            # Por el libro de inventario, para verificar también el stock derivado
+            inventario.ajustar(abundante, 10 ** 9 - productos[abundante])
+            inventario.ajustar(popular, options['stock'] - productos[popular])
+
+            usuarios = list(User.objects.filter(userprofile__role='customer').order_by('id'))
+            compradores = [cliente_para(usuario) for usuario in usuarios[:options['compradores']]]
+            otros = [cliente_para(usuario) for usuario in usuarios[options['compradores']:]]
+
+            resultados = {}
+            for nombre, funcion in preparar_casos(otros, abundante).items():
+                resultados[nombre] = benchmarking.medir(funcion, options['repeticiones'])
+                if nombre == 'reservar':
+                    resultados[nombre]['por_segundo'] = benchmarking.medir_rendimiento(
+                        funcion, hilos=options['hilos'], operaciones=options['operaciones'],
+                    )
+                self.stdout.write(f'  {nombre}: {resultados[nombre]}')
+
+            # Las reservas de la prueba anterior no cuentan para el producto popular
+            ReservaStock.objects.filter(producto_id=abundante).delete()
+
+            venta = comprar_concurrente(compradores, popular, options['hilos'])
+            self.stdout.write(f'  producto_popular: {venta}')
+            errores = verificar(popular, options['stock'], venta['vendidos'])
+            # Sin consultas propias: se compara por_segundo y se conservan los contadores
+            resultados['producto_popular'] = {
+                'tiempo_ms': 0, 'memoria_pico_kb': 0, 'consultas': 0, **venta,
+            }
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        self.stdout.write(
+            f"Producto popular: {venta['vendidos']} vendidos de {options['stock']}, "
+            f"{venta['rechazados']} rechazados, {venta['errores_bloqueo']} errores de bloqueo, "
+            f"{venta['por_segundo']} compradores/s con {options['hilos']} hilos"
+        )
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+        if errores:
+            raise CommandError('Invariantes de stock violadas:\n' + '\n'.join(errores))
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark de los serializers de logistics/serializers.py.
+
+Serializa N objetos (por defecto 1, 100 y 10000) con los mismos querysets que
+usan las vistas y registra tiempo, memoria y consultas SQL. Los resultados se
+comparan con benchmarks/serializers.baseline.json: si un cambio agrega
+consultas (por ejemplo un SerializerMethodField que consulta la base de
+datos) el comando termina con error.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from logistics import benchmarking, dataset
+from logistics.serializers import (
+    EnvioSerializer, EnvioListSerializer, PedidoSerializer, CarritoSerializer,
+    ClienteSerializer, VehiculoSerializer
+)
+from logistics.views import ClienteViewSet, EnvioViewSet, VehiculoViewSet
+from user_management.models import Carrito, Pedido
+
+
+NOMBRE = 'serializers'
+
+
+def casos():
+    """Serializer y queryset (igual al de la vista correspondiente) por caso"""
+    return {
+        'EnvioSerializer': (EnvioSerializer, lambda: EnvioViewSet.queryset.prefetch_related('seguimientos')),
+        'EnvioListSerializer': (EnvioListSerializer, lambda: EnvioViewSet.queryset.all()),
+        'PedidoSerializer': (
+            PedidoSerializer,
+            lambda: Pedido.objects.all().select_related('usuario', 'conductor').prefetch_related('items')
+        ),
+        'CarritoSerializer': (CarritoSerializer, lambda: Carrito.objects.all()),
+        'ClienteSerializer': (ClienteSerializer, lambda: ClienteViewSet().get_queryset()),
+        'VehiculoSerializer': (VehiculoSerializer, lambda: VehiculoViewSet.queryset.all()),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de serializers: tiempo, memoria y consultas SQL para N objetos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[1, 100, 10000], help='Cantidades de objetos a serializar')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por caso (se reporta la mediana)')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--solo', nargs='+', help='Limitar a estos serializers')
+        parser.add_argument('--actualizar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+
+    def handle(self, *args, **options):
+        seleccion = casos()
+        if options['solo']:
+            desconocidos = set(options['solo']) - set(seleccion)
+            if desconocidos:
+                raise CommandError(f'Serializers desconocidos: {", ".join(sorted(desconocidos))}')
+            seleccion = {nombre: seleccion[nombre] for nombre in options['solo']}
+
+        maximo = max(options['tamanos'])
+        with benchmarking.base_de_datos_temporal():
+            self.stdout.write(f'Generando fixtures ({maximo} objetos por modelo)...')
+            base, contexto = dataset.preparar_dataset(
+                semilla=options['semilla'], usuarios=maximo, conductores=maximo,
+                productos=200, lote=2000, dias=365, carritos=maximo, pedidos=maximo,
+            )
+            dataset.generar_bloques(options['semilla'], dataset.dividir_bloques(maximo), base, contexto)
+
+            resultados = {}
+            for nombre, (serializer_class, queryset) in seleccion.items():
+                for n in options['tamanos']:
+                    def serializar():
+                        return serializer_class(queryset().order_by('pk')[:n], many=True).data
+                    # Con muchos objetos el calentamiento no aporta y duplica el tiempo total
+                    resultados[f'{nombre}[{n}]'] = benchmarking.medir(
+                        serializar, options['repeticiones'], calentar=n < 1000
+                    )
+                    self.stdout.write(f'  {nombre}[{n}]: {resultados[f"{nombre}[{n}]"]}')
+
+        self.stdout.write(benchmarking.formatear_tabla(resultados))
+        archivo = benchmarking.guardar_resultados(NOMBRE, resultados)
+        self.stdout.write(f'Resultados guardados en {archivo}')
+
+        if options['actualizar_base']:
+            archivo = benchmarking.guardar_resultados(NOMBRE, resultados, como_base=True)
+            self.stdout.write(self.style.SUCCESS(f'Línea base actualizada: {archivo}'))
+            return
+
+        regresiones, advertencias = benchmarking.comparar(resultados, benchmarking.cargar_base(NOMBRE))
+        for advertencia in advertencias:
+            self.stdout.write(self.style.WARNING(f'Más lento/más memoria: {advertencia}'))
+        if regresiones:
+            raise CommandError('Regresión en consultas SQL:\n' + '\n'.join(regresiones))
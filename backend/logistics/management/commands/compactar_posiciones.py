@@ -0,0 +1,35 @@
+"""
+Reduce las posiciones GPS antiguas a trayectos diarios y aplica la retención
+de trayectos (ver logistics/posiciones.py).
+
+    python manage.py compactar_posiciones --dias 7 --intervalo 60 --retener-dias 365
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from logistics import posiciones
+
+
+class Command(BaseCommand):
+    help = 'Compacta las posiciones GPS de más de N días en trayectos y borra los trayectos vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=getattr(settings, 'POSICIONES_DETALLE_DIAS', 7),
+                            help='Días con todas las posiciones')
+        parser.add_argument('--intervalo', type=int, default=getattr(settings, 'POSICIONES_TRAYECTO_INTERVALO', 60),
+                            help='Segundos entre puntos de los trayectos')
+        parser.add_argument('--retener-dias', type=int, default=getattr(settings, 'POSICIONES_TRAYECTOS_DIAS', 365),
+                            help='Días que se conservan los trayectos')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre conductores')
+
+    def handle(self, *args, **options):
+        def progreso(conductor_id, cantidad, trayectos):
+            self.stdout.write(f'  conductor {conductor_id}: {cantidad} posiciones en {trayectos} trayectos')
+
+        cantidad, trayectos, borrados = posiciones.compactar(
+            dias=options['dias'], intervalo=options['intervalo'],
+            retener_dias=options['retener_dias'], pausa=options['pausa'], progreso=progreso,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Compactadas {cantidad} posiciones en {trayectos} trayectos; {borrados} trayectos vencidos borrados'
+        ))
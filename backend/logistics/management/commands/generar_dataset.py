@@ -0,0 +1,90 @@
+"""
+Genera un dataset sintético grande y reproducible para pruebas de rendimiento.
+
+Ejemplo (aprox. 10 millones de filas):
+    python manage.py generar_dataset --usuarios 200000 --conductores 5000 \
+        --productos 2000 --pedidos 1500000 --procesos 4
+"""
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from logistics import dataset
+
+
+_bloqueo_escritura = None
+
+
+def _inicializar_proceso(bloqueo):
+    global _bloqueo_escritura
+    _bloqueo_escritura = bloqueo
+    # Las conexiones heredadas del proceso padre no se pueden compartir
+    connections.close_all()
+
+
+def _generar_en_proceso(argumentos):
+    """Punto de entrada de cada proceso hijo"""
+    semilla, bloques, base, contexto = argumentos
+    try:
+        return dataset.generar_bloques(semilla, bloques, base, contexto, _bloqueo_escritura)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Genera un dataset sintético determinista (usuarios, conductores, productos, pedidos, envíos y seguimientos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador aleatorio')
+        parser.add_argument('--usuarios', type=int, default=1000, help='Cantidad de clientes')
+        parser.add_argument('--conductores', type=int, default=50, help='Cantidad de conductores (cada uno con vehículo)')
+        parser.add_argument('--productos', type=int, default=200, help='Cantidad de productos')
+        parser.add_argument('--carritos', type=int, default=0, help='Cantidad de clientes con carrito activo')
+        parser.add_argument('--pedidos', type=int, default=10000, help='Cantidad de pedidos (cada uno con items, envío y seguimientos)')
+        parser.add_argument('--dias', type=int, default=365, help='Rango de días hacia atrás para las fechas')
+        parser.add_argument('--lote', type=int, default=2000, help='Tamaño de lote para bulk_create')
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos en paralelo para generar pedidos')
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['productos'] < 1:
+            raise CommandError('Se requiere al menos un usuario y un producto')
+        if options['procesos'] < 1:
+            raise CommandError('--procesos debe ser mayor o igual a 1')
+
+        inicio = time.perf_counter()
+        base, contexto = dataset.preparar_dataset(
+            semilla=options['semilla'],
+            usuarios=options['usuarios'],
+            conductores=options['conductores'],
+            productos=options['productos'],
+            lote=options['lote'],
+            dias=options['dias'],
+            carritos=min(options['carritos'], options['usuarios']),
+            pedidos=options['pedidos'],
+        )
+        filas = contexto['filas']
+        self.stdout.write(f'Catálogo, clientes, conductores y carritos creados ({filas} filas)')
+
+        bloques = dataset.dividir_bloques(options['pedidos'])
+        procesos = min(options['procesos'], len(bloques)) or 1
+        if procesos == 1:
+            filas += dataset.generar_bloques(options['semilla'], bloques, base, contexto)
+        else:
+            # Reparto round-robin para equilibrar la carga entre procesos
+            repartos = [bloques[i::procesos] for i in range(procesos)]
+            # SQLite admite un solo escritor: se serializan las inserciones
+            ctx = multiprocessing.get_context('fork')
+            bloqueo = ctx.Lock() if connections['default'].vendor == 'sqlite' else None
+            connections.close_all()
+            with ctx.Pool(procesos, initializer=_inicializar_proceso, initargs=(bloqueo,)) as pool:
+                filas += sum(pool.map(
+                    _generar_en_proceso,
+                    [(options['semilla'], reparto, base, contexto) for reparto in repartos]
+                ))
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Dataset generado: {filas} filas en {duracion:.1f}s ({filas / duracion:,.0f} filas/s)'
+        ))
@@ -0,0 +1,29 @@
+"""
+Devuelve al stock disponible las reservas de carrito vencidas (ver
+logistics/reservas.py).
+
+    python manage.py liberar_reservas                 # una pasada (cron)
+    python manage.py liberar_reservas --intervalo 60  # en bucle cada 60 s
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from logistics import reservas
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock vencidas de los carritos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas por transacción')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Segundos entre pasadas; 0 hace una sola pasada')
+
+    def handle(self, *args, **options):
+        while True:
+            liberadas = reservas.liberar_vencidas(lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'Liberadas {liberadas} reservas vencidas'))
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,63 @@
+"""
+Ejecuta las tareas periódicas de mantenimiento (ver logistics/mantenimiento.py).
+
+    python manage.py mantenimiento                     # tareas vencidas, una pasada (cron cada minuto)
+    python manage.py mantenimiento --intervalo 60      # en bucle (proceso `mantenimiento` del Procfile)
+    python manage.py mantenimiento --tarea contactos --forzar
+    python manage.py mantenimiento --estado            # última ejecución de cada tarea
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logistics import mantenimiento
+from logistics.models import TareaMantenimiento
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas periódicas de mantenimiento (purga de códigos, tokens, carritos...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tarea', nargs='+', help='Solo estas tareas')
+        parser.add_argument('--forzar', action='store_true', help='Ejecutar aunque no estén vencidas')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Segundos entre pasadas; 0 hace una sola pasada')
+        parser.add_argument('--estado', action='store_true', help='Mostrar las tareas y su última ejecución')
+
+    def handle(self, *args, **options):
+        nombres = options['tarea']
+        desconocidas = set(nombres or []) - set(mantenimiento.TAREAS)
+        if desconocidas:
+            raise CommandError(f'Tareas desconocidas: {", ".join(sorted(desconocidas))}')
+
+        if options['estado']:
+            self.mostrar_estado()
+            return
+
+        while True:
+            resultados = mantenimiento.ejecutar_pendientes(nombres, forzar=options['forzar'])
+            for nombre, resultado in resultados.items():
+                if resultado['error']:
+                    self.stdout.write(self.style.ERROR(f'{nombre}: {resultado["error"]}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{nombre}: {resultado["procesados"]} registros en {resultado["duracion_ms"]} ms'
+                    ))
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
+
+    def mostrar_estado(self):
+        filas = {fila.nombre: fila for fila in TareaMantenimiento.objects.all()}
+        for nombre, tarea in mantenimiento.TAREAS.items():
+            fila = filas.get(nombre)
+            if fila is None or fila.ultima_ejecucion is None:
+                self.stdout.write(f'{nombre:<24} cada {tarea.intervalo_configurado()} s, sin ejecuciones')
+                continue
+            self.stdout.write(
+                f'{nombre:<24} cada {tarea.intervalo_configurado()} s, última {fila.ultima_ejecucion:%Y-%m-%d %H:%M:%S} '
+                f'({fila.procesados} registros, {fila.duracion_ms} ms, {fila.ejecuciones} ejecuciones, '
+                f'{fila.fallos} fallos), próxima {fila.proxima_ejecucion:%Y-%m-%d %H:%M:%S}'
+                + (f', bloqueada por {fila.nodo}' if fila.bloqueada_hasta else '')
+                + (f'\n    último error: {fila.error}' if fila.error else '')
+            )
@@ -0,0 +1,30 @@
+"""
+Estado de las réplicas de lectura (ver logistics/replicas.py).
+
+    REPLICAS_DB=/tmp/replica.sqlite3 python manage.py replicas
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from logistics import replicas
+
+
+class Command(BaseCommand):
+    help = 'Muestra el retraso de cada réplica de lectura y si se está usando'
+
+    def handle(self, *args, **options):
+        if not replicas.aliases():
+            self.stdout.write('Sin réplicas configuradas (REPLICAS_DB): todo se lee de la primaria')
+            return
+        maximo = getattr(settings, 'REPLICAS_RETRASO_MAXIMO', 5)
+        for alias in replicas.aliases():
+            estado = replicas.estado_replica(alias)
+            nombre = settings.DATABASES[alias]['NAME']
+            if estado.retraso is None:
+                self.stdout.write(self.style.ERROR(f'{alias} ({nombre}): no responde, se lee de la primaria'))
+            elif estado.disponible:
+                self.stdout.write(self.style.SUCCESS(f'{alias} ({nombre}): {estado.retraso:.1f} s de retraso, en uso'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'{alias} ({nombre}): {estado.retraso:.1f} s de retraso (máximo {maximo} s), se lee de la primaria'
+                ))
@@ -0,0 +1,32 @@
+"""
+Guarda snapshots del stock de los productos con movimientos nuevos en el
+libro de inventario (ver logistics/inventario.py).
+
+    python manage.py snapshot_stock             # cron, por ejemplo cada hora
+    python manage.py snapshot_stock --conciliar # además compara con Producto.stock
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from logistics import inventario
+
+
+class Command(BaseCommand):
+    help = 'Guarda snapshots de stock desde el libro de inventario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--margen', type=int, default=None,
+                            help='Segundos de movimientos recientes que se dejan para la próxima snapshot')
+        parser.add_argument('--conciliar', action='store_true',
+                            help='Verificar que Producto.stock coincida con el libro')
+
+    def handle(self, *args, **options):
+        creadas = inventario.tomar_snapshots(margen=options['margen'])
+        self.stdout.write(self.style.SUCCESS(f'{creadas} snapshots de stock guardadas'))
+
+        if options['conciliar']:
+            diferencias = inventario.conciliar()
+            for producto_id, registrado, derivado in diferencias:
+                self.stdout.write(f'  producto {producto_id}: stock {registrado}, libro {derivado}')
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} productos no coinciden con el libro de inventario')
+            self.stdout.write(self.style.SUCCESS('El stock coincide con el libro de inventario'))
@@ -0,0 +1,242 @@
+"""
+Tareas periódicas de mantenimiento (comando `mantenimiento`).
+
+Cada tarea se declara con @tarea(intervalo) y recibe una Ejecucion: borra en
+lotes de MANTENIMIENTO_LOTE filas con MANTENIMIENTO_PAUSA segundos entre
+lotes, para no retener el bloqueo de escritura de SQLite, y retorna cuántos
+registros procesó.
+
+Varios nodos pueden correr el comando a la vez: antes de ejecutar una tarea
+se toma su fila de TareaMantenimiento con un UPDATE condicional (vencida y sin
+bloqueo vigente), así que solo uno la ejecuta. El bloqueo dura
+MANTENIMIENTO_BLOQUEO_SEGUNDOS y se renueva en cada lote; si el proceso muere
+otro nodo la retoma cuando vence. La misma fila guarda las métricas de la
+última ejecución.
+"""
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from user_management.models import Carrito, CarritoItem, Contacto
+from . import admin_tablas, archivo, idempotencia, inventario, posiciones, reservas, sync
+from .log import get_logger
+from .models import PasswordResetCode, TareaMantenimiento
+
+
+log = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Tarea:
+    nombre: str
+    funcion: object
+    intervalo: int  # segundos entre ejecuciones
+
+    @property
+    def descripcion(self):
+        return (self.funcion.__doc__ or '').strip()
+
+    def intervalo_configurado(self):
+        return getattr(settings, 'MANTENIMIENTO_INTERVALOS', {}).get(self.nombre, self.intervalo)
+
+
+TAREAS = {}
+
+
+def tarea(intervalo):
+    """Registra la función como tarea periódica (MANTENIMIENTO_INTERVALOS cambia el intervalo)"""
+    def registrar(funcion):
+        TAREAS[funcion.__name__] = Tarea(funcion.__name__, funcion, intervalo)
+        return funcion
+    return registrar
+
+
+def nodo_actual():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _duracion_bloqueo():
+    return timedelta(seconds=getattr(settings, 'MANTENIMIENTO_BLOQUEO_SEGUNDOS', 900))
+
+
+class Ejecucion:
+    """Una ejecución de una tarea: lotes, pausas y renovación del bloqueo"""
+
+    def __init__(self, tarea, nodo):
+        self.tarea = tarea
+        self.nodo = nodo
+        self.lote = getattr(settings, 'MANTENIMIENTO_LOTE', 500)
+        self.pausa = getattr(settings, 'MANTENIMIENTO_PAUSA', 0.2)
+
+    def renovar(self):
+        TareaMantenimiento.objects.filter(nombre=self.tarea.nombre, nodo=self.nodo).update(
+            bloqueada_hasta=timezone.now() + _duracion_bloqueo()
+        )
+
+    def pausar(self):
+        if self.pausa:
+            time.sleep(self.pausa)
+        self.renovar()
+
+    def purgar(self, queryset):
+        """Borra las filas del queryset por lotes de ids. Retorna cuántas borró"""
+        total = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.lote])
+            if not ids:
+                return total
+            with transaction.atomic():
+                # delete() por modelo: emite las señales (caché de tokens, reservas)
+                queryset.model.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+            if len(ids) < self.lote:
+                return total
+            self.pausar()
+
+
+def tomar(tarea, nodo, forzar=False):
+    """Toma el bloqueo de la tarea si está vencida (o con forzar) y nadie la ejecuta"""
+    TareaMantenimiento.objects.get_or_create(nombre=tarea.nombre)
+    ahora = timezone.now()
+    filtro = Q(nombre=tarea.nombre) & (Q(bloqueada_hasta__isnull=True) | Q(bloqueada_hasta__lt=ahora))
+    if not forzar:
+        filtro &= Q(proxima_ejecucion__lte=ahora)
+    return TareaMantenimiento.objects.filter(filtro).update(
+        bloqueada_hasta=ahora + _duracion_bloqueo(), nodo=nodo,
+    ) == 1
+
+
+def ejecutar(tarea, nodo=None, forzar=False):
+    """
+    Ejecuta la tarea si este nodo toma el bloqueo. Retorna
+    {'procesados', 'duracion_ms', 'error'} o None si no le tocaba.
+    """
+    nodo = nodo or nodo_actual()
+    if not tomar(tarea, nodo, forzar):
+        return None
+
+    inicio = timezone.now()
+    reloj = time.perf_counter()
+    procesados, error = 0, ''
+    try:
+        procesados = tarea.funcion(Ejecucion(tarea, nodo)) or 0
+    except Exception as excepcion:
+        error = f'{type(excepcion).__name__}: {excepcion}'
+        log.exception('mantenimiento.error', tarea=tarea.nombre)
+    duracion_ms = round((time.perf_counter() - reloj) * 1000)
+
+    TareaMantenimiento.objects.filter(nombre=tarea.nombre, nodo=nodo).update(
+        bloqueada_hasta=None,
+        ultima_ejecucion=inicio,
+        proxima_ejecucion=inicio + timedelta(seconds=tarea.intervalo_configurado()),
+        duracion_ms=duracion_ms,
+        procesados=procesados,
+        error=error,
+        ejecuciones=F('ejecuciones') + 1,
+        fallos=F('fallos') + (1 if error else 0),
+    )
+    log.info('mantenimiento.tarea', tarea=tarea.nombre, procesados=procesados, duracion_ms=duracion_ms, error=bool(error))
+    return {'procesados': procesados, 'duracion_ms': duracion_ms, 'error': error}
+
+
+def ejecutar_pendientes(nombres=None, forzar=False, nodo=None):
+    """Ejecuta las tareas vencidas (o las indicadas). Retorna {nombre: resultado}"""
+    nodo = nodo or nodo_actual()
+    resultados = {}
+    for nombre in nombres or TAREAS:
+        resultado = ejecutar(TAREAS[nombre], nodo, forzar)
+        if resultado is not None:
+            resultados[nombre] = resultado
+    return resultados
+
+
+# Tareas
+
+@tarea(3600)
+def codigos_recuperacion(ejecucion):
+    """Códigos de recuperación de contraseña usados o vencidos"""
+    return ejecucion.purgar(PasswordResetCode.objects.filter(Q(used=True) | Q(expires_at__lt=timezone.now())))
+
+
+@tarea(3600)
+def tokens_inactivos(ejecucion):
+    """Tokens de usuarios desactivados"""
+    return ejecucion.purgar(Token.objects.filter(user__is_active=False))
+
+
+@tarea(86400)
+def carritos_inactivos(ejecucion):
+    """Carritos de usuarios desactivados y carritos vacíos sin cambios en MANTENIMIENTO_CARRITOS_DIAS"""
+    corte = timezone.now() - timedelta(days=getattr(settings, 'MANTENIMIENTO_CARRITOS_DIAS', 60))
+    vacio = ~Exists(CarritoItem.objects.filter(carrito=OuterRef('pk')))
+    return ejecucion.purgar(
+        Carrito.objects.filter(Q(usuario__is_active=False) | (vacio & Q(fecha_actualizacion__lt=corte)))
+    )
+
+
+@tarea(86400)
+def contactos(ejecucion):
+    """Mensajes de contacto leídos de hace más de MANTENIMIENTO_CONTACTOS_DIAS"""
+    corte = timezone.now() - timedelta(days=getattr(settings, 'MANTENIMIENTO_CONTACTOS_DIAS', 365))
+    return ejecucion.purgar(Contacto.objects.filter(leido=True, fecha_envio__lt=corte))
+
+
+@tarea(3600)
+def claves_idempotencia(ejecucion):
+    """Claves de Idempotency-Key vencidas"""
+    return ejecucion.purgar(idempotencia.vencidas())
+
+
+@tarea(86400)
+def cambios_sync(ejecucion):
+    """Cambios de sincronización de más de SYNC_RETENCION_DIAS"""
+    return ejecucion.purgar(sync.purgables())
+
+
+@tarea(60)
+def reservas_vencidas(ejecucion):
+    """Reservas de stock vencidas (vuelven al disponible)"""
+    return reservas.liberar_vencidas(lote=ejecucion.lote)
+
+
+@tarea(3600)
+def snapshots_stock(ejecucion):
+    """Snapshots del libro de inventario"""
+    return inventario.tomar_snapshots()
+
+
+@tarea(86400)
+def archivo_seguimientos(ejecucion):
+    """Archivo de seguimientos de envíos cerrados"""
+    _, eventos = archivo.archivar(pausa=ejecucion.pausa, progreso=lambda *_: ejecucion.renovar())
+    return eventos
+
+
+@tarea(86400)
+def compactar_posiciones(ejecucion):
+    """Compactación de posiciones GPS en trayectos"""
+    cantidad, _, _ = posiciones.compactar(pausa=ejecucion.pausa, progreso=lambda *_: ejecucion.renovar())
+    return cantidad
+
+
+@tarea(86400)
+def sesiones(ejecucion):
+    """Sesiones vencidas (no hace nada con el backend de caché)"""
+    import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+    return 0
+
+
+@tarea(86400)
+def estadisticas_tablas(ejecucion):
+    """Estadísticas del planificador (ANALYZE): índices y conteos aproximados del admin"""
+    admin_tablas.actualizar_estadisticas()
+    return 0
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:25
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+TAMANO_LOTE = 500
+
+
+def vincular_conductores(apps, schema_editor):
+    """Vincula cada conductor con el usuario de su mismo email, por lotes"""
+    Conductor = apps.get_model('logistics', 'Conductor')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    db_alias = schema_editor.connection.alias
+
+    ultimo_id = 0
+    while True:
+        with transaction.atomic(using=db_alias):
+            lote = list(
+                Conductor.objects.using(db_alias)
+                .filter(user__isnull=True, id__gt=ultimo_id)
+                .order_by('id')
+                .only('id', 'email')[:TAMANO_LOTE]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+
+            # Si hay varios usuarios con el mismo email se usa el más antiguo
+            usuarios = {}
+            for user_id, email in (
+                User.objects.using(db_alias)
+                .filter(email__in=[c.email for c in lote], conductor__isnull=True)
+                .order_by('-id')
+                .values_list('id', 'email')
+            ):
+                usuarios[email] = user_id
+
+            vinculados = []
+            for conductor in lote:
+                if conductor.email in usuarios:
+                    conductor.user_id = usuarios[conductor.email]
+                    vinculados.append(conductor)
+            Conductor.objects.using(db_alias).bulk_update(vinculados, ['user'])
+
+
+class Migration(migrations.Migration):
+    # Cada lote se confirma por separado para no bloquear la tabla entera
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('logistics', '0012_passwordresetcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conductor',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conductor', to=settings.AUTH_USER_MODEL, verbose_name='Usuario'),
+        ),
+        migrations.RunPython(vincular_conductores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0013_conductor_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RastreoPublico',
+            fields=[
+                ('numero_guia', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Número de Guía')),
+                ('documento', models.JSONField(verbose_name='Documento')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('envio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rastreo_publico', to='logistics.envio', verbose_name='Envío')),
+            ],
+            options={
+                'verbose_name': 'Rastreo Público',
+                'verbose_name_plural': 'Rastreos Públicos',
+            },
+        ),
+    ]
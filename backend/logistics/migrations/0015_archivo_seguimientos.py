@@ -0,0 +1,40 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0014_rastreopublico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueSeguimientoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.CharField(max_length=7, verbose_name='Mes')),
+                ('archivo', models.CharField(max_length=255, verbose_name='Archivo')),
+                ('offset', models.BigIntegerField(verbose_name='Posición')),
+                ('longitud', models.PositiveIntegerField(verbose_name='Longitud (bytes)')),
+                ('eventos', models.PositiveIntegerField(verbose_name='Eventos')),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Archivado')),
+            ],
+            options={
+                'verbose_name': 'Bloque de Seguimientos Archivado',
+                'verbose_name_plural': 'Bloques de Seguimientos Archivados',
+                'ordering': ['envio', 'mes'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='seguimientoenvio',
+            index=models.Index(fields=['envio', '-fecha_hora'], name='seguimiento_envio_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='bloqueseguimientoarchivado',
+            name='envio',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloques_archivados', to='logistics.envio', verbose_name='Envío'),
+        ),
+    ]
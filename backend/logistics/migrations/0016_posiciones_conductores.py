@@ -0,0 +1,59 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0015_archivo_seguimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionConductor',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('conductor_id', models.PositiveIntegerField(verbose_name='Conductor')),
+                ('envio_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Envío')),
+                ('latitud_e7', models.IntegerField(verbose_name='Latitud (grados x 10^7)')),
+                ('longitud_e7', models.IntegerField(verbose_name='Longitud (grados x 10^7)')),
+                ('velocidad_kmh', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Velocidad (km/h)')),
+                ('rumbo', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Rumbo (grados)')),
+                ('precision_m', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Precisión (m)')),
+                ('fecha_hora', models.DateTimeField(verbose_name='Fecha y Hora')),
+            ],
+            options={
+                'verbose_name': 'Posición de Conductor',
+                'verbose_name_plural': 'Posiciones de Conductores',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrayectoConductor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conductor_id', models.PositiveIntegerField(verbose_name='Conductor')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('intervalo', models.PositiveIntegerField(verbose_name='Intervalo (s)')),
+                ('puntos', models.BinaryField(verbose_name='Puntos')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad de Puntos')),
+            ],
+            options={
+                'verbose_name': 'Trayecto de Conductor',
+                'verbose_name_plural': 'Trayectos de Conductores',
+                'ordering': ['conductor_id', 'fecha'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trayectoconductor',
+            constraint=models.UniqueConstraint(fields=('conductor_id', 'fecha'), name='trayecto_conductor_fecha_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='posicionconductor',
+            index=models.Index(fields=['conductor_id', 'fecha_hora'], name='posicion_conductor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posicionconductor',
+            index=models.Index(fields=['fecha_hora'], name='posicion_fecha_idx'),
+        ),
+    ]
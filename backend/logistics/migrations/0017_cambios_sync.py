@@ -0,0 +1,32 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0016_posiciones_conductores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioSync',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('coleccion', models.CharField(max_length=20, verbose_name='Colección')),
+                ('objeto_id', models.PositiveIntegerField(verbose_name='Objeto')),
+                ('usuario_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Usuario')),
+                ('conductor_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Conductor')),
+                ('conductor_anterior_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Conductor Anterior')),
+                ('eliminado', models.BooleanField(default=False, verbose_name='Eliminado')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Cambio de Sincronización',
+                'verbose_name_plural': 'Cambios de Sincronización',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['coleccion', 'id'], name='cambio_sync_coleccion_idx'), models.Index(fields=['fecha'], name='cambio_sync_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:48
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0017_cambios_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usuario_id', models.PositiveIntegerField(verbose_name='Usuario')),
+                ('alcance', models.CharField(max_length=100, verbose_name='Método y Ruta')),
+                ('clave', models.CharField(max_length=255, verbose_name='Clave')),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella del Cuerpo')),
+                ('estado', models.CharField(choices=[('en_proceso', 'En Proceso'), ('completada', 'Completada')], default='en_proceso', max_length=20, verbose_name='Estado')),
+                ('codigo_respuesta', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código de Respuesta')),
+                ('respuesta', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Respuesta')),
+                ('fecha_creacion', models.DateTimeField(verbose_name='Fecha de Creación')),
+                ('expira', models.DateTimeField(verbose_name='Expira')),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+                'indexes': [models.Index(fields=['expira'], name='clave_idempotencia_expira_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('usuario_id', 'alcance', 'clave'), name='clave_idempotencia_unica'),
+        ),
+    ]
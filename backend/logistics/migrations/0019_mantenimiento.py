@@ -0,0 +1,43 @@
+# Generated by Django 4.2.24 on 2026-10-19 17:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0018_claves_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaMantenimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True, verbose_name='Tarea')),
+                ('proxima_ejecucion', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima Ejecución')),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Bloqueada Hasta')),
+                ('nodo', models.CharField(blank=True, max_length=100, verbose_name='Nodo')),
+                ('ultima_ejecucion', models.DateTimeField(blank=True, null=True, verbose_name='Última Ejecución')),
+                ('duracion_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Duración (ms)')),
+                ('procesados', models.PositiveIntegerField(default=0, verbose_name='Registros Procesados')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('ejecuciones', models.PositiveIntegerField(default=0, verbose_name='Ejecuciones')),
+                ('fallos', models.PositiveIntegerField(default=0, verbose_name='Fallos')),
+            ],
+            options={
+                'verbose_name': 'Tarea de Mantenimiento',
+                'verbose_name_plural': 'Tareas de Mantenimiento',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['email', 'code'], name='reset_code_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['expires_at'], name='reset_code_expira_idx'),
+        ),
+    ]
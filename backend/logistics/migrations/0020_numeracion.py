@@ -0,0 +1,26 @@
+# Generated by Django 4.2.24 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0019_mantenimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaNumeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=30, unique=True, verbose_name='Nombre')),
+                ('siguiente', models.BigIntegerField(default=1, verbose_name='Siguiente')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Numeración',
+                'verbose_name_plural': 'Secuencias de Numeración',
+                'ordering': ['nombre'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.24 on 2026-10-19 18:10
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def contar_archivados(apps, schema_editor):
+    """Eventos archivados de cada envío, a partir de sus bloques"""
+    Envio = apps.get_model('logistics', 'Envio')
+    BloqueSeguimientoArchivado = apps.get_model('logistics', 'BloqueSeguimientoArchivado')
+    db_alias = schema_editor.connection.alias
+
+    totales = (
+        BloqueSeguimientoArchivado.objects.using(db_alias)
+        .values('envio_id').annotate(total=Sum('eventos')).values_list('envio_id', 'total')
+    )
+    for envio_id, total in totales:
+        Envio.objects.using(db_alias).filter(id=envio_id).update(eventos_archivados=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0020_numeracion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='envio',
+            name='eventos_archivados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Eventos Archivados'),
+        ),
+        migrations.RunPython(contar_archivados, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import random
 import string
@@ -39,6 +40,7 @@ class Conductor(models.Model):
         ('inactivo', 'Inactivo'),
     ]
     
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='conductor', verbose_name="Usuario")
     nombres = models.CharField(max_length=100, blank=True, default='', verbose_name="Nombres")
     apellidos = models.CharField(max_length=100, blank=True, default='', verbose_name="Apellidos")
     cedula = models.CharField(max_length=20, unique=True, verbose_name="Cédula")
@@ -171,6 +173,9 @@ class Envio(models.Model):
     prioridad = models.CharField(max_length=20, choices=PRIORIDAD_CHOICES, default='media', verbose_name="Prioridad")
     
     observaciones = models.TextField(blank=True, verbose_name="Observaciones")
+    # Eventos de seguimiento movidos al archivo (logistics.archivo); con 0 no
+    # hace falta buscar sus bloques al leer la historia
+    eventos_archivados = models.PositiveIntegerField(default=0, editable=False, verbose_name="Eventos Archivados")
     
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
@@ -203,11 +208,224 @@ class SeguimientoEnvio(models.Model):
         verbose_name = "Seguimiento de Envío"
         verbose_name_plural = "Seguimientos de Envío"
         ordering = ['-fecha_hora']
+        indexes = [
+            # Línea de tiempo de un envío (ordering por -fecha_hora)
+            models.Index(fields=['envio', '-fecha_hora'], name='seguimiento_envio_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Seguimiento {self.envio.numero_guia} - {self.estado}"
 
 
+class BloqueSeguimientoArchivado(models.Model):
+    """
+    Índice del archivo de seguimientos (logistics.archivo): los eventos de un
+    envío en un mes, guardados como un miembro gzip independiente dentro del
+    archivo JSONL mensual, en la posición `offset` con `longitud` bytes.
+    """
+    envio = models.ForeignKey(Envio, on_delete=models.CASCADE, related_name='bloques_archivados', verbose_name="Envío")
+    mes = models.CharField(max_length=7, verbose_name="Mes")  # AAAA-MM
+    archivo = models.CharField(max_length=255, verbose_name="Archivo")
+    offset = models.BigIntegerField(verbose_name="Posición")
+    longitud = models.PositiveIntegerField(verbose_name="Longitud (bytes)")
+    eventos = models.PositiveIntegerField(verbose_name="Eventos")
+    fecha_archivado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Archivado")
+
+    class Meta:
+        verbose_name = "Bloque de Seguimientos Archivado"
+        verbose_name_plural = "Bloques de Seguimientos Archivados"
+        ordering = ['envio', 'mes']
+
+    def __str__(self):
+        return f"Archivo {self.archivo} - envío {self.envio_id} ({self.eventos} eventos)"
+
+
+class RastreoPublico(models.Model):
+    """
+    Documento de rastreo público de un envío (estado, ETA y últimos eventos),
+    mantenido por logistics.rastreo en la misma transacción que los cambios
+    del envío. Se consulta por número de guía sin joins ni serializers.
+    """
+    numero_guia = models.CharField(max_length=50, primary_key=True, verbose_name="Número de Guía")
+    envio = models.OneToOneField(Envio, on_delete=models.CASCADE, related_name='rastreo_publico', verbose_name="Envío")
+    documento = models.JSONField(verbose_name="Documento")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
+
+    class Meta:
+        verbose_name = "Rastreo Público"
+        verbose_name_plural = "Rastreos Públicos"
+
+    def __str__(self):
+        return f"Rastreo {self.numero_guia}"
+
+
+class PosicionConductor(models.Model):
+    """
+    Posición GPS reportada por un conductor. Tabla de solo inserción con
+    coordenadas en enteros (grados * 10^7, ~1 cm). Usa ids sueltos en lugar de
+    ForeignKey para poder vivir en otra base de datos (POSICIONES_DB).
+    """
+    id = models.BigAutoField(primary_key=True)
+    conductor_id = models.PositiveIntegerField(verbose_name="Conductor")
+    envio_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="Envío")
+    latitud_e7 = models.IntegerField(verbose_name="Latitud (grados x 10^7)")
+    longitud_e7 = models.IntegerField(verbose_name="Longitud (grados x 10^7)")
+    velocidad_kmh = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Velocidad (km/h)")
+    rumbo = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Rumbo (grados)")
+    precision_m = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Precisión (m)")
+    fecha_hora = models.DateTimeField(verbose_name="Fecha y Hora")
+
+    class Meta:
+        verbose_name = "Posición de Conductor"
+        verbose_name_plural = "Posiciones de Conductores"
+        indexes = [
+            models.Index(fields=['conductor_id', 'fecha_hora'], name='posicion_conductor_fecha_idx'),
+            models.Index(fields=['fecha_hora'], name='posicion_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conductor {self.conductor_id} ({self.latitud}, {self.longitud}) {self.fecha_hora}"
+
+    @property
+    def latitud(self):
+        return self.latitud_e7 / 10_000_000
+
+    @property
+    def longitud(self):
+        return self.longitud_e7 / 10_000_000
+
+
+class TrayectoConductor(models.Model):
+    """
+    Recorrido de un conductor en un día, reducido a una posición cada
+    `intervalo` segundos. Los puntos van en un arreglo binario de enteros
+    (segundo del día, latitud_e7, longitud_e7); ver logistics/posiciones.py.
+    """
+    conductor_id = models.PositiveIntegerField(verbose_name="Conductor")
+    fecha = models.DateField(verbose_name="Fecha")
+    intervalo = models.PositiveIntegerField(verbose_name="Intervalo (s)")
+    puntos = models.BinaryField(verbose_name="Puntos")
+    cantidad = models.PositiveIntegerField(verbose_name="Cantidad de Puntos")
+
+    class Meta:
+        verbose_name = "Trayecto de Conductor"
+        verbose_name_plural = "Trayectos de Conductores"
+        ordering = ['conductor_id', 'fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['conductor_id', 'fecha'], name='trayecto_conductor_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"Trayecto conductor {self.conductor_id} {self.fecha} ({self.cantidad} puntos)"
+
+
+class CambioSync(models.Model):
+    """
+    Registro de cambios para la sincronización incremental (logistics/sync.py).
+    El id autoincremental es la secuencia de cambios: los clientes guardan el
+    último id recibido por colección. usuario_id y conductor_id (y el conductor
+    anterior, si cambió) limitan qué clientes ven el cambio.
+    """
+    id = models.BigAutoField(primary_key=True)
+    coleccion = models.CharField(max_length=20, verbose_name="Colección")
+    objeto_id = models.PositiveIntegerField(verbose_name="Objeto")
+    usuario_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="Usuario")
+    conductor_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="Conductor")
+    conductor_anterior_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="Conductor Anterior")
+    eliminado = models.BooleanField(default=False, verbose_name="Eliminado")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Cambio de Sincronización"
+        verbose_name_plural = "Cambios de Sincronización"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['coleccion', 'id'], name='cambio_sync_coleccion_idx'),
+            models.Index(fields=['fecha'], name='cambio_sync_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.coleccion} {self.objeto_id}{' (eliminado)' if self.eliminado else ''}"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Petición de creación identificada por la cabecera Idempotency-Key
+    (logistics/idempotencia.py): huella del cuerpo y respuesta guardada para
+    devolverla en los reintentos sin volver a ejecutar la vista.
+    """
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En Proceso'),
+        ('completada', 'Completada'),
+    ]
+
+    usuario_id = models.PositiveIntegerField(verbose_name="Usuario")
+    alcance = models.CharField(max_length=100, verbose_name="Método y Ruta")
+    clave = models.CharField(max_length=255, verbose_name="Clave")
+    huella = models.CharField(max_length=64, verbose_name="Huella del Cuerpo")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_proceso', verbose_name="Estado")
+    codigo_respuesta = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Código de Respuesta")
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="Respuesta")
+    fecha_creacion = models.DateTimeField(verbose_name="Fecha de Creación")
+    expira = models.DateTimeField(verbose_name="Expira")
+
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+        constraints = [
+            models.UniqueConstraint(fields=['usuario_id', 'alcance', 'clave'], name='clave_idempotencia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['expira'], name='clave_idempotencia_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.alcance} {self.clave} ({self.get_estado_display()})"
+
+
+class TareaMantenimiento(models.Model):
+    """
+    Estado de una tarea periódica de logistics/mantenimiento.py: el bloqueo
+    (bloqueada_hasta, nodo) que asegura que un solo proceso la ejecute, la
+    próxima ejecución y las métricas de la última.
+    """
+    nombre = models.CharField(max_length=50, unique=True, verbose_name="Tarea")
+    proxima_ejecucion = models.DateTimeField(default=timezone.now, verbose_name="Próxima Ejecución")
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True, verbose_name="Bloqueada Hasta")
+    nodo = models.CharField(max_length=100, blank=True, verbose_name="Nodo")
+    ultima_ejecucion = models.DateTimeField(null=True, blank=True, verbose_name="Última Ejecución")
+    duracion_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name="Duración (ms)")
+    procesados = models.PositiveIntegerField(default=0, verbose_name="Registros Procesados")
+    error = models.TextField(blank=True, verbose_name="Error")
+    ejecuciones = models.PositiveIntegerField(default=0, verbose_name="Ejecuciones")
+    fallos = models.PositiveIntegerField(default=0, verbose_name="Fallos")
+
+    class Meta:
+        verbose_name = "Tarea de Mantenimiento"
+        verbose_name_plural = "Tareas de Mantenimiento"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class SecuenciaNumeracion(models.Model):
+    """
+    Siguiente número libre de cada secuencia de logistics/numeracion.py
+    (pedidos y guías). Los procesos reservan bloques sumando a `siguiente`.
+    """
+    nombre = models.CharField(max_length=30, unique=True, verbose_name="Nombre")
+    siguiente = models.BigIntegerField(default=1, verbose_name="Siguiente")
+
+    class Meta:
+        verbose_name = "Secuencia de Numeración"
+        verbose_name_plural = "Secuencias de Numeración"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return f"{self.nombre}: {self.siguiente}"
+
+
 # ELIMINADO: PedidoTransporte se unificó con Pedido en user_management
 # Los pedidos de productos electrodomésticos usan el modelo Pedido
 # Los envíos de logística usan el modelo Envio
@@ -225,6 +443,10 @@ class PasswordResetCode(models.Model):
         verbose_name = "Código de Recuperación"
         verbose_name_plural = "Códigos de Recuperación"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['email', 'code'], name='reset_code_email_idx'),
+            models.Index(fields=['expires_at'], name='reset_code_expira_idx'),
+        ]
     
     def __str__(self):
         return f"{self.email} - {self.code}"
@@ -0,0 +1,122 @@
+"""
+Números de pedido y de guía: PED-0000001234-5 y ENV-0000001234-5.
+
+Cada número sale de una secuencia (SecuenciaNumeracion) y termina en un
+dígito verificador de Luhn, que detecta un dígito mal copiado y casi todos
+los intercambios de dos dígitos vecinos. Los números nuevos no chocan con los
+antiguos (PED-1A2B3C4D, GEN-...), que siguen siendo válidos.
+
+Cada proceso reserva bloques de NUMERACION_BLOQUE números en una transacción
+corta (un UPDATE sobre la fila de la secuencia) y los entrega desde memoria.
+Los números crecen dentro de cada proceso, nunca se repiten y pueden quedar
+huecos (bloques sin terminar al reiniciar, pedidos que fallan).
+
+Fuera de una transacción (como en el checkout, que toma sus números antes
+de abrir la suya) la reserva confirma al instante y el sobrante del bloque
+pasa a memoria en el acto. Si se piden números dentro de una transacción y el
+bloque en memoria no alcanza, la reserva queda dentro de esa transacción y
+mantiene bloqueada la fila de la secuencia hasta que termine: el sobrante
+solo pasa a memoria cuando confirma (on_commit), porque con un rollback otro
+proceso podría reservar los mismos números. reservar() entrega de una vez un
+rango grande para importaciones masivas.
+"""
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import SecuenciaNumeracion
+
+
+SECUENCIAS = {'pedido': 'PED', 'guia': 'ENV'}
+DIGITOS = 10
+FORMATO = re.compile(r'^(?:%s)-(\d{%d})-(\d)$' % ('|'.join(SECUENCIAS.values()), DIGITOS))
+
+
+def digito_verificador(numero):
+    """Dígito de Luhn de un número entero positivo"""
+    total = 0
+    for posicion, digito in enumerate(reversed(str(numero))):
+        valor = int(digito)
+        if posicion % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        total += valor
+    return (10 - total % 10) % 10
+
+
+def formatear(secuencia, numero):
+    return f'{SECUENCIAS[secuencia]}-{numero:0{DIGITOS}d}-{digito_verificador(numero)}'
+
+
+def verificador_correcto(texto):
+    """False solo si el texto tiene el formato de la numeración y su dígito verificador no coincide"""
+    coincide = FORMATO.match(texto)
+    return coincide is None or digito_verificador(int(coincide[1])) == int(coincide[2])
+
+
+def _tamano_bloque():
+    return getattr(settings, 'NUMERACION_BLOQUE', 100)
+
+
+def reservar(secuencia, cantidad):
+    """Reserva `cantidad` números consecutivos en la base de datos. Retorna el range"""
+    if secuencia not in SECUENCIAS:
+        raise ValueError(f'Secuencia desconocida: {secuencia}')
+    with transaction.atomic():
+        # El UPDATE primero: toma el bloqueo de la fila (o de escritura en SQLite) antes de leer
+        filas = SecuenciaNumeracion.objects.filter(nombre=secuencia).update(siguiente=F('siguiente') + cantidad)
+        if not filas:
+            SecuenciaNumeracion.objects.get_or_create(nombre=secuencia)
+            SecuenciaNumeracion.objects.filter(nombre=secuencia).update(siguiente=F('siguiente') + cantidad)
+        fin = SecuenciaNumeracion.objects.filter(nombre=secuencia).values_list('siguiente', flat=True).get()
+    return range(fin - cantidad, fin)
+
+
+# Bloques en memoria: {secuencia: (pid, range)}. El pid descarta los heredados de un fork
+_bloques = {}
+_bloqueo = threading.Lock()
+
+
+def _guardar_sobrante(secuencia, sobrante):
+    with _bloqueo:
+        pid, actual = _bloques.get(secuencia, (None, range(0)))
+        if pid == os.getpid() and actual:
+            # Otro hilo ya guardó su sobrante: este queda como hueco
+            return
+        _bloques[secuencia] = (os.getpid(), sobrante)
+
+
+def _tomar(secuencia, cantidad):
+    with _bloqueo:
+        pid, bloque = _bloques.get(secuencia, (None, range(0)))
+        if pid != os.getpid():
+            bloque = range(0)
+        tomados = bloque[:cantidad]
+        _bloques[secuencia] = (os.getpid(), bloque[cantidad:])
+    return list(tomados)
+
+
+def siguientes(secuencia, cantidad=1):
+    """`cantidad` números formateados de la secuencia, en orden"""
+    numeros = _tomar(secuencia, cantidad)
+    faltan = cantidad - len(numeros)
+    if faltan:
+        bloque = _tamano_bloque()
+        rango = reservar(secuencia, -(-faltan // bloque) * bloque)
+        numeros += list(rango[:faltan])
+        sobrante = rango[faltan:]
+        if sobrante and transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: _guardar_sobrante(secuencia, sobrante))
+        elif sobrante:
+            # La reserva ya confirmó
+            _guardar_sobrante(secuencia, sobrante)
+    return [formatear(secuencia, numero) for numero in numeros]
+
+
+def siguiente(secuencia):
+    return siguientes(secuencia, 1)[0]
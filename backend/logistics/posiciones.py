@@ -0,0 +1,358 @@
+"""
+Posiciones GPS de los conductores.
+
+Ingreso: POST /api/posiciones/ recibe muchas posiciones por petición. Se
+validan sin serializers, se guarda la última de cada conductor en caché
+(consulta en vivo) y se acumulan en un buffer en memoria del proceso, que se
+escribe con bulk_create cuando llega a POSICIONES_BUFFER_MAXIMO o cada
+POSICIONES_BUFFER_SEGUNDOS. Si el proceso muere se pierde a lo sumo ese
+intervalo de posiciones; con POSICIONES_BUFFER_SEGUNDOS = 0 se escriben en la
+misma petición. Si la escritura falla el lote vuelve al buffer y se reintenta
+en el siguiente intervalo; pasado POSICIONES_BUFFER_LIMITE se descartan las
+más antiguas y se cuentan en buffer.descartadas (y en el log).
+
+La última posición de cada conductor se guarda con la fecha en UTC y se
+compara como fecha, así que los dispositivos con distinto huso horario no
+reemplazan una posición nueva por una anterior.
+
+Retención: compactar() reduce las posiciones de más de POSICIONES_DETALLE_DIAS
+días a un TrayectoConductor por conductor y día (una posición cada
+`intervalo` segundos en un arreglo binario) y borra los trayectos de más de
+POSICIONES_TRAYECTOS_DIAS días.
+"""
+import atexit
+import sys
+import threading
+import time
+from array import array
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .log import get_logger
+from .models import PosicionConductor, TrayectoConductor
+from .routers import alias_posiciones
+
+
+log = get_logger(__name__)
+
+ESCALA = 10_000_000
+
+# Posiciones con fecha más adelantada que esto (reloj del dispositivo) se rechazan
+TOLERANCIA_FUTURO = timedelta(minutes=5)
+
+
+def escalar(grados):
+    return round(grados * ESCALA)
+
+
+def _cache():
+    return caches[getattr(settings, 'POSICIONES_CACHE_ALIAS', 'default')]
+
+
+def clave_cache(conductor_id):
+    return f'posicion:{conductor_id}'
+
+
+# Validación
+
+def _numero(valor, minimo, maximo, requerido=True):
+    if valor is None and not requerido:
+        return None
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not minimo <= valor <= maximo:
+        raise ValueError
+    return valor
+
+
+def parsear(datos, conductor_id, ahora=None):
+    """
+    Convierte una posición del cliente en PosicionConductor (sin guardar).
+    Lanza ValueError con el motivo si no es válida.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError('Formato inválido')
+    ahora = ahora or timezone.now()
+    try:
+        latitud = _numero(datos.get('lat'), -90, 90)
+        longitud = _numero(datos.get('lon'), -180, 180)
+    except ValueError:
+        raise ValueError('Coordenadas inválidas')
+
+    fecha_hora = parse_datetime(datos['fecha_hora']) if isinstance(datos.get('fecha_hora'), str) else None
+    if fecha_hora is None:
+        raise ValueError('fecha_hora inválida')
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    if fecha_hora > ahora + TOLERANCIA_FUTURO:
+        raise ValueError('fecha_hora en el futuro')
+
+    try:
+        velocidad = _numero(datos.get('velocidad'), 0, 400, requerido=False)
+        rumbo = _numero(datos.get('rumbo'), 0, 360, requerido=False)
+        precision = _numero(datos.get('precision'), 0, 10000, requerido=False)
+        envio_id = _numero(datos.get('envio'), 1, 2 ** 31 - 1, requerido=False)
+    except ValueError:
+        raise ValueError('Campo opcional inválido')
+
+    return PosicionConductor(
+        conductor_id=conductor_id,
+        envio_id=int(envio_id) if envio_id is not None else None,
+        latitud_e7=escalar(latitud),
+        longitud_e7=escalar(longitud),
+        velocidad_kmh=round(velocidad) if velocidad is not None else None,
+        rumbo=round(rumbo) % 360 if rumbo is not None else None,
+        precision_m=round(precision) if precision is not None else None,
+        fecha_hora=fecha_hora,
+    )
+
+
+# Última posición (en vivo)
+
+def _documento(posicion):
+    return {
+        'conductor_id': posicion.conductor_id,
+        'envio_id': posicion.envio_id,
+        'lat': posicion.latitud,
+        'lon': posicion.longitud,
+        'velocidad': posicion.velocidad_kmh,
+        'rumbo': posicion.rumbo,
+        'fecha_hora': posicion.fecha_hora.astimezone(dt_timezone.utc).isoformat(),
+    }
+
+
+def _guardar_ultimas(posiciones):
+    ultimas = {}
+    for posicion in posiciones:
+        actual = ultimas.get(posicion.conductor_id)
+        if actual is None or posicion.fecha_hora >= actual.fecha_hora:
+            ultimas[posicion.conductor_id] = posicion
+    cache = _cache()
+    claves = [clave_cache(conductor_id) for conductor_id in ultimas]
+    anteriores = cache.get_many(claves)
+    nuevas = {}
+    for conductor_id, posicion in ultimas.items():
+        documento = _documento(posicion)
+        anterior = anteriores.get(clave_cache(conductor_id))
+        # Las posiciones atrasadas (reenvíos sin conexión) no reemplazan a la última
+        if anterior is None or parse_datetime(anterior['fecha_hora']) <= posicion.fecha_hora:
+            nuevas[clave_cache(conductor_id)] = documento
+    cache.set_many(nuevas, getattr(settings, 'POSICIONES_ULTIMA_TTL', 600))
+
+
+def ultima_posicion(conductor_id):
+    """Última posición conocida de un conductor, o None"""
+    documento = _cache().get(clave_cache(conductor_id))
+    if documento is not None:
+        return documento
+    posicion = (
+        PosicionConductor.objects.filter(conductor_id=conductor_id)
+        .order_by('-fecha_hora').first()
+    )
+    return _documento(posicion) if posicion else None
+
+
+# Buffer
+
+class BufferPosiciones:
+    """Acumula posiciones en memoria y las escribe por lotes"""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._pendientes = []
+        self._temporizador = None
+        # Escrituras fallidas y posiciones descartadas desde que arrancó el proceso
+        self.fallos = 0
+        self.descartadas = 0
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def _programar(self, segundos):
+        # Con el bloqueo tomado
+        if self._temporizador is None:
+            self._temporizador = threading.Timer(segundos, self._vaciar_en_hilo)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def agregar(self, posiciones):
+        maximo = getattr(settings, 'POSICIONES_BUFFER_MAXIMO', 5000)
+        segundos = getattr(settings, 'POSICIONES_BUFFER_SEGUNDOS', 2)
+        with self._bloqueo:
+            self._pendientes.extend(posiciones)
+            lleno = len(self._pendientes) >= maximo or not segundos
+            if not lleno:
+                self._programar(segundos)
+        if lleno:
+            # Sin buffer (segundos = 0) el error llega a la petición, que el cliente reintenta
+            self.vaciar(reintentar=bool(segundos))
+
+    def vaciar(self, reintentar=False):
+        """
+        Escribe lo pendiente. Retorna la cantidad de posiciones escritas. Si
+        falla y `reintentar`, el lote vuelve al buffer en vez de propagar el error
+        """
+        with self._bloqueo:
+            lote, self._pendientes = self._pendientes, []
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+        if not lote:
+            return 0
+        try:
+            PosicionConductor.objects.bulk_create(lote, batch_size=getattr(settings, 'POSICIONES_LOTE_ESCRITURA', 1000))
+        except Exception:
+            self.fallos += 1
+            log.exception('posiciones.error_escritura', posiciones=len(lote), reintentar=reintentar)
+            if not reintentar:
+                raise
+            self._devolver(lote)
+            return 0
+        return len(lote)
+
+    def _devolver(self, lote):
+        """Vuelve a encolar un lote que no se pudo escribir, antes de lo que llegó después"""
+        limite = getattr(settings, 'POSICIONES_BUFFER_LIMITE', 50000)
+        with self._bloqueo:
+            pendientes = lote + self._pendientes
+            sobran = max(len(pendientes) - limite, 0)
+            self._pendientes = pendientes[sobran:]
+            self.descartadas += sobran
+            self._programar(getattr(settings, 'POSICIONES_BUFFER_SEGUNDOS', 2) or 1)
+        if sobran:
+            log.error('posiciones.descartadas', posiciones=sobran, total=self.descartadas)
+
+    def _vaciar_en_hilo(self):
+        with self._bloqueo:
+            self._temporizador = None
+        try:
+            self.vaciar(reintentar=True)
+        finally:
+            # Las conexiones son por hilo: cerrar las que abrió el temporizador
+            connections.close_all()
+
+
+buffer = BufferPosiciones()
+atexit.register(buffer.vaciar)
+
+
+def registrar(posiciones):
+    """Punto de entrada del ingreso: última posición en caché + buffer"""
+    if not posiciones:
+        return
+    _guardar_ultimas(posiciones)
+    buffer.agregar(posiciones)
+
+
+# Trayectos (arreglo de enteros little-endian: segundo del día, lat, lon)
+
+def codificar(puntos):
+    datos = array('i', [valor for punto in puntos for valor in punto])
+    if sys.byteorder == 'big':
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def decodificar(binario):
+    datos = array('i')
+    datos.frombytes(bytes(binario))
+    if sys.byteorder == 'big':
+        datos.byteswap()
+    return [tuple(datos[i:i + 3]) for i in range(0, len(datos), 3)]
+
+
+def reducir(puntos, intervalo):
+    """Primer punto de cada intervalo de `intervalo` segundos (puntos ordenados)"""
+    reducidos = []
+    ultimo_bloque = None
+    for punto in puntos:
+        bloque = punto[0] // intervalo
+        if bloque != ultimo_bloque:
+            reducidos.append(punto)
+            ultimo_bloque = bloque
+    return reducidos
+
+
+def _segundo_del_dia(fecha_hora):
+    local = timezone.localtime(fecha_hora)
+    return local.date(), local.hour * 3600 + local.minute * 60 + local.second
+
+
+def compactar_conductor(conductor_id, corte, intervalo):
+    """
+    Pasa a trayectos las posiciones del conductor anteriores a `corte`.
+    Retorna (posiciones, trayectos).
+    """
+    alias = alias_posiciones()
+    filas = list(
+        PosicionConductor.objects.filter(conductor_id=conductor_id, fecha_hora__lt=corte)
+        .order_by('fecha_hora', 'id').values_list('id', 'fecha_hora', 'latitud_e7', 'longitud_e7')
+    )
+    if not filas:
+        return 0, 0
+
+    por_dia = {}
+    for _, fecha_hora, latitud, longitud in filas:
+        dia, segundo = _segundo_del_dia(fecha_hora)
+        por_dia.setdefault(dia, []).append((segundo, latitud, longitud))
+
+    with transaction.atomic(using=alias):
+        existentes = {
+            trayecto.fecha: trayecto
+            for trayecto in TrayectoConductor.objects.filter(conductor_id=conductor_id, fecha__in=list(por_dia))
+        }
+        for dia, puntos in por_dia.items():
+            trayecto = existentes.get(dia)
+            if trayecto is not None:
+                # Posiciones que llegaron tarde para un día ya compactado
+                puntos = sorted(decodificar(trayecto.puntos) + puntos)
+            puntos = reducir(puntos, intervalo)
+            TrayectoConductor.objects.update_or_create(
+                conductor_id=conductor_id, fecha=dia,
+                defaults={'intervalo': intervalo, 'puntos': codificar(puntos), 'cantidad': len(puntos)},
+            )
+        # Solo las filas leídas: las que lleguen mientras tanto quedan para la próxima vez
+        PosicionConductor.objects.filter(
+            conductor_id=conductor_id, fecha_hora__lt=corte, id__lte=max(fila[0] for fila in filas),
+        ).delete()
+    return len(filas), len(por_dia)
+
+
+def compactar(dias=None, intervalo=None, retener_dias=None, pausa=0, progreso=None):
+    """
+    Compacta las posiciones de más de `dias` días y borra los trayectos de más
+    de `retener_dias`. Retorna (posiciones, trayectos, trayectos_borrados).
+    """
+    if dias is None:
+        dias = getattr(settings, 'POSICIONES_DETALLE_DIAS', 7)
+    if intervalo is None:
+        intervalo = getattr(settings, 'POSICIONES_TRAYECTO_INTERVALO', 60)
+    if retener_dias is None:
+        retener_dias = getattr(settings, 'POSICIONES_TRAYECTOS_DIAS', 365)
+
+    # Días completos: el corte es la medianoche local
+    hoy = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    corte = hoy - timedelta(days=dias)
+
+    total_posiciones = total_trayectos = 0
+    conductores = (
+        PosicionConductor.objects.filter(fecha_hora__lt=corte)
+        .order_by('conductor_id').values_list('conductor_id', flat=True).distinct()
+    )
+    for conductor_id in list(conductores):
+        posiciones, trayectos = compactar_conductor(conductor_id, corte, intervalo)
+        total_posiciones += posiciones
+        total_trayectos += trayectos
+        log.info('posiciones.compactado', conductor=conductor_id, posiciones=posiciones, trayectos=trayectos)
+        if progreso:
+            progreso(conductor_id, posiciones, trayectos)
+        if pausa:
+            time.sleep(pausa)
+
+    borrados, _ = TrayectoConductor.objects.filter(
+        fecha__lt=(hoy - timedelta(days=retener_dias)).date(),
+    ).delete()
+    return total_posiciones, total_trayectos, borrados
@@ -0,0 +1,101 @@
+"""
+Principal de la petición: identidad, rol, perfil, conductor y admin del
+usuario autenticado, cargados en una sola consulta con JOIN.
+
+La autenticación por token (logistics.authentication) guarda en caché solo
+sus campos (datos()); el perfil, conductor y admin de un principal que viene
+de la caché se consultan la primera vez que se usan. Para otros métodos de
+autenticación se calcula una vez por petición y queda memorizado en
+request.user.
+"""
+from dataclasses import dataclass, field, fields
+from typing import Optional
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+
+
+# Relaciones uno a uno de User que forman el principal
+RELACIONES = ('userprofile', 'conductor', 'admin')
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    role: str
+    conductor_id: Optional[int]
+    is_admin: bool
+    profile_id: Optional[int] = None
+    admin_id: Optional[int] = None
+    # {relación: instancia} ya cargadas; las demás se consultan al usarlas
+    cargados: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def profile(self):
+        return self._relacionado('userprofile', self.profile_id)
+
+    @property
+    def conductor(self):
+        return self._relacionado('conductor', self.conductor_id)
+
+    @property
+    def admin(self):
+        return self._relacionado('admin', self.admin_id)
+
+    def _relacionado(self, nombre, pk):
+        if nombre not in self.cargados:
+            modelo = User._meta.get_field(nombre).related_model
+            self.cargados[nombre] = None if pk is None else modelo.objects.filter(pk=pk).first()
+        return self.cargados[nombre]
+
+    def datos(self):
+        """Campos del principal sin las instancias cargadas (lo que va a la caché)"""
+        return {campo.name: getattr(self, campo.name) for campo in fields(self) if campo.name != 'cargados'}
+
+
+def _relacionado(user, nombre):
+    try:
+        return getattr(user, nombre)
+    except ObjectDoesNotExist:
+        return None
+
+
+def _relaciones_cargadas(user):
+    return all(user._meta.get_field(nombre).is_cached(user) for nombre in RELACIONES)
+
+
+def cargar_principal(user):
+    """
+    Construye el principal de un usuario. Si sus relaciones no vienen ya
+    cargadas (select_related), las trae en una sola consulta.
+    """
+    if not _relaciones_cargadas(user):
+        cargado = User.objects.select_related(*RELACIONES).get(pk=user.pk)
+        for nombre in RELACIONES:
+            campo = user._meta.get_field(nombre)
+            campo.set_cached_value(user, campo.get_cached_value(cargado))
+
+    profile = _relacionado(user, 'userprofile')
+    conductor = _relacionado(user, 'conductor')
+    admin = _relacionado(user, 'admin')
+    # Sin perfil se trata como cliente (igual que antes de existir el principal)
+    role = profile.role if profile else 'customer'
+
+    return Principal(
+        user_id=user.id,
+        role=role,
+        conductor_id=conductor.id if conductor else None,
+        is_admin=role == 'admin',
+        profile_id=profile.id if profile else None,
+        admin_id=admin.pk if admin else None,
+        cargados={'userprofile': profile, 'conductor': conductor, 'admin': admin},
+    )
+
+
+def principal_de(user):
+    """Principal del usuario, calculándolo una sola vez por instancia"""
+    principal = getattr(user, 'principal', None)
+    if principal is None:
+        principal = cargar_principal(user)
+        user.principal = principal
+    return principal
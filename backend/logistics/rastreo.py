@@ -0,0 +1,179 @@
+"""
+Modelo de lectura para el rastreo público de envíos.
+
+Cada envío tiene un documento compacto en RastreoPublico (clave: número de
+guía) con el estado actual, la ETA y los últimos RASTREO_EVENTOS eventos.
+Las vistas que cambian un envío lo actualizan en su misma transacción y, al
+confirmarse, lo copian a la caché; la consulta pública lee primero la caché,
+luego la fila por clave primaria, y solo si el documento no existe (envíos
+anteriores a este modelo) lo construye desde Envio. Ese documento solo va a
+la caché: las consultas no escriben en la base de datos, la próxima escritura
+del envío guarda el suyo.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import archivo, numeracion
+from .models import Envio, RastreoPublico
+
+
+# Documento vacío en caché para guías inexistentes (evita consultas repetidas)
+NO_ENCONTRADO = {}
+
+
+def eventos_publicos():
+    return getattr(settings, 'RASTREO_EVENTOS', 10)
+
+
+def _cache():
+    return caches[getattr(settings, 'RASTREO_CACHE_ALIAS', 'default')]
+
+
+def clave_cache(numero_guia):
+    return f'rastreo:{numero_guia}'
+
+
+def _fecha(valor):
+    return valor.isoformat() if valor else None
+
+
+def evento(seguimiento):
+    return {
+        'estado': seguimiento.estado,
+        'descripcion': seguimiento.descripcion,
+        'ubicacion': seguimiento.ubicacion,
+        'fecha_hora': _fecha(seguimiento.fecha_hora),
+    }
+
+
+def documento_base(envio):
+    """Datos públicos del envío (sin datos del cliente ni de contacto)"""
+    entregado = envio.estado == 'entregado'
+    return {
+        'numero_guia': envio.numero_guia,
+        'estado': envio.estado,
+        'estado_display': envio.get_estado_display(),
+        'prioridad': envio.prioridad,
+        'origen': envio.origen,
+        'destino': envio.destino,
+        'fecha_recogida_programada': _fecha(envio.fecha_recogida_programada),
+        'fecha_entrega_programada': _fecha(envio.fecha_entrega_programada),
+        'fecha_recogida_real': _fecha(envio.fecha_recogida_real),
+        'fecha_entrega_real': _fecha(envio.fecha_entrega_real),
+        'eta': _fecha(envio.fecha_entrega_real if entregado else envio.fecha_entrega_programada),
+        'actualizado': _fecha(timezone.now()),
+    }
+
+
+def construir_documento(envio):
+    """Documento completo, con los últimos eventos del envío (incluso archivados)"""
+    documento = documento_base(envio)
+    documento['eventos'] = [evento(s) for s in archivo.eventos(envio)[:eventos_publicos()]]
+    return documento
+
+
+def _publicar(numero_guia, documento):
+    """Copia el documento a la caché cuando se confirme la transacción"""
+    timeout = getattr(settings, 'RASTREO_CACHE_TTL', 300)
+    transaction.on_commit(lambda: _cache().set(clave_cache(numero_guia), documento, timeout))
+
+
+def _guardar(envio, documento):
+    RastreoPublico.objects.update_or_create(
+        numero_guia=envio.numero_guia, defaults={'envio': envio, 'documento': documento},
+    )
+    _publicar(envio.numero_guia, documento)
+
+
+def registrar_evento(envio, seguimiento):
+    """
+    Agrega un evento al documento del envío reutilizando los eventos ya
+    guardados (sin volver a consultar los seguimientos).
+    """
+    anterior = (
+        RastreoPublico.objects.filter(numero_guia=envio.numero_guia)
+        .values_list('documento', flat=True).first()
+    )
+    if anterior is None:
+        documento = construir_documento(envio)
+    else:
+        documento = documento_base(envio)
+        documento['eventos'] = [evento(seguimiento), *anterior.get('eventos', [])][:eventos_publicos()]
+    _guardar(envio, documento)
+    return documento
+
+
+def registrar_eventos_lote(eventos_por_envio):
+    """
+    Versión por lotes de registrar_evento: {envio: seguimiento}. Actualiza los
+    documentos existentes con un solo bulk_update; los envíos que aún no
+    tienen documento lo construirán al consultarse.
+    """
+    envios = {envio.id: envio for envio in eventos_por_envio}
+    existentes = list(RastreoPublico.objects.filter(envio_id__in=list(envios)))
+    ahora = timezone.now()
+    for rastreo in existentes:
+        envio = envios[rastreo.envio_id]
+        documento = documento_base(envio)
+        documento['eventos'] = [
+            evento(eventos_por_envio[envio]), *rastreo.documento.get('eventos', []),
+        ][:eventos_publicos()]
+        rastreo.documento = documento
+        # bulk_update no aplica auto_now
+        rastreo.fecha_actualizacion = ahora
+    RastreoPublico.objects.bulk_update(existentes, ['documento', 'fecha_actualizacion'])
+
+    documentos = {clave_cache(r.numero_guia): r.documento for r in existentes}
+    # Los que no tienen documento salen de la caché (podían estar como no encontrados)
+    sin_documento = [
+        clave_cache(envio.numero_guia) for envio in envios.values()
+        if clave_cache(envio.numero_guia) not in documentos
+    ]
+
+    def publicar():
+        cache = _cache()
+        cache.set_many(documentos, getattr(settings, 'RASTREO_CACHE_TTL', 300))
+        cache.delete_many(sin_documento)
+    transaction.on_commit(publicar)
+
+
+def reconstruir(envio):
+    """Reconstruye el documento (creación o edición del envío o de sus eventos)"""
+    # Si cambió el número de guía, el documento anterior queda con otra clave
+    RastreoPublico.objects.filter(envio=envio).exclude(numero_guia=envio.numero_guia).delete()
+    documento = construir_documento(envio)
+    _guardar(envio, documento)
+    return documento
+
+
+def invalidar(numero_guia):
+    transaction.on_commit(lambda: _cache().delete(clave_cache(numero_guia)))
+
+
+def obtener(numero_guia):
+    """Documento público de una guía, o None si no existe"""
+    if not numeracion.verificador_correcto(numero_guia):
+        # Guía mal copiada: ni caché ni base de datos
+        return None
+    cache = _cache()
+    documento = cache.get(clave_cache(numero_guia))
+    if documento is not None:
+        return documento or None
+
+    documento = (
+        RastreoPublico.objects.filter(numero_guia=numero_guia)
+        .values_list('documento', flat=True).first()
+    )
+    if documento is None:
+        envio = Envio.objects.filter(numero_guia=numero_guia).first()
+        if envio is not None:
+            documento = construir_documento(envio)
+
+    # add y no set: si una escritura publicó su documento mientras tanto, no se pisa con este
+    if documento is None:
+        cache.add(clave_cache(numero_guia), NO_ENCONTRADO, getattr(settings, 'RASTREO_NO_ENCONTRADO_TTL', 60))
+    else:
+        cache.add(clave_cache(numero_guia), documento, getattr(settings, 'RASTREO_CACHE_TTL', 300))
+    return documento
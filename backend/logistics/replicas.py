@@ -0,0 +1,204 @@
+"""
+Réplicas de lectura (REPLICAS_DB_ALIASES) para las lecturas de la API.
+
+ReplicasMiddleware permite leer de una réplica solo en las peticiones GET,
+HEAD y OPTIONS bajo REPLICAS_RUTAS (listados, detalles, estadisticas,
+recientes...), fuera de REPLICAS_EXCLUIR_RUTAS. En esas peticiones
+logistics.routers.ReplicasRouter manda las lecturas a una réplica al azar,
+salvo:
+
+- Dentro de una transacción o después de una escritura en la misma petición.
+- Si el cliente escribió hace menos de REPLICAS_PEGAJOSO_SEGUNDOS (leer lo
+  propio): al responder una petición que escribió se marcan en caché su
+  credencial (token o cookie de sesión) y su IP. La IP cubre el login o el
+  registro, que escriben antes de que el cliente tenga su token.
+- Usuarios, tokens y sesiones: siempre de la primaria, para que un token
+  recién creado sirva aunque la réplica no lo tenga todavía.
+
+Cada proceso verifica cada réplica como máximo una vez cada
+REPLICAS_VERIFICAR_SEGUNDOS. El retraso es la antigüedad del primer cambio
+de CambioSync (la secuencia de cambios de logistics/sync.py) que la réplica
+no tiene; una réplica que falla o se atrasa más de REPLICAS_RETRASO_MAXIMO
+segundos se deja de usar hasta la siguiente verificación. Sin réplicas
+disponibles todo va a la primaria.
+
+Si una réplica falla en medio de una petición (OperationalError: se cayó o
+rechaza conexiones entre dos verificaciones), ReplicasMiddleware la marca
+como no disponible y repite la vista leyendo de la primaria. Solo se repiten
+peticiones GET, HEAD y OPTIONS, las únicas que leen de réplicas.
+"""
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, OperationalError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+# Siempre de la primaria: autenticación, sesiones y la caché en base de datos
+APPS_PRIMARIA = {'auth', 'authtoken', 'sessions', 'contenttypes', 'django_cache'}
+
+
+def aliases():
+    return getattr(settings, 'REPLICAS_DB_ALIASES', [])
+
+
+def _cache():
+    return caches[getattr(settings, 'REPLICAS_CACHE_ALIAS', 'default')]
+
+
+@dataclass
+class EstadoPeticion:
+    permite_replica: bool
+    escribio: bool = False
+    replicas: set = field(default_factory=set)  # aliases leídos en la petición
+
+
+_peticion = ContextVar('replicas_peticion', default=None)
+
+
+def peticion_actual():
+    return _peticion.get()
+
+
+def marcar_escritura():
+    estado = _peticion.get()
+    if estado is not None:
+        estado.escribio = True
+
+
+# Verificación de las réplicas
+
+@dataclass(frozen=True)
+class EstadoReplica:
+    verificada: float  # time.monotonic()
+    retraso: object  # segundos, o None si no respondió
+
+    @property
+    def disponible(self):
+        return self.retraso is not None and self.retraso <= getattr(settings, 'REPLICAS_RETRASO_MAXIMO', 5)
+
+
+_replicas = {}
+_bloqueo = threading.Lock()
+
+
+def medir_retraso(alias):
+    """Antigüedad (segundos) del primer cambio que le falta a la réplica; None si falla"""
+    from .models import CambioSync
+
+    try:
+        ultimo = CambioSync.objects.using(alias).aggregate(ultimo=Max('id'))['ultimo'] or 0
+    except DatabaseError:
+        log.warning('replicas.error', alias=alias)
+        return None
+    faltante = (
+        CambioSync.objects.using('default').filter(id__gt=ultimo)
+        .order_by('id').values_list('fecha', flat=True).first()
+    )
+    if faltante is None:
+        return 0.0
+    return max(0.0, (timezone.now() - faltante).total_seconds())
+
+
+def estado_replica(alias):
+    ahora = time.monotonic()
+    estado = _replicas.get(alias)
+    if estado is not None and ahora - estado.verificada < getattr(settings, 'REPLICAS_VERIFICAR_SEGUNDOS', 2):
+        return estado
+    with _bloqueo:
+        estado = _replicas.get(alias)
+        if estado is None or ahora - estado.verificada >= getattr(settings, 'REPLICAS_VERIFICAR_SEGUNDOS', 2):
+            estado = EstadoReplica(time.monotonic(), medir_retraso(alias))
+            if not estado.disponible:
+                log.info('replicas.no_disponible', alias=alias, retraso=estado.retraso)
+            _replicas[alias] = estado
+    return estado
+
+
+def elegir_replica():
+    """Alias de una réplica disponible al azar, o None para usar la primaria"""
+    disponibles = [alias for alias in aliases() if estado_replica(alias).disponible]
+    return random.choice(disponibles) if disponibles else None
+
+
+def marcar_caida(alias):
+    """Deja de usar la réplica hasta la siguiente verificación"""
+    with _bloqueo:
+        _replicas[alias] = EstadoReplica(time.monotonic(), None)
+
+
+def olvidar_estado():
+    """Fuerza una nueva verificación de todas las réplicas"""
+    _replicas.clear()
+
+
+# Leer lo propio
+
+def claves_cliente(request):
+    """Claves de caché de la credencial y de la IP del cliente"""
+    credenciales = {
+        request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+        request.META.get('REMOTE_ADDR', ''),
+    }
+    return [
+        'replicas:escritura:' + hashlib.sha256(credencial.encode()).hexdigest()[:32]
+        for credencial in sorted(filter(None, credenciales))
+    ]
+
+
+def _usa_replicas(request):
+    if request.method not in METODOS_SEGUROS:
+        return False
+    ruta = request.path_info
+    return (
+        any(ruta.startswith(prefijo) for prefijo in getattr(settings, 'REPLICAS_RUTAS', ['/api/']))
+        and not any(ruta.startswith(prefijo) for prefijo in getattr(settings, 'REPLICAS_EXCLUIR_RUTAS', []))
+    )
+
+
+class ReplicasMiddleware(MiddlewareMixin):
+    """Marca qué peticiones pueden leer de una réplica y recuerda quién escribió"""
+
+    def process_request(self, request):
+        if not aliases():
+            return None
+        permite = _usa_replicas(request) and not _cache().get_many(claves_cliente(request))
+        _peticion.set(EstadoPeticion(permite_replica=permite))
+        return None
+
+    def process_exception(self, request, exception):
+        estado = _peticion.get()
+        if not isinstance(exception, OperationalError) or estado is None or not estado.replicas:
+            return None
+        for alias in estado.replicas:
+            marcar_caida(alias)
+        log.warning('replicas.reintento', aliases=sorted(estado.replicas), ruta=request.path_info, error=str(exception))
+        estado.permite_replica = False
+        estado.replicas.clear()
+        # Solo las peticiones de lectura usan réplicas: repetir la vista no escribe dos veces
+        vista = request.resolver_match
+        return vista.func(request, *vista.args, **vista.kwargs)
+
+    def process_response(self, request, response):
+        estado = _peticion.get()
+        if estado is None:
+            return response
+        if estado.escribio or request.method not in METODOS_SEGUROS:
+            pegajoso = getattr(settings, 'REPLICAS_PEGAJOSO_SEGUNDOS', 5)
+            _cache().set_many(dict.fromkeys(claves_cliente(request), 1), pegajoso)
+        _peticion.set(None)
+        return response
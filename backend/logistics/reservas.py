@@ -0,0 +1,224 @@
+"""
+Reservas de stock para carritos.
+
+Al agregar o cambiar un item, el carrito aparta esas unidades por
+RESERVA_STOCK_TTL segundos (ReservaStock) y Producto.reservado lleva la suma
+por producto, así que el stock disponible (stock - reservado) se lee sin
+sumar reservas. Cada ajuste del contador es un UPDATE condicional
+(stock >= reservado + delta): si no alcanza, no se aparta nada.
+
+El checkout consume las reservas: un UPDATE por producto descuenta el stock y
+libera lo reservado a la vez (y la venta queda en el libro de inventario,
+logistics/inventario.py), y solo falla si el carrito pide más de lo que
+tenía apartado y ya no queda. liberar_vencidas() (comando liberar_reservas)
+devuelve al disponible las reservas vencidas por lotes.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from user_management.models import Carrito, Producto, ReservaStock
+from . import inventario, sync
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(', '.join(productos))
+
+
+def vencimiento():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'RESERVA_STOCK_TTL', 900))
+
+
+def _ajustar(producto_id, delta):
+    """Suma `delta` a lo reservado si hay disponible. Retorna True si se pudo"""
+    if delta > 0:
+        return bool(Producto.objects.filter(
+            id=producto_id, activo=True, stock__gte=F('reservado') + delta,
+        ).update(reservado=F('reservado') + delta))
+    if delta < 0:
+        Producto.objects.filter(id=producto_id).update(reservado=F('reservado') + delta)
+    return True
+
+
+class _Incompleto(Exception):
+    pass
+
+
+def _ajustar_lote(deltas):
+    """
+    Como _ajustar() para {producto_id: delta}, con un UPDATE condicional por
+    bloque. Retorna los ids sin disponible; si hay alguno, quien llama debe
+    deshacer su transacción.
+    """
+    faltantes = []
+    items = [(producto_id, delta) for producto_id, delta in deltas.items() if delta]
+    # Cada producto usa 2 parámetros por CASE (SET y WHERE) y 1 en el IN
+    for i in range(0, len(items), 100):
+        bloque = dict(items[i:i + 100])
+        caso = Case(*[When(id=producto_id, then=Value(delta)) for producto_id, delta in bloque.items()],
+                    output_field=IntegerField())
+        aumentos = [producto_id for producto_id, delta in bloque.items() if delta > 0]
+        if aumentos:
+            try:
+                with transaction.atomic():
+                    ajustados = Producto.objects.filter(
+                        id__in=aumentos, activo=True, stock__gte=F('reservado') + caso,
+                    ).update(reservado=F('reservado') + caso)
+                    if ajustados < len(aumentos):
+                        raise _Incompleto
+            except _Incompleto:
+                # Alguno no alcanza: uno por uno para saber cuáles
+                faltantes.extend(producto_id for producto_id in aumentos if not _ajustar(producto_id, bloque[producto_id]))
+        disminuciones = [producto_id for producto_id, delta in bloque.items() if delta < 0]
+        if disminuciones:
+            Producto.objects.filter(id__in=disminuciones).update(reservado=F('reservado') + caso)
+    return faltantes
+
+
+def reservar(carrito, producto_id, cantidad):
+    """
+    Deja reservadas `cantidad` unidades del producto para el carrito (0 libera
+    la reserva) y renueva el vencimiento de las reservas del carrito.
+    Retorna False si no hay stock disponible para el aumento.
+    """
+    expira = vencimiento()
+    with transaction.atomic():
+        # Escribir primero (renovar): en SQLite toma el bloqueo de escritura antes de leer
+        ReservaStock.objects.filter(carrito=carrito).update(expira=expira)
+        reserva = ReservaStock.objects.filter(carrito=carrito, producto_id=producto_id).first()
+        # Una reserva vencida que el barrido aún no liberó sigue contando en Producto.reservado
+        actual = reserva.cantidad if reserva else 0
+        if not _ajustar(producto_id, cantidad - actual):
+            return False
+        if cantidad <= 0:
+            if reserva:
+                reserva.delete()
+        elif reserva:
+            reserva.cantidad = cantidad
+            reserva.save(update_fields=['cantidad'])
+        else:
+            ReservaStock.objects.create(carrito=carrito, producto_id=producto_id, cantidad=cantidad, expira=expira)
+    return True
+
+
+def reservar_lote(carrito, cantidades):
+    """
+    Como reservar() para varios productos: {producto: cantidad}. Todo o nada,
+    lanza StockInsuficiente con los productos que no alcanzan.
+    """
+    expira = vencimiento()
+    with transaction.atomic():
+        ReservaStock.objects.filter(carrito=carrito).update(expira=expira)
+        existentes = {
+            reserva.producto_id: reserva
+            for reserva in ReservaStock.objects.filter(carrito=carrito, producto__in=list(cantidades))
+        }
+        faltantes = _ajustar_lote({
+            producto.id: max(cantidad, 0) - (existentes[producto.id].cantidad if producto.id in existentes else 0)
+            for producto, cantidad in cantidades.items()
+        })
+        if faltantes:
+            raise StockInsuficiente([producto.nombre for producto in cantidades if producto.id in faltantes])
+
+        liberadas, modificadas, nuevas = [], [], []
+        for producto, cantidad in cantidades.items():
+            reserva = existentes.get(producto.id)
+            if reserva is None:
+                if cantidad > 0:
+                    nuevas.append(ReservaStock(carrito=carrito, producto=producto, cantidad=cantidad, expira=expira))
+            elif cantidad <= 0:
+                liberadas.append(reserva.id)
+            else:
+                reserva.cantidad = cantidad
+                modificadas.append(reserva)
+        ReservaStock.objects.filter(id__in=liberadas).delete()
+        ReservaStock.objects.bulk_update(modificadas, ['cantidad'])
+        ReservaStock.objects.bulk_create(nuevas)
+
+
+def renovar(usuario):
+    """Extiende el vencimiento de las reservas del carrito del usuario"""
+    ReservaStock.objects.filter(carrito__usuario=usuario).update(expira=vencimiento())
+
+
+def carrito_bloqueado(usuario):
+    """
+    Carrito del usuario para modificarlo dentro de una transacción. Renueva
+    primero (en SQLite toma el bloqueo de escritura antes de leer) y bloquea
+    la fila del carrito, así dos peticiones del mismo usuario no se cruzan.
+    """
+    renovar(usuario)
+    carrito, _ = Carrito.objects.select_for_update().get_or_create(usuario=usuario)
+    return carrito
+
+
+def liberar_carrito(carrito):
+    """Devuelve todo lo reservado por el carrito"""
+    with transaction.atomic():
+        reservas = list(ReservaStock.objects.filter(carrito=carrito).values_list('producto_id', 'cantidad'))
+        for producto_id, cantidad in reservas:
+            _ajustar(producto_id, -cantidad)
+        ReservaStock.objects.filter(carrito=carrito).delete()
+
+
+def consumir(carrito, items, pedido):
+    """
+    Descuenta del stock los items del checkout usando las reservas del
+    carrito y registra las ventas del pedido en el libro de inventario. Debe
+    llamarse dentro de la transacción del pedido; lanza StockInsuficiente (y
+    no descuenta nada) si algún producto no alcanza.
+    """
+    reservadas = dict(ReservaStock.objects.filter(carrito=carrito).values_list('producto_id', 'cantidad'))
+    # Savepoint: si un producto no alcanza se deshacen los descuentos anteriores
+    with transaction.atomic():
+        faltantes = []
+        for item in items:
+            reservada = reservadas.get(item.producto_id, 0)
+            # Después del UPDATE debe quedar stock >= reservado (y nunca negativo)
+            descontado = Producto.objects.filter(
+                Q(stock__gte=F('reservado') - reservada + item.cantidad), Q(stock__gte=item.cantidad),
+                id=item.producto_id,
+            ).update(stock=F('stock') - item.cantidad, reservado=F('reservado') - reservada)
+            if not descontado:
+                faltantes.append(item.producto.nombre)
+        if faltantes:
+            raise StockInsuficiente(faltantes)
+        ReservaStock.objects.filter(carrito=carrito).delete()
+        inventario.vender(pedido, items, usuario=pedido.usuario)
+    # update() no emite señales: registrar el cambio de stock para la sincronización
+    sync.registrar_lote('productos', [item.producto for item in items])
+
+
+def liberar_vencidas(lote=1000):
+    """Libera por lotes las reservas vencidas. Retorna la cantidad liberada"""
+    total = 0
+    while True:
+        with transaction.atomic():
+            vencidas = list(
+                ReservaStock.objects.select_for_update()
+                .filter(expira__lte=timezone.now()).order_by('id')
+                .values_list('id', 'producto_id', 'cantidad')[:lote]
+            )
+            if not vencidas:
+                break
+            ReservaStock.objects.filter(id__in=[id_reserva for id_reserva, _, _ in vencidas]).delete()
+            por_producto = Counter()
+            for _, producto_id, cantidad in vencidas:
+                por_producto[producto_id] += cantidad
+            for producto_id, cantidad in por_producto.items():
+                _ajustar(producto_id, -cantidad)
+        total += len(vencidas)
+        log.info('reservas.liberadas', reservas=len(vencidas), productos=len(por_producto))
+        if len(vencidas) < lote:
+            break
+    return total
@@ -0,0 +1,84 @@
+"""
+Routers de base de datos.
+
+PosicionesRouter manda las posiciones GPS (escrituras continuas de todos los
+conductores) a la base POSICIONES_DB_ALIAS, para que no compitan por los
+bloqueos de escritura con pedidos y envíos. Con el alias 'default' no cambia
+nada.
+
+ReplicasRouter manda las lecturas de las peticiones que lo permiten a una
+réplica de REPLICAS_DB_ALIASES (ver logistics/replicas.py). Va después de
+PosicionesRouter en DATABASE_ROUTERS: las posiciones nunca van a réplicas.
+"""
+from django.conf import settings
+from django.db import connections
+
+from . import replicas
+
+
+MODELOS_POSICIONES = {'posicionconductor', 'trayectoconductor'}
+
+
+def alias_posiciones():
+    return getattr(settings, 'POSICIONES_DB_ALIAS', 'default')
+
+
+class PosicionesRouter:
+
+    def _es_posicion(self, model):
+        return model._meta.app_label == 'logistics' and model._meta.model_name in MODELOS_POSICIONES
+
+    def db_for_read(self, model, **hints):
+        if self._es_posicion(model):
+            return alias_posiciones()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = alias_posiciones()
+        if alias == 'default':
+            return None
+        if app_label == 'logistics' and model_name in MODELOS_POSICIONES:
+            return db == alias
+        # La base de posiciones solo tiene las tablas de posiciones
+        if db == alias:
+            return False
+        return None
+
+
+class ReplicasRouter:
+
+    def db_for_read(self, model, **hints):
+        estado = replicas.peticion_actual()
+        if estado is None or not estado.permite_replica or estado.escribio:
+            return None
+        if model._meta.app_label in replicas.APPS_PRIMARIA:
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        alias = replicas.elegir_replica()
+        if alias is not None:
+            # Para repetir la petición en la primaria si la réplica falla
+            estado.replicas.add(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        replicas.marcar_escritura()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        mismas = {'default', *replicas.aliases()}
+        if obj1._state.db in mismas and obj2._state.db in mismas:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben las tablas por replicación
+        if db in replicas.aliases():
+            return False
+        return None
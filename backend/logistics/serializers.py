@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from datetime import date
 from django.contrib.auth.models import User
+from . import archivo
 from .models import Conductor, Vehiculo, Envio, SeguimientoEnvio, Admin
-from user_management.models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem
+from user_management.models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem, MovimientoStock
 
 
 class ClienteSerializer(serializers.ModelSerializer):
@@ -51,6 +53,7 @@ class ConductorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conductor
         fields = '__all__'
+        read_only_fields = ('user',)
 
 
 class AdminSerializer(serializers.ModelSerializer):
@@ -87,12 +90,20 @@ class SeguimientoEnvioSerializer(serializers.ModelSerializer):
         read_only_fields = ('fecha_hora',)
 
 
+class HistoriaSeguimientosSerializer(serializers.ListSerializer):
+    """Seguimientos de un envío incluidos los movidos al archivo (logistics.archivo)"""
+
+    def get_attribute(self, instance):
+        return archivo.eventos(instance)
+
+
 class EnvioSerializer(serializers.ModelSerializer):
     cliente_nombre = serializers.SerializerMethodField()
     cliente_email = serializers.EmailField(source='cliente.email', read_only=True)
     vehiculo_placa = serializers.CharField(source='vehiculo.placa', read_only=True)
     conductor_nombre = serializers.CharField(source='conductor.nombre_completo', read_only=True)
-    seguimientos = SeguimientoEnvioSerializer(many=True, read_only=True)
+    # Un solo serializer para los seguimientos de todos los envíos (no uno por envío)
+    seguimientos = HistoriaSeguimientosSerializer(child=SeguimientoEnvioSerializer(), read_only=True)
     dias_transito = serializers.ReadOnlyField()
     
     def get_cliente_nombre(self, obj):
@@ -115,6 +126,8 @@ class EnvioCreateSerializer(serializers.ModelSerializer):
         model = Envio
         fields = '__all__'
         read_only_fields = ('fecha_creacion', 'fecha_actualizacion')
+        # Sin numero_guia se asigna el siguiente de logistics/numeracion.py
+        extra_kwargs = {'numero_guia': {'required': False}}
 
 
 class EnvioListSerializer(serializers.ModelSerializer):
@@ -191,8 +204,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return data
     
     def create(self, validated_data):
-        from datetime import date
-        
         validated_data.pop('password_confirm')
         
         # Manejar ambos formatos: telefono/phone y direccion/address
@@ -234,6 +245,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             
         if role == 'conductor':
             Conductor.objects.create(
+                user=user,
                 nombres=nombres,
                 apellidos=apellidos,
                 cedula=cedula,
@@ -264,11 +276,19 @@ class CategoriaSerializer(serializers.ModelSerializer):
 
 class ProductoSerializer(serializers.ModelSerializer):
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
+    disponible = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Producto
         fields = '__all__'
 
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    usuario_nombre = serializers.CharField(source='usuario.username', read_only=True, default=None)
+
+    class Meta:
+        model = MovimientoStock
+        fields = ['id', 'cantidad', 'motivo', 'referencia', 'usuario', 'usuario_nombre', 'fecha']
+
 class CarritoItemSerializer(serializers.ModelSerializer):
     producto = ProductoSerializer(read_only=True)
     producto_id = serializers.IntegerField(write_only=True)
@@ -0,0 +1,103 @@
+"""
+Receptores de señales de logistics.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user_management.models import Carrito, CarritoItem, Categoria, MovimientoStock, Pedido, Producto, UserProfile
+from .authentication import invalidar_token, invalidar_usuario
+from . import inventario, rastreo, reservas, sync
+from .models import Conductor, Envio
+
+
+# Caché de autenticación por token (logistics.authentication)
+
+@receiver(post_delete, sender=Token)
+def invalidar_token_eliminado(sender, instance, **kwargs):
+    """Logout (logout_user, LogoutView) y eliminación de cuenta"""
+    invalidar_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidar_usuario_modificado(sender, instance, created, **kwargs):
+    """Cambio de contraseña, desactivación o cambio de datos del usuario"""
+    # last_login (user_logged_in) no está en la caché de tokens
+    if not created and kwargs.get('update_fields') != frozenset({'last_login'}):
+        invalidar_usuario(instance.id)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidar_perfil_modificado(sender, instance, **kwargs):
+    """Cambio de rol del perfil"""
+    invalidar_usuario(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Conductor)
+def invalidar_conductor_modificado(sender, instance, **kwargs):
+    """El principal de un conductor incluye su registro"""
+    if instance.user_id:
+        invalidar_usuario(instance.user_id)
+
+
+# Rastreo público (logistics.rastreo)
+
+@receiver(post_delete, sender=Envio)
+def invalidar_rastreo_envio(sender, instance, **kwargs):
+    """El documento se elimina en cascada; también hay que quitarlo de la caché"""
+    rastreo.invalidar(instance.numero_guia)
+
+
+# Sincronización incremental (logistics.sync)
+
+@receiver(post_init, sender=Pedido)
+@receiver(post_init, sender=Envio)
+def recordar_conductor(sender, instance, **kwargs):
+    """Conductor al cargar, para avisar al anterior si el objeto se reasigna"""
+    # Sin cargar el campo si viene diferido (only/defer)
+    instance._conductor_sync = instance.__dict__.get('conductor_id')
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=Envio)
+@receiver(post_save, sender=Carrito)
+def registrar_cambio_sync(sender, instance, **kwargs):
+    sync.registrar(sync.POR_MODELO[sender], instance)
+
+
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=Envio)
+@receiver(post_delete, sender=Carrito)
+def registrar_eliminacion_sync(sender, instance, **kwargs):
+    sync.registrar(sync.POR_MODELO[sender], instance, eliminado=True)
+
+
+@receiver([post_save, post_delete], sender=CarritoItem)
+def registrar_cambio_carrito(sender, instance, **kwargs):
+    """Los items viajan dentro del carrito"""
+    try:
+        carrito = instance.carrito
+    except Carrito.DoesNotExist:
+        return
+    sync.registrar('carrito', carrito)
+
+
+# Reservas de stock (logistics.reservas)
+
+@receiver(pre_delete, sender=Carrito)
+def liberar_reservas_carrito(sender, instance, **kwargs):
+    """El borrado en cascada de las reservas no descuenta Producto.reservado"""
+    reservas.liberar_carrito(instance)
+
+
+# Libro de inventario (logistics.inventario)
+
+@receiver(post_save, sender=MovimientoStock)
+def invalidar_stock_cacheado(sender, instance, **kwargs):
+    """Ajustes desde Producto.save(); los lotes invalidan en inventario.registrar"""
+    inventario.invalidar([instance.producto_id])
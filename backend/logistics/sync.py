@@ -0,0 +1,258 @@
+"""
+Sincronización incremental para la app móvil y el frontend (GET /api/sync/).
+
+Cada cambio de Producto, Categoria, Pedido, Envio o Carrito (y sus items)
+agrega una fila a CambioSync desde logistics.signals; las actualizaciones
+masivas que no pasan por save() la agregan con registrar_lote. El cliente
+envía por colección el último id recibido (la marca) y recibe solo los
+objetos cambiados desde entonces, más los ids eliminados o desactivados (o
+que dejaron de ser suyos, como un pedido reasignado a otro conductor).
+
+La marca es un id de la secuencia, no una fecha, así que el reloj de los
+clientes no importa. Como un id menor puede confirmarse después que uno mayor
+(transacciones concurrentes), la marca devuelta no avanza sobre cambios de los
+últimos SYNC_MARGEN_SEGUNDOS: esos se vuelven a enviar en la siguiente
+sincronización, y el cliente los aplica de nuevo sin problema.
+
+Tanto la colección completa como los cambios van en páginas de SYNC_LIMITE.
+Mientras `hay_mas` sea verdadero el cliente vuelve a pedir la colección con
+el valor de `continuar`: en los cambios es la marca, y en la colección
+completa es "marca:último id", porque la página siguiente sigue por id y la
+marca (tomada en la primera página) no cambia hasta terminar.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from user_management.models import Carrito, Categoria, Pedido, Producto
+from .models import CambioSync, Envio
+from .serializers import (
+    CarritoSerializer, CategoriaSerializer, EnvioListSerializer, PedidoSerializer, ProductoSerializer,
+)
+
+
+@dataclass(frozen=True)
+class Coleccion:
+    nombre: str
+    consulta: Callable  # (principal) -> queryset con los objetos visibles
+    serializer: type
+    dueno: Optional[str] = None  # campo con el usuario dueño del objeto
+    con_conductor: bool = False
+    vigente: Callable = lambda objeto: True  # False: se envía como eliminado
+    por_dueno: bool = False  # solo el dueño ve los cambios, también los admin
+
+
+def _pedidos(principal):
+    pedidos = Pedido.objects.select_related('usuario', 'conductor').prefetch_related('items__producto')
+    if principal.is_admin:
+        return pedidos
+    if principal.role == 'conductor':
+        return pedidos.filter(conductor_id=principal.conductor_id)
+    return pedidos.filter(usuario_id=principal.user_id)
+
+
+def _envios(principal):
+    envios = Envio.objects.select_related('cliente')
+    if principal.is_admin:
+        return envios
+    if principal.role == 'conductor':
+        return envios.filter(conductor_id=principal.conductor_id)
+    return envios.filter(cliente_id=principal.user_id)
+
+
+COLECCIONES = {
+    coleccion.nombre: coleccion for coleccion in (
+        Coleccion(
+            'categorias', lambda principal: Categoria.objects.all(), CategoriaSerializer,
+            vigente=lambda categoria: categoria.activa,
+        ),
+        Coleccion(
+            'productos', lambda principal: Producto.objects.select_related('categoria'), ProductoSerializer,
+            vigente=lambda producto: producto.activo,
+        ),
+        Coleccion('pedidos', _pedidos, PedidoSerializer, dueno='usuario_id', con_conductor=True),
+        Coleccion('envios', _envios, EnvioListSerializer, dueno='cliente_id', con_conductor=True),
+        Coleccion(
+            'carrito',
+            lambda principal: Carrito.objects.filter(usuario_id=principal.user_id)
+            .prefetch_related('items__producto__categoria'),
+            CarritoSerializer, dueno='usuario_id', por_dueno=True,
+        ),
+    )
+}
+
+# Colección de cada modelo (para las señales)
+POR_MODELO = {
+    Categoria: 'categorias',
+    Producto: 'productos',
+    Pedido: 'pedidos',
+    Envio: 'envios',
+    Carrito: 'carrito',
+}
+
+
+# Registro de cambios
+
+def cambio(nombre, objeto, eliminado=False):
+    """CambioSync (sin guardar) para un objeto de la colección"""
+    coleccion = COLECCIONES[nombre]
+    conductor_id = anterior = None
+    if coleccion.con_conductor:
+        conductor_id = objeto.__dict__.get('conductor_id')
+        anterior = getattr(objeto, '_conductor_sync', None)
+        if anterior == conductor_id:
+            anterior = None
+    return CambioSync(
+        coleccion=nombre,
+        objeto_id=objeto.pk,
+        usuario_id=getattr(objeto, coleccion.dueno) if coleccion.dueno else None,
+        conductor_id=conductor_id,
+        conductor_anterior_id=anterior,
+        eliminado=eliminado,
+    )
+
+
+def registrar(nombre, objeto, eliminado=False):
+    cambio(nombre, objeto, eliminado).save()
+    if COLECCIONES[nombre].con_conductor:
+        objeto._conductor_sync = objeto.__dict__.get('conductor_id')
+
+
+def registrar_lote(nombre, objetos):
+    """Para cambios hechos con update()/bulk_update, que no emiten señales"""
+    CambioSync.objects.bulk_create([cambio(nombre, objeto) for objeto in objetos], batch_size=500)
+
+
+# Lectura
+
+def _limite_marca():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_MARGEN_SEGUNDOS', 30))
+
+
+def marca_segura():
+    """Marca hasta la que todos los cambios ya están confirmados"""
+    return CambioSync.objects.filter(fecha__lte=_limite_marca()).aggregate(marca=Max('id'))['marca'] or 0
+
+
+def _filtro(coleccion, principal):
+    if coleccion.por_dueno:
+        return Q(usuario_id=principal.user_id)
+    if principal.is_admin or not coleccion.dueno:
+        return Q()
+    if principal.role == 'conductor' and coleccion.con_conductor:
+        return Q(conductor_id=principal.conductor_id) | Q(conductor_anterior_id=principal.conductor_id)
+    return Q(usuario_id=principal.user_id)
+
+
+def _serializar(coleccion, objetos, contexto):
+    return coleccion.serializer(objetos, many=True, context=contexto).data
+
+
+def completo(coleccion, principal, contexto, marca, limite, desde=0):
+    """Colección completa (primera sincronización o marca vencida): una página de ids mayores a `desde`"""
+    pagina = list(coleccion.consulta(principal).filter(pk__gt=desde).order_by('pk')[:limite + 1])
+    hay_mas = len(pagina) > limite
+    pagina = pagina[:limite]
+    objetos = [objeto for objeto in pagina if coleccion.vigente(objeto)]
+    return {
+        'cambios': _serializar(coleccion, objetos, contexto),
+        'eliminados': [],
+        'marca': marca,
+        'completo': True,
+        'hay_mas': hay_mas,
+        'continuar': f'{marca}:{pagina[-1].pk}' if hay_mas else str(marca),
+    }
+
+
+def delta(coleccion, principal, contexto, marca, limite):
+    """Objetos cambiados desde `marca`: como máximo `limite` cambios"""
+    entradas = list(
+        CambioSync.objects.filter(_filtro(coleccion, principal), coleccion=coleccion.nombre, id__gt=marca)
+        .order_by('id').values_list('id', 'objeto_id', 'fecha')[:limite + 1]
+    )
+    hay_mas = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    ids = list(dict.fromkeys(objeto_id for _, objeto_id, _ in entradas))
+    visibles = {objeto.pk: objeto for objeto in coleccion.consulta(principal).filter(pk__in=ids)} if ids else {}
+    cambiados = [visibles[i] for i in ids if i in visibles and coleccion.vigente(visibles[i])]
+    eliminados = [i for i in ids if i not in visibles or not coleccion.vigente(visibles[i])]
+
+    # La marca avanza hasta el primer cambio dentro del margen
+    limite_fecha = _limite_marca()
+    nueva_marca = marca
+    for id_cambio, _, fecha in entradas:
+        if fecha > limite_fecha:
+            break
+        nueva_marca = id_cambio
+    if hay_mas and nueva_marca == marca:
+        # Más de `limite` cambios dentro del margen: avanzar para no repetir la misma página
+        nueva_marca = entradas[-1][0]
+
+    return {
+        'cambios': _serializar(coleccion, cambiados, contexto),
+        'eliminados': eliminados,
+        'marca': nueva_marca,
+        'completo': False,
+        'hay_mas': hay_mas,
+        'continuar': str(nueva_marca),
+    }
+
+
+def parsear_marca(valor):
+    """
+    Valor de una colección en la consulta: vacío (completa), "marca" (cambios)
+    o "marca:id" (siguiente página de la completa). Lanza ValueError
+    """
+    if not valor:
+        return None
+    marca, separador, desde = valor.partition(':')
+    return (int(marca), int(desde)) if separador else int(marca)
+
+
+def sincronizar(principal, marcas, contexto=None):
+    """
+    marcas: {colección: último id recibido, (marca, último id) para seguir
+    con la colección completa, o None para empezarla}. Retorna {colección: resultado}.
+    """
+    limite = getattr(settings, 'SYNC_LIMITE', 500)
+    contexto = contexto or {}
+    primera = segura = None
+    resultado = {}
+    for nombre, marca in marcas.items():
+        coleccion = COLECCIONES[nombre]
+        desde = 0
+        if isinstance(marca, tuple):
+            marca, desde = marca
+        if marca is not None:
+            if primera is None:
+                primera = CambioSync.objects.aggregate(primera=Min('id'))['primera'] or 0
+            # La purga borró cambios posteriores a la marca: hay que empezar de nuevo
+            if marca < primera - 1:
+                marca, desde = None, 0
+        if desde:
+            resultado[nombre] = completo(coleccion, principal, contexto, marca, limite, desde)
+        elif marca is not None:
+            resultado[nombre] = delta(coleccion, principal, contexto, marca, limite)
+        else:
+            if segura is None:
+                segura = marca_segura()
+            resultado[nombre] = completo(coleccion, principal, contexto, segura, limite)
+    return resultado
+
+
+def purgables(dias=None):
+    """
+    Cambios de más de SYNC_RETENCION_DIAS días, sin el último (indica hasta
+    dónde se purgó). La tarea cambios_sync los borra por lotes.
+    """
+    if dias is None:
+        dias = getattr(settings, 'SYNC_RETENCION_DIAS', 30)
+    ultimo = CambioSync.objects.aggregate(ultimo=Max('id'))['ultimo']
+    if ultimo is None:
+        return CambioSync.objects.none()
+    return CambioSync.objects.filter(fecha__lt=timezone.now() - timedelta(days=dias), id__lt=ultimo)
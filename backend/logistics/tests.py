@@ -1,3 +1,1265 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.cache import caches
+from django.db import OperationalError, connection, transaction
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user_management.models import (
+    Carrito, CarritoItem, Categoria, MovimientoStock, Pedido, Producto, ReservaStock, UserProfile,
+)
+from logistics import (
+    admin_tablas, archivo, authentication, dataset, hashers, inventario, login, mantenimiento, numeracion, posiciones, rastreo, replicas,
+    reservas, throttling, transiciones,
+)
+from logistics.cache_compartida import ALIASES, backend_por_defecto, configurar_caches, verificar_contadores
+from logistics import carrito as carrito_lote
+from logistics.log import get_logger
+from logistics.principal import principal_de
+from logistics.management.commands import benchmark_admin, benchmark_arranque
+from logistics.auth_views import ProductoViewSet
+from logistics.models import (
+    ClaveIdempotencia, Conductor, Envio, PosicionConductor, RastreoPublico, SecuenciaNumeracion, SeguimientoEnvio,
+    TareaMantenimiento,
+)
+from logistics.routers import ReplicasRouter
+from logistics.serializers import EnvioSerializer
+from logistics.views import EnvioViewSet
+
+
+def crear_envio(cliente, **campos):
+    ahora = timezone.now()
+    datos = dict(
+        numero_guia=f'ENV-PRUEBA-{Envio.objects.count() + 1}', cliente=cliente,
+        descripcion_carga='Caja', peso_kg=Decimal('1.00'), volumen_m3=Decimal('0.10'),
+        direccion_recogida='Origen 1', direccion_entrega='Destino 2',
+        contacto_recogida='Ana', contacto_entrega='Luis', telefono_recogida='111', telefono_entrega='222',
+        fecha_recogida_programada=ahora, fecha_entrega_programada=ahora + timedelta(days=1),
+        costo_envio=Decimal('10.00'), valor_declarado=Decimal('100.00'),
+    )
+    datos.update(campos)
+    return Envio.objects.create(**datos)
+
+
+def crear_producto(stock, nombre='Producto'):
+    categoria = Categoria.objects.create(nombre='Categoría')
+    return Producto.objects.create(
+        nombre=nombre, descripcion='', categoria=categoria, precio=Decimal('10.00'), stock=stock,
+    )
+
+
+# Cachés por proceso: las pruebas no escriben en CACHE_DIR ni dependen de Redis
+CACHES_PRUEBA = configurar_caches(dict.fromkeys(ALIASES, 'memoria'))
+
+
+class MuestreoLogsTests(SimpleTestCase):
+    @override_settings(LOG_SAMPLING={'logistics': 0.5, 'logistics.auth_views': 0.1})
+    def test_tasa_por_nombre_y_por_padre(self):
+        self.assertEqual(get_logger('logistics.auth_views').tasa_muestreo(), 0.1)
+        self.assertEqual(get_logger('logistics.views').tasa_muestreo(), 0.5)
+        self.assertEqual(get_logger('user_management.views').tasa_muestreo(), 1.0)
+
+
+class CacheCompartidaTests(SimpleTestCase):
+    def test_sin_redis_los_contadores_van_a_memoria(self):
+        backends = {alias: backend_por_defecto(alias) for alias in ALIASES}
+        self.assertEqual(backends, {'default': 'archivo', 'sessions': 'archivo', 'api': 'archivo', 'ratelimit': 'memoria'})
+        self.assertEqual({backend_por_defecto(alias, 'redis://localhost') for alias in ALIASES}, {'redis'})
+
+    def test_contadores_en_backend_no_atomico_fallan(self):
+        verificar_contadores({'default': 'archivo', 'ratelimit': 'redis'})
+        for backend in ('archivo', 'base_de_datos'):
+            with self.assertRaisesMessage(ValueError, 'CACHE_BACKEND_RATELIMIT'):
+                verificar_contadores({'ratelimit': backend})
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('conductor1', 'c1@tecnoroute.test', 'clave-secreta')
+        UserProfile.objects.create(user=self.user, role='conductor')
+        self.token = Token.objects.create(user=self.user)
+        self.autenticacion = authentication.CachedTokenAuthentication()
+
+    def test_segunda_peticion_sin_consultas_y_sin_hash_en_cache(self):
+        self.autenticacion.authenticate_credentials(self.token.key)
+        entrada = caches['default'].get(authentication.clave_cache(self.token.key))
+        self.assertNotIn('password', entrada['usuario'])
+        self.assertNotIn(self.token.key, authentication.clave_cache(self.token.key))
+
+        with self.assertNumQueries(0):
+            user, token = self.autenticacion.authenticate_credentials(self.token.key)
+            self.assertEqual(user.principal.role, 'conductor')
+        self.assertEqual((user.id, token.key), (self.user.id, self.token.key))
+        # Los campos que no viajan se cargan al usarlos
+        self.assertTrue(user.check_password('clave-secreta'))
+        self.assertEqual(user.principal.profile.user_id, self.user.id)
+
+    def test_lectura_anterior_al_logout_no_revive_el_token(self):
+        # Una petición lee la generación y el token de la base de datos...
+        generacion = caches['default'].get(authentication.clave_generacion(self.token.key))
+        token = Token.objects.select_related('user').get(key=self.token.key)
+        principal = authentication.cargar_principal(token.user)
+        # ...el logout elimina el token y la invalida...
+        self.token.delete()
+        # ...y después la petición guarda lo que leyó
+        authentication.guardar_en_cache(token.user, token, principal, generacion)
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.autenticacion.authenticate_credentials(token.key)
+
+    def test_cambio_de_rol_invalida(self):
+        self.autenticacion.authenticate_credentials(self.token.key)
+        UserProfile.objects.filter(user=self.user).update(role='admin')
+        UserProfile.objects.get(user=self.user).save()
+        user, _ = self.autenticacion.authenticate_credentials(self.token.key)
+        self.assertTrue(user.principal.is_admin)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cliente1', 'cliente1@tecnoroute.test', 'clave-secreta')
+        UserProfile.objects.create(user=self.user)
+        self.eventos = []
+        guardar = lambda signal, **kwargs: self.eventos.append(signal)
+        user_login_failed.connect(guardar, weak=False, dispatch_uid='prueba')
+        user_logged_in.connect(guardar, weak=False, dispatch_uid='prueba')
+        self.addCleanup(user_login_failed.disconnect, dispatch_uid='prueba')
+        self.addCleanup(user_logged_in.disconnect, dispatch_uid='prueba')
+
+    def test_fallo_envia_user_login_failed(self):
+        self.assertIsNone(login.iniciar_sesion('incorrecta', email='cliente1@tecnoroute.test'))
+        self.assertIsNone(login.iniciar_sesion('x', username='no-existe'))
+        self.assertEqual(self.eventos, [user_login_failed, user_login_failed])
+
+    def test_exito_envia_user_logged_in_y_actualiza_last_login(self):
+        sesion = login.iniciar_sesion('clave-secreta', email='cliente1@tecnoroute.test')
+        self.assertEqual(sesion.user.id, self.user.id)
+        self.assertEqual(self.eventos, [user_logged_in])
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend'])
+    def test_respeta_authentication_backends(self):
+        self.user.is_active = False
+        self.user.save()
+        # ModelBackend rechaza usuarios inactivos; este backend no
+        sesion = login.iniciar_sesion('clave-secreta', username='cliente1')
+        self.assertEqual(sesion.user.id, self.user.id)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class LimitePeticionesTests(SimpleTestCase):
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.limite = throttling.parsear_tasa('10/m')
+        base = throttling.clave_base('prueba', 'cliente')
+        # Último segundo de una ventana
+        self.ahora = 6000 - throttling.desfase(base, 60) - 1
+
+    def consumir(self, segundos=0):
+        return throttling.consumir('prueba', 'cliente', self.limite, ahora=self.ahora + segundos)
+
+    def test_sin_rafaga_doble_en_el_borde_de_la_ventana(self):
+        self.assertTrue(all(self.consumir().permitido for _ in range(10)))
+        self.assertFalse(self.consumir().permitido)
+        # Con una ventana fija, un segundo después habría 10 más
+        self.assertFalse(self.consumir(1).permitido)
+        # La capacidad vuelve de a poco: a mitad de la ventana siguiente 5 + 2 <= 10
+        estado = self.consumir(31)
+        self.assertTrue(estado.permitido)
+        self.assertEqual(estado.restantes, 2)
+
+    def test_retry_after_de_un_rechazo(self):
+        for _ in range(10):
+            self.consumir()
+        estado = self.consumir(1)
+        self.assertFalse(estado.permitido)
+        self.assertTrue(self.consumir(estado.reinicio + 1).permitido)
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 0})
+    def test_ip_ignora_x_forwarded_for_sin_proxies(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4')
+        self.assertEqual(throttling.ip_cliente(request), '10.0.0.1')
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_ip_detras_de_un_proxy(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 5.6.7.8')
+        self.assertEqual(throttling.ip_cliente(request), '5.6.7.8')
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ArchivoSeguimientosTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(ARCHIVO_SEGUIMIENTOS_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.cliente = User.objects.create_user('cliente-archivo')
+
+    def test_listado_sin_archivo_no_busca_bloques(self):
+        for _ in range(3):
+            envio = crear_envio(self.cliente)
+            SeguimientoEnvio.objects.create(envio=envio, estado='pendiente', descripcion='Creado')
+        envios = Envio.objects.select_related('cliente', 'vehiculo', 'conductor__user').prefetch_related('seguimientos')
+        # Una consulta para los envíos y otra para todos sus seguimientos
+        with self.assertNumQueries(2):
+            datos = EnvioSerializer(envios, many=True).data
+        self.assertEqual([len(envio['seguimientos']) for envio in datos], [1, 1, 1])
+
+    def test_solo_los_envios_archivados_leen_bloques(self):
+        archivado = crear_envio(self.cliente, estado='entregado')
+        SeguimientoEnvio.objects.create(envio=archivado, estado='entregado', descripcion='Entregado')
+        archivo.archivar_lote([archivado.id])
+        for _ in range(2):
+            SeguimientoEnvio.objects.create(envio=crear_envio(self.cliente), estado='pendiente', descripcion='Creado')
+        envios = EnvioViewSet.queryset.prefetch_related('seguimientos').order_by('id')
+        # Más la consulta de los bloques del envío archivado
+        with self.assertNumQueries(2 + 1):
+            datos = EnvioSerializer(envios, many=True).data
+        self.assertEqual([[s['estado'] for s in envio['seguimientos']] for envio in datos], [
+            ['entregado'], ['pendiente'], ['pendiente'],
+        ])
+
+    def test_cambiar_estado_responde_con_el_evento_nuevo(self):
+        envio = crear_envio(self.cliente)
+        SeguimientoEnvio.objects.create(envio=envio, estado='pendiente', descripcion='Creado')
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        respuesta = client.post(f'/api/envios/{envio.id}/cambiar_estado/', {'estado': 'en_transito'}, format='json')
+        self.assertEqual([s['estado'] for s in respuesta.json()['seguimientos']], ['en_transito', 'pendiente'])
+        self.assertEqual(len(client.get(f'/api/envios/{envio.id}/').json()['seguimientos']), 2)
+
+    def test_historia_incluye_eventos_archivados(self):
+        envio = crear_envio(self.cliente, estado='entregado')
+        for estado in ('pendiente', 'en_transito', 'entregado'):
+            SeguimientoEnvio.objects.create(envio=envio, estado=estado, descripcion=estado)
+        self.assertEqual(archivo.archivar_lote([envio.id]), 3)
+
+        envio.refresh_from_db()
+        self.assertEqual(envio.eventos_archivados, 3)
+        self.assertFalse(envio.seguimientos.exists())
+        SeguimientoEnvio.objects.create(envio=envio, estado='devuelto', descripcion='Nuevo')
+        estados = [evento.estado for evento in archivo.eventos(envio)]
+        self.assertEqual(sorted(estados), ['devuelto', 'en_transito', 'entregado', 'pendiente'])
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class PosicionesTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def posicion(self, fecha_hora):
+        ahora = datetime(2026, 1, 2, tzinfo=dt_timezone.utc)
+        return posiciones.parsear({'lat': -12.0, 'lon': -77.0, 'fecha_hora': fecha_hora}, conductor_id=7, ahora=ahora)
+
+    def test_ultima_posicion_con_husos_distintos(self):
+        # 15:00 UTC y luego una anterior (14:30 UTC) de un dispositivo en otro huso
+        posiciones._guardar_ultimas([self.posicion('2026-01-01T10:00:00-05:00')])
+        posiciones._guardar_ultimas([self.posicion('2026-01-01T14:30:00+00:00')])
+        self.assertEqual(posiciones.ultima_posicion(7)['fecha_hora'], '2026-01-01T15:00:00+00:00')
+        posiciones._guardar_ultimas([self.posicion('2026-01-01T16:10:00+01:00')])
+        self.assertEqual(posiciones.ultima_posicion(7)['fecha_hora'], '2026-01-01T15:10:00+00:00')
+
+    @override_settings(POSICIONES_BUFFER_SEGUNDOS=3600, POSICIONES_BUFFER_LIMITE=5)
+    def test_escritura_fallida_vuelve_al_buffer(self):
+        buffer = posiciones.BufferPosiciones()
+        self.addCleanup(lambda: buffer._temporizador and buffer._temporizador.cancel())
+        buffer.agregar([self.posicion('2026-01-01T10:00:00Z') for _ in range(3)])
+
+        with mock.patch.object(PosicionConductor.objects, 'bulk_create', side_effect=RuntimeError('sin base')):
+            self.assertEqual(buffer.vaciar(reintentar=True), 0)
+        self.assertEqual((len(buffer), buffer.fallos, buffer.descartadas), (3, 1, 0))
+
+        # Pasado el límite se descartan las más antiguas y quedan contadas
+        buffer.agregar([self.posicion('2026-01-01T11:00:00Z') for _ in range(3)])
+        with mock.patch.object(PosicionConductor.objects, 'bulk_create', side_effect=RuntimeError('sin base')):
+            buffer.vaciar(reintentar=True)
+        self.assertEqual((len(buffer), buffer.descartadas), (5, 1))
+
+        with mock.patch.object(PosicionConductor.objects, 'bulk_create') as bulk_create:
+            self.assertEqual(buffer.vaciar(), 5)
+        self.assertEqual(len(bulk_create.call_args[0][0]), 5)
+
+
+@override_settings(CACHES=CACHES_PRUEBA, SYNC_LIMITE=2, SYNC_MARGEN_SEGUNDOS=0)
+class SincronizacionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cliente-sync')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.categorias = [Categoria.objects.create(nombre=f'Categoría {i}') for i in range(5)]
+
+    def sincronizar(self, valor):
+        respuesta = self.client.get('/api/sync/', {'categorias': valor})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['categorias']
+
+    def paginas(self, valor):
+        recibidos, pagina = [], {'hay_mas': True, 'continuar': valor}
+        while pagina['hay_mas']:
+            pagina = self.sincronizar(pagina['continuar'])
+            recibidos.append(pagina)
+        return recibidos
+
+    def test_coleccion_completa_por_paginas(self):
+        paginas = self.paginas('')
+        self.assertEqual(len(paginas), 3)
+        self.assertTrue(all(pagina['completo'] for pagina in paginas))
+        ids = [categoria['id'] for pagina in paginas for categoria in pagina['cambios']]
+        self.assertEqual(ids, [categoria.id for categoria in self.categorias])
+        # La marca de la primera página se mantiene hasta el final
+        self.assertEqual({pagina['marca'] for pagina in paginas}, {paginas[0]['marca']})
+
+    def test_cambios_y_eliminados_desde_la_marca(self):
+        marca = self.paginas('')[-1]['continuar']
+        eliminada, desactivada = self.categorias[0].id, self.categorias[1]
+        self.categorias[0].delete()
+        desactivada.activa = False
+        desactivada.save()
+        nueva = Categoria.objects.create(nombre='Nueva')
+
+        paginas = self.paginas(marca)
+        self.assertFalse(any(pagina['completo'] for pagina in paginas))
+        self.assertEqual([c['id'] for pagina in paginas for c in pagina['cambios']], [nueva.id])
+        self.assertEqual(
+            sorted(i for pagina in paginas for i in pagina['eliminados']), sorted([eliminada, desactivada.id]),
+        )
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class IdempotenciaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cliente-idempotencia')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ahora = timezone.now()
+        self.cuerpo = {
+            'cliente': self.user.id, 'descripcion_carga': 'Caja', 'peso_kg': '1.00', 'volumen_m3': '0.10',
+            'direccion_recogida': 'Origen 1', 'direccion_entrega': 'Destino 2',
+            'contacto_recogida': 'Ana', 'contacto_entrega': 'Luis',
+            'telefono_recogida': '111', 'telefono_entrega': '222',
+            'fecha_recogida_programada': ahora.isoformat(),
+            'fecha_entrega_programada': (ahora + timedelta(days=1)).isoformat(),
+            'costo_envio': '10.00', 'valor_declarado': '100.00',
+        }
+
+    def crear(self, cuerpo, clave='clave-1'):
+        return self.client.post('/api/envios/', cuerpo, format='json', HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_recibe_la_misma_respuesta_sin_crear_otro(self):
+        primera = self.crear(self.cuerpo)
+        self.assertEqual(primera.status_code, 201)
+        segunda = self.crear(self.cuerpo)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(Envio.objects.count(), 1)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.crear(self.cuerpo)
+        respuesta = self.crear({**self.cuerpo, 'peso_kg': '2.00'})
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(Envio.objects.count(), 1)
+
+    def test_error_libera_la_clave(self):
+        respuesta = self.crear({**self.cuerpo, 'peso_kg': 'no-es-numero'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        self.assertEqual(self.crear(self.cuerpo).status_code, 201)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ReservasTests(TestCase):
+    def setUp(self):
+        self.producto = crear_producto(stock=5)
+        self.carritos = [
+            Carrito.objects.create(usuario=User.objects.create_user(f'cliente-reserva-{i}')) for i in range(2)
+        ]
+
+    def reservado(self):
+        self.producto.refresh_from_db()
+        return self.producto.reservado
+
+    def test_no_reserva_mas_que_el_disponible(self):
+        primero, segundo = self.carritos
+        self.assertTrue(reservas.reservar(primero, self.producto.id, 3))
+        self.assertFalse(reservas.reservar(segundo, self.producto.id, 3))
+        self.assertTrue(reservas.reservar(segundo, self.producto.id, 2))
+        self.assertEqual(self.reservado(), 5)
+        # Bajar la cantidad devuelve la diferencia
+        self.assertTrue(reservas.reservar(primero, self.producto.id, 1))
+        self.assertEqual(self.reservado(), 3)
+
+    def test_reservar_lote_es_todo_o_nada(self):
+        otro = crear_producto(stock=1, nombre='Escaso')
+        with self.assertRaises(reservas.StockInsuficiente):
+            reservas.reservar_lote(self.carritos[0], {self.producto: 2, otro: 2})
+        self.assertEqual(self.reservado(), 0)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_liberar_vencidas(self):
+        reservas.reservar(self.carritos[0], self.producto.id, 4)
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservas.liberar_vencidas(), 1)
+        self.assertEqual(self.reservado(), 0)
+        self.assertTrue(reservas.reservar(self.carritos[1], self.producto.id, 5))
+
+    def carrito_api(self):
+        user = self.carritos[0].usuario
+        UserProfile.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        respuesta = client.post('/api/carrito/', {'producto_id': self.producto.id, 'cantidad': 2}, format='json')
+        return client, respuesta.json()['items'][0]['id']
+
+    def reserva(self):
+        return ReservaStock.objects.filter(carrito=self.carritos[0]).values_list('cantidad', flat=True).first()
+
+    @override_settings(CACHES=CACHES_PRUEBA)
+    def test_patch_ajusta_item_y_reserva(self):
+        client, item_id = self.carrito_api()
+        respuesta = client.patch('/api/carrito/', {'item_id': item_id, 'cantidad': 4}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((self.reservado(), self.reserva()), (4, 4))
+        respuesta = client.patch('/api/carrito/', {'item_id': item_id, 'cantidad': 6}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual((self.reservado(), self.reserva()), (4, 4))
+        self.assertEqual(CarritoItem.objects.get().cantidad, 4)
+        client.patch('/api/carrito/', {'item_id': item_id, 'cantidad': 0}, format='json')
+        self.assertEqual((self.reservado(), self.reserva()), (0, None))
+        self.assertFalse(CarritoItem.objects.exists())
+
+    @override_settings(CACHES=CACHES_PRUEBA)
+    def test_delete_quita_item_y_reserva_juntos(self):
+        client, item_id = self.carrito_api()
+        with mock.patch.object(reservas, 'reservar', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError), self.assertLogs('django.request', 'ERROR'):
+            client.delete('/api/carrito/', {'item_id': item_id}, format='json')
+        # El error deshizo también el borrado del item
+        self.assertTrue(CarritoItem.objects.filter(id=item_id).exists())
+        self.assertEqual((self.reservado(), self.reserva()), (2, 2))
+        respuesta = client.delete('/api/carrito/', {'item_id': item_id}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((self.reservado(), self.reserva()), (0, None))
+        self.assertFalse(CarritoItem.objects.exists())
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CarritoCantidadTests(TestCase):
+    def setUp(self):
+        self.producto = crear_producto(stock=10)
+        self.client = APIClient()
+
+    def items(self, respuesta):
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return {item['producto']['id']: item['cantidad'] for item in respuesta.json()['items']}
+
+    def test_invitado_acepta_cantidad_como_texto(self):
+        respuesta = self.client.post('/api/carrito/', {'producto_id': self.producto.id, 'cantidad': '1'}, format='json')
+        cabecera = {'HTTP_X_CARRITO_INVITADO': respuesta['X-Carrito-Invitado']}
+        respuesta = self.client.patch(
+            '/api/carrito/', {'item_id': self.producto.id, 'cantidad': '3'}, format='json', **cabecera,
+        )
+        self.assertEqual(self.items(respuesta), {self.producto.id: 3})
+        respuesta = self.client.patch(
+            '/api/carrito/', {'item_id': self.producto.id, 'cantidad': 'tres'}, format='json', **cabecera,
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_usuario_acepta_cantidad_como_texto(self):
+        user = User.objects.create_user('cliente-carrito')
+        UserProfile.objects.create(user=user)
+        self.client.force_authenticate(user)
+        respuesta = self.client.post('/api/carrito/', {'producto_id': self.producto.id, 'cantidad': '2'}, format='json')
+        self.assertEqual(self.items(respuesta), {self.producto.id: 2})
+        item_id = respuesta.json()['items'][0]['id']
+        respuesta = self.client.patch('/api/carrito/', {'item_id': item_id, 'cantidad': '4'}, format='json')
+        self.assertEqual(self.items(respuesta), {self.producto.id: 4})
+        respuesta = self.client.patch('/api/carrito/', {'item_id': item_id, 'cantidad': None}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ArranqueTests(SimpleTestCase):
+    def test_arranque_dentro_del_presupuesto(self):
+        """django.setup() y la carga de las URLs en un proceso nuevo, sin consultas"""
+        with tempfile.TemporaryDirectory() as directorio:
+            entorno = {'SQLITE_DB': f'{directorio}/arranque.sqlite3', 'CACHE_BACKEND': 'memoria'}
+            # La primera corrida compila los .pyc, como en un despliegue
+            benchmark_arranque.medir_proceso(None, entorno)
+            metricas, _ = benchmark_arranque.medir_proceso(None, entorno)
+        total_ms = (metricas['fases']['setup'] + metricas['fases']['urls']) * 1000
+        self.assertEqual(metricas['consultas'], {'setup': 0, 'urls': 0})
+        self.assertLess(total_ms, settings.ARRANQUE_PRESUPUESTO_MS)
+
+
+@override_settings(CACHES=CACHES_PRUEBA, ADMIN_CONTEO_MAXIMO=20)
+class ChangelistsAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        base, contexto = dataset.preparar_dataset(
+            semilla=42, usuarios=30, conductores=3, productos=30, lote=500, dias=30, carritos=15, pedidos=60,
+        )
+        dataset.generar_bloques(42, dataset.dividir_bloques(60), base, contexto)
+        admin_tablas.actualizar_estadisticas()
+        cls.superusuario = User.objects.create_superuser('admin-pruebas', 'admin-pruebas@tecnoroute.test', 'x')
+
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.client = Client()
+        self.client.force_login(self.superusuario)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        for caso, (modelo_admin, ruta) in benchmark_admin.changelists().items():
+            if modelo_admin.model._meta.app_label not in benchmark_admin.APPS_PROPIAS:
+                continue
+            rutas = [ruta] + ([f'{ruta}?{benchmark_admin.FILTROS[caso]}'] if caso in benchmark_admin.FILTROS else [])
+            for ruta_caso in rutas:
+                with self.subTest(ruta=ruta_caso):
+                    pocas = benchmark_admin.consultas_con(self.client, modelo_admin, ruta_caso, 10)
+                    original, modelo_admin.list_per_page = modelo_admin.list_per_page, 100
+                    try:
+                        with self.assertNumQueries(pocas):
+                            benchmark_admin.abrir(self.client, ruta_caso)()
+                    finally:
+                        modelo_admin.list_per_page = original
+
+    def test_tabla_grande_sin_filtros_usa_la_estimacion(self):
+        self.assertGreaterEqual(admin_tablas.estimar_filas(Envio), 20)
+        with CaptureQueriesContext(connection) as consultas:
+            benchmark_admin.abrir(self.client, '/admin/logistics/envio/')()
+        conteos = [c['sql'] for c in consultas if 'COUNT(' in c['sql'] and 'logistics_envio' in c['sql']]
+        self.assertEqual(conteos, [])
+
+    def test_tabla_grande_con_filtro_cuenta_hasta_el_maximo(self):
+        respuesta = self.client.get('/admin/logistics/envio/?q=ENV')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['cl'].result_count, 20)
+
+
+@override_settings(CACHES=CACHES_PRUEBA, REPLICAS_DB_ALIASES=['replica_1'])
+class ReplicasTests(TestCase):
+    def setUp(self):
+        replicas.olvidar_estado()
+        self.addCleanup(replicas.olvidar_estado)
+        self.estado = replicas.EstadoPeticion(permite_replica=True)
+        token = replicas._peticion.set(self.estado)
+        self.addCleanup(replicas._peticion.reset, token)
+
+    def test_router_recuerda_la_replica_usada(self):
+        replicas._replicas['replica_1'] = replicas.EstadoReplica(verificada=float('inf'), retraso=0.0)
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(ReplicasRouter().db_for_read(Producto), 'replica_1')
+        self.assertEqual(self.estado.replicas, {'replica_1'})
+
+    def test_error_en_la_replica_repite_en_la_primaria(self):
+        crear_producto(stock=3)
+        self.estado.replicas.add('replica_1')
+        request = RequestFactory().get('/api/productos/', SERVER_NAME='localhost')
+        request.resolver_match = resolve('/api/productos/')
+        respuesta = replicas.ReplicasMiddleware(lambda r: None).process_exception(
+            request, OperationalError('no such table: user_management_producto'),
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(self.estado.permite_replica)
+        self.assertFalse(replicas.estado_replica('replica_1').disponible)
+
+    def test_otros_errores_no_se_repiten(self):
+        request = RequestFactory().get('/api/productos/')
+        middleware = replicas.ReplicasMiddleware(lambda r: None)
+        self.assertIsNone(middleware.process_exception(request, OperationalError('primaria')))
+        self.estado.replicas.add('replica_1')
+        self.assertIsNone(middleware.process_exception(request, ValueError()))
+
+
+@override_settings(NUMERACION_BLOQUE=10)
+class NumeracionTests(TestCase):
+    def setUp(self):
+        numeracion._bloques.clear()
+        self.addCleanup(numeracion._bloques.clear)
+
+    def test_formato_y_digito_verificador(self):
+        self.assertEqual(numeracion.formatear('pedido', 7992739871), 'PED-7992739871-3')
+        self.assertTrue(numeracion.verificador_correcto('ENV-0000001234-' + str(numeracion.digito_verificador(1234))))
+        self.assertFalse(numeracion.verificador_correcto('PED-7992739872-3'))
+        # Los números antiguos no tienen el formato y siguen siendo válidos
+        self.assertTrue(numeracion.verificador_correcto('PED-1A2B3C4D'))
+
+    def test_numeros_consecutivos_desde_un_bloque(self):
+        # En la transacción de la prueba el sobrante pasa a memoria al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            primeros = numeracion.siguientes('pedido', 3)
+        with self.assertNumQueries(0):
+            siguientes = [numeracion.siguiente('pedido') for _ in range(7)]
+        numeros = primeros + siguientes + numeracion.siguientes('pedido', 15)
+        self.assertEqual(len(set(numeros)), 25)
+        self.assertEqual(numeros, sorted(numeros))
+        self.assertTrue(all(numeracion.verificador_correcto(numero) for numero in numeros))
+        self.assertEqual(SecuenciaNumeracion.objects.get(nombre='pedido').siguiente, 31)
+
+    def test_rollback_no_guarda_el_sobrante(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            numeracion.siguiente('guia')
+            raise ValueError
+        self.assertEqual(numeracion._tomar('guia', 1), [])
+        # La reserva también se deshizo: el siguiente número es el primero
+        self.assertEqual(numeracion.siguiente('guia'), numeracion.formatear('guia', 1))
+
+
+@override_settings(CACHES=CACHES_PRUEBA, NUMERACION_BLOQUE=10)
+class NumeracionCheckoutTests(TransactionTestCase):
+    def setUp(self):
+        numeracion._bloques.clear()
+        self.addCleanup(numeracion._bloques.clear)
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('cliente-checkout')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        producto = crear_producto(stock=5)
+        self.client.post('/api/carrito/', {'producto_id': producto.id, 'cantidad': 1}, format='json')
+
+    def test_numeros_fuera_de_la_transaccion_de_la_clave(self):
+        en_transaccion = []
+        reservar = numeracion.reservar
+
+        def reservar_registrando(secuencia, cantidad):
+            en_transaccion.append(connection.in_atomic_block)
+            return reservar(secuencia, cantidad)
+
+        cuerpo = {'direccion_envio': 'Calle 1', 'telefono_contacto': '300'}
+        with mock.patch.object(numeracion, 'reservar', reservar_registrando):
+            primera = self.client.post('/api/pedidos/', cuerpo, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+            segunda = self.client.post('/api/pedidos/', cuerpo, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(primera.status_code, 201, primera.content)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(en_transaccion, [False, False])
+        # El sobrante de cada bloque quedó en memoria y el reintento no tomó números
+        self.assertEqual(len(numeracion._tomar('pedido', 10)), 9)
+        self.assertEqual(Pedido.objects.get().numero_pedido, numeracion.formatear('pedido', 1))
+
+
+class DatasetTests(TestCase):
+    def generar(self):
+        """Filas de pedidos de un dataset pequeño; se deshace al terminar"""
+        with transaction.atomic():
+            base, contexto = dataset.preparar_dataset(
+                semilla=7, usuarios=5, conductores=2, productos=6, lote=100, dias=30, carritos=3, pedidos=20,
+            )
+            dataset.generar_bloques(7, dataset.dividir_bloques(20), base, contexto)
+            filas = list(Pedido.objects.order_by('id').values_list('numero_pedido', 'fecha_creacion', 'total'))
+            creadas = (
+                Categoria.objects.count() + Producto.objects.count() + MovimientoStock.objects.count()
+                + User.objects.count() + UserProfile.objects.count() + 2 * Conductor.objects.count()
+                + Carrito.objects.count() + CarritoItem.objects.count()
+            )
+            self.assertEqual(contexto['filas'], creadas)
+            transaction.set_rollback(True)
+        return filas
+
+    def test_misma_semilla_mismo_dataset(self):
+        primera = self.generar()
+        self.assertEqual(len(primera), 20)
+        self.assertEqual(self.generar(), primera)
+        self.assertTrue(all(fecha.date() <= dataset.fecha_referencia(7).date() for _, fecha, _ in primera))
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class InventarioTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.producto = crear_producto(stock=10)
+        self.user = User.objects.create_user('cliente-inventario')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def movimientos(self):
+        return list(MovimientoStock.objects.filter(producto=self.producto).order_by('id').values_list('motivo', 'cantidad'))
+
+    def stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock
+
+    def comprar(self, cantidad):
+        self.client.post('/api/carrito/', {'producto_id': self.producto.id, 'cantidad': cantidad}, format='json')
+        respuesta = self.client.post(
+            '/api/pedidos/', {'direccion_envio': 'Calle 1', 'telefono_contacto': '300'}, format='json',
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        return Pedido.objects.get(numero_pedido=respuesta.json()['numero_pedido'])
+
+    def test_venta_y_cancelacion_quedan_en_el_libro(self):
+        pedido = self.comprar(3)
+        self.assertEqual(self.stock(), 7)
+        venta = MovimientoStock.objects.get(motivo='venta')
+        self.assertEqual((venta.cantidad, venta.referencia, venta.usuario), (-3, pedido.numero_pedido, self.user))
+        respuesta = self.client.delete(f'/api/pedidos/{pedido.id}/')
+        self.assertEqual(respuesta.status_code, 204, respuesta.content)
+        self.assertEqual(self.stock(), 10)
+        self.assertEqual(self.movimientos(), [('inicial', 10), ('venta', -3), ('cancelacion', 3)])
+
+    def test_ajuste_por_la_api(self):
+        respuesta = self.client.patch(f'/api/productos/{self.producto.id}/', {'stock': 4}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(self.stock(), 4)
+        ajuste = MovimientoStock.objects.get(motivo='ajuste')
+        self.assertEqual((ajuste.cantidad, ajuste.usuario), (-6, self.user))
+
+    def test_ajuste_que_dejaria_stock_negativo_es_400(self):
+        # La instancia se cargó con stock 10 y mientras tanto se vendieron 9
+        vieja = Producto.objects.get(pk=self.producto.pk)
+        Producto.objects.filter(pk=self.producto.pk).update(stock=1)
+        with mock.patch.object(ProductoViewSet, 'get_object', return_value=vieja):
+            respuesta = self.client.patch(f'/api/productos/{self.producto.id}/', {'stock': 0}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('stock', respuesta.json())
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(MovimientoStock.objects.filter(motivo='ajuste').exists())
+        self.assertFalse(inventario.ajustar(self.producto.id, -2))
+
+    def test_snapshot_mas_movimientos_es_el_stock(self):
+        self.comprar(2)
+        self.assertEqual(inventario.tomar_snapshots(margen=0), 1)
+        self.assertTrue(inventario.ajustar(self.producto.id, 5, usuario=self.user))
+        self.comprar(1)
+        # Solo cuenta los movimientos posteriores a la snapshot
+        with self.assertNumQueries(2):
+            derivado = inventario.calcular([self.producto.id])
+        self.assertEqual(derivado, {self.producto.id: self.stock()})
+        self.assertEqual(inventario.stock(self.producto.id), 12)
+        self.assertEqual(inventario.conciliar(), [])
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CambioEstadoLoteTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('bodega')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def cambiar(self, estado, ids=(), numeros_guia=()):
+        respuesta = self.client.post('/api/envios/cambiar_estado_lote/', {
+            'estado': estado, 'ids': list(ids), 'numeros_guia': list(numeros_guia),
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json()
+
+    def test_ids_y_guias_con_resultado_por_referencia(self):
+        primero, segundo = crear_envio(self.user), crear_envio(self.user)
+        entregado = crear_envio(self.user, estado='entregado')
+        datos = self.cambiar(
+            'en_transito', ids=[primero.id, entregado.id, 999999], numeros_guia=[segundo.numero_guia, primero.numero_guia],
+        )
+        self.assertEqual([r['resultado'] for r in datos['resultados']], [
+            transiciones.ACTUALIZADO, transiciones.TRANSICION_INVALIDA, transiciones.NO_ENCONTRADO,
+            transiciones.ACTUALIZADO, transiciones.SIN_CAMBIOS,
+        ])
+        self.assertEqual(datos['resumen'], {'actualizado': 2, 'transicion_invalida': 1, 'no_encontrado': 1, 'sin_cambios': 1})
+        estados = dict(Envio.objects.values_list('id', 'estado'))
+        self.assertEqual(estados, {primero.id: 'en_transito', segundo.id: 'en_transito', entregado.id: 'entregado'})
+        # Un seguimiento por envío actualizado, aunque venga por id y por guía
+        self.assertEqual(
+            sorted(SeguimientoEnvio.objects.values_list('envio_id', 'estado', 'usuario')),
+            [(primero.id, 'en_transito', self.user.id), (segundo.id, 'en_transito', self.user.id)],
+        )
+
+    def test_fechas_reales_solo_si_estan_vacias(self):
+        recogido = timezone.now() - timedelta(days=2)
+        con_fecha = crear_envio(self.user, fecha_recogida_real=recogido)
+        sin_fecha = crear_envio(self.user)
+        self.cambiar('en_transito', ids=[con_fecha.id, sin_fecha.id])
+        con_fecha.refresh_from_db()
+        sin_fecha.refresh_from_db()
+        self.assertEqual(con_fecha.fecha_recogida_real, recogido)
+        self.assertIsNotNone(sin_fecha.fecha_recogida_real)
+        self.assertIsNone(sin_fecha.fecha_entrega_real)
+        self.cambiar('entregado', ids=[sin_fecha.id])
+        sin_fecha.refresh_from_db()
+        self.assertIsNotNone(sin_fecha.fecha_entrega_real)
+
+    def test_mas_referencias_que_max_query_params(self):
+        envios = [crear_envio(self.user) for _ in range(5)]
+        # Bloques de 2 referencias: un UPDATE por bloque
+        with mock.patch.object(connection.features, 'max_query_params', 12), \
+                CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(transiciones.tamano_bloque(), 2)
+            datos = self.cambiar('en_transito', numeros_guia=[envio.numero_guia for envio in envios])
+        updates = [c for c in consultas if c['sql'].startswith('UPDATE "logistics_envio"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(datos['resumen'], {'actualizado': 5})
+        self.assertEqual(Envio.objects.filter(estado='en_transito').count(), 5)
+        self.assertEqual(SeguimientoEnvio.objects.count(), 5)
+
+    def test_error_a_mitad_del_lote_deshace_todo(self):
+        envios = [crear_envio(self.user) for _ in range(4)]
+        registrar = transiciones.rastreo.registrar_eventos_lote
+        llamadas = []
+
+        def fallar_en_el_segundo_bloque(eventos):
+            llamadas.append(len(eventos))
+            if len(llamadas) == 2:
+                raise RuntimeError('fallo en el segundo bloque')
+            return registrar(eventos)
+
+        with mock.patch.object(connection.features, 'max_query_params', 12), \
+                mock.patch.object(transiciones.rastreo, 'registrar_eventos_lote', fallar_en_el_segundo_bloque), \
+                self.assertRaises(RuntimeError):
+            transiciones.cambiar_estado_lote([envio.id for envio in envios], 'en_transito')
+        self.assertEqual(llamadas, [2, 2])
+        self.assertEqual(Envio.objects.filter(estado='pendiente').count(), 4)
+        self.assertFalse(SeguimientoEnvio.objects.exists())
+
+
+@override_settings(MANTENIMIENTO_PAUSA=0)
+class MantenimientoTests(TestCase):
+    def setUp(self):
+        self.llamadas = []
+        self.tarea = mantenimiento.Tarea('prueba', self.llamadas.append, 3600)
+
+    def test_otro_nodo_no_toma_una_tarea_bloqueada(self):
+        self.assertTrue(mantenimiento.tomar(self.tarea, 'nodo-a'))
+        self.assertFalse(mantenimiento.tomar(self.tarea, 'nodo-b', forzar=True))
+        self.assertIsNone(mantenimiento.ejecutar(self.tarea, 'nodo-b', forzar=True))
+        self.assertEqual(self.llamadas, [])
+        self.assertEqual(TareaMantenimiento.objects.get(nombre='prueba').nodo, 'nodo-a')
+
+    def test_bloqueo_vencido_se_retoma(self):
+        self.assertTrue(mantenimiento.tomar(self.tarea, 'nodo-a'))
+        TareaMantenimiento.objects.filter(nombre='prueba').update(
+            bloqueada_hasta=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(mantenimiento.ejecutar(self.tarea, 'nodo-b')['error'], '')
+        self.assertEqual(len(self.llamadas), 1)
+        fila = TareaMantenimiento.objects.get(nombre='prueba')
+        self.assertEqual((fila.nodo, fila.bloqueada_hasta, fila.ejecuciones), ('nodo-b', None, 1))
+
+    def test_error_queda_registrado(self):
+        def fallar(ejecucion):
+            raise RuntimeError('disco lleno')
+
+        with self.assertLogs('logistics.mantenimiento', 'ERROR'):
+            resultado = mantenimiento.ejecutar(mantenimiento.Tarea('prueba', fallar, 3600), 'nodo-a')
+        self.assertEqual(resultado['error'], 'RuntimeError: disco lleno')
+        fila = TareaMantenimiento.objects.get(nombre='prueba')
+        self.assertEqual((fila.error, fila.fallos, fila.ejecuciones, fila.bloqueada_hasta), (
+            'RuntimeError: disco lleno', 1, 1, None,
+        ))
+        # Vencida de nuevo en el próximo intervalo, no antes
+        self.assertFalse(mantenimiento.tomar(self.tarea, 'nodo-b'))
+
+    @override_settings(MANTENIMIENTO_INTERVALOS={'prueba': 60})
+    def test_proxima_ejecucion_usa_mantenimiento_intervalos(self):
+        antes = timezone.now()
+        mantenimiento.ejecutar(self.tarea, 'nodo-a')
+        fila = TareaMantenimiento.objects.get(nombre='prueba')
+        self.assertGreaterEqual(fila.proxima_ejecucion, antes + timedelta(seconds=60))
+        self.assertLess(fila.proxima_ejecucion, antes + timedelta(seconds=3600))
+
+    @override_settings(MANTENIMIENTO_LOTE=2)
+    def test_claves_idempotencia_se_borran_por_lotes(self):
+        ahora = timezone.now()
+        for numero in range(5):
+            ClaveIdempotencia.objects.create(
+                usuario_id=1, alcance='POST /api/envios/', clave=f'clave-{numero}', huella='x',
+                fecha_creacion=ahora - timedelta(days=2), expira=ahora - timedelta(days=1),
+            )
+        vigente = ClaveIdempotencia.objects.create(
+            usuario_id=1, alcance='POST /api/envios/', clave='vigente', huella='x',
+            fecha_creacion=ahora, expira=ahora + timedelta(days=1),
+        )
+        tarea = mantenimiento.TAREAS['claves_idempotencia']
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = mantenimiento.ejecutar(tarea, 'nodo-a', forzar=True)
+        self.assertEqual(resultado['procesados'], 5)
+        borrados = [c for c in consultas if c['sql'].startswith('DELETE FROM "logistics_claveidempotencia"')]
+        self.assertEqual(len(borrados), 3)
+        self.assertEqual(list(ClaveIdempotencia.objects.values_list('id', flat=True)), [vigente.id])
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class RastreoPublicoTests(TestCase):
+    PRIVADOS = {
+        'id', 'cliente', 'conductor', 'vehiculo', 'ruta', 'descripcion_carga', 'peso_kg', 'volumen_m3',
+        'direccion_recogida', 'direccion_entrega', 'contacto_recogida', 'contacto_entrega',
+        'telefono_recogida', 'telefono_entrega', 'costo_envio', 'valor_declarado', 'usuario',
+    }
+
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('operador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.envio = crear_envio(self.user, origen='Bogotá', destino='Soacha')
+
+    def cambiar_estado(self, estado):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(f'/api/envios/{self.envio.id}/cambiar_estado/', {
+                'estado': estado, 'ubicacion': 'Bodega',
+            }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_fallo_de_cache_construye_sin_escribir_y_el_acierto_no_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            documento = rastreo.obtener(self.envio.numero_guia)
+        self.assertEqual(documento['estado'], 'pendiente')
+        self.assertFalse([c for c in consultas if not c['sql'].startswith('SELECT')])
+        self.assertFalse(RastreoPublico.objects.exists())
+        with self.assertNumQueries(0):
+            self.assertEqual(rastreo.obtener(self.envio.numero_guia), documento)
+        with self.assertNumQueries(0):
+            respuesta = Client().get(f'/api/rastreo/{self.envio.numero_guia}/')
+        self.assertEqual(respuesta.json(), documento)
+
+    def test_guia_inexistente_queda_en_cache(self):
+        with self.assertNumQueries(2):
+            self.assertIsNone(rastreo.obtener('NO-EXISTE'))
+        with self.assertNumQueries(0):
+            self.assertEqual(Client().get('/api/rastreo/NO-EXISTE/').status_code, 404)
+
+    def test_documento_publico_sin_datos_privados(self):
+        self.cambiar_estado('en_transito')
+        documento = Client().get(f'/api/rastreo/{self.envio.numero_guia}/').json()
+        self.assertFalse(self.PRIVADOS & set(documento))
+        self.assertEqual((documento['origen'], documento['destino']), ('Bogotá', 'Soacha'))
+        self.assertFalse(self.PRIVADOS & {campo for evento in documento['eventos'] for campo in evento})
+        for privado in ('Origen 1', 'Destino 2', 'Ana', 'Luis', '111', '222', 'Caja'):
+            self.assertNotIn(privado, json.dumps(documento, ensure_ascii=False))
+
+    def test_nuevo_evento_actualiza_la_cache(self):
+        self.cambiar_estado('en_transito')
+        guia = self.envio.numero_guia
+        self.assertEqual(Client().get(f'/api/rastreo/{guia}/').json()['estado'], 'en_transito')
+        self.cambiar_estado('entregado')
+        with self.assertNumQueries(0):
+            documento = Client().get(f'/api/rastreo/{guia}/').json()
+        self.assertEqual(documento['estado'], 'entregado')
+        self.assertEqual([evento['estado'] for evento in documento['eventos']], ['entregado', 'en_transito'])
+        self.assertEqual(RastreoPublico.objects.get(numero_guia=guia).documento, documento)
+
+    def test_buscar_por_guia_y_seguimiento_sirven_el_documento(self):
+        self.cambiar_estado('en_transito')
+        documento = rastreo.obtener(self.envio.numero_guia)
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/envios/buscar_por_guia/', {'numero_guia': self.envio.numero_guia})
+        self.assertEqual(respuesta.json(), documento)
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(f'/api/envios/{self.envio.id}/seguimiento/')
+        self.assertEqual(respuesta.json(), documento['eventos'])
+        completo = self.client.get(f'/api/envios/{self.envio.id}/seguimiento/', {'completo': 1}).json()
+        self.assertEqual([(s['estado'], s['usuario']) for s in completo], [('en_transito', self.user.id)])
+        self.assertEqual(
+            self.client.get('/api/envios/buscar_por_guia/', {'numero_guia': 'NO-EXISTE'}).status_code, 404,
+        )
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('cliente-async', email='async@example.com')
+        UserProfile.objects.create(user=self.user, telefono='3001112233')
+        self.autorizacion = f'Token {Token.objects.create(user=self.user).key}'
+        self.envio = crear_envio(self.user)
+        SeguimientoEnvio.objects.create(envio=self.envio, estado='pendiente', descripcion='Creado')
+        self.producto = crear_producto(5)
+        self.sincrono = APIClient(HTTP_AUTHORIZATION=self.autorizacion)
+        # AsyncClient (Django 4.2) no aplica las cabeceras del constructor: van en cada petición
+        self.asincrono = AsyncClient()
+        self.cabeceras = {'Authorization': self.autorizacion}
+
+    def rutas(self):
+        return {
+            ('GET', f'/api/envios/buscar_por_guia/?numero_guia={self.envio.numero_guia}'): 1,
+            ('GET', f'/api/envios/{self.envio.id}/seguimiento/'): 1,
+            ('GET', f'/api/envios/{self.envio.id}/seguimiento/?completo=1'): 2,
+            ('GET', '/api/productos/'): 1,
+            ('GET', f'/api/productos/{self.producto.id}/'): 1,
+            ('GET', '/api/pedidos/estadisticas/'): 1,
+            ('POST', '/api/auth/check-email/'): 1,
+            ('POST', '/api/auth/check-phone/'): 1,
+        }
+
+    async def pedir(self, metodo, ruta, cuerpo):
+        if metodo == 'POST':
+            return await self.asincrono.post(ruta, cuerpo, content_type='application/json', headers=self.cabeceras)
+        return await self.asincrono.get(ruta, headers=self.cabeceras)
+
+    def test_mismas_respuestas_que_las_sincronas_con_pocas_consultas(self):
+        cuerpo = {'email': 'async@example.com', 'phone': '3001112233'}
+        for (metodo, ruta), consultas in self.rutas().items():
+            with self.subTest(ruta=ruta):
+                ruta_async = ruta.replace('/api/', '/api/async/', 1)
+                if metodo == 'POST':
+                    sincrona = self.sincrono.post(ruta, cuerpo, format='json')
+                else:
+                    sincrona = self.sincrono.get(ruta)
+                # Token y documento de rastreo ya en caché: solo las consultas de la vista
+                with CaptureQueriesContext(connection) as capturadas:
+                    asincrona = async_to_sync(self.pedir)(metodo, ruta_async, cuerpo)
+                self.assertEqual(asincrona.status_code, 200)
+                self.assertEqual(asincrona.json(), sincrona.json())
+                self.assertLessEqual(len(capturadas), consultas, [c['sql'] for c in capturadas])
+
+    async def test_errores(self):
+        cliente, cabeceras = self.asincrono, self.cabeceras
+        self.assertEqual((await cliente.get('/api/async/envios/buscar_por_guia/?numero_guia=X')).status_code, 401)
+        self.assertEqual((await cliente.get('/api/async/envios/buscar_por_guia/', headers=cabeceras)).status_code, 400)
+        respuesta = await cliente.get('/api/async/envios/buscar_por_guia/?numero_guia=X', headers=cabeceras)
+        self.assertEqual(respuesta.status_code, 404)
+        respuesta = await cliente.get('/api/async/envios/999999/seguimiento/', headers=cabeceras)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual((await cliente.post('/api/async/productos/')).status_code, 405)
+        respuesta = await cliente.post('/api/async/auth/check-email/', 'x', content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_nombres_propios_y_limites_compartidos(self):
+        for ruta in ('/api/auth/check-email/', f'/api/envios/{self.envio.id}/seguimiento/', '/api/productos/'):
+            sincrona, asincrona = resolve(ruta), resolve(ruta.replace('/api/', '/api/async/', 1))
+            self.assertEqual(asincrona.url_name, f'async-{sincrona.url_name}')
+            self.assertEqual(asincrona.namespace, '')
+        self.assertEqual(reverse('async-check-email'), '/api/async/auth/check-email/')
+        request = RequestFactory().post('/api/async/auth/check-email/')
+        request.resolver_match = resolve('/api/async/auth/check-email/')
+        self.assertEqual(throttling.alcance_de(request), 'check-email')
+
+
+def crear_conductor(email, **campos):
+    numero = Conductor.objects.count() + 1
+    return Conductor.objects.create(
+        nombres='Carlos', apellidos=f'Conductor {numero}', cedula=f'100{numero}', licencia='C2',
+        telefono='3000000000', email=email, direccion='Calle 1', fecha_contratacion=date(2024, 1, 1), **campos,
+    )
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ConductorUsuarioTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+
+    def test_migracion_vincula_por_email_y_deja_nulos_los_demas(self):
+        antiguo = User.objects.create_user('carlos', 'carlos@tecnoroute.test')
+        User.objects.create_user('carlos-duplicado', 'carlos@tecnoroute.test')
+        ana = User.objects.create_user('ana', 'ana@tecnoroute.test')
+        ocupado = User.objects.create_user('luis', 'luis@tecnoroute.test')
+        crear_conductor('otro@tecnoroute.test', user=ocupado)
+        carlos, ana_conductor = crear_conductor('carlos@tecnoroute.test'), crear_conductor('ana@tecnoroute.test')
+        sin_usuario = crear_conductor('nadie@tecnoroute.test')
+        # El email de luis ya tiene conductor: su segundo registro no se vincula
+        luis = crear_conductor('luis@tecnoroute.test')
+
+        migracion = import_module('logistics.migrations.0013_conductor_user')
+        # Lotes de 2 conductores: el vínculo no depende de en qué lote cae cada uno
+        with mock.patch.object(migracion, 'TAMANO_LOTE', 2):
+            migracion.vincular_conductores(django_apps, SimpleNamespace(connection=connection))
+
+        vinculos = dict(Conductor.objects.values_list('id', 'user_id'))
+        self.assertEqual(vinculos[carlos.id], antiguo.id)
+        self.assertEqual(vinculos[ana_conductor.id], ana.id)
+        self.assertIsNone(vinculos[sin_usuario.id])
+        self.assertIsNone(vinculos[luis.id])
+
+    def test_principal_de_un_conductor(self):
+        user = User.objects.create_user('conductor-principal', 'cp@tecnoroute.test')
+        UserProfile.objects.create(user=user, role='conductor')
+        conductor = crear_conductor('cp@tecnoroute.test', user=user)
+        cliente = User.objects.create_user('cliente-principal')
+
+        user = User.objects.get(pk=user.pk)
+        # Perfil, conductor y admin en un solo JOIN
+        with self.assertNumQueries(1):
+            principal = principal_de(user)
+        self.assertEqual((principal.role, principal.conductor_id, principal.is_admin), ('conductor', conductor.id, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(principal.conductor, conductor)
+        self.assertIsNone(principal_de(cliente).conductor_id)
+
+        # Desde la caché del token: solo el id, el registro se consulta al usarlo
+        token = Token.objects.create(user=user)
+        autenticacion = authentication.CachedTokenAuthentication()
+        autenticacion.authenticate_credentials(token.key)
+        with self.assertNumQueries(0):
+            desde_cache, _ = autenticacion.authenticate_credentials(token.key)
+            self.assertEqual(desde_cache.principal.conductor_id, conductor.id)
+        self.assertEqual(desde_cache.principal.conductor, conductor)
+
+
+# Costos mínimos: las pruebas verifican el formato y el rehash, no la resistencia
+PARAMETROS_BAJOS = {
+    'scrypt': {'work_factor': 2**4, 'block_size': 8, 'parallelism': 1},
+    'argon2': {'time_cost': 1, 'memory_cost': 8, 'parallelism': 1},
+    'pbkdf2': {'iterations': 1000},
+}
+
+
+class HashersTests(TestCase):
+    def con_hasher(self, algoritmo, parametros=PARAMETROS_BAJOS):
+        # PASSWORD_HASHERS también cambia: así Django vuelve a instanciar los hashers con los parámetros
+        return override_settings(PASSWORD_HASHERS=hashers.lista_hashers(algoritmo), PASSWORD_HASHER_PARAMS=parametros)
+
+    def verificar_ida_y_vuelta(self, algoritmo):
+        with self.con_hasher(algoritmo):
+            codificada = make_password('clave-secreta')
+            hasher = identify_hasher(codificada)
+            self.assertEqual(hasher.nombre, algoritmo)
+            self.assertEqual(hasher.costo(), PARAMETROS_BAJOS[algoritmo])
+            self.assertTrue(check_password('clave-secreta', codificada))
+            self.assertFalse(check_password('otra-clave', codificada))
+            self.assertFalse(hasher.must_update(codificada))
+
+    def test_scrypt(self):
+        self.verificar_ida_y_vuelta('scrypt')
+
+    @skipUnless(hashers.argon2_disponible(), 'requiere argon2-cffi')
+    def test_argon2(self):
+        self.verificar_ida_y_vuelta('argon2')
+
+    def test_pbkdf2(self):
+        self.verificar_ida_y_vuelta('pbkdf2')
+
+    def test_cambio_de_parametros_rehace_el_hash_al_iniciar_sesion(self):
+        with self.con_hasher('scrypt'):
+            user = User.objects.create_user('cliente-hash', 'hash@tecnoroute.test', 'clave-secreta')
+        anterior = user.password
+
+        nuevos = {**PARAMETROS_BAJOS, 'scrypt': {**PARAMETROS_BAJOS['scrypt'], 'work_factor': 2**5}}
+        with self.con_hasher('scrypt', nuevos):
+            self.assertTrue(identify_hasher(anterior).must_update(anterior))
+            self.assertIsNotNone(login.iniciar_sesion('clave-secreta', email='hash@tecnoroute.test'))
+            user.refresh_from_db()
+            self.assertNotEqual(user.password, anterior)
+            self.assertEqual(identify_hasher(user.password).decode(user.password)['work_factor'], 2**5)
+            # El hash nuevo ya no necesita cambios y sigue verificando
+            self.assertFalse(identify_hasher(user.password).must_update(user.password))
+            self.assertIsNotNone(login.iniciar_sesion('clave-secreta', username='cliente-hash'))
+
+    def test_cambio_de_algoritmo_rehace_el_hash_al_iniciar_sesion(self):
+        with self.con_hasher('pbkdf2'):
+            user = User.objects.create_user('cliente-pbkdf2', password='clave-secreta')
+        with self.con_hasher('scrypt'):
+            self.assertIsNotNone(login.iniciar_sesion('clave-secreta', username='cliente-pbkdf2'))
+            user.refresh_from_db()
+            self.assertEqual(identify_hasher(user.password).algorithm, 'scrypt')
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CarritoLoteTests(TestCase):
+    def setUp(self):
+        for alias in ALIASES:
+            caches[alias].clear()
+        self.a, self.b, self.c = crear_producto(10, 'A'), crear_producto(5, 'B'), crear_producto(2, 'C')
+        self.user = User.objects.create_user('cliente-lote')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        carrito_lote.aplicar(self.user, [
+            {'accion': 'agregar', 'producto_id': self.b.id, 'cantidad': 2},
+            {'accion': 'agregar', 'producto_id': self.c.id, 'cantidad': 1},
+        ])
+
+    def lote(self, client, operaciones, **cabeceras):
+        return client.post('/api/carrito/lote/', {'operaciones': operaciones}, format='json', **cabeceras)
+
+    def cantidades(self, respuesta):
+        return {item['producto']['id']: item['cantidad'] for item in respuesta.json()['items']}
+
+    def estado(self):
+        """Items del carrito del usuario y lo reservado de cada producto"""
+        items = dict(CarritoItem.objects.filter(carrito__usuario=self.user).values_list('producto_id', 'cantidad'))
+        reservado = dict(Producto.objects.values_list('id', 'reservado'))
+        return items, reservado
+
+    def test_lote_mixto_se_aplica_completo(self):
+        respuesta = self.lote(self.client, [
+            {'accion': 'agregar', 'producto_id': self.a.id, 'cantidad': 3},
+            {'accion': 'agregar', 'producto_id': self.a.id},
+            {'accion': 'fijar', 'producto_id': self.b.id, 'cantidad': 4},
+            {'accion': 'quitar', 'producto_id': self.c.id},
+        ])
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(self.cantidades(respuesta), {self.a.id: 4, self.b.id: 4})
+        self.assertEqual(self.estado(), (
+            {self.a.id: 4, self.b.id: 4}, {self.a.id: 4, self.b.id: 4, self.c.id: 0},
+        ))
+
+    def test_stock_insuficiente_rechaza_todo_el_lote(self):
+        antes = self.estado()
+        respuesta = self.lote(self.client, [
+            {'accion': 'agregar', 'producto_id': self.a.id, 'cantidad': 2},
+            {'accion': 'fijar', 'producto_id': self.b.id, 'cantidad': 3},
+            {'accion': 'agregar', 'producto_id': self.c.id, 'cantidad': 2},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['productos'], ['C'])
+        self.assertEqual(self.estado(), antes)
+
+    def test_producto_inexistente_rechaza_todo_el_lote(self):
+        antes = self.estado()
+        respuesta = self.lote(self.client, [
+            {'accion': 'agregar', 'producto_id': self.a.id},
+            {'accion': 'agregar', 'producto_id': 999999},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores'], [{'indice': 1, 'error': 'Producto no encontrado'}])
+        self.assertEqual(self.estado(), antes)
+
+    def test_invitado(self):
+        invitado = APIClient()
+        antes = self.estado()
+        respuesta = self.lote(invitado, [
+            {'accion': 'agregar', 'producto_id': self.a.id, 'cantidad': 2},
+            # Disponible de C: 2 menos 1 reservado por el carrito del usuario
+            {'accion': 'agregar', 'producto_id': self.c.id, 'cantidad': 1},
+        ])
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        clave = respuesta[carrito_lote.CABECERA_INVITADO]
+        cabecera = {'HTTP_X_CARRITO_INVITADO': clave}
+
+        respuesta = self.lote(invitado, [
+            {'accion': 'fijar', 'producto_id': self.b.id, 'cantidad': 1},
+            {'accion': 'quitar', 'producto_id': self.a.id},
+        ], **cabecera)
+        self.assertEqual(self.cantidades(respuesta), {self.c.id: 1, self.b.id: 1})
+
+        # Más que el disponible de A (10): nada cambia
+        respuesta = self.lote(invitado, [
+            {'accion': 'fijar', 'producto_id': self.b.id, 'cantidad': 3},
+            {'accion': 'agregar', 'producto_id': self.a.id, 'cantidad': 11},
+        ], **cabecera)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['productos'], ['A'])
+        self.assertEqual(self.cantidades(invitado.get('/api/carrito/', **cabecera)), {self.c.id: 1, self.b.id: 1})
+        # Sin carrito en la base de datos ni reservas
+        self.assertEqual(Carrito.objects.count(), 1)
+        self.assertEqual(self.estado(), antes)
@@ -0,0 +1,230 @@
+"""
+Límite de peticiones para los endpoints públicos (AllowAny).
+
+Cada endpoint (por nombre de URL) tiene en settings.RATELIMIT_RATES uno o
+más buckets: 'ip' cuenta por IP del cliente y cualquier otra clave cuenta por
+ese campo del cuerpo de la petición (email, username, phone...), de modo que
+un bot no pueda rotar IPs contra la misma cuenta:
+
+    RATELIMIT_RATES = {
+        'request-password-reset': {'ip': '10/h', 'email': '3/h'},
+    }
+
+Cada bucket permite N peticiones en cualquier periodo, contadas con una
+ventana deslizante: el contador de la ventana actual más el de la anterior
+ponderado por la parte de ella que sigue dentro del periodo. Así no hay
+ráfagas de 2N en el borde entre dos ventanas, como con una ventana fija, y la
+capacidad se recupera de a poco como en un token bucket. Un token bucket con
+relleno continuo necesita leer y escribir su nivel de forma atómica, y la API
+de caché de Django no tiene compare-and-set; los contadores solo usan
+cache.add + cache.incr, que son atómicos en Redis, memcached y la caché en
+memoria, así que dos workers nunca pierden una petición.
+
+RateLimitMiddleware lo revisa antes de la vista y de la autenticación de DRF,
+así que una petición rechazada nunca llega a la base de datos. Las respuestas
+llevan las cabeceras RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset y
+RateLimit-Policy, y Retry-After cuando se rechazan (429).
+
+La IP es REMOTE_ADDR, salvo que REST_FRAMEWORK['NUM_PROXIES'] indique
+cuántos proxies propios agregan su entrada a X-Forwarded-For: sin proxies la
+cabecera la escribe el cliente y cambiarla en cada petición evitaría el
+límite por IP.
+"""
+import hashlib
+import json
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# No se leen cuerpos más grandes para buscar los campos de los buckets
+TAMANO_MAXIMO_CUERPO = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Limite:
+    capacidad: int
+    periodo: int
+
+    @property
+    def politica(self):
+        return f'{self.capacidad};w={self.periodo}'
+
+
+@dataclass(frozen=True)
+class Estado:
+    limite: Limite
+    permitido: bool
+    restantes: int
+    reinicio: int
+
+
+def parsear_tasa(tasa):
+    """'5/m' -> Limite(5, 60); '3/10m' -> Limite(3, 600)"""
+    cantidad, _, periodo = tasa.partition('/')
+    multiplicador = int(periodo[:-1] or 1)
+    return Limite(int(cantidad), multiplicador * PERIODOS[periodo[-1]])
+
+
+def _cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE_ALIAS', 'default')]
+
+
+def _resumen(valor):
+    return hashlib.sha1(valor.encode()).hexdigest()[:16]
+
+
+def clave_base(alcance, identidad):
+    return f'rl:{alcance}:{_resumen(identidad)}'
+
+
+def desfase(base, periodo):
+    """
+    Cada identidad cambia de ventana en un momento distinto del periodo, para
+    que no se liberen todos los buckets a la vez
+    """
+    return int(base[-8:], 16) % periodo
+
+
+def _contar(cache, clave, timeout):
+    cache.add(clave, 0, timeout=timeout)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        # Expiró entre add e incr
+        cache.set(clave, 1, timeout=timeout)
+        return 1
+
+
+def consumir(alcance, identidad, limite, ahora=None):
+    """Cuenta una petición en el bucket (alcance, identidad) y retorna su Estado"""
+    ahora = int(time.time() if ahora is None else ahora)
+    base = clave_base(alcance, identidad)
+    ventana, transcurrido = divmod(ahora + desfase(base, limite.periodo), limite.periodo)
+
+    cache = _cache()
+    # La ventana actual se sigue leyendo durante la siguiente
+    usados = _contar(cache, f'{base}:{ventana}', 2 * limite.periodo + 1)
+    anteriores = cache.get(f'{base}:{ventana - 1}') or 0
+
+    # Parte de la ventana anterior que sigue dentro del periodo
+    peso = 1 - transcurrido / limite.periodo
+    estimados = anteriores * peso + usados
+    permitido = estimados <= limite.capacidad
+
+    if permitido or usados >= limite.capacidad:
+        reinicio = limite.periodo - transcurrido
+    else:
+        # Hasta que el peso de la ventana anterior deje lugar a una petición más
+        libre = (limite.capacidad - usados - 1) / anteriores
+        reinicio = max(math.ceil(limite.periodo * (1 - libre)) - transcurrido, 1)
+
+    return Estado(
+        limite=limite,
+        permitido=permitido,
+        restantes=max(int(limite.capacidad - estimados), 0),
+        reinicio=reinicio,
+    )
+
+
+def ip_cliente(request):
+    # Misma lógica que DRF: REMOTE_ADDR, o la entrada de X-Forwarded-For que
+    # agregó el primero de los REST_FRAMEWORK['NUM_PROXIES'] proxies
+    return BaseThrottle().get_ident(request)
+
+
+def campos_cuerpo(request):
+    """Campos del cuerpo (JSON o formulario) sin pasar por DRF"""
+    if request.method not in ('POST', 'PUT', 'PATCH'):
+        return {}
+    try:
+        if int(request.META.get('CONTENT_LENGTH') or 0) > TAMANO_MAXIMO_CUERPO:
+            return {}
+        if request.content_type == 'application/json':
+            datos = json.loads(request.body or b'{}')
+            return datos if isinstance(datos, dict) else {}
+        return request.POST
+    except (ValueError, UnicodeDecodeError):
+        return {}
+
+
+def revisar(request, alcance, tasas):
+    """
+    Consume un token de cada bucket del endpoint, deteniéndose en el primero
+    que esté vacío. Retorna los estados de los buckets revisados.
+    """
+    campos = None
+    estados = []
+    for clave, tasa in tasas.items():
+        if clave == 'ip':
+            identidad = ip_cliente(request)
+        else:
+            if campos is None:
+                campos = campos_cuerpo(request)
+            valor = campos.get(clave)
+            if not isinstance(valor, str) or not valor.strip():
+                continue
+            identidad = valor.strip().lower()
+
+        estado = consumir(f'{alcance}:{clave}', identidad, parsear_tasa(tasa))
+        estados.append(estado)
+        if not estado.permitido:
+            break
+    return estados
+
+
+def agregar_cabeceras(respuesta, estados):
+    # Se informa el bucket más restrictivo
+    estado = min(estados, key=lambda e: (e.permitido, e.restantes))
+    respuesta['RateLimit-Limit'] = str(estado.limite.capacidad)
+    respuesta['RateLimit-Remaining'] = str(estado.restantes)
+    respuesta['RateLimit-Reset'] = str(estado.reinicio)
+    respuesta['RateLimit-Policy'] = ', '.join(e.limite.politica for e in estados)
+    if not estado.permitido:
+        respuesta['Retry-After'] = str(estado.reinicio)
+    return respuesta
+
+
+def alcance_de(request):
+    """Nombre de la URL resuelta; las vistas async (async-<nombre>) usan el de la síncrona"""
+    nombre = request.resolver_match.url_name if request.resolver_match else None
+    return nombre.removeprefix('async-') if nombre else None
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Aplica settings.RATELIMIT_RATES según el nombre de la URL resuelta.
+    MiddlewareMixin lo hace compatible con ASGI (las vistas async no pasan a
+    un hilo por este middleware).
+    """
+
+    def process_response(self, request, respuesta):
+        estados = getattr(request, 'ratelimit', None)
+        if estados:
+            agregar_cabeceras(respuesta, estados)
+        return respuesta
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'RATELIMIT_ENABLED', True):
+            return None
+        nombre = alcance_de(request)
+        tasas = getattr(settings, 'RATELIMIT_RATES', {}).get(nombre)
+        if not tasas or request.method == 'OPTIONS':
+            return None
+
+        estados = revisar(request, nombre, tasas)
+        request.ratelimit = estados
+        if estados and not estados[-1].permitido:
+            return JsonResponse({
+                'success': False,
+                'error': f'Demasiadas solicitudes. Intenta de nuevo en {estados[-1].reinicio} segundos.',
+            }, status=429)
+        return None
@@ -0,0 +1,123 @@
+"""
+Cambio de estado de envíos por lotes (bodega despachando cientos de envíos).
+
+Por cada bloque de referencias: una consulta trae y valida los envíos, un
+UPDATE aplica el estado y las fechas reales a todos los válidos a la vez, y
+bulk_create registra los seguimientos. Todo va en una sola transacción.
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import rastreo, sync
+from .models import Envio, SeguimientoEnvio
+
+
+# Estados desde los que se puede pasar a cada estado
+TRANSICIONES = {
+    'pendiente': (),
+    'en_transito': ('pendiente',),
+    'entregado': ('en_transito',),
+    'cancelado': ('pendiente', 'en_transito'),
+    'devuelto': ('en_transito', 'entregado'),
+}
+
+# Fecha real que se completa al llegar a cada estado (si aún no tiene)
+FECHAS_REALES = {
+    'en_transito': 'fecha_recogida_real',
+    'entregado': 'fecha_entrega_real',
+}
+
+# Campos que necesitan el UPDATE, el documento de rastreo y el registro de sync
+CAMPOS = (
+    'id', 'numero_guia', 'estado', 'prioridad', 'origen', 'destino',
+    'fecha_recogida_programada', 'fecha_entrega_programada',
+    'fecha_recogida_real', 'fecha_entrega_real', 'cliente', 'conductor',
+)
+
+ACTUALIZADO = 'actualizado'
+SIN_CAMBIOS = 'sin_cambios'
+NO_ENCONTRADO = 'no_encontrado'
+TRANSICION_INVALIDA = 'transicion_invalida'
+
+Resultado = namedtuple('Resultado', 'referencia resultado envio estado_anterior')
+
+
+def tamano_bloque():
+    """Referencias por consulta, dentro del límite de parámetros de la base de datos"""
+    # Dos listas (ids y guías) más el estado y las fechas en el UPDATE
+    return max((connection.features.max_query_params or 20000) - 10, 1)
+
+
+def _bloques(referencias, tamano):
+    for i in range(0, len(referencias), tamano):
+        yield referencias[i:i + tamano]
+
+
+def _cargar(referencias):
+    """{referencia: envio} para un bloque de ids (int) y números de guía (str)"""
+    ids = [r for r in referencias if isinstance(r, int)]
+    guias = [r for r in referencias if isinstance(r, str)]
+    envios = Envio.objects.filter(Q(id__in=ids) | Q(numero_guia__in=guias)).only(*CAMPOS).select_for_update()
+    encontrados = {}
+    for envio in envios:
+        encontrados[envio.id] = envio
+        encontrados[envio.numero_guia] = envio
+    return encontrados
+
+
+def cambiar_estado_lote(referencias, estado, usuario=None, descripcion='', ubicacion=''):
+    """
+    Cambia el estado de los envíos indicados por id o número de guía.
+    Retorna un Resultado por referencia, en el mismo orden.
+    """
+    origenes = TRANSICIONES[estado]
+    campo_fecha = FECHAS_REALES.get(estado)
+    ahora = timezone.now()
+    descripcion = descripcion or f"Estado cambiado a {estado}"
+
+    resultados = []
+    with transaction.atomic():
+        for bloque in _bloques(list(dict.fromkeys(referencias)), tamano_bloque()):
+            encontrados = _cargar(bloque)
+            validos = {}
+            for referencia in bloque:
+                envio = encontrados.get(referencia)
+                if envio is None:
+                    resultados.append(Resultado(referencia, NO_ENCONTRADO, None, None))
+                elif envio.id in validos or envio.estado == estado:
+                    # Ya está en el estado (o el mismo envío vino por id y por guía)
+                    resultados.append(Resultado(referencia, SIN_CAMBIOS, envio, envio.estado))
+                elif envio.estado not in origenes:
+                    resultados.append(Resultado(referencia, TRANSICION_INVALIDA, envio, envio.estado))
+                else:
+                    resultados.append(Resultado(referencia, ACTUALIZADO, envio, envio.estado))
+                    validos[envio.id] = envio
+            if not validos:
+                continue
+
+            # Un solo UPDATE para el bloque; update() no aplica auto_now
+            cambios = {'estado': estado, 'fecha_actualizacion': ahora}
+            if campo_fecha:
+                cambios[campo_fecha] = Coalesce(campo_fecha, Value(ahora))
+            Envio.objects.filter(id__in=list(validos), estado__in=origenes).update(**cambios)
+
+            eventos = {}
+            for envio in validos.values():
+                envio.estado = estado
+                if campo_fecha and getattr(envio, campo_fecha) is None:
+                    setattr(envio, campo_fecha, ahora)
+                eventos[envio] = SeguimientoEnvio(
+                    envio=envio, estado=estado, descripcion=descripcion,
+                    ubicacion=ubicacion, usuario=usuario,
+                )
+            SeguimientoEnvio.objects.bulk_create(eventos.values(), batch_size=1000)
+            rastreo.registrar_eventos_lote(eventos)
+            sync.registrar_lote('envios', validos.values())
+
+    # Las referencias repetidas en la entrada se reportan con el primer resultado
+    por_referencia = {resultado.referencia: resultado for resultado in resultados}
+    return [por_referencia[referencia] for referencia in referencias]
@@ -1,9 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .auth_views import (
     AuthView, RegisterView, LogoutView, UserProfileView, ChangePasswordView,
-    CategoriaViewSet, ProductoViewSet, CarritoView, PedidoViewSet,
+    CategoriaViewSet, ProductoViewSet, CarritoView, CarritoLoteView, PedidoViewSet,
     test_connection, check_email, check_phone, send_verification_code, verify_code,
     request_password_reset, verify_reset_code, reset_password
 )
@@ -34,8 +34,30 @@ urlpatterns = [
     path('auth/request-password-reset/', request_password_reset, name='request-password-reset'),
     path('auth/verify-reset-code/', verify_reset_code, name='verify-reset-code'),
     path('auth/reset-password/', reset_password, name='reset-password'),
+    # Rastreo público de envíos
+    path('rastreo/<str:numero_guia>/', views.rastreo_publico, name='rastreo-publico'),
+    # Posiciones GPS de conductores
+    path('posiciones/', views.registrar_posiciones, name='posiciones'),
+    # Sincronización incremental (app móvil)
+    path('sync/', views.sincronizar, name='sync'),
     # Carrito
     path('carrito/', CarritoView.as_view(), name='carrito'),
+    path('carrito/lote/', CarritoLoteView.as_view(), name='carrito-lote'),
     # Test
     path('test/', test_connection, name='test-connection'),
 ]
+
+# Lecturas async para servir con ASGI (logistics/async_views.py). Se llaman
+# async-<nombre de la vista síncrona>: comparten los límites de RATELIMIT_RATES
+# (throttling.alcance_de) sin que reverse() las confunda con las síncronas
+urlpatterns_async = [
+    path('auth/check-email/', async_views.check_email, name='async-check-email'),
+    path('auth/check-phone/', async_views.check_phone, name='async-check-phone'),
+    path('envios/buscar_por_guia/', async_views.buscar_por_guia, name='async-envio-buscar-por-guia'),
+    path('envios/<int:pk>/seguimiento/', async_views.seguimiento, name='async-envio-seguimiento'),
+    path('productos/', async_views.productos, name='async-producto-list'),
+    path('productos/<int:pk>/', async_views.producto, name='async-producto-detail'),
+    path('pedidos/estadisticas/', async_views.estadisticas, name='async-pedido-estadisticas'),
+]
+
+urlpatterns.append(path('async/', include(urlpatterns_async)))
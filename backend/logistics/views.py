@@ -1,13 +1,24 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.permissions import SAFE_METHODS, AllowAny
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from django.conf import settings
 from django.contrib.auth.models import User
-
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+import secrets
+
+from user_management.models import UserProfile
+from . import archivo, numeracion, posiciones, rastreo, sync, transiciones
+from .idempotencia import idempotente
+from .log import get_logger
 from .models import Conductor, Vehiculo, Envio, SeguimientoEnvio
+from .principal import principal_de
 from .serializers import (
     ClienteSerializer, ConductorSerializer, VehiculoSerializer, 
     EnvioSerializer, EnvioCreateSerializer, 
@@ -15,12 +26,13 @@ from .serializers import (
 )
 
 
+log = get_logger(__name__)
+
+
 class ClienteViewSet(viewsets.ModelViewSet):
     """API endpoint para gestionar clientes usando auth_user y UserProfile"""
     
     def get_queryset(self):
-        from django.contrib.auth.models import User
-        from user_management.models import UserProfile
         # Filter users with customer role and include UserProfile
         return User.objects.select_related('userprofile').filter(
             userprofile__role='customer'
@@ -35,8 +47,6 @@ class ClienteViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         """Update customer user and profile"""
-        from user_management.models import UserProfile
-        
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         data = request.data
@@ -91,12 +101,6 @@ class ConductorViewSet(viewsets.ModelViewSet):
     
     def create(self, request, *args, **kwargs):
         """Create conductor with user authentication account"""
-        from django.contrib.auth.models import User
-        from user_management.models import UserProfile
-        from django.db import transaction
-        from datetime import date
-        import secrets
-        
         data = request.data
         
         try:
@@ -150,7 +154,7 @@ class ConductorViewSet(viewsets.ModelViewSet):
                 
                 serializer = self.get_serializer(data=conductor_data)
                 serializer.is_valid(raise_exception=True)
-                conductor = serializer.save()
+                conductor = serializer.save(user=user)
                 
                 # Create vehicle if placa_vehiculo is provided
                 placa_vehiculo = data.get('placa_vehiculo', '').strip().upper()
@@ -178,9 +182,6 @@ class ConductorViewSet(viewsets.ModelViewSet):
                     
                     # Send password via email
                     try:
-                        from django.core.mail import send_mail
-                        from django.conf import settings
-                        
                         subject = 'Bienvenido a TecnoRoute - Credenciales de Acceso'
                         message = f'''
 ¡Hola {nombres} {apellidos}!
@@ -210,10 +211,10 @@ Equipo de TecnoRoute
                             fail_silently=True,
                         )
                         
-                        print(f"✅ Email enviado a {data.get('email')} con contraseña: {password}")
+                        log.info('conductores.email_credenciales_enviado', email=data.get('email'))
                         response_data['email_enviado'] = True
                     except Exception as e:
-                        print(f"❌ Error enviando email: {e}")
+                        log.exception('conductores.error_email_credenciales', email=data.get('email'))
                         response_data['email_enviado'] = False
                         response_data['mensaje'] += f' (No se pudo enviar el email: {str(e)})'
                 
@@ -224,20 +225,15 @@ Equipo de TecnoRoute
     
     def update(self, request, *args, **kwargs):
         """Update conductor and optionally update user password"""
-        from django.contrib.auth.models import User
-        
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         data = request.data
         
         # If password is provided, update user password
-        if data.get('password'):
-            try:
-                user = User.objects.get(email=instance.email)
-                user.set_password(data.get('password'))
-                user.save()
-            except User.DoesNotExist:
-                pass  # Continue with regular update if no user account exists
+        user = instance.user
+        if data.get('password') and user is not None:
+            user.set_password(data.get('password'))
+            user.save()
         
         # Remove password from data before serializing conductor
         conductor_data = data.copy()
@@ -295,64 +291,74 @@ Equipo de TecnoRoute
                 {'error': 'Estado no válido'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+    @action(detail=True, methods=['get'])
+    def posicion(self, request, pk=None):
+        """Última posición GPS del conductor (desde la caché, sin consultar el conductor)"""
+        try:
+            conductor_id = int(pk)
+        except ValueError:
+            return Response({'error': 'Conductor no válido'}, status=status.HTTP_400_BAD_REQUEST)
+        ultima = posiciones.ultima_posicion(conductor_id)
+        if ultima is None:
+            return Response({'error': 'Sin posiciones registradas'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ultima)
     
     @action(detail=False, methods=['post'])
     def guardar_datos_vehiculo(self, request):
         """Guardar datos temporales del vehículo del conductor"""
-        print(f"\n=== GUARDAR DATOS VEHICULO ===")
-        print(f"User: {request.user}")
-        print(f"User email: {request.user.email}")
-        print(f"Data received: {request.data}")
-        try:
-            # Buscar conductor por email del usuario autenticado
-            conductor = Conductor.objects.get(email=request.user.email)
-            print(f"Conductor encontrado: {conductor.nombres} {conductor.apellidos}")
-            
-            # Validar que la placa no esté siendo usada por otro conductor
-            placa = request.data.get('placa', '').strip().upper()
-            if placa:
-                # Verificar si otro conductor ya tiene esta placa temporal
-                other_conductor = Conductor.objects.filter(
-                    placa_temporal=placa
-                ).exclude(id=conductor.id).first()
-                
-                if other_conductor:
-                    return Response({
-                        'error': f'La placa {placa} ya está registrada por otro conductor'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Verificar si la placa ya existe en vehículos
-                from .models import Vehiculo
-                vehiculo_existente = Vehiculo.objects.filter(placa=placa).first()
-                if vehiculo_existente:
-                    return Response({
-                        'error': f'La placa {placa} ya está registrada en el sistema'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Guardar datos temporales
-            conductor.placa_temporal = request.data.get('placa', '').strip().upper()
-            conductor.marca_vehiculo_temporal = request.data.get('marca', '').strip()
-            conductor.modelo_vehiculo_temporal = request.data.get('modelo', '').strip()
-            conductor.año_vehiculo_temporal = request.data.get('año')
-            conductor.tipo_vehiculo_temporal = request.data.get('tipo', 'camion')
-            conductor.capacidad_kg_temporal = request.data.get('capacidad_kg')
-            conductor.color_vehiculo_temporal = request.data.get('color', 'Blanco').strip()
-            conductor.combustible_temporal = request.data.get('combustible', 'gasolina')
-            conductor.capacidad_motor_temporal = request.data.get('capacidad_motor')
-            conductor.save()
-            print(f"Datos guardados exitosamente")
-            print(f"Placa temporal: {conductor.placa_temporal}")
-            print(f"Marca temporal: {conductor.marca_vehiculo_temporal}")
-            
-            return Response({
-                'message': 'Datos del vehículo guardados exitosamente',
-                'conductor': self.get_serializer(conductor).data
-            }, status=status.HTTP_200_OK)
-        except Conductor.DoesNotExist:
+        log.debug('conductores.guardar_datos_vehiculo', usuario=request.user.id, datos=lambda: dict(request.data))
+        # Registro de conductor vinculado al usuario autenticado
+        conductor = principal_de(request.user).conductor
+        if conductor is None:
             return Response(
                 {'error': 'Conductor no encontrado'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Validar que la placa no esté siendo usada por otro conductor
+        placa = request.data.get('placa', '').strip().upper()
+        if placa:
+            # Verificar si otro conductor ya tiene esta placa temporal
+            other_conductor = Conductor.objects.filter(
+                placa_temporal=placa
+            ).exclude(id=conductor.id).first()
+            
+            if other_conductor:
+                return Response({
+                    'error': f'La placa {placa} ya está registrada por otro conductor'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Verificar si la placa ya existe en vehículos
+            vehiculo_existente = Vehiculo.objects.filter(placa=placa).first()
+            if vehiculo_existente:
+                return Response({
+                    'error': f'La placa {placa} ya está registrada en el sistema'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Guardar datos temporales
+        conductor.placa_temporal = request.data.get('placa', '').strip().upper()
+        conductor.marca_vehiculo_temporal = request.data.get('marca', '').strip()
+        conductor.modelo_vehiculo_temporal = request.data.get('modelo', '').strip()
+        conductor.año_vehiculo_temporal = request.data.get('año')
+        conductor.tipo_vehiculo_temporal = request.data.get('tipo', 'camion')
+        conductor.capacidad_kg_temporal = request.data.get('capacidad_kg')
+        conductor.color_vehiculo_temporal = request.data.get('color', 'Blanco').strip()
+        conductor.combustible_temporal = request.data.get('combustible', 'gasolina')
+        conductor.capacidad_motor_temporal = request.data.get('capacidad_motor')
+        # El registro puede venir de la caché de autenticación: solo se
+        # escriben los campos temporales para no pisar otros cambios
+        conductor.save(update_fields=[
+            'placa_temporal', 'marca_vehiculo_temporal', 'modelo_vehiculo_temporal',
+            'año_vehiculo_temporal', 'tipo_vehiculo_temporal', 'capacidad_kg_temporal',
+            'color_vehiculo_temporal', 'combustible_temporal', 'capacidad_motor_temporal',
+        ])
+        log.info('conductores.datos_vehiculo_guardados', conductor=conductor.id, placa=conductor.placa_temporal)
+        
+        return Response({
+            'message': 'Datos del vehículo guardados exitosamente',
+            'conductor': self.get_serializer(conductor).data
+        }, status=status.HTTP_200_OK)
 
 
 class VehiculoViewSet(viewsets.ModelViewSet):
@@ -508,6 +514,15 @@ class EnvioViewSet(viewsets.ModelViewSet):
             return EnvioCreateSerializer
         return EnvioSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # EnvioSerializer incluye los seguimientos: una consulta para todos los
+        # envíos (archivo.eventos lee el prefetch). Solo en lecturas: las
+        # acciones que crean un seguimiento serializan el envío después
+        if self.request.method in SAFE_METHODS and self.get_serializer_class() is EnvioSerializer:
+            queryset = queryset.prefetch_related('seguimientos')
+        return queryset
+
     @action(detail=False, methods=['get'])
     def pendientes(self, request):
         """Obtener envíos pendientes"""
@@ -522,7 +537,35 @@ class EnvioViewSet(viewsets.ModelViewSet):
         serializer = EnvioListSerializer(envios_transito, many=True)
         return Response(serializer.data)
 
+    def _numero_guia(self, request):
+        """Guía del envío, fuera de la transacción de la Idempotency-Key (si no viene en el cuerpo)"""
+        if request.data.get('numero_guia'):
+            return {}
+        return {'numero_guia': numeracion.siguiente('guia')}
+
+    @idempotente(antes=_numero_guia)
+    def create(self, request, *args, numero_guia=None, **kwargs):
+        """Crear envío (admite la cabecera Idempotency-Key)"""
+        self.numero_guia = numero_guia
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        if serializer.validated_data.get('numero_guia'):
+            envio = serializer.save()
+        else:
+            envio = serializer.save(numero_guia=self.numero_guia or numeracion.siguiente('guia'))
+        rastreo.reconstruir(envio)
+
+    def perform_update(self, serializer):
+        envio = serializer.save()
+        rastreo.reconstruir(envio)
+
+    def perform_destroy(self, instance):
+        rastreo.invalidar(instance.numero_guia)
+        instance.delete()
+
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def cambiar_estado(self, request, pk=None):
         """Cambiar el estado de un envío y crear seguimiento"""
         envio = self.get_object()
@@ -535,20 +578,21 @@ class EnvioViewSet(viewsets.ModelViewSet):
             
             # Actualizar fechas según el estado
             if nuevo_estado == 'en_transito' and not envio.fecha_recogida_real:
-                envio.fecha_recogida_real = datetime.now()
+                envio.fecha_recogida_real = timezone.now()
             elif nuevo_estado == 'entregado' and not envio.fecha_entrega_real:
-                envio.fecha_entrega_real = datetime.now()
+                envio.fecha_entrega_real = timezone.now()
             
             envio.save()
             
             # Crear seguimiento
-            SeguimientoEnvio.objects.create(
+            seguimiento = SeguimientoEnvio.objects.create(
                 envio=envio,
                 estado=nuevo_estado,
                 descripcion=descripcion or f"Estado cambiado a {nuevo_estado}",
                 ubicacion=ubicacion,
                 usuario=request.user if request.user.is_authenticated else None
             )
+            rastreo.registrar_evento(envio, seguimiento)
             
             serializer = self.get_serializer(envio)
             return Response(serializer.data)
@@ -558,35 +602,98 @@ class EnvioViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'])
+    def cambiar_estado_lote(self, request):
+        """
+        Cambiar el estado de varios envíos a la vez.
+        Body: {"estado": "en_transito", "ids": [1, 2], "numeros_guia": ["GU-1"], "descripcion": "", "ubicacion": ""}
+        """
+        nuevo_estado = request.data.get('estado')
+        ids = request.data.get('ids') or []
+        numeros_guia = request.data.get('numeros_guia') or []
+
+        if nuevo_estado not in transiciones.TRANSICIONES:
+            return Response({'error': 'Estado no válido'}, status=status.HTTP_400_BAD_REQUEST)
+        if (
+            not isinstance(ids, list) or not isinstance(numeros_guia, list)
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+            or not all(isinstance(g, str) for g in numeros_guia)
+        ):
+            return Response(
+                {'error': 'ids debe ser una lista de enteros y numeros_guia una lista de textos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        maximo = getattr(settings, 'ENVIOS_CAMBIO_ESTADO_MAXIMO', 10000)
+        if not ids and not numeros_guia:
+            return Response({'error': 'Debe indicar ids o numeros_guia'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) + len(numeros_guia) > maximo:
+            return Response(
+                {'error': f'Máximo {maximo} envíos por petición'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = transiciones.cambiar_estado_lote(
+            ids + numeros_guia, nuevo_estado,
+            usuario=request.user if request.user.is_authenticated else None,
+            descripcion=request.data.get('descripcion', ''),
+            ubicacion=request.data.get('ubicacion', ''),
+        )
+        conteo = {}
+        for resultado in resultados:
+            conteo[resultado.resultado] = conteo.get(resultado.resultado, 0) + 1
+        log.info('envios.cambiar_estado_lote', estado=nuevo_estado, **conteo)
+
+        return Response({
+            'estado': nuevo_estado,
+            'resumen': conteo,
+            'resultados': [
+                {
+                    'referencia': resultado.referencia,
+                    'id': resultado.envio.id if resultado.envio else None,
+                    'numero_guia': resultado.envio.numero_guia if resultado.envio else None,
+                    'resultado': resultado.resultado,
+                    'estado_anterior': resultado.estado_anterior,
+                }
+                for resultado in resultados
+            ],
+        })
+
     @action(detail=True, methods=['get'])
     def seguimiento(self, request, pk=None):
-        """Obtener el seguimiento completo de un envío"""
-        envio = self.get_object()
-        seguimientos = envio.seguimientos.all()
-        serializer = SeguimientoEnvioSerializer(seguimientos, many=True)
-        return Response(serializer.data)
+        """
+        Últimos eventos del envío, del documento de rastreo. Con ?completo=1,
+        la historia completa (incluye eventos archivados y el usuario).
+        """
+        if request.query_params.get('completo') in ('1', 'true'):
+            envio = self.get_object()
+            serializer = SeguimientoEnvioSerializer(archivo.eventos(envio), many=True)
+            return Response(serializer.data)
+        numero_guia = Envio.objects.filter(pk=pk).values_list('numero_guia', flat=True).first()
+        documento = rastreo.obtener(numero_guia) if numero_guia else None
+        if documento is None:
+            return Response({'error': 'Envío no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(documento['eventos'])
 
     @action(detail=False, methods=['get'])
     def buscar_por_guia(self, request):
-        """Buscar envío por número de guía"""
+        """Buscar envío por número de guía (documento de rastreo, el mismo de /api/rastreo/)"""
         numero_guia = request.query_params.get('numero_guia')
         if not numero_guia:
             return Response(
                 {'error': 'Debe proporcionar un número de guía'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        try:
-            envio = Envio.objects.get(numero_guia=numero_guia)
-            serializer = self.get_serializer(envio)
-            return Response(serializer.data)
-        except Envio.DoesNotExist:
+
+        documento = rastreo.obtener(numero_guia)
+        if documento is None:
             return Response(
                 {'error': 'Envío no encontrado'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(documento)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def asignar_vehiculo_conductor(self, request, pk=None):
         """Asignar vehículo y conductor a un envío"""
         envio = self.get_object()
@@ -609,12 +716,13 @@ class EnvioViewSet(viewsets.ModelViewSet):
             envio.save()
             
             # Crear seguimiento
-            SeguimientoEnvio.objects.create(
+            seguimiento = SeguimientoEnvio.objects.create(
                 envio=envio,
                 estado='asignado',
                 descripcion=f"Vehículo y conductor asignados",
                 usuario=request.user if request.user.is_authenticated else None
             )
+            rastreo.registrar_evento(envio, seguimiento)
             
             serializer = self.get_serializer(envio)
             return Response(serializer.data)
@@ -635,5 +743,99 @@ class SeguimientoEnvioViewSet(viewsets.ModelViewSet):
     ordering_fields = ['fecha_hora']
     ordering = ['-fecha_hora']
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        seguimiento = serializer.save()
+        rastreo.registrar_evento(seguimiento.envio, seguimiento)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        seguimiento = serializer.save()
+        rastreo.reconstruir(seguimiento.envio)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        envio = instance.envio
+        instance.delete()
+        rastreo.reconstruir(envio)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def rastreo_publico(request, numero_guia):
+    """Rastreo público por número de guía (documento precalculado, sin login)"""
+    documento = rastreo.obtener(numero_guia)
+    if documento is None:
+        return Response({'error': 'Envío no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    respuesta = Response(documento)
+    respuesta['Cache-Control'] = f'public, max-age={getattr(settings, "RASTREO_CACHE_CONTROL", 30)}'
+    return respuesta
+
 
 # PedidoTransporteViewSet eliminado - funcionalidad consolidada en PedidoViewSet de auth_views
+
+
+@api_view(['POST'])
+def registrar_posiciones(request):
+    """
+    Posiciones GPS por lotes. Body: {"posiciones": [{"lat": 4.65, "lon": -74.05,
+    "fecha_hora": "2025-01-01T08:00:00-05:00", "velocidad": 40, "rumbo": 90,
+    "precision": 5, "envio": 12}, ...]}. Los administradores indican
+    "conductor_id" en cada posición.
+    """
+    principal = principal_de(request.user)
+    if principal.conductor_id is None and not principal.is_admin:
+        return Response({'error': 'Solo conductores pueden reportar posiciones'}, status=status.HTTP_403_FORBIDDEN)
+
+    datos = request.data.get('posiciones')
+    maximo = getattr(settings, 'POSICIONES_MAXIMO_POR_PETICION', 1000)
+    if not isinstance(datos, list) or not datos:
+        return Response({'error': 'Debe enviar una lista de posiciones'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(datos) > maximo:
+        return Response({'error': f'Máximo {maximo} posiciones por petición'}, status=status.HTTP_400_BAD_REQUEST)
+
+    validas, rechazadas = [], []
+    ahora = timezone.now()
+    for indice, dato in enumerate(datos):
+        conductor_id = principal.conductor_id
+        if principal.is_admin and isinstance(dato, dict) and dato.get('conductor_id') is not None:
+            conductor_id = dato['conductor_id']
+        try:
+            if not isinstance(conductor_id, int) or isinstance(conductor_id, bool):
+                raise ValueError('conductor_id inválido')
+            validas.append(posiciones.parsear(dato, conductor_id, ahora))
+        except ValueError as error:
+            rechazadas.append({'indice': indice, 'error': str(error)})
+
+    posiciones.registrar(validas)
+    return Response({'aceptadas': len(validas), 'rechazadas': rechazadas}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def sincronizar(request):
+    """
+    Sincronización incremental. Query: una marca por colección
+    (?productos=120&pedidos=87); vacía para recibir la colección completa.
+    Sin parámetros se devuelven todas las colecciones completas. Con hay_mas,
+    la página siguiente se pide con el valor de continuar (?pedidos=87:1500).
+    """
+    if request.query_params:
+        desconocidas = set(request.query_params) - set(sync.COLECCIONES)
+        if desconocidas:
+            return Response(
+                {'error': f'Colecciones desconocidas: {", ".join(sorted(desconocidas))}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            marcas = {
+                nombre: sync.parsear_marca(valor)
+                for nombre, valor in request.query_params.items()
+            }
+        except ValueError:
+            return Response({'error': 'Las marcas deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        marcas = dict.fromkeys(sync.COLECCIONES)
+
+    resultado = sync.sincronizar(principal_de(request.user), marcas, {'request': request})
+    return Response(resultado)
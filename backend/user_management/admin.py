@@ -1,12 +1,16 @@
 from django.contrib import admin
-from .models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem, Contacto
+
+from logistics.admin_tablas import TablaGrandeAdmin
+from .models import UserProfile, Categoria, Producto, Carrito, CarritoItem, Pedido, PedidoItem, Contacto, MovimientoStock
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(TablaGrandeAdmin):
     list_display = ('user', 'role', 'nombres', 'apellidos', 'telefono', 'ciudad', 'fecha_creacion')
+    list_select_related = ('user',)
     list_filter = ('role', 'ciudad')
     search_fields = ('user__username', 'user__email', 'nombres', 'apellidos', 'telefono')
+    autocomplete_fields = ('user',)
 
 
 @admin.register(Categoria)
@@ -18,44 +22,77 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'categoria', 'precio', 'stock', 'activo', 'fecha_creacion')
+    list_display = ('nombre', 'categoria', 'precio', 'stock', 'reservado', 'activo', 'fecha_creacion')
+    list_select_related = ('categoria',)
     list_filter = ('categoria', 'activo')
     search_fields = ('nombre', 'descripcion')
 
+    def save_model(self, request, obj, form, change):
+        # Un cambio de stock queda en el libro como ajuste de este usuario
+        obj._usuario_stock = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(TablaGrandeAdmin):
+    """Libro de inventario: solo lectura"""
+    list_display = ('fecha', 'producto', 'cantidad', 'motivo', 'referencia', 'usuario')
+    list_select_related = ('producto', 'usuario')
+    list_filter = ('motivo', 'fecha')
+    search_fields = ('producto__nombre', 'referencia')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Carrito)
-class CarritoAdmin(admin.ModelAdmin):
+class CarritoAdmin(TablaGrandeAdmin):
     list_display = ('usuario', 'fecha_creacion', 'fecha_actualizacion')
+    list_select_related = ('usuario',)
     search_fields = ('usuario__username',)
+    autocomplete_fields = ('usuario',)
 
 
 @admin.register(CarritoItem)
-class CarritoItemAdmin(admin.ModelAdmin):
+class CarritoItemAdmin(TablaGrandeAdmin):
     list_display = ('carrito', 'producto', 'cantidad', 'subtotal', 'fecha_agregado')
+    list_select_related = ('carrito__usuario', 'producto')
     list_filter = ('fecha_agregado',)
+    autocomplete_fields = ('carrito', 'producto')
 
 
 @admin.register(Pedido)
-class PedidoAdmin(admin.ModelAdmin):
+class PedidoAdmin(TablaGrandeAdmin):
     list_display = ('numero_pedido', 'usuario', 'estado', 'total', 'conductor', 'fecha_creacion')
+    list_select_related = ('usuario', 'conductor')
     list_filter = ('estado', 'fecha_creacion')
     search_fields = ('numero_pedido', 'usuario__username', 'usuario__email')
-    date_hierarchy = 'fecha_creacion'
+    autocomplete_fields = ('usuario', 'conductor')
 
 
 @admin.register(PedidoItem)
-class PedidoItemAdmin(admin.ModelAdmin):
+class PedidoItemAdmin(TablaGrandeAdmin):
     list_display = ('pedido', 'producto', 'cantidad', 'precio_unitario', 'subtotal')
+    list_select_related = ('pedido__usuario', 'producto')
     search_fields = ('pedido__numero_pedido', 'producto__nombre')
+    autocomplete_fields = ('pedido', 'producto')
 
 
 @admin.register(Contacto)
 class ContactoAdmin(admin.ModelAdmin):
     list_display = ('get_nombre_completo', 'email', 'asunto', 'fecha_envio', 'leido', 'respondido', 'usuario')
+    list_select_related = ('usuario',)
     list_filter = ('leido', 'respondido', 'fecha_envio')
     search_fields = ('nombres', 'apellidos', 'email', 'asunto', 'mensaje')
     date_hierarchy = 'fecha_envio'
     readonly_fields = ('fecha_envio',)
+    autocomplete_fields = ('usuario',)
     
     def get_nombre_completo(self, obj):
         return f"{obj.nombres} {obj.apellidos}"
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def stock_inicial(apps, schema_editor):
+    """El stock actual de cada producto como su primer movimiento"""
+    Producto = apps.get_model('user_management', 'Producto')
+    MovimientoStock = apps.get_model('user_management', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(producto_id=producto_id, cantidad=stock, motivo='inicial')
+            for producto_id, stock in Producto.objects.exclude(stock=0).values_list('id', 'stock').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_management', '0006_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('movimiento_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='user_management.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Stock',
+                'verbose_name_plural': 'Snapshots de Stock',
+                'indexes': [models.Index(fields=['producto', 'movimiento_id'], name='user_manage_product_8a25b4_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('motivo', models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('cancelacion', 'Cancelación'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('referencia', models.CharField(blank=True, max_length=50)),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='user_management.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Movimientos de Stock',
+                'indexes': [models.Index(fields=['producto', 'id'], name='user_manage_product_1784e1_idx')],
+            },
+        ),
+        migrations.RunPython(stock_inicial, migrations.RunPython.noop),
+    ]
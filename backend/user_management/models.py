@@ -1,4 +1,6 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -43,6 +45,8 @@ class Producto(models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stock = models.IntegerField(validators=[MinValueValidator(0)])
+    # Unidades apartadas por carritos (ReservaStock); solo cambia con UPDATE condicionales
+    reservado = models.IntegerField(default=0, editable=False)
     imagen_url = models.URLField(blank=True)
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -51,6 +55,57 @@ class Producto(models.Model):
     def __str__(self):
         return self.nombre
 
+    @property
+    def disponible(self):
+        """Stock que se puede vender (sin lo reservado por carritos)"""
+        return max(self.stock - self.reservado, 0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Stock al cargar: save() aplica la diferencia como un ajuste
+        instancia._stock_cargado = instancia.__dict__.get('stock')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if self.stock:
+                    MovimientoStock.objects.create(producto=self, cantidad=self.stock, motivo='inicial')
+            self._stock_cargado = self.stock
+            return
+
+        # Un save() con la instancia vieja no debe pisar las reservas ni las
+        # ventas hechas mientras tanto: reservado no se escribe y el stock
+        # cambia con un UPDATE relativo que queda en el libro de inventario
+        campos = kwargs.get('update_fields')
+        if campos is None:
+            campos = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'reservado'
+            ]
+        cargado = getattr(self, '_stock_cargado', None)
+        diferencia = 0
+        if 'stock' in campos and cargado is not None:
+            diferencia = self.stock - cargado
+            campos = [campo for campo in campos if campo != 'stock']
+        kwargs['update_fields'] = campos
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if diferencia:
+                ajustado = Producto.objects.filter(pk=self.pk, stock__gte=-diferencia).update(
+                    stock=F('stock') + diferencia
+                )
+                if not ajustado:
+                    raise ValidationError('El ajuste dejaría el stock en negativo')
+                MovimientoStock.objects.create(
+                    producto=self, cantidad=diferencia, motivo='ajuste',
+                    usuario=getattr(self, '_usuario_stock', None),
+                )
+                self.refresh_from_db(fields=['stock'])
+        self._stock_cargado = self.stock
+
 class Carrito(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -79,6 +134,68 @@ class CarritoItem(models.Model):
     def subtotal(self):
         return self.cantidad * self.producto.precio
 
+class ReservaStock(models.Model):
+    """
+    Unidades de un producto apartadas para un carrito hasta `expira`
+    (logistics/reservas.py). La suma por producto es Producto.reservado.
+    """
+    carrito = models.ForeignKey(Carrito, related_name='reservas', on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, related_name='reservas', on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField(db_index=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Reserva de Stock"
+        verbose_name_plural = "Reservas de Stock"
+        unique_together = ['carrito', 'producto']
+
+    def __str__(self):
+        return f"{self.cantidad}x {self.producto_id} - carrito {self.carrito_id} (hasta {self.expira})"
+
+class MovimientoStock(models.Model):
+    """
+    Entrada del libro de inventario (logistics/inventario.py). Solo se
+    agregan filas: el stock de un producto es la suma de sus movimientos.
+    """
+    MOTIVOS = [
+        ('inicial', 'Stock inicial'),
+        ('venta', 'Venta'),
+        ('cancelacion', 'Cancelación'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    producto = models.ForeignKey(Producto, related_name='movimientos', on_delete=models.CASCADE)
+    cantidad = models.IntegerField()  # positivo entra, negativo sale
+    motivo = models.CharField(max_length=20, choices=MOTIVOS)
+    # Número de pedido (texto: el pedido puede eliminarse al cancelarlo)
+    referencia = models.CharField(max_length=50, blank=True)
+    usuario = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        indexes = [models.Index(fields=['producto', 'id'])]
+
+    def __str__(self):
+        return f"{self.cantidad:+d} {self.producto_id} ({self.motivo})"
+
+class SnapshotStock(models.Model):
+    """Stock de un producto sumando los movimientos hasta `movimiento_id` inclusive"""
+    producto = models.ForeignKey(Producto, related_name='snapshots', on_delete=models.CASCADE)
+    stock = models.IntegerField()
+    movimiento_id = models.BigIntegerField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Snapshot de Stock"
+        verbose_name_plural = "Snapshots de Stock"
+        indexes = [models.Index(fields=['producto', 'movimiento_id'])]
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.stock} (movimiento {self.movimiento_id})"
+
 class Pedido(models.Model):
     ESTADOS_PEDIDO = [
         ('pendiente', 'Pendiente'),
@@ -8,6 +8,11 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 
+from logistics.log import get_logger
+
+
+log = get_logger(__name__)
+
 
 class EmailVerificationCode:
     """Generador y validador de códigos de verificación"""
@@ -92,12 +97,8 @@ Equipo de TecnoRoute
                 [email],
                 fail_silently=True,
             )
-            print(f"✅ Email enviado a {email} con código: {code}")
+            log.info('verificacion.email_enviado', email=email)
             return True
-        except Exception as e:
-            print(f"❌ Error enviando email: {e}")
-            # En desarrollo, imprimir el código en consola
-            print(f"\n{'='*50}")
-            print(f"CÓDIGO DE VERIFICACIÓN PARA {email}: {code}")
-            print(f"{'='*50}\n")
+        except Exception:
+            log.exception('verificacion.error_email', email=email)
             return True
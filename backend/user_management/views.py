@@ -13,9 +13,14 @@ from rest_framework.authtoken.models import Token
 from django.db import transaction
 import json
 
+from logistics.log import get_logger
+from logistics.login import iniciar_sesion
 from .models import UserProfile, Contacto
 
 
+log = get_logger(__name__)
+
+
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -141,14 +146,10 @@ def login_user(request):
     try:
         data = request.data if hasattr(request, 'data') else json.loads(request.body)
         
-        print(f"\n=== DEBUG LOGIN ===")
-        print(f"Data recibida: {data}")
-        
         username = data.get('username') or data.get('email')
         password = data.get('password')
         
-        print(f"Username extraído: {username}")
-        print(f"Password presente: {bool(password)}")
+        log.debug('login.intento', username=username, password_presente=bool(password))
         
         if not username or not password:
             return Response({
@@ -156,27 +157,16 @@ def login_user(request):
                 'error': 'Email y contraseña son requeridos'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Intentar autenticar
-        print(f"Intentando autenticar con username={username}")
-        user = authenticate(username=username, password=password)
-        print(f"Resultado autenticación: {user}")
+        # Intentar autenticar (usuario, perfil y token en una sola consulta)
+        sesion = iniciar_sesion(password, username=username, request=request)
+        log.info('login.resultado', username=username, exitoso=sesion is not None)
         
-        if user is not None:
+        if sesion is not None:
+            user = sesion.user
             if user.is_active:
-                # Obtener o crear token
-                token, created = Token.objects.get_or_create(user=user)
-                
-                # Obtener perfil del usuario
-                try:
-                    profile = UserProfile.objects.get(user=user)
-                    role = profile.role
-                except UserProfile.DoesNotExist:
-                    # Crear perfil básico si no existe
-                    profile = UserProfile.objects.create(
-                        user=user,
-                        role='admin' if user.is_superuser else 'customer'
-                    )
-                    role = profile.role
+                token = sesion.token
+                profile = sesion.principal.profile
+                role = profile.role
                 
                 return Response({
                     'success': True,
@@ -43,10 +43,13 @@ export const AuthProvider = ({ children }) => {
           ? { email: emailOrUsername, password }
           : { username: emailOrUsername, password };
         
+        // El carrito armado sin sesión se fusiona con el del usuario al iniciar sesión
+        const carritoInvitado = localStorage.getItem('carritoInvitado');
         const response = await fetch('http://localhost:8000/api/auth/login/', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            ...(carritoInvitado && { 'X-Carrito-Invitado': carritoInvitado }),
           },
           body: JSON.stringify(requestBody)
         });
@@ -80,6 +83,7 @@ export const AuthProvider = ({ children }) => {
           setUser(userData);
           localStorage.setItem('user', JSON.stringify(userData));
           localStorage.setItem('authToken', data.token);
+          localStorage.removeItem('carritoInvitado');
           
           console.log('Login exitoso:', userData);
           return { success: true };
@@ -18,20 +18,14 @@ export const CartProvider = ({ children }) => {
   const [error, setError] = useState(null);
   const { user, isAuthenticated } = useAuth();
 
-  // Load cart from backend when user logs in
+  // Load cart from backend when user logs in or out (guests keep a cart too;
+  // it is merged into the user's cart on login)
   useEffect(() => {
-    if (isAuthenticated && user) {
-      loadCartFromBackend();
-    } else {
-      // Clear cart when user logs out
-      setCartItems([]);
-    }
+    loadCartFromBackend();
   }, [isAuthenticated, user]);
 
   // Load cart from backend
   const loadCartFromBackend = async () => {
-    if (!isAuthenticated) return;
-    
     try {
       setLoading(true);
       setError(null);
@@ -46,7 +40,7 @@ export const CartProvider = ({ children }) => {
         imagen_url: item.producto.imagen_url,
         categoria: item.producto.categoria,
         quantity: item.cantidad,
-        cartItemId: item.id, // Store the cart item ID for updates/deletes
+        cartItemId: item.id, // Store the cart item ID for updates/deletes (product ID for guests)
         stock: item.producto.stock
       }));
       
@@ -61,11 +55,6 @@ export const CartProvider = ({ children }) => {
   };
 
   const addToCart = async (product, quantity = 1) => {
-    if (!isAuthenticated) {
-      setError('Debes iniciar sesión para agregar productos al carrito');
-      return false;
-    }
-
     try {
       setLoading(true);
       setError(null);
@@ -84,8 +73,6 @@ export const CartProvider = ({ children }) => {
   };
 
   const removeFromCart = async (productId) => {
-    if (!isAuthenticated) return false;
-
     try {
       setLoading(true);
       setError(null);
@@ -111,8 +98,6 @@ export const CartProvider = ({ children }) => {
   };
 
   const updateQuantity = async (productId, quantity) => {
-    if (!isAuthenticated) return false;
-
     if (quantity <= 0) {
       return await removeFromCart(productId);
     }
@@ -142,8 +127,6 @@ export const CartProvider = ({ children }) => {
   };
 
   const clearCart = async () => {
-    if (!isAuthenticated) return false;
-
     try {
       setLoading(true);
       setError(null);
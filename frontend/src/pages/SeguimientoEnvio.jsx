@@ -140,13 +140,10 @@ const SeguimientoEnvio = () => {
         console.log('No es un código de pedido, intentando como número de guía');
       }
       
-      // Si no es un pedido, buscar como envío
+      // Si no es un pedido, buscar como envío (el documento de rastreo trae los últimos eventos)
       const response = await enviosAPI.buscarPorGuia(codigoBusqueda);
       setEnvio(response.data);
-      
-      // Obtener seguimientos del envío
-      const seguimientoResponse = await enviosAPI.getSeguimiento(response.data.id);
-      setSeguimientos(seguimientoResponse.data || []);
+      setSeguimientos(response.data.eventos || []);
     } catch (error) {
       console.error('Error buscando envío:', error);
       setError('No se encontró el pedido o envío con el código proporcionado');
@@ -321,16 +318,27 @@ const SeguimientoEnvio = () => {
                         />
                       </Typography>
                     </Box>
-                    <Box sx={{ mb: 1 }}>
-                      <Typography variant="body2">
-                        <strong>Peso:</strong> {envio.peso_kg} kg
-                      </Typography>
-                    </Box>
-                    <Box sx={{ mb: 1 }}>
-                      <Typography variant="body2">
-                        <strong>Valor Declarado:</strong> ${envio.valor_declarado?.toLocaleString('es-CO')}
-                      </Typography>
-                    </Box>
+                    {envio.peso_kg !== undefined && (
+                      <Box sx={{ mb: 1 }}>
+                        <Typography variant="body2">
+                          <strong>Peso:</strong> {envio.peso_kg} kg
+                        </Typography>
+                      </Box>
+                    )}
+                    {envio.valor_declarado !== undefined && (
+                      <Box sx={{ mb: 1 }}>
+                        <Typography variant="body2">
+                          <strong>Valor Declarado:</strong> ${envio.valor_declarado?.toLocaleString('es-CO')}
+                        </Typography>
+                      </Box>
+                    )}
+                    {envio.eta && (
+                      <Box sx={{ mb: 1 }}>
+                        <Typography variant="body2">
+                          <strong>Entrega Estimada:</strong> {formatDateTime(envio.eta)}
+                        </Typography>
+                      </Box>
+                    )}
                   </CardContent>
                 </Card>
               </Grid>
@@ -341,22 +349,26 @@ const SeguimientoEnvio = () => {
                     <Typography variant="subtitle2" color="text.secondary" gutterBottom>
                       DESTINATARIO
                     </Typography>
-                    <Box sx={{ mb: 1 }}>
-                      <Typography variant="body2">
-                        <strong>Nombre:</strong> {envio.cliente?.nombre}
-                      </Typography>
-                    </Box>
-                    <Box sx={{ mb: 1 }}>
-                      <Typography variant="body2">
-                        <strong>Teléfono:</strong> {envio.cliente?.telefono}
-                      </Typography>
-                    </Box>
+                    {envio.cliente && (
+                      <>
+                        <Box sx={{ mb: 1 }}>
+                          <Typography variant="body2">
+                            <strong>Nombre:</strong> {envio.cliente.nombre}
+                          </Typography>
+                        </Box>
+                        <Box sx={{ mb: 1 }}>
+                          <Typography variant="body2">
+                            <strong>Teléfono:</strong> {envio.cliente.telefono}
+                          </Typography>
+                        </Box>
+                      </>
+                    )}
                     <Box sx={{ mb: 1 }}>
                       <Typography variant="body2">
                         <strong>Dirección de Entrega:</strong>
                       </Typography>
                       <Typography variant="body2" color="text.secondary">
-                        {envio.direccion_entrega}
+                        {envio.direccion_entrega || envio.destino}
                       </Typography>
                     </Box>
                   </CardContent>
@@ -418,14 +430,14 @@ const SeguimientoEnvio = () => {
             {seguimientos.length > 0 ? (
               <Stepper orientation="vertical">
                 {seguimientos.map((seguimiento, index) => (
-                  <Step key={seguimiento.id} active={true} completed={index < seguimientos.length - 1}>
+                  <Step key={seguimiento.id ?? index} active={true} completed={index < seguimientos.length - 1}>
                     <StepLabel>
                       <Box>
                         <Typography variant="subtitle2">
                           {seguimiento.estado}
                         </Typography>
                         <Typography variant="caption" color="text.secondary">
-                          {formatDateTime(seguimiento.fecha_hora)} - {seguimiento.usuario}
+                          {formatDateTime(seguimiento.fecha_hora)}{seguimiento.usuario && ` - ${seguimiento.usuario}`}
                         </Typography>
                       </Box>
                     </StepLabel>
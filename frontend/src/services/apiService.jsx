@@ -16,6 +16,11 @@ apiService.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Token ${token}`;
     }
+    // Carrito de invitado (sin sesión): el backend lo identifica por esta cabecera
+    const carritoInvitado = localStorage.getItem('carritoInvitado');
+    if (carritoInvitado) {
+      config.headers['X-Carrito-Invitado'] = carritoInvitado;
+    }
     return config;
   },
   (error) => {
@@ -26,6 +31,10 @@ apiService.interceptors.request.use(
 // Response interceptor for error handling
 apiService.interceptors.response.use(
   (response) => {
+    const carritoInvitado = response.headers?.['x-carrito-invitado'];
+    if (carritoInvitado) {
+      localStorage.setItem('carritoInvitado', carritoInvitado);
+    }
     return response;
   },
   (error) => {
@@ -81,6 +90,7 @@ const API_ENDPOINTS = {
   productos: '/api/productos/',
   categorias: '/api/categorias/',
   carrito: '/api/carrito/',
+  carritoLote: '/api/carrito/lote/',
   
   // Autenticación
   login: '/api/auth/login/',
@@ -191,15 +201,16 @@ export const carritoAPI = {
   removeItem: (itemId) => apiService.delete(API_ENDPOINTS.carrito, {
     data: { item_id: itemId }
   }),
+  // Varias operaciones en una petición: [{ accion: 'agregar' | 'fijar' | 'quitar', producto_id, cantidad }]
+  batch: (operaciones) => apiService.post(API_ENDPOINTS.carritoLote, { operaciones }),
   clear: () => {
-    // Clear cart by removing all items - will be handled by getting cart and removing each item
+    // Vaciar el carrito quitando todos los items en una sola petición
     return apiService.get(API_ENDPOINTS.carrito).then(response => {
-      const promises = response.data.items?.map(item => 
-        apiService.delete(API_ENDPOINTS.carrito, {
-          data: { item_id: item.id }
-        })
-      ) || [];
-      return Promise.all(promises);
+      const operaciones = response.data.items?.map(item => ({
+        accion: 'quitar',
+        producto_id: item.producto.id
+      })) || [];
+      return operaciones.length ? apiService.post(API_ENDPOINTS.carritoLote, { operaciones }) : response;
     });
   }
 };